@@ -81,6 +81,10 @@ THIRD_PARTY_PY_ABSL_PY = [
     requirement("absl-py"),
 ]
 
+THIRD_PARTY_PY_ASGIREF = [
+    requirement("asgiref"),
+]
+
 THIRD_PARTY_PY_FIREBASE_ADMIN = [
     requirement("firebase-admin"),
 ]
@@ -25,6 +25,12 @@ FLAGS = flags.FLAGS
 flags.DEFINE_bool(
   "prod", False, "set to true for prod mode; otherwise editor mode."
 )
+flags.DEFINE_integer(
+  "workers",
+  1,
+  "number of worker processes to serve the app with (requires --prod).",
+  lower_bound=1,
+)
 
 
 def main(argv: Sequence[str]):
@@ -81,6 +87,15 @@ $\u001b[35m mesop {argv[1]}\u001b[0m"""
     )
     sys.exit(1)
 
+  if FLAGS.workers > 1 and not FLAGS.prod:
+    print(
+      """\u001b[31mERROR: --workers requires --prod because hot reload only works with one process.\u001b[0m
+
+Re-run with:
+$\u001b[35m mesop --prod --workers N file.py\u001b[0m"""
+    )
+    sys.exit(1)
+
   if not FLAGS.prod:
     enable_debug_mode()
 
@@ -114,7 +129,7 @@ $\u001b[35m mesop {argv[1]}\u001b[0m"""
     stdin_thread.start()
 
   logging.getLogger("werkzeug").setLevel(logging.WARN)
-  app.run()
+  app.run(workers=FLAGS.workers)
 
 
 app_modules: set[str] = set()
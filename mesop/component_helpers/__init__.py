@@ -22,6 +22,9 @@ from .helper import (
 from .helper import (
   register_native_component as register_native_component,
 )
+from .helper import (
+  without_subtree_hashes as without_subtree_hashes,
+)
 from .style import Border as Border
 from .style import BorderSide as BorderSide
 from .style import Margin as Margin
@@ -1,7 +1,12 @@
+import random
+
 import pytest
 
 import mesop.protos.ui_pb2 as pb
-from mesop.component_helpers.helper import diff_component
+from mesop.component_helpers.helper import (
+  _append_to_first_field,
+  diff_component,
+)
 
 
 def create_default_single_component():
@@ -364,7 +369,7 @@ def test_update_child_child_component():
   )
 
 
-def test_swapped_child_components_will_update_fields():
+def test_swapped_keyed_child_components_are_moved():
   c1 = create_default_single_component()
   c1_c1 = create_default_single_component()
   c1_c1.key.CopyFrom(pb.Key(key="key2"))
@@ -383,21 +388,14 @@ def test_swapped_child_components_will_update_fields():
     children=[
       pb.ComponentDiff(
         index=0,
-        diff_type=pb.ComponentDiff.DiffType.DIFF_TYPE_UPDATE,
-        update_strategy_key=pb.ComponentDiff.UpdateStrategy.UPDATE_STRATEGY_REPLACE,
-        key=pb.Key(key="key"),
-      ),
-      pb.ComponentDiff(
-        index=1,
-        diff_type=pb.ComponentDiff.DiffType.DIFF_TYPE_UPDATE,
-        update_strategy_key=pb.ComponentDiff.UpdateStrategy.UPDATE_STRATEGY_REPLACE,
-        key=pb.Key(key="key2"),
+        from_index=1,
+        diff_type=pb.ComponentDiff.DiffType.DIFF_TYPE_MOVE,
       ),
     ],
   )
 
 
-def test_displaced_child_component_will_update_and_add_component():
+def test_displaced_keyed_child_component_inserts_component():
   c1 = create_default_single_component()
   c1_c1 = create_default_single_component()
   c1_c1.key.CopyFrom(pb.Key(key="key2"))
@@ -414,18 +412,276 @@ def test_displaced_child_component_will_update_and_add_component():
     children=[
       pb.ComponentDiff(
         index=0,
-        diff_type=pb.ComponentDiff.DiffType.DIFF_TYPE_UPDATE,
-        update_strategy_key=pb.ComponentDiff.UpdateStrategy.UPDATE_STRATEGY_REPLACE,
-        key=pb.Key(key="key"),
+        diff_type=pb.ComponentDiff.DiffType.DIFF_TYPE_INSERT,
+        component=c2_c1,
+      ),
+    ],
+  )
+
+
+def create_parent(*keys: str, text: str = "value") -> pb.Component:
+  """Creates a component with a child for each key (or no key if empty)."""
+  parent = pb.Component()
+  for key in keys:
+    child = pb.Component(
+      type=pb.Type(name=pb.ComponentName(fn_name="text"), value=text.encode())
+    )
+    if key:
+      child.key.key = key
+    parent.children.append(child)
+  return parent
+
+
+def apply_component_diff(component: pb.Component, diff: pb.ComponentDiff):
+  """Applies a diff the same way as `applyComponentDiff` in diff.ts."""
+  for field in (
+    "key",
+    "source_code_location",
+    "style",
+    "style_debug_json",
+    "type",
+  ):
+    if (
+      getattr(diff, f"update_strategy_{field}")
+      == pb.ComponentDiff.UpdateStrategy.UPDATE_STRATEGY_REPLACE
+    ):
+      if field == "style_debug_json":
+        component.style_debug_json = diff.style_debug_json
+      elif getattr(diff, field).ByteSize():
+        getattr(component, field).CopyFrom(getattr(diff, field))
+      else:
+        component.ClearField(field)
+  if (
+    diff.update_strategy_type
+    == pb.ComponentDiff.UpdateStrategy.UPDATE_STRATEGY_APPEND
+  ):
+    component.type.value = _append_to_first_field(
+      component.type.value, diff.type.value
+    )
+
+  DiffType = pb.ComponentDiff.DiffType
+  children = list(component.children)
+  for index in sorted(
+    (
+      d.index for d in diff.children if d.diff_type == DiffType.DIFF_TYPE_DELETE
+    ),
+    reverse=True,
+  ):
+    children.pop(index)
+  for child_diff in diff.children:
+    if child_diff.diff_type == DiffType.DIFF_TYPE_MOVE:
+      children.insert(child_diff.index, children.pop(child_diff.from_index))
+    elif child_diff.diff_type == DiffType.DIFF_TYPE_INSERT:
+      children.insert(child_diff.index, child_diff.component)
+  for child_diff in diff.children:
+    if child_diff.diff_type == DiffType.DIFF_TYPE_UPDATE:
+      apply_component_diff(children[child_diff.index], child_diff)
+    elif child_diff.diff_type == DiffType.DIFF_TYPE_ADD:
+      children.append(child_diff.component)
+  del component.children[:]
+  component.children.extend(children)
+
+
+def test_prepended_keyed_child_component_is_inserted():
+  c1 = create_parent("a", "b", "c")
+  c2 = create_parent("new", "a", "b", "c")
+
+  assert diff_component(c1, c2) == pb.ComponentDiff(
+    diff_type=pb.ComponentDiff.DiffType.DIFF_TYPE_UPDATE,
+    children=[
+      pb.ComponentDiff(
+        index=0,
+        diff_type=pb.ComponentDiff.DiffType.DIFF_TYPE_INSERT,
+        component=c2.children[0],
+      ),
+    ],
+  )
+
+
+def test_deleted_keyed_child_component():
+  c1 = create_parent("a", "b", "c")
+  c2 = create_parent("a", "c")
+
+  assert diff_component(c1, c2) == pb.ComponentDiff(
+    diff_type=pb.ComponentDiff.DiffType.DIFF_TYPE_UPDATE,
+    children=[
+      pb.ComponentDiff(
+        index=1, diff_type=pb.ComponentDiff.DiffType.DIFF_TYPE_DELETE
       ),
+    ],
+  )
+
+
+def test_moved_keyed_child_component_is_moved_once():
+  c1 = create_parent("a", "b", "c", "d")
+  c2 = create_parent("b", "c", "d", "a")
+
+  assert diff_component(c1, c2) == pb.ComponentDiff(
+    diff_type=pb.ComponentDiff.DiffType.DIFF_TYPE_UPDATE,
+    children=[
+      pb.ComponentDiff(
+        index=3,
+        from_index=0,
+        diff_type=pb.ComponentDiff.DiffType.DIFF_TYPE_MOVE,
+      ),
+    ],
+  )
+
+
+def test_unkeyed_siblings_are_matched_by_position():
+  c1 = create_parent("", "a", "b", "")
+  c2 = create_parent("", "new", "a", "b", "")
+
+  assert diff_component(c1, c2) == pb.ComponentDiff(
+    diff_type=pb.ComponentDiff.DiffType.DIFF_TYPE_UPDATE,
+    children=[
       pb.ComponentDiff(
         index=1,
-        diff_type=pb.ComponentDiff.DiffType.DIFF_TYPE_ADD,
-        component=c2_c2,
+        diff_type=pb.ComponentDiff.DiffType.DIFF_TYPE_INSERT,
+        component=c2.children[1],
       ),
     ],
   )
 
 
+def test_moved_keyed_child_component_is_also_updated():
+  c1 = create_parent("a", "b")
+  c2 = create_parent("b", "a", text="updated")
+
+  diff = diff_component(c1, c2)
+  apply_component_diff(c1, diff)
+
+  assert [d.diff_type for d in diff.children] == [
+    pb.ComponentDiff.DiffType.DIFF_TYPE_MOVE,
+    pb.ComponentDiff.DiffType.DIFF_TYPE_UPDATE,
+    pb.ComponentDiff.DiffType.DIFF_TYPE_UPDATE,
+  ]
+  assert c1 == c2
+
+
+def test_duplicate_keys_are_diffed_by_index():
+  c1 = create_parent("a", "a", "b")
+  c2 = create_parent("b", "a", "a")
+
+  diff = diff_component(c1, c2)
+
+  assert all(
+    d.diff_type == pb.ComponentDiff.DiffType.DIFF_TYPE_UPDATE
+    for d in diff.children
+  )
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_applying_keyed_diffs_produces_new_component(seed: int):
+  rng = random.Random(seed)
+  keys = [f"k{i}" for i in range(10)] + [""] * 3
+  c1 = create_parent(*rng.sample(keys, rng.randint(0, len(keys))))
+  c2 = create_parent(
+    *rng.sample(keys, rng.randint(0, len(keys))), text=rng.choice(["a", "b"])
+  )
+
+  apply_component_diff(c1, diff_component(c1, c2))
+
+  assert c1 == c2
+
+
+def test_subtrees_with_same_hash_are_skipped():
+  c1 = create_default_single_component()
+  c1.subtree_hash = 123
+  c2 = create_default_single_component()
+  # Changes that are not reflected in the hash are not diffed.
+  c2.style.CopyFrom(pb.Style(color="blue"))
+  c2.subtree_hash = 123
+
+  assert diff_component(c1, c2) == pb.ComponentDiff()
+
+
+def test_subtrees_with_unknown_hash_are_diffed():
+  c1 = create_default_single_component()
+  c2 = create_default_single_component()
+  c2.style.CopyFrom(pb.Style(color="blue"))
+
+  assert diff_component(c1, c2) == pb.ComponentDiff(
+    diff_type=pb.ComponentDiff.DiffType.DIFF_TYPE_UPDATE,
+    update_strategy_style=pb.ComponentDiff.UpdateStrategy.UPDATE_STRATEGY_REPLACE,
+    style=pb.Style(color="blue"),
+  )
+
+
+def test_added_child_component_has_no_subtree_hashes():
+  c1 = create_default_single_component()
+  c2 = create_default_single_component()
+  child = c2.children.add(key=pb.Key(key="child"), subtree_hash=1)
+  child.children.add(subtree_hash=2)
+
+  diff = diff_component(c1, c2)
+
+  assert diff.children[0].component == pb.Component(
+    key=pb.Key(key="child"), children=[pb.Component()]
+  )
+
+
+def create_text_component(
+  text: str, line: int = 1, debug_json: str = ""
+) -> pb.Component:
+  # SourceCodeLocation stands in for a component type whose first field is text.
+  return pb.Component(
+    type=pb.Type(
+      name=pb.ComponentName(core_module=True, fn_name="text"),
+      value=pb.SourceCodeLocation(module=text, line=line).SerializeToString(),
+      debug_json=debug_json,
+    )
+  )
+
+
+def test_appended_text_is_sent_as_appended_text():
+  c1 = create_text_component("Hello")
+  c2 = create_text_component("Hello, world")
+
+  diff = diff_component(c1, c2)
+
+  assert diff == pb.ComponentDiff(
+    diff_type=pb.ComponentDiff.DiffType.DIFF_TYPE_UPDATE,
+    update_strategy_type=pb.ComponentDiff.UpdateStrategy.UPDATE_STRATEGY_APPEND,
+    type=pb.Type(value=b", world"),
+  )
+  apply_component_diff(c1, diff)
+  assert c1 == c2
+
+
+def test_appended_text_with_longer_length_prefix():
+  c1 = create_text_component("a" * 100)
+  c2 = create_text_component("a" * 100 + "b" * 100)
+
+  diff = diff_component(c1, c2)
+
+  assert (
+    diff.update_strategy_type
+    == pb.ComponentDiff.UpdateStrategy.UPDATE_STRATEGY_APPEND
+  )
+  apply_component_diff(c1, diff)
+  assert c1 == c2
+
+
+@pytest.mark.parametrize(
+  "c2",
+  [
+    create_text_component("Hi, world"),
+    create_text_component("Hello, world", line=2),
+    create_text_component("Hello, world", debug_json="{}"),
+  ],
+)
+def test_text_with_other_changes_is_replaced(c2: pb.Component):
+  c1 = create_text_component("Hello")
+
+  diff = diff_component(c1, c2)
+
+  assert diff == pb.ComponentDiff(
+    diff_type=pb.ComponentDiff.DiffType.DIFF_TYPE_UPDATE,
+    update_strategy_type=pb.ComponentDiff.UpdateStrategy.UPDATE_STRATEGY_REPLACE,
+    type=c2.type,
+  )
+
+
 if __name__ == "__main__":
   raise SystemExit(pytest.main([__file__]))
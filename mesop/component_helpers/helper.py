@@ -1,8 +1,13 @@
 import hashlib
 import inspect
 import json
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Sequence
 from dataclasses import dataclass, is_dataclass
 from dataclasses import field as dataclass_field
+from dataclasses import fields as dataclass_fields
 from enum import Enum
 from functools import lru_cache, partial, wraps
 from typing import (
@@ -24,6 +29,11 @@ from google.protobuf.message import Message
 
 import mesop.protos.ui_pb2 as pb
 from mesop.component_helpers.style import Style, to_style_proto
+from mesop.env.env import (
+  MESOP_HANDLER_REGISTRY_ENABLED,
+  MESOP_PROD_VALIDATION_MODE,
+  MESOP_WEBSOCKETS_ENABLED,
+)
 from mesop.events import (
   ClickEvent,
   InputEvent,
@@ -34,11 +44,14 @@ from mesop.events import (
 from mesop.exceptions import MesopDeveloperException
 from mesop.key import Key, key_from_proto
 from mesop.runtime import runtime
+from mesop.runtime.component_cache import PureComponentOutput
+from mesop.runtime.component_tree import ComponentNode
 from mesop.runtime.context import NodeSlot, NodeTreeState
 from mesop.utils.caller import (
   get_app_caller_source_code_location,
 )
-from mesop.utils.validate import validate
+from mesop.utils.validate import ValidationMode, validate
+from mesop.utils.varint import decode_varint, encode_varint
 
 
 class _ComponentWithChildren:
@@ -51,21 +64,21 @@ class _ComponentWithChildren:
     source_code_location: pb.SourceCodeLocation | None = None,
   ):
     self.prev_current_node = runtime().context().current_node()
-    self.component = self.prev_current_node.children.add()
-    self.component.MergeFrom(
-      create_component(
-        component_name=pb.ComponentName(core_module=True, fn_name=type_name),
-        proto=proto,
-        key=key,
-        style=style,
-        source_code_location=source_code_location,
-      )
+    self.component = create_component(
+      component_name=_core_component_name(type_name),
+      proto=proto,
+      key=key,
+      style=style,
+      source_code_location=source_code_location,
     )
+    self.prev_current_node.children.append(self.component)
+    self.subtree_hasher = _SubtreeHasher()
 
   def __enter__(self):
     runtime().context().set_current_node(self.component)
 
   def __exit__(self, exc_type, exc_val, exc_tb):  # type: ignore
+    self.subtree_hasher.set_subtree_hash(self.component)
     runtime().context().set_current_node(self.prev_current_node)
 
 
@@ -160,27 +173,26 @@ class _UserCompositeComponent(Generic[S]):
 
     self.unnamed_slot = None
     self.named_slots = {}
+    node_slots = node_tree_state.node_slots()
 
     if named_slots_cls is UnnamedSlot:
-      if len(node_tree_state.node_slots()) != 1:
+      if len(node_slots) != 1:
         raise MesopDeveloperException(
           "Must configure one child slot when defining a content component with unnamed slots."
         )
-      if node_tree_state.node_slots()[0].name:
+      if node_slots[0].name:
         raise MesopDeveloperException(
           "Named slots are not allowed when defining a content component with unnamed slots."
         )
-      self.unnamed_slot = SlotMetadata(
-        node_slot=node_tree_state.node_slots()[0]
-      )
+      self.unnamed_slot = SlotMetadata(node_slot=node_slots[0])
       DetachedNodeTreeStateContext(self.unnamed_slot.node_tree_state)
     else:
       self.named_slots = {
         node_slot.name: SlotMetadata(node_slot=node_slot)
-        for node_slot in node_tree_state.node_slots()
+        for node_slot in node_slots
       }
 
-      if len(self.named_slots) != len(node_tree_state.node_slots()):
+      if len(self.named_slots) != len(node_slots):
         raise MesopDeveloperException(
           "Multiple slots of the same name encountered. The names must be unique within the content component."
         )
@@ -218,13 +230,9 @@ class _UserCompositeComponent(Generic[S]):
   def _insert_slot_content(self, slot_metadata: SlotMetadata) -> None:
     index = slot_metadata.node_slot.insertion_index
     parent_node = slot_metadata.node_slot.parent_node
-    current_items = list(parent_node.children)
-    current_items[index:index] = (
+    parent_node.children[index:index] = (
       slot_metadata.node_tree_state.current_node().children
     )
-    del parent_node.children[:]
-    for item in current_items:
-      parent_node.children.add().CopyFrom(item)
 
 
 # Overload when the decorator is called with parens, e.g.
@@ -320,6 +328,9 @@ def component(
 def component(
   *,
   skip_validation: bool = False,
+  prod_validation_mode: ValidationMode | None = None,
+  reactive: bool = False,
+  pure: bool = False,
 ) -> Callable[[C], C]:
   pass
 
@@ -329,36 +340,123 @@ def component(
   /,
   *,
   skip_validation: bool = False,
+  prod_validation_mode: ValidationMode | None = None,
+  reactive: bool = False,
+  pure: bool = False,
 ):
+  """Makes a Python function a user-defined component.
+
+  Args:
+    skip_validation: If set to True, skips validation of the arguments.
+    prod_validation_mode: How the arguments are validated when not running in
+      debug mode: "full", "fast" or "none". Defaults to the app's
+      `MESOP_PROD_VALIDATION_MODE`.
+    reactive: If set to True, a render reuses the component tree from the
+      previous render if the component is called with equal arguments and the
+      state fields it reads (with `me.state`) are also equal. Only use it for
+      components that depend on nothing else, e.g. not on the viewport size or
+      on global variables.
+    pure: If set to True, the component tree built by a call is cached
+      process-wide and reused by later calls with equal arguments, including
+      from other sessions. Only use it for components that depend on nothing
+      but their arguments. Pure components cannot read state.
+  """
+  if reactive and pure:
+    raise MesopDeveloperException(
+      "A component cannot be both reactive and pure."
+    )
+
   def component_wrapper(fn: C) -> C:
     """Wraps a Python function to make it a user-defined component."""
 
-    validated_fn = fn if skip_validation else validate(fn)
+    validated_fn = (
+      fn if skip_validation else validate_component(fn, prod_validation_mode)
+    )
+    component_name = get_component_name(fn).SerializeToString()
 
     @wraps(fn)
     def wrapper(*args: Any, **kw_args: Any):
+      if reactive:
+        return render_reactive_component(args, kw_args)
+      if pure:
+        return render_pure_component(args, kw_args)
+      return render_component(*args, **kw_args)
+
+    def render_pure_component(
+      args: tuple[Any, ...], kw_args: dict[str, Any]
+    ) -> Any:
+      key = _pure_component_key(fn, args, kw_args)
+      if key is None:
+        return render_component(*args, **kw_args)
+      context = runtime().context()
+      cached = runtime().get_pure_component(key)
+      if cached is not None:
+        context.current_node().children.append(cached.component)
+        context.replay_registrations(cached.registrations)
+        return cached.return_value
+
+      saved_slot_count = context.saved_slot_count()
+      with context.record_pure_component_registrations() as registrations:
+        ret = render_component(*args, **kw_args)
+      # Slot content is inserted into the component after it is rendered.
+      if context.saved_slot_count() == saved_slot_count:
+        component = context.current_node().children[-1]
+        component.freeze()
+        runtime().cache_pure_component(
+          key,
+          PureComponentOutput(
+            component=component,
+            return_value=ret,
+            registrations=registrations,
+          ),
+        )
+      return ret
+
+    def render_reactive_component(
+      args: tuple[Any, ...], kw_args: dict[str, Any]
+    ) -> Any:
+      component_cache = runtime().context().component_cache()
+      cached = component_cache.enter(fn, args, kw_args)
+      if cached is not None:
+        runtime().context().current_node().children.append(cached.component)
+        return cached.return_value
+
+      saved_slot_count = runtime().context().saved_slot_count()
+      try:
+        ret = render_component(*args, **kw_args)
+      except BaseException:
+        component_cache.exit(None, None)
+        raise
+      component = None
+      # Slot content is inserted into the component after it is rendered.
+      if runtime().context().saved_slot_count() == saved_slot_count:
+        component = runtime().context().current_node().children[-1]
+      component_cache.exit(component, ret)
+      return ret
+
+    def render_component(*args: Any, **kw_args: Any) -> Any:
       prev_current_node = runtime().context().current_node()
-      component = prev_current_node.children.add()
       source_code_location = None
       if runtime().debug_mode:
         source_code_location = get_app_caller_source_code_location()
-      component.MergeFrom(
-        create_component(
-          component_name=get_component_name(fn),
-          proto=pb.UserDefinedType(
-            args=[
-              pb.UserDefinedType.Arg(
-                arg_name=kw_arg, code_value=map_code_value(value)
-              )
-              for kw_arg, value in kw_args.items()
-              if map_code_value(value) is not None
-            ]
-          ),
-          source_code_location=source_code_location,
-        )
+      component = create_component(
+        component_name=component_name,
+        proto=pb.UserDefinedType(
+          args=[
+            pb.UserDefinedType.Arg(
+              arg_name=kw_arg, code_value=map_code_value(value)
+            )
+            for kw_arg, value in kw_args.items()
+            if map_code_value(value) is not None
+          ]
+        ),
+        source_code_location=source_code_location,
       )
+      prev_current_node.children.append(component)
+      subtree_hasher = _SubtreeHasher()
       runtime().context().set_current_node(component)
       ret = validated_fn(*args, **kw_args)
+      subtree_hasher.set_subtree_hash(component)
       runtime().context().set_current_node(prev_current_node)
       return ret
 
@@ -371,6 +469,77 @@ def component(
     return component_wrapper(decorated_fn)
 
 
+def _pure_component_key(
+  fn: Callable[..., Any], args: tuple[Any, ...], kw_args: dict[str, Any]
+) -> Any:
+  """Returns the cache key of a pure component call.
+
+  Returns None if an argument cannot be converted to a hashable value, in which
+  case the call is not cached.
+  """
+  try:
+    key = (
+      fn,
+      _to_hashable(args),
+      _to_hashable(tuple(sorted(kw_args.items(), key=lambda item: item[0]))),
+    )
+  except TypeError:
+    return None
+  if runtime().debug_mode:
+    # The source code location of the component is included in its output.
+    location = get_app_caller_source_code_location()
+    if location is not None:
+      key += (location.module, location.line, location.col)
+  return key
+
+
+def _to_hashable(value: Any) -> Any:
+  """Converts an argument of a pure component to a hashable value.
+
+  Equal values are converted to equal hashable values. Values of different types
+  are kept apart, e.g. `1` and `True`. Raises TypeError if the value cannot be
+  converted.
+  """
+  value_type = type(value)
+  if value is None or value_type in (bool, int, float, str, bytes):
+    return (value_type, value)
+  if isinstance(value, Enum):
+    return (value_type, value)
+  if value_type in (tuple, list):
+    return (value_type, tuple(_to_hashable(item) for item in value))
+  if value_type is dict:
+    return (
+      value_type,
+      tuple((_to_hashable(k), _to_hashable(v)) for k, v in value.items()),
+    )
+  if value_type in (set, frozenset):
+    return (value_type, frozenset(_to_hashable(item) for item in value))
+  if is_dataclass(value) and not isinstance(value, type):
+    # E.g. `me.Style`, which is mutable and therefore not hashable.
+    return (
+      value_type,
+      tuple(
+        _to_hashable(getattr(value, field.name))
+        for field in dataclass_fields(value)
+      ),
+    )
+  if isinstance(value, partial):
+    return (
+      value_type,
+      _to_hashable(value.func),
+      _to_hashable(value.args),
+      _to_hashable(value.keywords),
+    )
+  if callable(value):
+    # E.g. event handlers, which are compared by identity.
+    return (value_type, value)
+  if value_type.__hash__ is None or value_type.__hash__ is object.__hash__:
+    # Objects that are compared by identity may have changed since they were
+    # cached.
+    raise TypeError(f"Cannot use {value_type} as a pure component argument.")
+  return (value_type, value)
+
+
 def get_component_name(fn: Callable[..., Any]) -> pb.ComponentName:
   if "mesop.components" in fn.__module__:
     return pb.ComponentName(core_module=True, fn_name=fn.__name__)
@@ -390,25 +559,26 @@ def map_code_value(value: Any) -> pb.CodeValue | None:
 
 
 def create_component(
-  component_name: pb.ComponentName,
+  component_name: bytes,
   proto: Message,
   key: str | None = None,
   style: pb.Style | None = None,
   source_code_location: pb.SourceCodeLocation | None = None,
-) -> pb.Component:
+) -> ComponentNode:
+  """Creates a component without children.
+
+  Args:
+    component_name: Serialized `pb.ComponentName`.
+  """
   type_index = 0
   # This is not exactly type-safe, but it's a convenient way of grabbing the
   # type index value.
   if hasattr(proto, "type_index"):
     type_index = proto.type_index  # type: ignore
-  type = pb.Type(
-    name=component_name,
-    value=proto.SerializeToString(),
-    type_index=type_index,  # type: ignore
-  )
+  type_debug_json = None
   style_debug_json = ""
   if runtime().debug_mode:
-    type.debug_json = json_format.MessageToJson(
+    type_debug_json = json_format.MessageToJson(
       proto, preserving_proto_field_name=True
     )
     if style:
@@ -416,15 +586,79 @@ def create_component(
         style, preserving_proto_field_name=True
       )
 
-  return pb.Component(
-    key=pb.Key(key=key),
-    type=type,
-    style=style,
+  return ComponentNode.create(
+    component_name=component_name,
+    type_value=proto.SerializeToString(),
+    type_index=type_index,
+    type_debug_json=type_debug_json,
+    key=key,
+    style=style.SerializeToString() if style is not None else None,
     style_debug_json=style_debug_json,
-    source_code_location=source_code_location,
+    source_code_location=source_code_location.SerializeToString()
+    if source_code_location is not None
+    else None,
   )
 
 
+@lru_cache(maxsize=1024)
+def _core_component_name(type_name: str) -> bytes:
+  return pb.ComponentName(
+    core_module=True, fn_name=type_name
+  ).SerializeToString()
+
+
+# Component trees are not diffed when web sockets are enabled, so the subtree
+# hashes would go unused.
+_SUBTREE_HASHES_ENABLED = not MESOP_WEBSOCKETS_ENABLED
+
+
+class _SubtreeHasher:
+  """Computes the subtree hash of a component once its children are added.
+
+  Must be created before any children are added.
+  """
+
+  def __init__(self):
+    if _SUBTREE_HASHES_ENABLED:
+      self.saved_slot_count = runtime().context().saved_slot_count()
+
+  def set_subtree_hash(self, component: ComponentNode) -> None:
+    """Sets the subtree hash, unless it cannot be known yet.
+
+    Slot content is inserted into a content component after the nodes that
+    enclose the slot have been added, so the hash of those nodes is left
+    unknown. The same applies to nodes with a child whose hash is unknown.
+    """
+    if (
+      not _SUBTREE_HASHES_ENABLED
+      or runtime().context().saved_slot_count() != self.saved_slot_count
+    ):
+      return
+    child_hashes = [child.subtree_hash for child in component.children]
+    if 0 not in child_hashes:
+      component.subtree_hash = hash((component.fields, *child_hashes))
+
+
+def without_subtree_hashes(component: pb.Component) -> pb.Component:
+  """Returns the component tree to send to the client.
+
+  Subtree hashes are only used by the server, so they are removed from a copy
+  of the tree. The original tree keeps them for diffing the next render.
+  """
+  if not _SUBTREE_HASHES_ENABLED:
+    return component
+  client_component = pb.Component()
+  client_component.CopyFrom(component)
+  _clear_subtree_hashes(client_component)
+  return client_component
+
+
+def _clear_subtree_hashes(component: pb.Component) -> None:
+  component.ClearField("subtree_hash")
+  for child in component.children:
+    _clear_subtree_hashes(child)
+
+
 def insert_composite_component(
   type_name: str,
   proto: Message,
@@ -544,15 +778,15 @@ def insert_component(
   source_code_location = None
   if runtime().debug_mode:
     source_code_location = get_app_caller_source_code_location()
-  runtime().context().current_node().children.append(
-    create_component(
-      component_name=pb.ComponentName(core_module=True, fn_name=type_name),
-      proto=proto,
-      key=key,
-      style=to_style_proto(style) if style else None,
-      source_code_location=source_code_location,
-    )
+  component = create_component(
+    component_name=_core_component_name(type_name),
+    proto=proto,
+    key=key,
+    style=to_style_proto(style) if style else None,
+    source_code_location=source_code_location,
   )
+  _SubtreeHasher().set_subtree_hash(component)
+  runtime().context().current_node().children.append(component)
 
 
 E = TypeVar("E", bound=MesopEvent)
@@ -589,12 +823,49 @@ def register_event_handler(
   event_qualified_name = f"{event.__module__}.{event.__name__}"
   handler_id = f"{fn_id}:{event_qualified_name}"
 
-  runtime().context().register_event_handler(
-    handler_id, wrap_handler_with_event(handler_fn, event)
-  )
+  handler = wrap_handler_with_event(handler_fn, event)
+  runtime().context().register_event_handler(handler_id, handler)
+  if MESOP_HANDLER_REGISTRY_ENABLED and is_context_free_handler(handler_fn):
+    runtime().register_event_handler(handler_id, handler)
   return handler_id
 
 
+def is_context_free_handler(fn: Callable[..., Any]) -> bool:
+  """Check if a handler can be shared across contexts.
+
+  The handler ID is derived from the function source (and the arguments for
+  `functools.partial`), so it does not account for values captured by closures or
+  by default arguments of functions defined during rendering (e.g.
+  `lambda e, i=i: ...`). Handlers that capture values could behave differently for
+  the same handler ID, so they can only be looked up from the context that rendered
+  them.
+
+  The arguments of a `functools.partial` handler are shared with every context
+  that renders the same handler ID, so they must be immutable. Otherwise, e.g. a
+  list from the state of one session would be mutated by the events of another.
+  """
+  if isinstance(fn, partial):
+    return (
+      all(_is_immutable_value(arg) for arg in fn.args)
+      and all(_is_immutable_value(value) for value in fn.keywords.values())
+      and is_context_free_handler(fn.func)
+    )
+  if not inspect.isfunction(fn) or fn.__closure__ is not None:
+    return False
+  if "<locals>" in fn.__qualname__:
+    return not fn.__defaults__ and not fn.__kwdefaults__
+  return True
+
+
+def _is_immutable_value(obj: Any) -> bool:
+  """Check if an object is a scalar, or a tuple or frozenset of them."""
+  if isinstance(obj, (int, float, str, bool, type(None), Enum)):
+    return True
+  if isinstance(obj, (tuple, frozenset)):
+    return all(_is_immutable_value(item) for item in obj)  # type: ignore
+  return False
+
+
 def has_stable_repr(obj: Any) -> bool:
   """Check if an object has a stable repr.
   We need to ensure that the repr is stable between different Python runtimes.
@@ -619,46 +890,106 @@ def has_stable_repr(obj: Any) -> bool:
   return False
 
 
-@lru_cache(maxsize=None)
+# Bounds the number of event handlers whose IDs are cached, since functions are
+# re-created on hot reload and bound methods are created per object.
+_FN_ID_CACHE_MAX_SIZE = 4_096
+
+# Maps a function, whether debug mode is enabled and the function computing the
+# value to either the function's ID or, for the underlying function of
+# `functools.partial` handlers, a hash of the start of their IDs.
+_fn_id_cache: OrderedDict[
+  tuple[Callable[..., Any], bool, Callable[..., Any]], Any
+] = OrderedDict()
+_fn_id_cache_lock = threading.Lock()
+
+
 def compute_fn_id(fn: Callable[..., Any]) -> str:
-  if isinstance(fn, partial):
-    func_source = inspect.getsource(fn.func)
-    # For partial functions, we need to ensure that the arguments have a stable repr
-    # because we use the repr to compute the fn_id.
-    for arg in fn.args:
-      if not has_stable_repr(arg):
-        raise MesopDeveloperException(
-          f"Argument {arg} for functools.partial event handler {fn.func.__name__} does not have a stable repr"
-        )
+  debug_mode = runtime().debug_mode
+  if not isinstance(fn, partial):
+    return _get_or_compute_fn_id(fn, debug_mode, _compute_fn_id)
 
-    for k, v in fn.keywords.items():
-      if not has_stable_repr(v):
-        raise MesopDeveloperException(
-          f"Keyword argument {k}={v} for functools.partial event handler {fn.func.__name__} does not have a stable repr"
-        )
+  # Partials are created on each render, so only the hash of the underlying
+  # function's source code is cached, and the arguments are hashed each time.
+  #
+  # For partial functions, we need to ensure that the arguments have a stable repr
+  # because we use the repr to compute the fn_id.
+  for arg in fn.args:
+    if not has_stable_repr(arg):
+      raise MesopDeveloperException(
+        f"Argument {arg} for functools.partial event handler {fn.func.__name__} does not have a stable repr"
+      )
 
-    args_str = ", ".join(repr(arg) for arg in fn.args)
-    kwargs_str = ", ".join(f"{k}={v!r}" for k, v in fn.keywords.items())
-    partial_args = (
-      f"{args_str}{', ' if args_str and kwargs_str else ''}{kwargs_str}"
-    )
+  for k, v in fn.keywords.items():
+    if not has_stable_repr(v):
+      raise MesopDeveloperException(
+        f"Keyword argument {k}={v} for functools.partial event handler {fn.func.__name__} does not have a stable repr"
+      )
 
-    source_code = f"partial(<<{func_source}>>, {partial_args})"
-    fn_name = fn.func.__name__
-    fn_module = fn.func.__module__
-  else:
-    source_code = inspect.getsource(fn) if inspect.isfunction(fn) else str(fn)
-    fn_name = fn.__name__
-    fn_module = fn.__module__
+  args_str = ", ".join(repr(arg) for arg in fn.args)
+  kwargs_str = ", ".join(f"{k}={v!r}" for k, v in fn.keywords.items())
+  partial_args = (
+    f"{args_str}{', ' if args_str and kwargs_str else ''}{kwargs_str}"
+  )
+
+  source_code_hash = _get_or_compute_fn_id(
+    fn.func, debug_mode, _hash_partial_source_code_start
+  ).copy()
+  source_code_hash.update(f"{partial_args})".encode())
+  if debug_mode:
+    return (
+      f"{fn.func.__module__}.{fn.func.__name__}.{source_code_hash.hexdigest()}"
+    )
+  return source_code_hash.hexdigest()
+
+
+def _get_or_compute_fn_id(
+  fn: Callable[..., Any],
+  debug_mode: bool,
+  compute: Callable[[Callable[..., Any], bool], Any],
+) -> Any:
+  key = (fn, debug_mode, compute)
+  with _fn_id_cache_lock:
+    value = _fn_id_cache.get(key)
+    if value is not None:
+      _fn_id_cache.move_to_end(key)
+      return value
+  value = compute(fn, debug_mode)
+  with _fn_id_cache_lock:
+    _fn_id_cache[key] = value
+    if len(_fn_id_cache) > _FN_ID_CACHE_MAX_SIZE:
+      _fn_id_cache.popitem(last=False)
+  return value
+
+
+def _compute_fn_id(fn: Callable[..., Any], debug_mode: bool) -> str:
+  source_code = inspect.getsource(fn) if inspect.isfunction(fn) else str(fn)
+  fn_name = fn.__name__
+  fn_module = fn.__module__
 
   # Skip hashing the fn/module name in debug mode because it makes it hard to debug.
-  if runtime().debug_mode:
+  if debug_mode:
     source_code_hash = hashlib.sha256(source_code.encode()).hexdigest()
     return f"{fn_module}.{fn_name}.{source_code_hash}"
   input = f"{fn_module}.{fn_name}.{source_code}"
   return hashlib.sha256(input.encode()).hexdigest()
 
 
+def _hash_partial_source_code_start(
+  fn: Callable[..., Any], debug_mode: bool
+) -> "hashlib._Hash":
+  """Hashes the start of the source code of a partial of `fn`.
+
+  The hash is copied and completed with the partial's arguments, which gives
+  the same IDs as hashing the whole source code.
+  """
+  source_code_start = f"partial(<<{inspect.getsource(fn)}>>, "
+  if debug_mode:
+    return hashlib.sha256(source_code_start.encode())
+  return hashlib.sha256(
+    f"{fn.__module__}.{fn.__name__}.{source_code_start}".encode()
+  )
+
+
 def get_qualified_fn_name(fn: Callable[..., Any]) -> str:
   return f"{fn.__module__}.{fn.__name__}"
 
@@ -670,7 +1001,33 @@ def register_native_component(fn: C) -> C:
   Returns a component function which validates arguments.
   """
   runtime().register_native_component_fn(fn)
-  return validate(fn)
+  return validate_component(fn)
+
+
+def validate_component(
+  fn: C, prod_validation_mode: ValidationMode | None = None
+) -> C:
+  """Validates the arguments of the component on each call.
+
+  Arguments are fully validated in debug mode, which is when developers see the
+  errors, and as configured by `prod_validation_mode` (or the app's
+  `MESOP_PROD_VALIDATION_MODE`) otherwise.
+  """
+  mode = prod_validation_mode or cast(
+    ValidationMode, MESOP_PROD_VALIDATION_MODE
+  )
+  validated_fn = validate(fn)
+  if mode == "full":
+    return validated_fn
+  prod_fn = validate(fn, mode=mode)
+
+  @wraps(fn)
+  def wrapper(*args: Any, **kw_args: Any):
+    if runtime().debug_mode:
+      return validated_fn(*args, **kw_args)
+    return prod_fn(*args, **kw_args)
+
+  return cast(C, wrapper)
 
 
 def register_event_mapper(
@@ -746,12 +1103,24 @@ def diff_component(
     Changes needed to make component1 equal to component2.
   """
   diff = pb.ComponentDiff()
+  if component1.subtree_hash == component2.subtree_hash != 0:
+    return diff
 
-  # Check each field for differences. For now if there are any differences, we will
-  # mark the entire field for replacement.
+  # Check each field for differences. Text that was appended to is sent as the
+  # appended text. Otherwise we mark the entire field for replacement.
   for field in _COMPONENT_DIFF_FIELDS:
     if getattr(component1, field) != getattr(component2, field):
       diff.diff_type = pb.ComponentDiff.DiffType.DIFF_TYPE_UPDATE
+      if field == "type":
+        appended_value = _get_appended_type_value(
+          component1.type, component2.type
+        )
+        if appended_value is not None:
+          diff.update_strategy_type = (
+            pb.ComponentDiff.UpdateStrategy.UPDATE_STRATEGY_APPEND
+          )
+          diff.type.value = appended_value
+          continue
       setattr(
         diff,
         f"update_strategy_{field}",
@@ -763,8 +1132,80 @@ def diff_component(
         setattr(diff, field, getattr(component2, field))
 
   # Handle differences with child components.
-  for index, child_component in enumerate(component1.children):
-    if index >= len(component2.children):
+  if _should_diff_children_by_key(component1.children, component2.children):
+    _diff_children_by_key(component1.children, component2.children, diff)
+  else:
+    _diff_children_by_index(component1.children, component2.children, diff)
+
+  return diff
+
+
+# Tag of field 1 with the length-delimited wire type, e.g. the `text` field of
+# the text and markdown component types.
+_FIRST_FIELD_LENGTH_DELIMITED_TAG = b"\x0a"
+
+
+def _get_appended_type_value(type1: pb.Type, type2: pb.Type) -> bytes | None:
+  """Returns the bytes appended to the first field of the type value.
+
+  Returns None if the types differ in any other way. This lets streamed text
+  (e.g. a markdown component showing an LLM response as it is generated) be
+  sent as the new text rather than as the entire text on every update.
+  """
+  value1 = type1.value
+  value2 = type2.value
+  if (
+    len(value2) <= len(value1)
+    or not value1.startswith(_FIRST_FIELD_LENGTH_DELIMITED_TAG)
+    or not value2.startswith(_FIRST_FIELD_LENGTH_DELIMITED_TAG)
+  ):
+    return None
+  try:
+    length1, start1 = decode_varint(value1, 1)
+    length2, start2 = decode_varint(value2, 1)
+  except IndexError:
+    return None
+  if start1 + length1 > len(value1) or length2 <= length1:
+    return None
+  appended_value = value2[start2 + length1 : start2 + length2]
+  expected_type = pb.Type()
+  expected_type.CopyFrom(type1)
+  expected_type.value = _append_to_first_field(value1, appended_value)
+  if expected_type != type2:
+    return None
+  return appended_value
+
+
+def _append_to_first_field(value: bytes, appended_value: bytes) -> bytes:
+  """Appends bytes to the length-delimited first field of a serialized proto.
+
+  This is how `UPDATE_STRATEGY_APPEND` is applied to `type.value`, which must be
+  kept in sync with `appendToTypeValue` in diff.ts.
+  """
+  length, start = decode_varint(value, 1)
+  end = start + length
+  return b"".join(
+    [
+      value[:1],
+      encode_varint(length + len(appended_value)),
+      value[start:end],
+      appended_value,
+      value[end:],
+    ]
+  )
+
+
+# Identifies a child component among its siblings when diffing by key.
+_ChildId = tuple[bool, str | int]
+
+
+def _diff_children_by_index(
+  children1: Sequence[pb.Component],
+  children2: Sequence[pb.Component],
+  diff: pb.ComponentDiff,
+):
+  for index, child_component in enumerate(children1):
+    if index >= len(children2):
       diff.diff_type = pb.ComponentDiff.DiffType.DIFF_TYPE_UPDATE
       diff.children.append(
         pb.ComponentDiff(
@@ -772,7 +1213,7 @@ def diff_component(
         )
       )
     else:
-      child_diff = diff_component(child_component, component2.children[index])
+      child_diff = diff_component(child_component, children2[index])
       if (
         child_diff
         and child_diff.diff_type != pb.ComponentDiff.DiffType.DIFF_TYPE_NONE
@@ -789,8 +1230,8 @@ def diff_component(
   #
   # Although in practice child components diffs can contain either add or delete
   # operations, but not both.
-  for index, component2_child in enumerate(component2.children):
-    if index >= len(component1.children):
+  for index, component2_child in enumerate(children2):
+    if index >= len(children1):
       diff.diff_type = pb.ComponentDiff.DiffType.DIFF_TYPE_UPDATE
       diff.children.append(
         pb.ComponentDiff(
@@ -799,5 +1240,166 @@ def diff_component(
           component=component2_child,
         )
       )
+      _clear_subtree_hashes(diff.children[-1].component)
 
-  return diff
+
+def _should_diff_children_by_key(
+  children1: Sequence[pb.Component], children2: Sequence[pb.Component]
+) -> bool:
+  """Returns true if a keyed child component has moved.
+
+  Matching children by index would then produce an update for every child
+  between the old and new position, e.g. when prepending an item to a list.
+
+  Children are only matched by key if the keys are unique among their siblings.
+  """
+  old_indexes: dict[str, int] = {}
+  for index, child in enumerate(children1):
+    if child.key.key:
+      if child.key.key in old_indexes:
+        return False
+      old_indexes[child.key.key] = index
+
+  new_keys: set[str] = set()
+  has_moved = False
+  for index, child in enumerate(children2):
+    if child.key.key:
+      if child.key.key in new_keys:
+        return False
+      new_keys.add(child.key.key)
+      if old_indexes.get(child.key.key, index) != index:
+        has_moved = True
+  return has_moved
+
+
+def _diff_children_by_key(
+  children1: Sequence[pb.Component],
+  children2: Sequence[pb.Component],
+  diff: pb.ComponentDiff,
+):
+  """Diffs child components that are matched by key.
+
+  Children without a key are matched by their position among the other
+  children without a key. Children that exist in both lists are only moved if
+  they are not part of the longest sequence of children that kept their
+  relative order, so that the number of moves is minimal.
+  """
+  ids1 = _get_child_ids(children1)
+  ids2 = _get_child_ids(children2)
+  new_ids = set(ids2)
+
+  # Remaining old children, in order, after deleting the children that no
+  # longer exist.
+  remaining_ids: list[_ChildId] = []
+  old_indexes: dict[_ChildId, int] = {}
+  for index, child_id in enumerate(ids1):
+    if child_id in new_ids:
+      old_indexes[child_id] = index
+      remaining_ids.append(child_id)
+    else:
+      diff.children.append(
+        pb.ComponentDiff(
+          index=index, diff_type=pb.ComponentDiff.DiffType.DIFF_TYPE_DELETE
+        )
+      )
+
+  remaining_positions = {
+    child_id: position for position, child_id in enumerate(remaining_ids)
+  }
+  stable_positions = _longest_increasing_subsequence(
+    [
+      remaining_positions[child_id]
+      for child_id in ids2
+      if child_id in old_indexes
+    ]
+  )
+
+  # Move and insert children from the last to the first, before the child that
+  # follows them in the new list, which is already in its final position.
+  children = list(remaining_ids)
+  next_child_id: _ChildId | None = None
+  for index in reversed(range(len(ids2))):
+    child_id = ids2[index]
+    if child_id not in old_indexes:
+      to_index = _index_before(children, next_child_id)
+      children.insert(to_index, child_id)
+      diff.children.append(
+        pb.ComponentDiff(
+          index=to_index,
+          diff_type=pb.ComponentDiff.DiffType.DIFF_TYPE_INSERT,
+          component=children2[index],
+        )
+      )
+      _clear_subtree_hashes(diff.children[-1].component)
+    elif remaining_positions[child_id] not in stable_positions:
+      from_index = children.index(child_id)
+      children.pop(from_index)
+      to_index = _index_before(children, next_child_id)
+      children.insert(to_index, child_id)
+      if to_index != from_index:
+        diff.children.append(
+          pb.ComponentDiff(
+            index=to_index,
+            from_index=from_index,
+            diff_type=pb.ComponentDiff.DiffType.DIFF_TYPE_MOVE,
+          )
+        )
+    next_child_id = child_id
+
+  for index, child_id in enumerate(ids2):
+    if child_id in old_indexes:
+      child_diff = diff_component(
+        children1[old_indexes[child_id]], children2[index]
+      )
+      if child_diff.diff_type != pb.ComponentDiff.DiffType.DIFF_TYPE_NONE:
+        child_diff.index = index
+        diff.children.append(child_diff)
+
+  if diff.children:
+    diff.diff_type = pb.ComponentDiff.DiffType.DIFF_TYPE_UPDATE
+
+
+def _get_child_ids(children: Sequence[pb.Component]) -> list[_ChildId]:
+  """Returns (True, key) for keyed children.
+
+  Children without a key get (False, position among the children without a key).
+  """
+  ids: list[_ChildId] = []
+  unkeyed_count = 0
+  for child in children:
+    if child.key.key:
+      ids.append((True, child.key.key))
+    else:
+      ids.append((False, unkeyed_count))
+      unkeyed_count += 1
+  return ids
+
+
+def _index_before(children: list[_ChildId], next_child: _ChildId | None) -> int:
+  return len(children) if next_child is None else children.index(next_child)
+
+
+def _longest_increasing_subsequence(values: list[int]) -> set[int]:
+  """Returns the values of a longest strictly increasing subsequence."""
+  # tails[i] is the index of the smallest value that ends an increasing
+  # subsequence of length i + 1.
+  tails: list[int] = []
+  tail_values: list[int] = []
+  previous: list[int] = [-1] * len(values)
+  for index, value in enumerate(values):
+    position = bisect_left(tail_values, value)
+    if position > 0:
+      previous[index] = tails[position - 1]
+    if position == len(tails):
+      tails.append(index)
+      tail_values.append(value)
+    else:
+      tails[position] = index
+      tail_values[position] = value
+
+  result: set[int] = set()
+  index = tails[-1] if tails else -1
+  while index != -1:
+    result.add(values[index])
+    index = previous[index]
+  return result
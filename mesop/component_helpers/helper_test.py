@@ -1,5 +1,7 @@
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Callable
+from functools import partial
+from typing import Any, Callable
 from unittest.mock import patch
 
 import pytest
@@ -10,14 +12,22 @@ from mesop.component_helpers.helper import (
   DetachedNodeTreeStateContext,
   NamedSlot,
   UnnamedSlot,
+  _pure_component_key,
   _UserCompositeComponent,
   check_property_keys_is_safe,
+  component,
+  compute_fn_id,
+  insert_component,
+  insert_composite_component,
+  is_context_free_handler,
   register_event_handler,
   slot,
   slotclass,
 )
-from mesop.events import MesopEvent
+from mesop.component_helpers.style import Style
+from mesop.events import ClickEvent, MesopEvent
 from mesop.exceptions import MesopDeveloperException
+from mesop.runtime.component_tree import ComponentNode
 from mesop.runtime.context import NodeTreeState
 from mesop.runtime.runtime import Runtime
 
@@ -35,7 +45,9 @@ def create_default_single_component():
 
 
 def add_child(runtime: Callable[[], Runtime], component: pb.Component):
-  runtime().context().current_node().children.add().CopyFrom(component)
+  runtime().context().current_node().children.append(
+    ComponentNode.from_proto(component)
+  )
 
 
 def test_check_property_keys_is_safe_raises_exception():
@@ -127,7 +139,7 @@ def test_detached_node_tree_state_context(runtime, app):
     node_tree_state = runtime().context().get_node_tree_state()
     detached_node_tree_state = NodeTreeState()
     c1 = create_default_single_component()
-    detached_node_tree_state.set_current_node(c1)
+    detached_node_tree_state.set_current_node(ComponentNode.from_proto(c1))
 
     with DetachedNodeTreeStateContext(detached_node_tree_state):
       assert (
@@ -154,7 +166,7 @@ def test_user_composite_component_unnamed(runtime, app):
     ):
       add_child(runtime, c3)
 
-    assert runtime().context().current_node().children[1] == c3
+    assert runtime().context().current_component().children[1] == c3
 
 
 @pytest.mark.usefixtures("runtime")
@@ -247,8 +259,36 @@ def test_user_composite_component_named(runtime, app):
       with c.b():
         add_child(runtime, c4)
 
-    assert runtime().context().current_node().children[1] == c4
-    assert runtime().context().current_node().children[3] == c3
+    assert runtime().context().current_component().children[1] == c4
+    assert runtime().context().current_component().children[3] == c3
+
+
+def test_user_composite_component_nested(runtime, app):
+  with app.app_context():
+
+    def card():
+      with insert_composite_component(type_name="card", proto=pb.Key()):
+        insert_component(type_name="text", proto=pb.Key(key="header"))
+        slot()
+
+    with _UserCompositeComponent(card, named_slots_cls=UnnamedSlot):
+      with _UserCompositeComponent(card, named_slots_cls=UnnamedSlot):
+        insert_component(type_name="text", proto=pb.Key(key="content"))
+      insert_component(type_name="text", proto=pb.Key(key="footer"))
+
+    outer_card = runtime().context().current_component().children[0]
+    inner_card = outer_card.children[1]
+    assert not runtime().context().get_node_tree_state().node_slots()
+
+  assert [child.type.name.fn_name for child in outer_card.children] == [
+    "text",
+    "card",
+    "text",
+  ]
+  assert [child.type.value for child in inner_card.children] == [
+    pb.Key(key="header").SerializeToString(),
+    pb.Key(key="content").SerializeToString(),
+  ]
 
 
 @pytest.mark.usefixtures("runtime")
@@ -345,5 +385,255 @@ def test_event_handler_registers_different_handler_id_based_on_event_type(app):
     ), "Handler IDs should be different for different event types"
 
 
+def module_level_handler(event, value: int = 0):
+  pass
+
+
+def test_is_context_free_handler():
+  assert is_context_free_handler(module_level_handler)
+  assert is_context_free_handler(partial(module_level_handler, value=1))
+  assert is_context_free_handler(partial(module_level_handler, ("a", (1,))))
+  assert not is_context_free_handler(partial(module_level_handler, [1]))
+  assert not is_context_free_handler(
+    partial(module_level_handler, value={"a": 1})
+  )
+  assert not is_context_free_handler(
+    partial(module_level_handler, value=(1, [2]))
+  )
+
+  def nested_handler(event):
+    pass
+
+  assert is_context_free_handler(nested_handler)
+
+  captured = 1
+
+  def closure_handler(event):
+    return captured
+
+  assert not is_context_free_handler(closure_handler)
+  assert not is_context_free_handler(partial(closure_handler))
+  assert not is_context_free_handler(lambda event, value=captured: value)
+
+
+def test_runtime_event_handler_registry_evicts_least_recently_used():
+  runtime = Runtime()
+  with patch("mesop.runtime.runtime._EVENT_HANDLER_REGISTRY_MAX_SIZE", 2):
+    runtime.register_event_handler("a", module_level_handler)
+    runtime.register_event_handler("b", module_level_handler)
+    assert runtime.get_event_handler("a") is module_level_handler
+    runtime.register_event_handler("c", module_level_handler)
+
+  assert runtime.get_event_handler("a") is module_level_handler
+  assert runtime.get_event_handler("b") is None
+  assert runtime.get_event_handler("c") is module_level_handler
+
+
+@pytest.mark.usefixtures("runtime")
+def test_compute_fn_id_for_partials():
+  fn_id = compute_fn_id(partial(module_level_handler, value=1))
+
+  assert compute_fn_id(partial(module_level_handler, value=1)) == fn_id
+  assert compute_fn_id(partial(module_level_handler, value=2)) != fn_id
+  assert compute_fn_id(partial(module_level_handler)) != fn_id
+  assert compute_fn_id(module_level_handler) != fn_id
+  with pytest.raises(MesopDeveloperException, match="stable repr"):
+    compute_fn_id(partial(module_level_handler, object()))
+
+
+@pytest.mark.usefixtures("runtime")
+def test_compute_fn_id_cache_is_bounded():
+  with (
+    patch("mesop.component_helpers.helper._FN_ID_CACHE_MAX_SIZE", 2),
+    patch(
+      "mesop.component_helpers.helper._fn_id_cache", OrderedDict()
+    ) as cache,
+  ):
+    fn_ids = [
+      compute_fn_id(fn)
+      for fn in [
+        module_level_handler,
+        test_compute_fn_id_for_partials,
+        test_compute_fn_id_cache_is_bounded,
+      ]
+    ]
+
+    assert len(cache) == 2
+    assert list(cache.values()) == fn_ids[1:]
+
+
+def render_box(
+  runtime: Callable[[], Runtime], texts: list[str]
+) -> pb.Component:
+  runtime().context().reset_current_node()
+  with insert_composite_component(type_name="box", proto=pb.Key()):
+    for text in texts:
+      insert_component(type_name="text", proto=pb.Key(key=text))
+  return runtime().context().current_component().children[0]
+
+
+def test_components_have_subtree_hashes(runtime, app):
+  with app.app_context():
+    box1 = render_box(runtime, ["a", "b"])
+    box2 = render_box(runtime, ["a", "b"])
+    box3 = render_box(runtime, ["a", "c"])
+
+  assert box1.subtree_hash != 0
+  assert box1.subtree_hash == box2.subtree_hash
+  assert box1.subtree_hash != box3.subtree_hash
+  assert box1.children[0].subtree_hash == box3.children[0].subtree_hash
+  assert box1.children[1].subtree_hash != box3.children[1].subtree_hash
+
+
+def test_components_enclosing_slots_have_no_subtree_hash(runtime, app):
+  with app.app_context():
+
+    def unnamed_component():
+      with insert_composite_component(type_name="box", proto=pb.Key()):
+        slot()
+
+    with _UserCompositeComponent(
+      unnamed_component, named_slots_cls=UnnamedSlot
+    ):
+      insert_component(type_name="text", proto=pb.Key(key="a"))
+
+    box = runtime().context().current_component().children[0]
+
+  assert box.subtree_hash == 0
+  assert box.children[0].subtree_hash != 0
+
+
+@dataclass
+class ReactiveState:
+  count: int = 0
+  other: int = 0
+
+
+def test_reactive_component_reuses_unchanged_component(app):
+  runtime = Runtime()
+  runtime.register_state_class(ReactiveState)
+  rendered = []
+
+  with (
+    patch("mesop.component_helpers.helper.runtime", return_value=runtime),
+    app.app_context(),
+  ):
+
+    @component(reactive=True)
+    def counter(label: str):
+      rendered.append(label)
+      count = runtime.context().state(ReactiveState).count
+      insert_component(type_name="text", proto=pb.Key(key=f"{label}{count}"))
+
+    def render_page() -> pb.Component:
+      runtime.context().reset_current_node()
+      runtime.context().component_cache().start_render()
+      counter("a")
+      counter(label="b")
+      return runtime.context().current_component()
+
+    root1 = render_page()
+    runtime.context().state(ReactiveState).other = 1
+    root2 = render_page()
+    assert rendered == ["a", "b"]
+    assert root2 == root1
+
+    runtime.context().state(ReactiveState).count = 1
+    root3 = render_page()
+    assert rendered == ["a", "b", "a", "b"]
+    assert (
+      root3.children[0].children[0].type.value
+      == pb.Key(key="a1").SerializeToString()
+    )
+
+
+def test_pure_component_reuses_component_across_contexts(app):
+  runtime = Runtime()
+  rendered = []
+
+  def on_click(event: ClickEvent):
+    pass
+
+  with patch("mesop.component_helpers.helper.runtime", return_value=runtime):
+
+    @component(pure=True)
+    def header(title: str, style: Style | None = None):
+      rendered.append(title)
+      handler_id = register_event_handler(on_click, event=ClickEvent)
+      insert_component(
+        type_name="text", proto=pb.Key(key=f"{title}:{handler_id}")
+      )
+      return title.upper()
+
+    def render_page() -> tuple[pb.Component, Any]:
+      ret = header("a", style=Style(width=1))
+      header("b")
+      return runtime.context().current_component(), ret
+
+    with app.app_context():
+      root1, ret1 = render_page()
+    with app.app_context():
+      root2, ret2 = render_page()
+      handler_ids = runtime.context()._handlers.keys()
+
+    assert rendered == ["a", "b"]
+    assert root2 == root1
+    assert ret1 == ret2 == "A"
+    assert len(handler_ids) == 1
+
+    with app.app_context():
+      header("a", style=Style(width=2))
+    assert rendered == ["a", "b", "a"]
+
+
+def test_pure_component_cannot_read_state(app):
+  runtime = Runtime()
+  runtime.register_state_class(ReactiveState)
+
+  with (
+    patch("mesop.component_helpers.helper.runtime", return_value=runtime),
+    app.app_context(),
+  ):
+
+    @component(pure=True)
+    def counter():
+      runtime.context().state(ReactiveState)
+
+    with pytest.raises(MesopDeveloperException, match="pure component"):
+      counter()
+
+
+def test_pure_component_key():
+  def fn():
+    pass
+
+  assert _pure_component_key(fn, (1,), {"a": [1]}) == _pure_component_key(
+    fn, (1,), {"a": [1]}
+  )
+  assert _pure_component_key(fn, (1,), {}) != _pure_component_key(
+    fn, (True,), {}
+  )
+  assert _pure_component_key(fn, (object(),), {}) is None
+
+
+def test_component_prod_validation_mode_only_applies_in_prod(app):
+  runtime = Runtime()
+
+  with (
+    patch("mesop.component_helpers.helper.runtime", return_value=runtime),
+    app.app_context(),
+  ):
+
+    @component(prod_validation_mode="none")
+    def label(text: str):
+      pass
+
+    label(1)  # type: ignore
+
+    runtime.debug_mode = True
+    with pytest.raises(MesopDeveloperException):
+      label(1)  # type: ignore
+
+
 if __name__ == "__main__":
   raise SystemExit(pytest.main([__file__]))
@@ -1,8 +1,15 @@
-from dataclasses import dataclass
-from typing import Literal
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, fields
+from operator import attrgetter
+from typing import Any, Literal
 
 import mesop.protos.ui_pb2 as pb
 
+# Bounds the number of distinct styles kept by `to_style_proto`, since styles
+# may be computed from data (e.g. a width per item).
+_STYLE_CACHE_MAX_SIZE = 4_096
+
 ContentAlignmentValues = Literal[
   "center",
   "start",
@@ -562,7 +569,77 @@ class Style:
   z_index: int | None = None
 
 
+# Returns the values of the style fields that are not nested styles.
+_get_flat_style_values = attrgetter(
+  *(
+    field.name
+    for field in fields(Style)
+    if field.name not in ("border", "margin", "padding")
+  )
+)
+_style_cache: OrderedDict[tuple[Any, ...], pb.Style] = OrderedDict()
+_style_cache_lock = threading.Lock()
+
+
 def to_style_proto(s: Style) -> pb.Style:
+  """Converts the style to a proto.
+
+  Conversions are cached by value, since apps usually pass the same styles
+  (e.g. module-level constants) on every render. The returned proto may be
+  shared and must not be modified.
+  """
+  try:
+    key = _style_key(s)
+    with _style_cache_lock:
+      style = _style_cache.get(key)
+      if style is not None:
+        _style_cache.move_to_end(key)
+        return style
+  except TypeError:
+    # A value is unhashable, e.g. a list passed by mistake.
+    return _to_style_proto(s)
+
+  style = _to_style_proto(s)
+  with _style_cache_lock:
+    _style_cache[key] = style
+    if len(_style_cache) > _STYLE_CACHE_MAX_SIZE:
+      _style_cache.popitem(last=False)
+  return style
+
+
+def _style_key(s: Style) -> tuple[Any, ...]:
+  # Values of different types can be equal (e.g. `1` and `1.0`) but are
+  # converted differently, so the key includes the type of each value.
+  values = _get_flat_style_values(s)
+  return (
+    values,
+    tuple(map(type, values)),
+    _nested_style_key(s.border),
+    _nested_style_key(s.margin),
+    _nested_style_key(s.padding),
+  )
+
+
+def _nested_style_key(
+  value: Border | BorderSide | _EdgeInsets | None,
+) -> tuple[Any, ...] | None:
+  # Nested styles are unhashable and may be modified after they are cached, so
+  # the key holds their values.
+  if value is None:
+    return None
+  if isinstance(value, Border):
+    return (
+      Border,
+      _nested_style_key(value.top),
+      _nested_style_key(value.right),
+      _nested_style_key(value.bottom),
+      _nested_style_key(value.left),
+    )
+  values = tuple(value.__dict__.values())
+  return (type(value), values, tuple(map(type, values)))
+
+
+def _to_style_proto(s: Style) -> pb.Style:
   return pb.Style(
     align_content=s.align_content,
     align_items=s.align_items,
@@ -0,0 +1,54 @@
+import pytest
+
+import mesop.protos.ui_pb2 as pb
+from mesop.component_helpers.style import (
+  Border,
+  BorderSide,
+  Padding,
+  Style,
+  to_style_proto,
+)
+
+
+def test_to_style_proto_reuses_conversions_of_equal_styles():
+  style = to_style_proto(
+    Style(
+      color="red",
+      padding=Padding.all(8),
+      border=Border.all(BorderSide(width=1, style="solid")),
+    )
+  )
+
+  assert style == pb.Style(
+    color="red",
+    font_weight="",
+    padding=pb.EdgeInsets(top="8px", right="8px", bottom="8px", left="8px"),
+    border=pb.Border(
+      top=pb.BorderSide(width="1px", style="solid"),
+      right=pb.BorderSide(width="1px", style="solid"),
+      bottom=pb.BorderSide(width="1px", style="solid"),
+      left=pb.BorderSide(width="1px", style="solid"),
+    ),
+  )
+  assert (
+    to_style_proto(
+      Style(
+        color="red",
+        padding=Padding.all(8),
+        border=Border.all(BorderSide(width=1, style="solid")),
+      )
+    )
+    is style
+  )
+  assert to_style_proto(Style(color="blue", padding=Padding.all(8))) != style
+
+
+def test_to_style_proto_distinguishes_equal_values_of_different_types():
+  assert to_style_proto(Style(opacity=1)).opacity == "1"
+  assert to_style_proto(Style(opacity=1.0)).opacity == "1.0"
+  assert to_style_proto(Style(line_height=2)).line_height == "2"
+  assert to_style_proto(Style(line_height=2.0)).line_height == "2.0"
+
+
+if __name__ == "__main__":
+  raise SystemExit(pytest.main([__file__]))
@@ -3,14 +3,20 @@ import os
 from functools import wraps
 from typing import Any, Callable, TypeVar, cast
 
+from mesop.component_helpers.helper import validate_component
 from mesop.env.env import get_app_base_path
 from mesop.runtime import runtime
-from mesop.utils.validate import validate
+from mesop.utils.validate import ValidationMode
 
 C = TypeVar("C", bound=Callable[..., Any])
 
 
-def web_component(*, path: str, skip_validation: bool = False):
+def web_component(
+  *,
+  path: str,
+  skip_validation: bool = False,
+  prod_validation_mode: ValidationMode | None = None,
+):
   """A decorator for defining a web component.
 
   This decorator is used to define a web component. It takes a path to the
@@ -20,6 +26,9 @@ def web_component(*, path: str, skip_validation: bool = False):
   Args:
     path: The path to the JavaScript file of the web component.
     skip_validation: If set to True, skips validation. Defaults to False.
+    prod_validation_mode: How the arguments are validated when not running in
+      debug mode: "full", "fast" or "none". Defaults to the app's
+      `MESOP_PROD_VALIDATION_MODE`.
   """
   runtime().check_register_web_component_is_valid()
 
@@ -37,7 +46,9 @@ def web_component(*, path: str, skip_validation: bool = False):
   js_module_path = full_path
 
   def component_wrapper(fn: C) -> C:
-    validated_fn = fn if skip_validation else validate(fn)
+    validated_fn = (
+      fn if skip_validation else validate_component(fn, prod_validation_mode)
+    )
 
     @wraps(fn)
     def wrapper(*args: Any, **kw_args: Any):
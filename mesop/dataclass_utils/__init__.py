@@ -1,3 +1,6 @@
+from .dataclass_utils import (
+  dataclass_to_dict as dataclass_to_dict,
+)
 from .dataclass_utils import (
   dataclass_with_defaults as dataclass_with_defaults,
 )
@@ -7,6 +10,21 @@ from .dataclass_utils import (
 from .dataclass_utils import (
   serialize_dataclass as serialize_dataclass,
 )
+from .dataclass_utils import (
+  update_dataclass_from_dict as update_dataclass_from_dict,
+)
 from .dataclass_utils import (
   update_dataclass_from_json as update_dataclass_from_json,
 )
+from .mutation_tracking import (
+  diff_tracked_state as diff_tracked_state,
+)
+from .mutation_tracking import (
+  enable_mutation_tracking as enable_mutation_tracking,
+)
+from .mutation_tracking import (
+  has_mutation_tracking as has_mutation_tracking,
+)
+from .mutation_tracking import (
+  start_tracking as start_tracking,
+)
@@ -1,10 +1,26 @@
 # ruff: noqa: E721
 import base64
 import json
-from dataclasses import Field, asdict, dataclass, field, is_dataclass
+import re
+import weakref
+from contextvars import ContextVar
+from dataclasses import Field, asdict, dataclass, field, fields, is_dataclass
 from datetime import date, datetime
+from importlib import metadata
 from io import StringIO
-from typing import Any, Type, TypeVar, cast, get_origin, get_type_hints
+from types import UnionType
+from typing import (
+  Any,
+  Callable,
+  Literal,
+  Type,
+  TypeVar,
+  Union,
+  cast,
+  get_args,
+  get_origin,
+  get_type_hints,
+)
 
 from deepdiff import DeepDiff, Delta
 from deepdiff.operator import BaseOperator
@@ -15,6 +31,8 @@ from mesop.components.uploader.uploaded_file import UploadedFile
 from mesop.exceptions import MesopDeveloperException, MesopException
 
 _PANDAS_OBJECT_KEY = "__pandas.DataFrame__"
+_PANDAS_ARROW_OBJECT_KEY = "__pandas.DataFrame.arrow__"
+_PANDAS_PATCHED_OBJECT_KEY = "__pandas.DataFrame.patched__"
 _DATE_OBJECT_KEY = "__datetime.date__"
 _PYDANTIC_OBJECT_KEY = "__pydantic.BaseModel__"
 _DATETIME_OBJECT_KEY = "__datetime.datetime__"
@@ -22,7 +40,16 @@ _BYTES_OBJECT_KEY = "__python.bytes__"
 _SET_OBJECT_KEY = "__python.set__"
 _UPLOADED_FILE_OBJECT_KEY = "__mesop.UploadedFile__"
 _DIFF_ACTION_DATA_FRAME_CHANGED = "data_frame_changed"
+_DIFF_ACTION_DATA_FRAME_PATCHED = "data_frame_patched"
 _DIFF_ACTION_EQUALITY_CHANGED = "mesop_equality_changed"
+_DIFF_ACTION_VALUES_CHANGED = "values_changed"
+_DIFF_ACTION_TYPE_CHANGES = "type_changes"
+_DIFF_ACTION_DICT_ITEM_ADDED = "dictionary_item_added"
+_DIFF_ACTION_DICT_ITEM_REMOVED = "dictionary_item_removed"
+_DIFF_ACTION_ITERABLE_ITEM_ADDED = "iterable_item_added"
+_DIFF_ACTION_ITERABLE_ITEM_REMOVED = "iterable_item_removed"
+_DIFF_ACTION_SET_ITEM_ADDED = "set_item_added"
+_DIFF_ACTION_SET_ITEM_REMOVED = "set_item_removed"
 
 C = TypeVar("C")
 
@@ -39,8 +66,29 @@ def _check_has_pandas():
 
 _has_pandas = _check_has_pandas()
 
+
+def _check_has_pyarrow():
+  """Checks if pyarrow exists since it is an optional dependency for Mesop.
+
+  Versions before 14.0.1 are treated as missing, since reading Arrow data with them
+  can run arbitrary code (CVE-2023-47248), and DataFrames in the state are read from
+  the client.
+  """
+  try:
+    version = metadata.version("pyarrow")
+  except metadata.PackageNotFoundError:
+    return False
+  match = re.match(r"(\d+)\.(\d+)\.(\d+)", version)
+  return match is not None and tuple(map(int, match.groups())) >= (14, 0, 1)
+
+
+_has_pyarrow = _check_has_pyarrow()
+
 pydantic_model_cache = {}
 
+# Type hints of dataclasses, collected by `dataclass_with_defaults` or on first use.
+_dataclass_type_hints: dict[type, dict[str, Any]] = {}
+
 
 def dataclass_with_defaults(cls: Type[C]) -> Type[C]:
   """
@@ -68,6 +116,7 @@ def dataclass_with_defaults(cls: Type[C]) -> Type[C]:
         raise MesopDeveloperException(error_message) from exc
 
   annotations = get_type_hints(cls)
+  _dataclass_type_hints[cls] = annotations
   for name, type_hint in annotations.items():
     if (
       isinstance(type_hint, type)
@@ -116,7 +165,7 @@ def has_parent(cls: Type[Any]) -> bool:
 
 def serialize_dataclass(state: Any):
   if is_dataclass(state):
-    json_str = json.dumps(asdict(state), cls=MesopJSONEncoder)
+    json_str = json.dumps(dataclass_to_dict(state), cls=MesopJSONEncoder)
     return json_str
   else:
     raise MesopException("Tried to serialize state which was not a dataclass")
@@ -127,48 +176,219 @@ def update_dataclass_from_json(instance: Any, json_string: str):
   _recursive_update_dataclass_from_json_obj(instance, data)
 
 
+def dataclass_to_dict(state: Any) -> dict[str, Any]:
+  """
+  Converts a dataclass to a dict for encoding, like `asdict`.
+
+  Unlike `asdict`, values other than dataclasses, lists, tuples and dicts are not
+  copied, and are left as is for the encoder (e.g. `MesopJSONEncoder`). Each
+  dataclass is converted by a function generated once per class from its type hints,
+  which skips fields whose type hints cannot contain dataclasses.
+  """
+  if not is_dataclass(state) or isinstance(state, type):
+    raise MesopException("Tried to serialize state which was not a dataclass")
+  return _encode_value(state)
+
+
+def update_dataclass_from_dict(instance: Any, data: dict[str, Any]):
+  """
+  Updates a dataclass from a dict decoded with `decode_mesop_json_state_hook`.
+
+  This is `update_dataclass_from_json` for dicts decoded by other means than
+  `json.loads`.
+  """
+  _recursive_update_dataclass_from_json_obj(instance, data)
+
+
+_Encoder = Callable[[Any], Any]
+_Updater = Callable[[Any, dict[str, Any]], None]
+_dataclass_encoders: dict[type, _Encoder] = {}
+_dataclass_updaters: dict[type, _Updater] = {}
+# Types that encoders pass through as is.
+_PLAIN_TYPES = frozenset((str, int, float, bool, type(None)))
+# Type hints of fields that are encoded as is, in addition to `_PLAIN_TYPES`.
+_PLAIN_TYPE_HINTS = _PLAIN_TYPES | frozenset((bytes, date, datetime))
+_GENERIC_ORIGINS = frozenset(
+  (list, tuple, set, frozenset, dict, Union, UnionType)
+)
+
+
+def _get_dataclass_type_hints(cls: type) -> dict[str, Any]:
+  hints = _dataclass_type_hints.get(cls)
+  if hints is None:
+    try:
+      hints = get_type_hints(cls)
+    except Exception:
+      # E.g. a forward reference to a class defined in a function. Fields without
+      # type hints are handled generically.
+      hints = {}
+    _dataclass_type_hints[cls] = hints
+  return hints
+
+
+def _encode_value(value: Any) -> Any:
+  value_type = type(value)
+  if value_type in _PLAIN_TYPES:
+    return value
+  encoder = _dataclass_encoders.get(value_type)
+  if encoder is not None:
+    return encoder(value)
+  if isinstance(value, (list, tuple)):
+    return [_encode_value(item) for item in value]
+  if isinstance(value, dict):
+    return {key: _encode_value(item) for key, item in value.items()}
+  if is_dataclass(value) and not isinstance(value, type):
+    encoder = _dataclass_encoders[value_type] = _compile_encoder(value_type)
+    return encoder(value)
+  return value
+
+
+def _compile_encoder(cls: type) -> _Encoder:
+  """Returns a function that converts instances of the dataclass to dicts.
+
+  For a dataclass with the fields `name: str` and `items: list[Item]`, the function
+  is `lambda value: {"name": value.name, "items": _encode_value(value.items)}`.
+  """
+  hints = _get_dataclass_type_hints(cls)
+  namespace: dict[str, Any] = {"_encode_value": _encode_value}
+  items: list[str] = []
+  for field_ in fields(cls):
+    value = f"value.{field_.name}"
+    if not _is_encoded_as_is(hints.get(field_.name, Any)):
+      value = f"_encode_value({value})"
+    items.append(f"{field_.name!r}: {value}")
+  exec(f"def encode(value):\n  return {{{', '.join(items)}}}\n", namespace)
+  return namespace["encode"]
+
+
+def _is_encoded_as_is(type_hint: Any) -> bool:
+  """Returns whether values of the type hint cannot contain dataclasses.
+
+  This only needs to be right for values that match the type hint. Other values are
+  still encoded correctly (see `MesopJSONEncoder.default`), but more slowly.
+  """
+  if type_hint in _PLAIN_TYPE_HINTS:
+    return True
+  origin = get_origin(type_hint)
+  if origin is Literal:
+    return True
+  if origin in _GENERIC_ORIGINS:
+    return all(
+      arg is Ellipsis or _is_encoded_as_is(arg) for arg in get_args(type_hint)
+    )
+  # E.g. a DataFrame or pydantic model, but not a dataclass or an unparameterized
+  # container.
+  return (
+    isinstance(type_hint, type)
+    and origin is None
+    and type_hint is not object
+    and not is_dataclass(type_hint)
+    and not issubclass(type_hint, (list, tuple, set, frozenset, dict))
+  )
+
+
 def _recursive_update_dataclass_from_json_obj(instance: Any, json_dict: Any):
-  for key, value in json_dict.items():
-    if key.startswith("__") and key.endswith("__"):
-      raise MesopDeveloperException(
-        f"Cannot use dunder property: {key} in stateclass"
-      )
-    if hasattr(instance, key):
-      attr = getattr(instance, key)
-      if isinstance(value, dict):
-        # If the value is a dict, recursively update the dataclass.
+  instance_type = type(instance)
+  updater = _dataclass_updaters.get(instance_type)
+  if updater is None:
+    if not is_dataclass(instance_type):
+      _update_object_from_json_obj(instance, json_dict)
+      return instance
+    updater = _dataclass_updaters[instance_type] = _create_updater(
+      instance_type
+    )
+  updater(instance, json_dict)
+  return instance
+
+
+def _create_updater(cls: type) -> _Updater:
+  """Returns a function that updates instances of the dataclass from JSON objects.
+
+  Lists of JSON objects are converted into the item type of the field's type hint,
+  which is looked up once here rather than for each update.
+  """
+  hints = _get_dataclass_type_hints(cls)
+  item_types: dict[str, Any] = {}
+  for field_ in fields(cls):
+    if field_.name.startswith("__") and field_.name.endswith("__"):
+      # Rejected by `_update_object_from_json_obj`.
+      continue
+    args = getattr(hints.get(field_.name), "__args__", None)
+    item_types[field_.name] = args[0] if args else None
+
+  def update(instance: Any, json_dict: dict[str, Any]):
+    for key, value in json_dict.items():
+      if key not in item_types:
+        _update_attribute_from_json_obj(instance, key, value)
+      elif isinstance(value, dict):
         setattr(
           instance,
           key,
-          _recursive_update_dataclass_from_json_obj(attr, value),
+          _recursive_update_dataclass_from_json_obj(
+            getattr(instance, key), value
+          ),
         )
       elif isinstance(value, list):
-        updated_list: list[Any] = []
-        for item in cast(list[Any], value):
-          if isinstance(item, dict):
-            # If the json item value is an instance of dict
-            # and the instance has an attribute with a matching name,
-            # we assume the dict should be converted into a dataclass.
-            attr = getattr(instance, key)
-            item_instance = instance.__annotations__[key].__args__[0]()
-            updated_list.append(
-              _recursive_update_dataclass_from_json_obj(item_instance, item)
-            )
-          else:
-            # If the item is not a dict, append it directly.
-            updated_list.append(item)
-        setattr(instance, key, updated_list)
+        item_type = item_types[key]
+        setattr(
+          instance,
+          key,
+          [
+            _recursive_update_dataclass_from_json_obj(item_type(), item)
+            if isinstance(item, dict) and item_type is not None
+            else item
+            for item in cast(list[Any], value)
+          ],
+        )
       else:
-        # For other types, set the value directly.
         setattr(instance, key, value)
+
+  return update
+
+
+def _update_object_from_json_obj(instance: Any, json_dict: Any):
+  for key, value in json_dict.items():
+    _update_attribute_from_json_obj(instance, key, value)
+
+
+def _update_attribute_from_json_obj(instance: Any, key: str, value: Any):
+  if key.startswith("__") and key.endswith("__"):
+    raise MesopDeveloperException(
+      f"Cannot use dunder property: {key} in stateclass"
+    )
+  if isinstance(instance, dict):
+    instance[key] = value
+  elif hasattr(instance, key):
+    attr = getattr(instance, key)
+    if isinstance(value, dict):
+      # If the value is a dict, recursively update the dataclass.
+      setattr(
+        instance,
+        key,
+        _recursive_update_dataclass_from_json_obj(attr, value),
+      )
+    elif isinstance(value, list):
+      updated_list: list[Any] = []
+      for item in cast(list[Any], value):
+        if isinstance(item, dict):
+          # If the json item value is an instance of dict
+          # and the instance has an attribute with a matching name,
+          # we assume the dict should be converted into a dataclass.
+          item_instance = instance.__annotations__[key].__args__[0]()
+          updated_list.append(
+            _recursive_update_dataclass_from_json_obj(item_instance, item)
+          )
+        else:
+          # If the item is not a dict, append it directly.
+          updated_list.append(item)
+      setattr(instance, key, updated_list)
     else:
-      if isinstance(instance, dict):
-        instance[key] = value
-      else:
-        raise MesopException(
-          f"Unhandled stateclass deserialization where key={key}, value={value}, instance={instance}"
-        )
-  return instance
+      # For other types, set the value directly.
+      setattr(instance, key, value)
+  else:
+    raise MesopException(
+      f"Unhandled stateclass deserialization where key={key}, value={value}, instance={instance}"
+    )
 
 
 class MesopJSONEncoder(json.JSONEncoder):
@@ -179,18 +399,26 @@ class MesopJSONEncoder(json.JSONEncoder):
   the DataFrames in Mesop State. This means we need a way to serialize the DataFrame to
   JSON and back.
 
-  For simplicity we will convert the DataFrame to JSON within the JSON serialized state.
-  This makes it so we don't have to worry about serializing other data types used by
-  Pandas. The "table" serialization format is verbose, but will ensure the most accurate
-  deserialization back into a DataFrame.
+  If pyarrow is installed, DataFrames are encoded with Arrow (see `encode_data_frame`),
+  which is compact and keeps their dtypes. Otherwise, we will convert the DataFrame to
+  JSON within the JSON serialized state. This makes it so we don't have to worry about
+  serializing other data types used by Pandas. The "table" serialization format is
+  verbose, but will ensure the most accurate deserialization back into a DataFrame.
+
+  With `binary=True`, DataFrames encoded with Arrow are kept as bytes rather than
+  base64, for formats that support bytes (e.g. MessagePack).
   """
 
+  def __init__(self, *args: Any, binary: bool = False, **kw_args: Any):
+    super().__init__(*args, **kw_args)
+    self.binary = binary
+
   def default(self, obj):
     try:
       import pandas as pd
 
       if isinstance(obj, pd.DataFrame):
-        return {_PANDAS_OBJECT_KEY: pd.DataFrame.to_json(obj, orient="table")}
+        return encode_data_frame(obj, binary=self.binary)
     except ImportError:
       pass
 
@@ -205,9 +433,11 @@ class MesopJSONEncoder(json.JSONEncoder):
       }
 
     if isinstance(obj, BaseModel):
+      # The model is embedded as JSON-compatible values rather than as a JSON
+      # string, so that it is not encoded twice.
       return {
         _PYDANTIC_OBJECT_KEY: {
-          "json": obj.model_dump_json(),
+          "value": obj.model_dump(mode="json"),
           "module": obj.__class__.__module__,
           "qualname": obj.__class__.__qualname__,
         }
@@ -234,6 +464,43 @@ class MesopJSONEncoder(json.JSONEncoder):
     return super().default(obj)
 
 
+def encode_data_frame(df: Any, *, binary: bool = False) -> dict[str, Any]:
+  """
+  Encodes a DataFrame for `MesopJSONEncoder`.
+
+  If pyarrow is installed, the DataFrame is encoded in the Arrow IPC stream format,
+  compressed with zstd if available, and then in base64 unless `binary` is set. The
+  pandas metadata stored by pyarrow restores the dtypes and index of the DataFrame,
+  including e.g. categorical and nullable integer dtypes that the "table" JSON format
+  loses. DataFrames that Arrow does not support, e.g. with a column of mixed types, are
+  encoded as "table" JSON instead.
+  """
+  if _has_pyarrow:
+    import pyarrow as pa
+
+    try:
+      table = pa.Table.from_pandas(df)
+    except (pa.ArrowException, ValueError):
+      # E.g. a column with values of different types or duplicate column names.
+      pass
+    else:
+      compression = "zstd" if pa.Codec.is_available("zstd") else None
+      sink = pa.BufferOutputStream()
+      with pa.ipc.new_stream(
+        sink,
+        table.schema,
+        options=pa.ipc.IpcWriteOptions(compression=compression),
+      ) as writer:
+        writer.write_table(table)
+      data = sink.getvalue().to_pybytes()
+      return {
+        _PANDAS_ARROW_OBJECT_KEY: data
+        if binary
+        else base64.b64encode(data).decode("utf-8")
+      }
+  return {_PANDAS_OBJECT_KEY: df.to_json(orient="table")}
+
+
 def decode_mesop_json_state_hook(dct):
   """
   Object hook to decode JSON for Mesop state.
@@ -244,45 +511,85 @@ def decode_mesop_json_state_hook(dct):
 
   One thing to note is that pandas.NA becomes numpy.nan during deserialization.
   """
-  if _has_pandas:
-    import pandas as pd
-
-    if _PANDAS_OBJECT_KEY in dct:
-      return pd.read_json(StringIO(dct[_PANDAS_OBJECT_KEY]), orient="table")
-
-  if _PYDANTIC_OBJECT_KEY in dct:
-    cache_key = (
-      dct[_PYDANTIC_OBJECT_KEY]["module"],
-      dct[_PYDANTIC_OBJECT_KEY]["qualname"],
+  # Values encoded by `MesopJSONEncoder` are dicts with a single key, so other dicts
+  # are returned without looking up each key.
+  if len(dct) != 1:
+    return dct
+  key = next(iter(dct))
+  decoder = _json_object_decoders.get(key)
+  if decoder is None:
+    return dct
+  return decoder(dct[key])
+
+
+def _decode_data_frame(value: str) -> Any:
+  import pandas as pd
+
+  return pd.read_json(StringIO(value), orient="table")
+
+
+def _decode_patched_data_frame(value: dict[str, Any]) -> Any:
+  """Decodes a DataFrame that the client patched (see `addDataFramePatch` in
+  `diff.ts`)."""
+  import pandas as pd
+
+  df = value.get("data_frame")
+  patches = value.get("patches")
+  if not isinstance(df, pd.DataFrame) or not isinstance(patches, list):
+    raise MesopException("Tried to deserialize an invalid patched DataFrame")
+  for patch in patches:
+    df = _apply_data_frame_patch(df, patch)
+  _data_frame_patch_counts[id(df)] = len(patches)
+  weakref.finalize(df, _data_frame_patch_counts.pop, id(df), None)
+  return df
+
+
+def _decode_arrow_data_frame(value: str | bytes) -> Any:
+  if not _has_pyarrow:
+    raise MesopException(
+      "Tried to deserialize a DataFrame encoded with Arrow, but pyarrow 14.0.1 or later is not installed"
     )
-    if cache_key not in pydantic_model_cache:
-      raise MesopException(
-        f"Tried to deserialize Pydantic model, but it's not in the cache: {cache_key}"
-      )
-    model_class = pydantic_model_cache[cache_key]
-    return model_class.model_validate_json(dct[_PYDANTIC_OBJECT_KEY]["json"])
-
-  if _DATETIME_OBJECT_KEY in dct:
-    return datetime.fromisoformat(dct[_DATETIME_OBJECT_KEY])
-
-  if _DATE_OBJECT_KEY in dct:
-    return date.fromisoformat(dct[_DATE_OBJECT_KEY])
+  import pyarrow as pa
 
-  if _BYTES_OBJECT_KEY in dct:
-    return base64.b64decode(dct[_BYTES_OBJECT_KEY])
+  if isinstance(value, str):
+    value = base64.b64decode(value)
+  return pa.ipc.open_stream(value).read_all().to_pandas()
 
-  if _SET_OBJECT_KEY in dct:
-    return set(dct[_SET_OBJECT_KEY])
 
-  if _UPLOADED_FILE_OBJECT_KEY in dct:
-    return UploadedFile(
-      base64.b64decode(dct[_UPLOADED_FILE_OBJECT_KEY]["contents"]),
-      name=dct[_UPLOADED_FILE_OBJECT_KEY]["name"],
-      size=dct[_UPLOADED_FILE_OBJECT_KEY]["size"],
-      mime_type=dct[_UPLOADED_FILE_OBJECT_KEY]["mime_type"],
+def _decode_pydantic_model(value: dict[str, Any]) -> BaseModel:
+  cache_key = (value["module"], value["qualname"])
+  if cache_key not in pydantic_model_cache:
+    raise MesopException(
+      f"Tried to deserialize Pydantic model, but it's not in the cache: {cache_key}"
     )
-
-  return dct
+  model_class = pydantic_model_cache[cache_key]
+  if "value" in value:
+    return model_class.model_validate(value["value"])
+  # Models used to be embedded as JSON strings.
+  return model_class.model_validate_json(value["json"])
+
+
+def _decode_uploaded_file(value: dict[str, Any]) -> UploadedFile:
+  return UploadedFile(
+    base64.b64decode(value["contents"]),
+    name=value["name"],
+    size=value["size"],
+    mime_type=value["mime_type"],
+  )
+
+
+_json_object_decoders: dict[str, Callable[[Any], Any]] = {
+  _PYDANTIC_OBJECT_KEY: _decode_pydantic_model,
+  _DATETIME_OBJECT_KEY: datetime.fromisoformat,
+  _DATE_OBJECT_KEY: date.fromisoformat,
+  _BYTES_OBJECT_KEY: base64.b64decode,
+  _SET_OBJECT_KEY: set,
+  _UPLOADED_FILE_OBJECT_KEY: _decode_uploaded_file,
+}
+if _has_pandas:
+  _json_object_decoders[_PANDAS_OBJECT_KEY] = _decode_data_frame
+  _json_object_decoders[_PANDAS_ARROW_OBJECT_KEY] = _decode_arrow_data_frame
+  _json_object_decoders[_PANDAS_PATCHED_OBJECT_KEY] = _decode_patched_data_frame
 
 
 class DataFrameOperator(BaseOperator):
@@ -341,11 +648,454 @@ class EqualityOperator(BaseOperator):
     return True
 
 
-def diff_state(state1: Any, state2: Any) -> str:
+def diff_state(
+  state1: Any, state2: Any, *, data_frame_patches: bool = False
+) -> str:
+  """
+  Diffs two state objects and returns the difference as a JSON string.
+
+  The difference is a list of flat dicts with the path, action and value of each change
+  (the subset of DeepDiff's flat dicts format used by `applyStateDiff` in `diff.ts`).
+
+  Rather than using DeepDiff, the state is walked with differs specialized by type, and
+  the fields of dataclasses are looked up once per class. Lists are diffed by position
+  after skipping their common prefix and suffix, so inserting or removing items only
+  sends those items.
+
+  Args:
+    data_frame_patches: If true, changed DataFrames may be sent as patches (see
+      `_create_data_frame_patch`). Only enable this if `state1` was decoded from the
+      client's state, since the patches pile up in the client's state until the server
+      decodes it.
+  """
+  if not is_dataclass(state1) or not is_dataclass(state2):
+    raise MesopException("Tried to diff state which was not a dataclass")
+
+  diffs: list[dict[str, Any]] = []
+  token = _data_frame_patches_enabled.set(data_frame_patches)
+  try:
+    _diff_value(state1, state2, [], diffs)
+  finally:
+    _data_frame_patches_enabled.reset(token)
+  return json.dumps(diffs, cls=MesopJSONEncoder)
+
+
+# Types that are compared with `==` and sent whole when changed.
+_ATOMIC_TYPES = frozenset(
+  (str, int, float, bool, type(None), bytes, date, datetime)
+)
+# Dict keys that are kept as is (or converted to strings) by JSON encoding, so they
+# can be used in paths.
+_JSON_KEY_TYPES = (str, int, float, bool, type(None))
+
+_Differ = Callable[[Any, Any, list[Any], list[dict[str, Any]]], None]
+_differs: dict[type, _Differ] = {}
+_dataclass_field_names: dict[type, tuple[str, ...]] = {}
+# Subclasses whose instances are not a type change from their base type.
+_diff_base_types: dict[type, type] = {}
+
+
+def register_diff_base_type(subclass: type, base_type: type) -> None:
+  """Diffs instances of the subclass against instances of its base type by value.
+
+  E.g. the lists of a tracked state (see `mutation_tracking`) are copied as plain
+  lists, which must not be sent as a type change when a state without tracking
+  holds one of these lists.
+  """
+  _diff_base_types[subclass] = base_type
+
+
+def _diff_value(
+  value1: Any, value2: Any, path: list[Any], diffs: list[dict[str, Any]]
+) -> None:
+  """Appends the changes from `value1` to `value2` at `path` to `diffs`.
+
+  `path` is modified while diffing nested values, so it is copied into diffs.
+  """
+  if value1 is value2:
+    return
+  value_type = type(value2)
+  value1_type = type(value1)
+  if value1_type is not value_type and _diff_base_types.get(
+    value1_type, value1_type
+  ) is not _diff_base_types.get(value_type, value_type):
+    _append_diff(diffs, path, _DIFF_ACTION_TYPE_CHANGES, value2)
+    return
+  differ = _differs.get(value_type)
+  if differ is None:
+    differ = _differs[value_type] = _get_differ(value_type)
+  differ(value1, value2, path, diffs)
+
+
+def _append_diff(
+  diffs: list[dict[str, Any]], path: list[Any], action: str, value: Any
+) -> None:
+  diffs.append({"path": list(path), "action": action, "value": value})
+
+
+def _get_differ(value_type: type) -> _Differ:
+  if value_type in _ATOMIC_TYPES:
+    return _diff_atomic
+  if is_dataclass(value_type):
+    _dataclass_field_names[value_type] = tuple(
+      f.name for f in fields(value_type)
+    )
+    return _diff_dataclass
+  if issubclass(value_type, (list, tuple)):
+    return _diff_sequence
+  if issubclass(value_type, dict):
+    return _diff_dict
+  if issubclass(value_type, (set, frozenset)):
+    return _diff_set
+  if issubclass(value_type, (UploadedFile, BaseModel)):
+    return _diff_equality
+  if _has_pandas:
+    import pandas as pd
+
+    if issubclass(value_type, pd.DataFrame):
+      return _diff_data_frame
+  if issubclass(value_type, (date, bytes, str, int, float)):
+    return _diff_atomic
+  return _diff_object
+
+
+def _diff_atomic(
+  value1: Any, value2: Any, path: list[Any], diffs: list[dict[str, Any]]
+) -> None:
+  if value1 != value2:
+    _append_diff(diffs, path, _DIFF_ACTION_VALUES_CHANGED, value2)
+
+
+def _diff_dataclass(
+  value1: Any, value2: Any, path: list[Any], diffs: list[dict[str, Any]]
+) -> None:
+  for name in _dataclass_field_names[type(value2)]:
+    path.append(name)
+    _diff_value(getattr(value1, name), getattr(value2, name), path, diffs)
+    path.pop()
+
+
+def _diff_sequence(
+  value1: Any, value2: Any, path: list[Any], diffs: list[dict[str, Any]]
+) -> None:
+  """Diffs lists (and tuples, which are JSON encoded as lists).
+
+  Removed items are sent with their old indexes, in increasing order, since
+  `applyStateDiff` removes them in reverse order before applying the other changes.
+  Added items are sent with their new indexes, in increasing order.
+  """
+  length1 = len(value1)
+  length2 = len(value2)
+  start = 0
+  end1 = length1
+  end2 = length2
+  if length1 != length2:
+    # Skip the common prefix and suffix, so that only the inserted or removed items
+    # are sent, rather than changing every item after them.
+    common_length = min(length1, length2)
+    while start < common_length and _is_equal(value1[start], value2[start]):
+      start += 1
+    while (
+      end1 > start
+      and end2 > start
+      and _is_equal(value1[end1 - 1], value2[end2 - 1])
+    ):
+      end1 -= 1
+      end2 -= 1
+
+  paired_end = min(end1, end2)
+  for index in range(start, paired_end):
+    path.append(index)
+    _diff_value(value1[index], value2[index], path, diffs)
+    path.pop()
+  for index in range(paired_end, end2):
+    path.append(index)
+    _append_diff(diffs, path, _DIFF_ACTION_ITERABLE_ITEM_ADDED, value2[index])
+    path.pop()
+  for index in range(paired_end, end1):
+    path.append(index)
+    _append_diff(diffs, path, _DIFF_ACTION_ITERABLE_ITEM_REMOVED, value1[index])
+    path.pop()
+
+
+def _diff_dict(
+  value1: Any, value2: Any, path: list[Any], diffs: list[dict[str, Any]]
+) -> None:
+  if not _has_json_keys(value1) or not _has_json_keys(value2):
+    # The keys cannot be represented in paths, so send the whole dict.
+    if not _is_equal_dict(value1, value2):
+      _append_diff(diffs, path, _DIFF_ACTION_VALUES_CHANGED, value2)
+    return
+  for key, item2 in value2.items():
+    path.append(key)
+    if key in value1:
+      _diff_value(value1[key], item2, path, diffs)
+    else:
+      _append_diff(diffs, path, _DIFF_ACTION_DICT_ITEM_ADDED, item2)
+    path.pop()
+  for key, item1 in value1.items():
+    if key not in value2:
+      path.append(key)
+      _append_diff(diffs, path, _DIFF_ACTION_DICT_ITEM_REMOVED, item1)
+      path.pop()
+
+
+def _has_json_keys(value: dict[Any, Any]) -> bool:
+  return all(isinstance(key, _JSON_KEY_TYPES) for key in value)
+
+
+def _is_equal_dict(value1: dict[Any, Any], value2: dict[Any, Any]) -> bool:
+  if value1.keys() != value2.keys():
+    return False
+  return all(_is_equal(item1, value2[key]) for key, item1 in value1.items())
+
+
+def _diff_set(
+  value1: Any, value2: Any, path: list[Any], diffs: list[dict[str, Any]]
+) -> None:
+  if value1 == value2:
+    return
+  # Sets are JSON encoded as an object with the items in a list.
+  path.append(_SET_OBJECT_KEY)
+  for item in value1 - value2:
+    _append_diff(diffs, path, _DIFF_ACTION_SET_ITEM_REMOVED, item)
+  for item in value2 - value1:
+    _append_diff(diffs, path, _DIFF_ACTION_SET_ITEM_ADDED, item)
+  path.pop()
+
+
+def _diff_equality(
+  value1: Any, value2: Any, path: list[Any], diffs: list[dict[str, Any]]
+) -> None:
+  if value1 != value2:
+    _append_diff(diffs, path, _DIFF_ACTION_EQUALITY_CHANGED, value2)
+
+
+def _diff_data_frame(
+  value1: Any, value2: Any, path: list[Any], diffs: list[dict[str, Any]]
+) -> None:
+  if value1.equals(value2):
+    return
+  patch = (
+    _create_data_frame_patch(value1, value2)
+    if _data_frame_patches_enabled.get()
+    else None
+  )
+  if patch is None:
+    _append_diff(diffs, path, _DIFF_ACTION_DATA_FRAME_CHANGED, value2)
+  else:
+    _append_diff(diffs, path, _DIFF_ACTION_DATA_FRAME_PATCHED, patch)
+
+
+# Whether `diff_state` may send changed DataFrames as patches.
+_data_frame_patches_enabled: ContextVar[bool] = ContextVar(
+  "mesop_data_frame_patches_enabled", default=False
+)
+# DataFrames with fewer rows are sent whole when they change, since a patch would not
+# be much smaller.
+_MIN_DATA_FRAME_PATCH_ROWS = 100
+# DataFrames that were patched this many times by the client are sent whole when they
+# change, so that the patches do not pile up in the client's state.
+_MAX_DATA_FRAME_PATCHES = 20
+# Number of patches applied to DataFrames decoded from patched DataFrames, by `id`.
+_data_frame_patch_counts: dict[int, int] = {}
+
+
+def _create_data_frame_patch(df1: Any, df2: Any) -> dict[str, Any] | None:
+  """Returns a JSON patch that changes `df1` into `df2`, or None if `df2` should be
+  sent whole.
+
+  Rows are compared by their hashes (see `pd.util.hash_pandas_object`). If the rows
+  are the same, i.e. only values changed, the patch has the changed cells as
+  `[row, column, value]` (by position). Otherwise, e.g. when rows were inserted or
+  removed, the patch replaces the rows between the rows that did not change at the
+  start and at the end of the DataFrame.
+
+  The client cannot apply patches to encoded DataFrames, so it adds them to the
+  DataFrame in its state, and they are applied when the state is decoded (see
+  `_apply_data_frame_patch`).
+  """
+  if (
+    len(df2) < _MIN_DATA_FRAME_PATCH_ROWS
+    or _data_frame_patch_counts.get(id(df1), 0) >= _MAX_DATA_FRAME_PATCHES
+    or not df1.columns.equals(df2.columns)
+    or not df1.dtypes.equals(df2.dtypes)
+  ):
+    return None
+
+  import numpy as np
+
+  same_rows = len(df1) == len(df2) and df1.index.equals(df2.index)
+  # If the rows are the same, only the rows of the changed columns are compared.
+  columns = (
+    [
+      column
+      for column in range(df2.shape[1])
+      if not df1.iloc[:, column].equals(df2.iloc[:, column])
+    ]
+    if same_rows
+    else list(range(df2.shape[1]))
+  )
+  try:
+    hashes1 = _hash_rows(df1.iloc[:, columns])
+    hashes2 = _hash_rows(df2.iloc[:, columns])
+  except (TypeError, ValueError):
+    # E.g. values that cannot be hashed.
+    return None
+
+  patch: dict[str, Any]
+  if same_rows:
+    changed_rows = np.flatnonzero(hashes1 != hashes2)
+    if len(changed_rows) * 2 > len(df2):
+      return None
+    patch = {"cells": _get_changed_cells(df1, df2, changed_rows, columns)}
+  else:
+    start, stop1, stop2 = _get_changed_rows(hashes1, hashes2)
+    if (stop2 - start) * 2 > len(df2):
+      return None
+    patch = {"start": start, "stop": stop1}
+    if stop2 > start:
+      patch["rows"] = df2.iloc[start:stop2]
+    if df2.index.equals(_default_index(len(df2))):
+      # Otherwise, e.g. the rows after removed rows would keep their index.
+      patch["reset_index"] = True
+
+  # The patch is encoded here, and checked as it will be applied (i.e. after encoding
+  # and decoding), since e.g. not all values can be encoded exactly.
+  try:
+    patch_json = json.dumps(patch, cls=MesopJSONEncoder, allow_nan=False)
+    patched_df = _apply_data_frame_patch(
+      df1.copy(),
+      json.loads(patch_json, object_hook=decode_mesop_json_state_hook),
+    )
+  except Exception:
+    # E.g. values that cannot be encoded, or that do not fit the column's dtype.
+    return None
+  if not (
+    patched_df.equals(df2)
+    and patched_df.dtypes.equals(df2.dtypes)
+    and patched_df.index.equals(df2.index)
+    and patched_df.index.dtype == df2.index.dtype
+  ):
+    return None
+  return json.loads(patch_json)
+
+
+def _hash_rows(df: Any) -> Any:
+  import pandas as pd
+
+  return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def _default_index(length: int) -> Any:
+  import pandas as pd
+
+  return pd.RangeIndex(length)
+
+
+def _get_changed_cells(
+  df1: Any, df2: Any, rows: Any, columns: list[int]
+) -> list[list[Any]]:
+  import numpy as np
+  import pandas as pd
+
+  old_rows = df1.iloc[rows]
+  new_rows = df2.iloc[rows]
+  cells: list[list[Any]] = []
+  for column in columns:
+    changed = np.flatnonzero(
+      _hash_rows(old_rows.iloc[:, column])
+      != _hash_rows(new_rows.iloc[:, column])
+    )
+    for index in changed:
+      value = new_rows.iat[index, column]
+      if pd.api.types.is_scalar(value) and pd.isna(value):
+        # NaN cannot be sent in JSON. Setting None sets the column's missing value.
+        value = None
+      elif isinstance(value, np.generic):
+        value = value.item()
+      cells.append([int(rows[index]), column, value])
+  return cells
+
+
+def _get_changed_rows(hashes1: Any, hashes2: Any) -> tuple[int, int, int]:
+  """Returns the start of the changed rows, and their stop in each DataFrame."""
+  import numpy as np
+
+  length = min(len(hashes1), len(hashes2))
+  mismatches = np.flatnonzero(hashes1[:length] != hashes2[:length])
+  start = int(mismatches[0]) if len(mismatches) else length
+  # Rows at the end are only compared if they are not at the start.
+  length -= start
+  mismatches = np.flatnonzero(
+    hashes1[len(hashes1) - length :][::-1]
+    != hashes2[len(hashes2) - length :][::-1]
+  )
+  end = int(mismatches[0]) if len(mismatches) else length
+  return start, len(hashes1) - end, len(hashes2) - end
+
+
+def _apply_data_frame_patch(df: Any, patch: dict[str, Any]) -> Any:
+  """Applies a patch from `_create_data_frame_patch`, updating `df` in place if the
+  patch only changes cells."""
+  import pandas as pd
+
+  if "cells" in patch:
+    for row, column, value in patch["cells"]:
+      df.iat[row, column] = value
+    return df
+  parts = [
+    part
+    for part in (
+      df.iloc[: patch["start"]],
+      patch.get("rows", df.iloc[:0]),
+      df.iloc[patch["stop"] :],
+    )
+    if len(part)
+  ]
+  df = pd.concat(parts) if parts else df.iloc[:0]
+  if patch.get("reset_index"):
+    df = df.reset_index(drop=True)
+  return df
+
+
+def _diff_object(
+  value1: Any, value2: Any, path: list[Any], diffs: list[dict[str, Any]]
+) -> None:
+  """Diffs the attributes of objects, or compares them if they have none."""
+  attributes1 = getattr(value1, "__dict__", None)
+  attributes2 = getattr(value2, "__dict__", None)
+  if attributes1 is None or attributes2 is None:
+    _diff_atomic(value1, value2, path, diffs)
+  else:
+    _diff_dict(attributes1, attributes2, path, diffs)
+
+
+def _is_equal(value1: Any, value2: Any) -> bool:
+  """Returns whether the values are equal, using the same rules as `diff_state`.
+
+  Unlike `==`, this handles values like DataFrames nested in other values.
+  """
+  if value1 is value2:
+    return True
+  value_type = type(value1)
+  if value_type is not type(value2):
+    return False
+  if value_type in _ATOMIC_TYPES:
+    return value1 == value2
+  diffs: list[dict[str, Any]] = []
+  _diff_value(value1, value2, [], diffs)
+  return not diffs
+
+
+def diff_state_with_deepdiff(state1: Any, state2: Any) -> str:
   """
   Diffs two state objects and returns the difference using DeepDiff's Delta format as a
   JSON string.
 
+  This was the implementation of `diff_state`. It is kept as a reference for tests and
+  benchmarks, since it is much slower.
+
   DeepDiff does not support DataFrames yet. See `DataFrameOperator`.
 
   The `to_flat_dicts` method does not include custom report results, so we need to add
@@ -1,5 +1,7 @@
-from dataclasses import dataclass, field
+import json
+from dataclasses import asdict, dataclass, field
 from datetime import date, datetime
+from typing import Any
 
 import numpy as np
 import pandas as pd
@@ -9,9 +11,12 @@ from pydantic import BaseModel
 import mesop.protos.ui_pb2 as pb
 from mesop.components.uploader.uploaded_file import UploadedFile
 from mesop.dataclass_utils.dataclass_utils import (
+  MesopJSONEncoder,
+  dataclass_to_dict,
   dataclass_with_defaults,
   has_parent,
   serialize_dataclass,
+  update_dataclass_from_dict,
   update_dataclass_from_json,
 )
 from mesop.exceptions import MesopDeveloperException
@@ -83,6 +88,14 @@ class WithPydanticModelDefaultFactory:
   default_factory: PydanticModel = field(default_factory=PydanticModel)
 
 
+@pytest.fixture
+def without_pyarrow(monkeypatch):
+  """Encodes DataFrames as "table" JSON, as when pyarrow is not installed."""
+  monkeypatch.setattr(
+    "mesop.dataclass_utils.dataclass_utils._has_pyarrow", False
+  )
+
+
 JSON_STR = """{"b": {"c": {"val": "<init>"}},
 "list_b": [
   {"c": {"val": "1"}},
@@ -176,6 +189,7 @@ def test_serialize_dataclass():
   )
 
 
+@pytest.mark.usefixtures("without_pyarrow")
 def test_serialize_pandas_dataframe():
   df = pd.DataFrame(
     data={
@@ -203,6 +217,41 @@ def test_serialize_pandas_dataframe():
   )
 
 
+def test_serialize_deserialize_pandas_dataframe_with_arrow():
+  pytest.importorskip("pyarrow")
+  df = pd.DataFrame(
+    data={
+      "Ints": pd.array([1, None], dtype="Int64"),
+      "Floats": [2.3, np.float64(-3.000000003)],
+      "Strings": ["Hello", "World"],
+      "Categories": pd.Categorical(["a", "b"]),
+      "DateTimes": pd.date_range("2024-01-01", periods=2, tz="UTC"),
+    },
+    index=pd.Index(["x", "y"], name="key"),
+  )
+
+  serialized_dataclass = serialize_dataclass(WithPandasDataFrame(val=df))
+  new_state = WithPandasDataFrame()
+  update_dataclass_from_json(new_state, serialized_dataclass)
+
+  assert list(json.loads(serialized_dataclass)["val"]) == [
+    "__pandas.DataFrame.arrow__"
+  ]
+  assert new_state.val is not None
+  pd.testing.assert_frame_equal(new_state.val, df)
+
+
+def test_serialize_pandas_dataframe_not_supported_by_arrow():
+  pytest.importorskip("pyarrow")
+  df = pd.DataFrame(data={"Mixed": ["a", 1]})
+
+  serialized_dataclass = serialize_dataclass(WithPandasDataFrame(val=df))
+
+  assert serialized_dataclass == json.dumps(
+    {"val": {"__pandas.DataFrame__": df.to_json(orient="table")}}
+  )
+
+
 def test_serialize_uploaded_file():
   serialized_dataclass = serialize_dataclass(
     WithUploadedFile(
@@ -270,6 +319,121 @@ def test_serialize_deserialize_pydantic_model_default_factory():
   assert new_state == state
 
 
+def test_serialize_pydantic_model_embeds_model_values():
+  state = WithPydanticModel()
+  state.data.counter = 1
+
+  assert json.loads(serialize_dataclass(state))["data"] == {
+    "__pydantic.BaseModel__": {
+      "value": {
+        "name": "World",
+        "counter": 1,
+        "list_models": [],
+        "nested": {
+          "default_value": "default",
+          "no_default_value": "<no_default_factory>",
+        },
+        "optional_value": None,
+        "union_value": 0,
+        "tuple_value": ["a", 1],
+      },
+      "module": PydanticModel.__module__,
+      "qualname": "PydanticModel",
+    }
+  }
+
+
+def test_deserialize_pydantic_model_embedded_as_json_string():
+  state = WithPydanticModel()
+  state.data.name = "Hello"
+  serialized_model = {
+    "json": state.data.model_dump_json(),
+    "module": PydanticModel.__module__,
+    "qualname": "PydanticModel",
+  }
+  new_state = WithPydanticModel()
+  update_dataclass_from_json(
+    new_state,
+    json.dumps({"data": {"__pydantic.BaseModel__": serialized_model}}),
+  )
+  assert new_state == state
+
+
+@dataclass
+class Item:
+  name: str = ""
+  tags: set[str] = field(default_factory=set)
+
+
+@dataclass
+class ChildItem(Item):
+  _private: int = 0
+
+
+@dataclass
+class StateWithItems:
+  item: Item = field(default_factory=Item)
+  optional_item: Item | None = None
+  items: list[Item] = field(default_factory=list)
+  item_lookup: dict[str, list[Item]] = field(default_factory=dict)
+  item_tuple: tuple[Item, ...] = ()
+  untyped: Any = None
+  strs: list[str] = field(default_factory=list)
+
+
+@pytest.mark.parametrize(
+  "state",
+  [
+    StateWithItems(),
+    StateWithItems(
+      item=ChildItem("child", {"a"}, 1),
+      optional_item=Item("optional"),
+      items=[Item("a"), ChildItem("b")],
+      item_lookup={"x": [Item("c")], "y": []},
+      item_tuple=(Item("d"),),
+      untyped={"nested": [Item("e")]},
+    ),
+    # Values that do not match the type hints are converted too.
+    StateWithItems(item=None, strs=[Item("f")]),  # type: ignore
+  ],
+)
+def test_serialize_dataclass_matches_asdict(state):
+  assert serialize_dataclass(state) == json.dumps(
+    asdict(state), cls=MesopJSONEncoder
+  )
+
+
+def test_dataclass_to_dict_does_not_copy_values():
+  df = pd.DataFrame(data={"a": [1]})
+  state = WithPandasDataFrame(val=df)
+
+  assert dataclass_to_dict(state)["val"] is df
+
+
+def test_update_dataclass_from_dict():
+  @dataclass
+  class ChildState(StateWithItems):
+    more_items: list[Item] = field(default_factory=list)
+
+  state = ChildState()
+  update_dataclass_from_dict(
+    state,
+    {
+      "item": {"name": "a"},
+      "items": [{"name": "b", "tags": {"x"}}],
+      "item_lookup": {"c": []},
+      "more_items": [{"name": "d"}],
+    },
+  )
+
+  assert state == ChildState(
+    item=Item("a"),
+    items=[Item("b", {"x"})],
+    item_lookup={"c": []},
+    more_items=[Item("d")],
+  )
+
+
 @pytest.mark.parametrize(
   "input_bytes, expected_json",
   [
@@ -322,6 +486,7 @@ def test_update_dataclass_from_json_list_nested_dataclass():
   assert a.strs == ["a", "b"]
 
 
+@pytest.mark.usefixtures("without_pyarrow")
 def test_update_dataclass_with_pandas_dataframe():
   serialized_dataclass = serialize_dataclass(
     WithPandasDataFrame(
@@ -1,16 +1,30 @@
 import json
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
+from typing import Any
 
 import pandas as pd
 import pytest
 from pydantic import BaseModel
 
 from mesop.components.uploader.uploaded_file import UploadedFile
-from mesop.dataclass_utils.dataclass_utils import diff_state
+from mesop.dataclass_utils.dataclass_utils import (
+  diff_state,
+  diff_state_with_deepdiff,
+  serialize_dataclass,
+  update_dataclass_from_json,
+)
 from mesop.exceptions import MesopException
 
 
+@pytest.fixture
+def without_pyarrow(monkeypatch):
+  """Encodes DataFrames as "table" JSON, as when pyarrow is not installed."""
+  monkeypatch.setattr(
+    "mesop.dataclass_utils.dataclass_utils._has_pyarrow", False
+  )
+
+
 def test_no_diff():
   @dataclass
   class C:
@@ -31,70 +45,30 @@ def test_diff_primitives():
   s1 = C()
   s2 = C(val1="VAL1", val2=2, val3=1.2, val4=False, val5=None)
   assert json.loads(diff_state(s1, s2)) == [
-    {
-      "path": ["val5"],
-      "action": "type_changes",
-      "value": None,
-      "type": "<class 'NoneType'>",
-      "old_type": "<class 'bool'>",
-      "old_value": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
-    },
     {
       "path": ["val1"],
       "action": "values_changed",
       "value": "VAL1",
-      "type": "<class 'str'>",
-      "old_type": "unknown___",
-      "old_value": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
     {
       "path": ["val2"],
       "action": "values_changed",
       "value": 2,
-      "type": "<class 'int'>",
-      "old_type": "unknown___",
-      "old_value": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
     {
       "path": ["val3"],
       "action": "values_changed",
       "value": 1.2,
-      "type": "<class 'float'>",
-      "old_type": "unknown___",
-      "old_value": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
     {
       "path": ["val4"],
       "action": "values_changed",
       "value": False,
-      "type": "<class 'bool'>",
-      "old_type": "unknown___",
-      "old_value": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
+    },
+    {
+      "path": ["val5"],
+      "action": "type_changes",
+      "value": None,
     },
   ]
 
@@ -110,96 +84,40 @@ def test_diff_core_data_structures():
   s2 = C(val1=[2, 3, 4], val2={"k2": "v2"}, val3=("t2", "t1"))
 
   assert json.loads(diff_state(s1, s2)) == [
+    {
+      "path": ["val1", 0],
+      "action": "values_changed",
+      "value": 2,
+    },
+    {
+      "path": ["val1", 1],
+      "action": "values_changed",
+      "value": 3,
+    },
+    {
+      "path": ["val1", 2],
+      "action": "values_changed",
+      "value": 4,
+    },
     {
       "path": ["val2", "k2"],
       "action": "dictionary_item_added",
       "value": "v2",
-      "old_value": "unknown___",
-      "type": "<class 'str'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
     {
       "path": ["val2", "k1"],
       "action": "dictionary_item_removed",
       "value": "v1",
-      "old_value": "unknown___",
-      "type": "<class 'str'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
     {
       "path": ["val3", 0],
       "action": "values_changed",
       "value": "t2",
-      "old_value": "unknown___",
-      "type": "<class 'str'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
     {
       "path": ["val3", 1],
       "action": "values_changed",
       "value": "t1",
-      "old_value": "unknown___",
-      "type": "<class 'str'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
-    },
-    {
-      "path": ["val1"],
-      "action": "iterable_items_deleted",
-      "value": [],
-      "old_value": [1],
-      "type": "<class 'list'>",
-      "old_type": "<class 'list'>",
-      "new_path": None,
-      "t1_from_index": 0,
-      "t1_to_index": 1,
-      "t2_from_index": 0,
-      "t2_to_index": 0,
-    },
-    {
-      "path": ["val1"],
-      "action": "iterable_items_equal",
-      "value": None,
-      "old_value": None,
-      "type": "<class 'NoneType'>",
-      "old_type": "<class 'NoneType'>",
-      "new_path": None,
-      "t1_from_index": 1,
-      "t1_to_index": 3,
-      "t2_from_index": 0,
-      "t2_to_index": 2,
-    },
-    {
-      "path": ["val1"],
-      "action": "iterable_items_inserted",
-      "value": [4],
-      "old_value": [],
-      "type": "<class 'list'>",
-      "old_type": "<class 'list'>",
-      "new_path": None,
-      "t1_from_index": 3,
-      "t1_to_index": 3,
-      "t2_from_index": 2,
-      "t2_to_index": 3,
     },
   ]
 
@@ -221,15 +139,7 @@ def test_diff_nested_dataclass():
       "path": ["val1", "val1"],
       "action": "values_changed",
       "value": 2,
-      "old_value": "unknown___",
-      "type": "<class 'int'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
-    }
+    },
   ]
 
 
@@ -244,21 +154,12 @@ def test_diff_nested_class():
 
   s1 = C(val1=B())
   s2 = C(val1=B(val1=2))
-  print(json.loads(diff_state(s1, s2)))
   assert json.loads(diff_state(s1, s2)) == [
     {
       "path": ["val1", "val1"],
       "action": "values_changed",
       "value": 2,
-      "old_value": "unknown___",
-      "type": "<class 'int'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
-    }
+    },
   ]
 
 
@@ -269,21 +170,12 @@ def test_diff_type_change():
 
   s1 = C()
   s2 = C(val1=True)
-  print(json.loads(diff_state(s1, s2)))
   assert json.loads(diff_state(s1, s2)) == [
     {
       "path": ["val1"],
       "action": "type_changes",
       "value": True,
-      "old_value": "unknown___",
-      "type": "<class 'bool'>",
-      "old_type": "<class 'str'>",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
-    }
+    },
   ]
 
 
@@ -309,57 +201,25 @@ def test_diff_multiple_dict_changes():
   )
 
   assert json.loads(diff_state(s1, s2)) == [
+    {
+      "path": ["val1", "k1"],
+      "action": "values_changed",
+      "value": "V1",
+    },
     {
       "path": ["val1", "k4"],
       "action": "dictionary_item_added",
       "value": "v4",
-      "old_value": "unknown___",
-      "type": "<class 'str'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
     {
       "path": ["val1", "k5"],
       "action": "dictionary_item_added",
       "value": "v5",
-      "old_value": "unknown___",
-      "type": "<class 'str'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
     {
       "path": ["val1", "k3"],
       "action": "dictionary_item_removed",
       "value": "v3",
-      "old_value": "unknown___",
-      "type": "<class 'str'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
-    },
-    {
-      "path": ["val1", "k1"],
-      "action": "values_changed",
-      "value": "V1",
-      "old_value": "unknown___",
-      "type": "<class 'str'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
   ]
 
@@ -390,108 +250,44 @@ def test_diff_nested_changes():
 
   assert json.loads(diff_state(s1, s2)) == [
     {
-      "path": ["val1", "k4", 0],
-      "value": {"val1": []},
-      "action": "iterable_item_added",
-      "old_value": "unknown___",
-      "type": "<class 'dataclass_utils.diff_state_test.test_diff_nested_changes.<locals>.B'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
-    },
-    {
-      "path": ["val1", "k3"],
-      "action": "dictionary_item_removed",
-      "value": [{"val1": []}],
-      "old_value": "unknown___",
-      "type": "<class 'list'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
+      "path": ["val1", "k1", 0, "val1", 2],
+      "action": "iterable_item_removed",
+      "value": 3,
     },
     {
       "path": ["val1", "k1", 1, "val1", 0],
       "action": "values_changed",
       "value": 3,
-      "old_value": "unknown___",
-      "type": "<class 'int'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
     {
       "path": ["val1", "k1", 1, "val1", 1],
       "action": "iterable_item_added",
       "value": 4,
-      "old_value": "unknown___",
-      "type": "<class 'int'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
     {
       "path": ["val1", "k1", 1, "val1", 2],
       "action": "iterable_item_added",
       "value": 6,
-      "old_value": "unknown___",
-      "type": "<class 'int'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
     {
       "path": ["val1", "k1", 1, "val1", 3],
       "action": "iterable_item_added",
       "value": "2",
-      "old_value": "unknown___",
-      "type": "<class 'str'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
     {
       "path": ["val1", "k2", 0],
       "action": "iterable_item_added",
       "value": {"val1": [2, 2]},
-      "old_value": "unknown___",
-      "type": "<class 'dataclass_utils.diff_state_test.test_diff_nested_changes.<locals>.B'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
     {
-      "path": ["val1", "k1", 0, "val1", 2],
-      "action": "iterable_item_removed",
-      "value": 3,
-      "old_value": "unknown___",
-      "type": "<class 'int'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
+      "path": ["val1", "k4"],
+      "action": "dictionary_item_added",
+      "value": [{"val1": []}],
+    },
+    {
+      "path": ["val1", "k3"],
+      "action": "dictionary_item_removed",
+      "value": [{"val1": []}],
     },
   ]
 
@@ -521,27 +317,11 @@ def test_diff_weird_str_dict_keys():
       "path": ["val1", "k-1"],
       "action": "values_changed",
       "value": "V1",
-      "old_value": "unknown___",
-      "type": "<class 'str'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
     {
       "path": ["val1", "k 3"],
       "action": "values_changed",
       "value": "v4",
-      "old_value": "unknown___",
-      "type": "<class 'str'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
   ]
 
@@ -567,19 +347,12 @@ def test_diff_int_dict_keys():
       "path": ["val1", 1],
       "action": "values_changed",
       "value": "V1",
-      "old_value": "unknown___",
-      "type": "<class 'str'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
-    }
+    },
   ]
 
 
-# This looks like a bug.
+# Tuple keys cannot be used in paths, so the whole dict is sent, which cannot be
+# JSON encoded (like when serializing the state).
 def test_diff_tuple_dict_keys():
   @dataclass
   class C:
@@ -596,21 +369,8 @@ def test_diff_tuple_dict_keys():
     }
   )
 
-  assert json.loads(diff_state(s1, s2)) == [
-    {
-      "path": ["val1", 1, 2],
-      "action": "values_changed",
-      "value": "V1",
-      "old_value": "unknown___",
-      "type": "<class 'str'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
-    }
-  ]
+  with pytest.raises(TypeError):
+    diff_state(s1, s2)
 
 
 def test_diff_multiple_iterable_changes():
@@ -623,95 +383,29 @@ def test_diff_multiple_iterable_changes():
 
   assert json.loads(diff_state(s1, s2)) == [
     {
-      "path": ["val1"],
-      "action": "iterable_items_deleted",
-      "value": [],
-      "old_value": [1],
-      "type": "<class 'list'>",
-      "old_type": "<class 'list'>",
-      "new_path": None,
-      "t1_from_index": 0,
-      "t1_to_index": 1,
-      "t2_from_index": 0,
-      "t2_to_index": 0,
-    },
-    {
-      "path": ["val1"],
-      "action": "iterable_items_equal",
-      "value": None,
-      "old_value": None,
-      "type": "<class 'NoneType'>",
-      "old_type": "<class 'NoneType'>",
-      "new_path": None,
-      "t1_from_index": 1,
-      "t1_to_index": 3,
-      "t2_from_index": 0,
-      "t2_to_index": 2,
-    },
-    {
-      "path": ["val1"],
-      "action": "iterable_items_inserted",
-      "value": [3],
-      "old_value": [],
-      "type": "<class 'list'>",
-      "old_type": "<class 'list'>",
-      "new_path": None,
-      "t1_from_index": 3,
-      "t1_to_index": 3,
-      "t2_from_index": 2,
-      "t2_to_index": 3,
+      "path": ["val1", 0],
+      "action": "values_changed",
+      "value": 2,
     },
     {
-      "path": ["val1"],
-      "action": "iterable_items_equal",
-      "value": None,
-      "old_value": None,
-      "type": "<class 'NoneType'>",
-      "old_type": "<class 'NoneType'>",
-      "new_path": None,
-      "t1_from_index": 3,
-      "t1_to_index": 4,
-      "t2_from_index": 3,
-      "t2_to_index": 4,
+      "path": ["val1", 1],
+      "action": "values_changed",
+      "value": 3,
     },
     {
-      "path": ["val1"],
-      "action": "iterable_items_deleted",
-      "value": [],
-      "old_value": [5],
-      "type": "<class 'list'>",
-      "old_type": "<class 'list'>",
-      "new_path": None,
-      "t1_from_index": 4,
-      "t1_to_index": 5,
-      "t2_from_index": 4,
-      "t2_to_index": 4,
+      "path": ["val1", 4],
+      "action": "values_changed",
+      "value": 6,
     },
     {
-      "path": ["val1"],
-      "action": "iterable_items_equal",
-      "value": None,
-      "old_value": None,
-      "type": "<class 'NoneType'>",
-      "old_type": "<class 'NoneType'>",
-      "new_path": None,
-      "t1_from_index": 5,
-      "t1_to_index": 6,
-      "t2_from_index": 4,
-      "t2_to_index": 5,
+      "path": ["val1", 5],
+      "action": "iterable_item_removed",
+      "value": 6,
     },
     {
-      "path": ["val1"],
-      "action": "iterable_items_deleted",
-      "value": [],
-      "old_value": [7],
-      "type": "<class 'list'>",
-      "old_type": "<class 'list'>",
-      "new_path": None,
-      "t1_from_index": 6,
-      "t1_to_index": 7,
-      "t2_from_index": 5,
-      "t2_to_index": 5,
+      "path": ["val1", 6],
+      "action": "iterable_item_removed",
+      "value": 7,
     },
   ]
 
@@ -736,151 +430,76 @@ def test_diff_multiple_iterable_deletions():
 
   assert json.loads(diff_state(s1, s2)) == [
     {
-      "path": ["val1"],
-      "action": "iterable_items_deleted",
-      "value": [],
-      "old_value": [1],
-      "type": "<class 'list'>",
-      "old_type": "<class 'list'>",
-      "new_path": None,
-      "t1_from_index": 0,
-      "t1_to_index": 1,
-      "t2_from_index": 0,
-      "t2_to_index": 0,
-    },
-    {
-      "path": ["val1"],
-      "action": "iterable_items_equal",
-      "value": None,
-      "old_value": None,
-      "type": "<class 'NoneType'>",
-      "old_type": "<class 'NoneType'>",
-      "new_path": None,
-      "t1_from_index": 1,
-      "t1_to_index": 2,
-      "t2_from_index": 0,
-      "t2_to_index": 1,
+      "path": ["val1", 0],
+      "action": "values_changed",
+      "value": 2,
     },
     {
-      "path": ["val1"],
-      "action": "iterable_items_deleted",
-      "value": [],
-      "old_value": [3],
-      "type": "<class 'list'>",
-      "old_type": "<class 'list'>",
-      "new_path": None,
-      "t1_from_index": 2,
-      "t1_to_index": 3,
-      "t2_from_index": 1,
-      "t2_to_index": 1,
+      "path": ["val1", 1],
+      "action": "values_changed",
+      "value": 4,
     },
     {
-      "path": ["val1"],
-      "action": "iterable_items_equal",
-      "value": None,
-      "old_value": None,
-      "type": "<class 'NoneType'>",
-      "old_type": "<class 'NoneType'>",
-      "new_path": None,
-      "t1_from_index": 3,
-      "t1_to_index": 4,
-      "t2_from_index": 1,
-      "t2_to_index": 2,
+      "path": ["val1", 2],
+      "action": "iterable_item_removed",
+      "value": 3,
     },
     {
-      "path": ["val1"],
-      "action": "iterable_items_deleted",
-      "value": [],
-      "old_value": [5],
-      "type": "<class 'list'>",
-      "old_type": "<class 'list'>",
-      "new_path": None,
-      "t1_from_index": 4,
-      "t1_to_index": 5,
-      "t2_from_index": 2,
-      "t2_to_index": 2,
+      "path": ["val1", 3],
+      "action": "iterable_item_removed",
+      "value": 4,
     },
     {
-      "path": ["val1"],
-      "action": "iterable_items_equal",
-      "value": None,
-      "old_value": None,
-      "type": "<class 'NoneType'>",
-      "old_type": "<class 'NoneType'>",
-      "new_path": None,
-      "t1_from_index": 5,
-      "t1_to_index": 7,
-      "t2_from_index": 2,
-      "t2_to_index": 4,
+      "path": ["val1", 4],
+      "action": "iterable_item_removed",
+      "value": 5,
     },
     {
-      "path": ["val2", "val2A"],
-      "action": "iterable_items_equal",
-      "value": None,
-      "old_value": None,
-      "type": "<class 'NoneType'>",
-      "old_type": "<class 'NoneType'>",
-      "new_path": None,
-      "t1_from_index": 0,
-      "t1_to_index": 2,
-      "t2_from_index": 0,
-      "t2_to_index": 2,
+      "path": ["val2", "val2A", 2],
+      "action": "values_changed",
+      "value": 40,
     },
     {
-      "path": ["val2", "val2A"],
-      "action": "iterable_items_deleted",
-      "value": [],
-      "old_value": [30],
-      "type": "<class 'list'>",
-      "old_type": "<class 'list'>",
-      "new_path": None,
-      "t1_from_index": 2,
-      "t1_to_index": 3,
-      "t2_from_index": 2,
-      "t2_to_index": 2,
+      "path": ["val2", "val2A", 3],
+      "action": "iterable_item_removed",
+      "value": 40,
     },
     {
-      "path": ["val2", "val2A"],
-      "action": "iterable_items_equal",
-      "value": None,
-      "old_value": None,
-      "type": "<class 'NoneType'>",
-      "old_type": "<class 'NoneType'>",
-      "new_path": None,
-      "t1_from_index": 3,
-      "t1_to_index": 4,
-      "t2_from_index": 2,
-      "t2_to_index": 3,
+      "path": ["val2", "val2A", 4],
+      "action": "iterable_item_removed",
+      "value": 50,
     },
+  ]
+
+
+def test_diff_list_insertions_and_removals_skip_unchanged_items():
+  @dataclass
+  class B:
+    val1: int = 0
+
+  @dataclass
+  class C:
+    val1: list[int] = field(default_factory=lambda: [1, 2, 3, 4])
+    val2: list[B] = field(default_factory=lambda: [B(1), B(2), B(3)])
+
+  s1 = C()
+  s2 = C(val1=[0, 1, 2, 3, 4], val2=[B(1), B(3)])
+
+  assert json.loads(diff_state(s1, s2)) == [
     {
-      "path": ["val2", "val2A"],
-      "action": "iterable_items_deleted",
-      "value": [],
-      "old_value": [50],
-      "type": "<class 'list'>",
-      "old_type": "<class 'list'>",
-      "new_path": None,
-      "t1_from_index": 4,
-      "t1_to_index": 5,
-      "t2_from_index": 3,
-      "t2_to_index": 3,
+      "path": ["val1", 0],
+      "action": "iterable_item_added",
+      "value": 0,
     },
     {
-      "path": ["val2", "val2A"],
-      "action": "iterable_items_equal",
-      "value": None,
-      "old_value": None,
-      "type": "<class 'NoneType'>",
-      "old_type": "<class 'NoneType'>",
-      "new_path": None,
-      "t1_from_index": 5,
-      "t1_to_index": 7,
-      "t2_from_index": 3,
-      "t2_to_index": 5,
+      "path": ["val2", 1],
+      "action": "iterable_item_removed",
+      "value": {"val1": 2},
     },
   ]
 
 
+@pytest.mark.usefixtures("without_pyarrow")
 def test_diff_pandas():
   @dataclass
   class C:
@@ -900,6 +519,7 @@ def test_diff_pandas():
   ]
 
 
+@pytest.mark.usefixtures("without_pyarrow")
 def test_diff_nested_pandas():
   @dataclass
   class C:
@@ -917,30 +537,105 @@ def test_diff_nested_pandas():
 
   assert json.loads(diff_state(s1, s2)) == [
     {
-      "path": ["data", "test", 1],
-      "action": "iterable_item_added",
+      "path": ["data", "test", 0],
+      "action": "data_frame_changed",
       "value": {
-        "__pandas.DataFrame__": '{"schema":{"fields":[{"name":"index","type":"integer"},{"name":"Strings","type":"string"}],"primaryKey":["index"],"pandas_version":"1.4.0"},"data":[{"index":0,"Strings":"Hola"},{"index":1,"Strings":"Universe"}]}'
+        "__pandas.DataFrame__": '{"schema":{"fields":[{"name":"index","type":"integer"},{"name":"Strings","type":"string"}],"primaryKey":["index"],"pandas_version":"1.4.0"},"data":[{"index":0,"Strings":"Hello"},{"index":1,"Strings":"Universe"}]}'
       },
-      "old_value": "unknown___",
-      "type": "<class 'pandas.core.frame.DataFrame'>",
-      "old_type": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
     {
-      "path": ["data", "test", 0],
-      "action": "data_frame_changed",
+      "path": ["data", "test", 1],
+      "action": "iterable_item_added",
       "value": {
-        "__pandas.DataFrame__": '{"schema":{"fields":[{"name":"index","type":"integer"},{"name":"Strings","type":"string"}],"primaryKey":["index"],"pandas_version":"1.4.0"},"data":[{"index":0,"Strings":"Hello"},{"index":1,"Strings":"Universe"}]}'
+        "__pandas.DataFrame__": '{"schema":{"fields":[{"name":"index","type":"integer"},{"name":"Strings","type":"string"}],"primaryKey":["index"],"pandas_version":"1.4.0"},"data":[{"index":0,"Strings":"Hola"},{"index":1,"Strings":"Universe"}]}'
       },
     },
   ]
 
 
+def test_diff_data_frame_cells():
+  @dataclass
+  class C:
+    data: pd.DataFrame
+
+  data = {"a": list(range(200)), "b": [f"row {i}" for i in range(200)]}
+  s1 = C(data=pd.DataFrame(data=data))
+  s2 = C(data=pd.DataFrame(data=data))
+  s2.data.iat[3, 0] = 10
+  s2.data.iat[5, 1] = "x"
+
+  assert json.loads(diff_state(s1, s2, data_frame_patches=True)) == [
+    {
+      "path": ["data"],
+      "action": "data_frame_patched",
+      "value": {"cells": [[3, 0, 10], [5, 1, "x"]]},
+    }
+  ]
+  # Patches are only sent if they are enabled.
+  assert json.loads(diff_state(s1, s2))[0]["action"] == "data_frame_changed"
+
+
+def test_diff_data_frame_rows():
+  @dataclass
+  class C:
+    data: pd.DataFrame
+
+  s1 = C(data=pd.DataFrame(data={"a": list(range(200))}))
+  s2 = C(data=s1.data.drop(index=[3, 4]).reset_index(drop=True))
+
+  assert json.loads(diff_state(s1, s2, data_frame_patches=True)) == [
+    {
+      "path": ["data"],
+      "action": "data_frame_patched",
+      "value": {"start": 3, "stop": 5, "reset_index": True},
+    }
+  ]
+
+
+def test_diff_data_frame_sent_whole_after_max_patches():
+  @dataclass
+  class C:
+    data: pd.DataFrame | None = None
+
+  data_frame_json = json.loads(
+    serialize_dataclass(C(data=pd.DataFrame(data={"a": list(range(200))})))
+  )["data"]
+
+  def diff_after_patches(patches: int) -> str:
+    s1 = C()
+    update_dataclass_from_json(
+      s1,
+      json.dumps(
+        {
+          "data": {
+            "__pandas.DataFrame.patched__": {
+              "data_frame": data_frame_json,
+              "patches": [{"cells": [[0, 0, 1]]}] * patches,
+            }
+          }
+        }
+      ),
+    )
+    s2 = C(data=s1.data.copy())
+    s2.data.iat[1, 0] = 10
+    return json.loads(diff_state(s1, s2, data_frame_patches=True))[0]["action"]
+
+  assert diff_after_patches(1) == "data_frame_patched"
+  assert diff_after_patches(20) == "data_frame_changed"
+
+
+def test_decode_invalid_data_frame_patch():
+  @dataclass
+  class C:
+    data: pd.DataFrame | None = None
+
+  with pytest.raises(MesopException):
+    update_dataclass_from_json(
+      C(),
+      json.dumps({"data": {"__pandas.DataFrame.patched__": {"data_frame": 1}}}),
+    )
+
+
 def test_diff_uploaded_file():
   @dataclass
   class C:
@@ -985,7 +680,7 @@ def test_diff_pydantic_model():
       "action": "mesop_equality_changed",
       "value": {
         "__pydantic.BaseModel__": {
-          "json": '{"name":"Hello","counter":1}',
+          "value": {"name": "Hello", "counter": 1},
           "module": "dataclass_utils.diff_state_test",
           "qualname": "test_diff_pydantic_model.<locals>.PydanticModel",
         },
@@ -1022,40 +717,16 @@ def test_diff_set():
       "path": ["val1", "__python.set__"],
       "action": "set_item_removed",
       "value": 2,
-      "type": "<class 'int'>",
-      "old_type": "unknown___",
-      "old_value": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
     {
       "path": ["val1", "__python.set__"],
       "action": "set_item_removed",
       "value": 3,
-      "type": "<class 'int'>",
-      "old_type": "unknown___",
-      "old_value": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
     {
       "path": ["val1", "__python.set__"],
       "action": "set_item_added",
       "value": 5,
-      "type": "<class 'int'>",
-      "old_type": "unknown___",
-      "old_value": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
   ]
 
@@ -1086,14 +757,6 @@ def test_diff_bytes():
       "value": {
         "__python.bytes__": "VkFMMQ=="
       },  # Check if value is base64 encoded without asserting exact value
-      "type": "<class 'bytes'>",
-      "old_type": "unknown___",
-      "old_value": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     }
   ]
 
@@ -1128,41 +791,219 @@ def test_diff_dates():
       "path": ["val1", "__python.set__"],
       "action": "set_item_added",
       "value": {"__datetime.datetime__": "2024-12-05T00:00:00+05:30"},
-      "type": "<class 'datetime.datetime'>",
-      "old_type": "unknown___",
-      "old_value": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
     {
       "path": ["val1", "__python.set__"],
       "action": "set_item_added",
       "value": {"__datetime.datetime__": "1972-02-02T00:00:00+00:00"},
-      "type": "<class 'datetime.datetime'>",
-      "old_type": "unknown___",
-      "old_value": "unknown___",
-      "new_path": None,
-      "t1_from_index": None,
-      "t1_to_index": None,
-      "t2_from_index": None,
-      "t2_to_index": None,
     },
     {
       "path": ["val1", "__python.set__"],
       "action": "set_item_added",
       "value": {"__datetime.datetime__": "2005-10-12T00:00:00-05:00"},
-      "type": "<class 'datetime.datetime'>",
-      "old_type": "unknown___",
+    },
+  ]
+
+
+def _apply_state_diff(state_json: str, diff_json: str) -> Any:
+  """Applies the diff like `applyStateDiff` in `diff.ts`, and returns the state."""
+  root = json.loads(state_json)
+  diff = json.loads(diff_json)
+
+  def parent(path: list[Any]) -> Any:
+    value = root
+    for key in path[:-1]:
+      value = value[key if isinstance(value, list) else str(key)]
+    return value
+
+  def key(container: Any, path: list[Any]) -> Any:
+    return path[-1] if isinstance(container, list) else str(path[-1])
+
+  for row in reversed(diff):
+    if row["action"] == "iterable_item_removed":
+      container = parent(row["path"])
+      del container[row["path"][-1]]
+  for row in diff:
+    action = row["action"]
+    container = parent(row["path"])
+    if action in (
+      "values_changed",
+      "type_changes",
+      "data_frame_changed",
+      "mesop_equality_changed",
+      "dictionary_item_added",
+    ):
+      container[key(container, row["path"])] = row["value"]
+    elif action == "dictionary_item_removed":
+      del container[key(container, row["path"])]
+    elif action == "iterable_item_added":
+      container.insert(row["path"][-1], row["value"])
+    elif action == "set_item_added":
+      container[row["path"][-1]].append(row["value"])
+    elif action == "set_item_removed":
+      container[row["path"][-1]].remove(row["value"])
+    elif action == "data_frame_patched":
+      data_frame = container[key(container, row["path"])]
+      if "__pandas.DataFrame.patched__" in data_frame:
+        data_frame["__pandas.DataFrame.patched__"]["patches"].append(
+          row["value"]
+        )
+      else:
+        container[key(container, row["path"])] = {
+          "__pandas.DataFrame.patched__": {
+            "data_frame": data_frame,
+            "patches": [row["value"]],
+          }
+        }
+    elif action != "iterable_item_removed":
+      raise AssertionError(f"Unexpected action: {action}")
+  return root
+
+
+@dataclass
+class Item:
+  name: str = ""
+  tags: list[str] = field(default_factory=list)
+
+
+@dataclass
+class RoundTripState:
+  items: list[Item] = field(default_factory=list)
+  values: list[int] = field(default_factory=list)
+  lookup: dict[str, list[int]] = field(default_factory=dict)
+  data: pd.DataFrame | None = None
+
+
+@pytest.mark.parametrize(
+  "state1,state2",
+  [
+    (RoundTripState(values=[1, 2, 3]), RoundTripState(values=[])),
+    (RoundTripState(values=[]), RoundTripState(values=[1, 2, 3])),
+    (
+      RoundTripState(values=[1, 2, 3, 4, 5, 6, 7]),
+      RoundTripState(values=[2, 3, 3, 4, 6]),
+    ),
+    (
+      RoundTripState(values=[1, 2, 3, 4, 5]),
+      RoundTripState(values=[1, 9, 8, 7, 6, 5]),
+    ),
+    (
+      RoundTripState(items=[Item("a", ["x"]), Item("b"), Item("c", ["y"])]),
+      RoundTripState(
+        items=[Item("new"), Item("a", ["x", "z"]), Item("c", ["y"])]
+      ),
+    ),
+    (
+      RoundTripState(items=[Item("a", ["x", "y", "z"]), Item("b"), Item("c")]),
+      RoundTripState(items=[Item("a", ["z"]), Item("c")]),
+    ),
+    (
+      RoundTripState(lookup={"a": [1, 2], "b": [3], "c": []}),
+      RoundTripState(lookup={"a": [2], "c": [4, 5], "d": [6]}),
+    ),
+    (
+      RoundTripState(values=[1], data=None),
+      RoundTripState(values=[1], data=pd.DataFrame(data={"a": [1, 2]})),
+    ),
+    (
+      RoundTripState(data=pd.DataFrame(data={"a": [1, 2]})),
+      RoundTripState(data=pd.DataFrame(data={"a": [1, 3]})),
+    ),
+  ],
+)
+def test_diff_round_trip(state1: RoundTripState, state2: RoundTripState):
+  state2_json = json.loads(serialize_dataclass(state2))
+
+  assert (
+    _apply_state_diff(serialize_dataclass(state1), diff_state(state1, state2))
+    == state2_json
+  )
+
+
+def _change_data_frame(data_frame: pd.DataFrame, change: str) -> pd.DataFrame:
+  data_frame = data_frame.copy()
+  if change == "cells":
+    data_frame.iat[10, 0] = None
+    data_frame.iat[20, 1] = "changed"
+    data_frame.iat[30, 2] = 1.5
+  elif change == "insert":
+    data_frame = pd.concat(
+      [data_frame.iloc[:5], data_frame.iloc[:2], data_frame.iloc[5:]]
+    ).reset_index(drop=True)
+  elif change == "append":
+    data_frame = pd.concat([data_frame, data_frame.iloc[:3]])
+  elif change == "delete":
+    data_frame = data_frame.drop(index=[50, 51, 52])
+  elif change == "dtype":
+    data_frame["a"] = data_frame["a"].astype("int64")
+  return data_frame
+
+
+@pytest.mark.parametrize(
+  "encode_with_arrow",
+  [
+    pytest.param(True, id="arrow"),
+    pytest.param(False, id="table"),
+  ],
+)
+@pytest.mark.parametrize(
+  "changes",
+  [["cells"], ["insert"], ["append"], ["delete"], ["dtype"], ["cells"] * 3],
+)
+def test_diff_data_frame_round_trip(
+  monkeypatch, encode_with_arrow: bool, changes: list[str]
+):
+  if encode_with_arrow:
+    pytest.importorskip("pyarrow")
+  else:
+    monkeypatch.setattr(
+      "mesop.dataclass_utils.dataclass_utils._has_pyarrow", False
+    )
+  state = RoundTripState(
+    data=pd.DataFrame(
+      data={
+        "a": [float(i) for i in range(200)],
+        "b": [f"row {i}" for i in range(200)],
+        "c": [i / 2 for i in range(200)],
+      }
+    )
+  )
+  state_json = serialize_dataclass(state)
+  # Each event diffs the state decoded from the client, like the server does.
+  for change in changes:
+    previous_state = RoundTripState()
+    update_dataclass_from_json(previous_state, state_json)
+    state = RoundTripState(data=_change_data_frame(previous_state.data, change))
+    state_json = json.dumps(
+      _apply_state_diff(
+        state_json, diff_state(previous_state, state, data_frame_patches=True)
+      )
+    )
+
+  decoded_state = RoundTripState()
+  update_dataclass_from_json(decoded_state, state_json)
+  pd.testing.assert_frame_equal(decoded_state.data, state.data)
+
+
+def test_diff_state_with_deepdiff():
+  @dataclass
+  class C:
+    val1: list[int] = field(default_factory=lambda: [1, 2, 3])
+
+  assert json.loads(diff_state_with_deepdiff(C(), C(val1=[1, 2, 4]))) == [
+    {
+      "path": ["val1", 2],
+      "action": "values_changed",
+      "value": 4,
       "old_value": "unknown___",
+      "type": "<class 'int'>",
+      "old_type": "unknown___",
       "new_path": None,
       "t1_from_index": None,
       "t1_to_index": None,
       "t2_from_index": None,
       "t2_to_index": None,
-    },
+    }
   ]
 
 
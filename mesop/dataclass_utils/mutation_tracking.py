@@ -0,0 +1,676 @@
+"""Tracks the mutations of state objects, so that they can be diffed cheaply.
+
+Diffing a state object with `diff_state` requires a copy of the state from before
+the event handler ran, and compares every value of the state. State classes opt
+in with `@me.stateclass(track_mutations=True)` to record the changes instead:
+
+- Assignments to the fields of dataclass instances are recorded by their
+  (instrumented) `__setattr__`.
+- Lists, dicts and sets in the state are replaced with subclasses that record
+  their mutations.
+
+The diff is then built from the recorded changes, so it only costs time and
+memory proportional to the size of the changes. Changes are recorded at the
+granularity that the client can apply: assigned fields, dict keys and list
+items, and appended list items, are sent with their new values. Other changes
+to a list, such as inserting or sorting items, send the whole list.
+
+Values assigned to a tracked state are converted: lists, dicts and sets are
+copied into tracked lists, dicts and sets, and dataclass instances are tracked
+in place. A value that is already in the state is copied when it is assigned
+elsewhere in the state, since the state does not keep shared references after
+being serialized anyway. Mutations of other values (e.g. DataFrames) are not
+detected, so they must be assigned again to be sent.
+"""
+
+import json
+from dataclasses import fields, is_dataclass
+from typing import Any, Callable, Iterable, SupportsIndex
+
+from mesop.dataclass_utils.dataclass_utils import (
+  MesopJSONEncoder,
+  register_diff_base_type,
+)
+from mesop.exceptions import MesopException
+
+_TRACK_MUTATIONS_ATTRIBUTE = "__mesop_track_mutations__"
+# Holds the node of tracked dataclass instances (in their `__dict__`).
+_NODE_ATTRIBUTE = "__mesop_node__"
+
+_DIFF_ACTION_VALUES_CHANGED = "values_changed"
+_DIFF_ACTION_DICT_ITEM_REMOVED = "dictionary_item_removed"
+_DIFF_ACTION_ITERABLE_ITEM_ADDED = "iterable_item_added"
+
+_field_names: dict[type, frozenset[str]] = {}
+
+
+def enable_mutation_tracking(cls: type[Any]) -> None:
+  """Makes instances of the state class record their mutations."""
+  setattr(cls, _TRACK_MUTATIONS_ATTRIBUTE, True)
+  _instrument_class(cls)
+
+
+def has_mutation_tracking(cls: type[Any]) -> bool:
+  return cls.__dict__.get(_TRACK_MUTATIONS_ATTRIBUTE, False)
+
+
+def start_tracking(state: Any) -> None:
+  """Starts recording the mutations of the state object from its current value.
+
+  The first call converts the values of the state, which costs time proportional
+  to the size of the state. Later calls only clear the recorded changes.
+  """
+  node = state.__dict__.get(_NODE_ATTRIBUTE)
+  if node is not None and node.parent is None and node.tracker.root is node:
+    node.tracker.reset()
+  else:
+    _StateTracker(state)
+
+
+def diff_tracked_state(state: Any) -> str:
+  """Returns the changes recorded since `start_tracking`, like `diff_state`."""
+  node = state.__dict__.get(_NODE_ATTRIBUTE)
+  if node is None or node.tracker.root is not node:
+    raise MesopException("Tried to diff state which is not tracked")
+  return json.dumps(node.tracker.diff(), cls=MesopJSONEncoder)
+
+
+class _StateTracker:
+  def __init__(self, state: Any):
+    # Nodes with changes since the last reset.
+    self.dirty: list[_Node] = []
+    _instrument_class(type(state))
+    self.root = _track_dataclass(state, self, None, None)
+
+  def mark_dirty(self, node: "_Node") -> None:
+    if not node.dirty:
+      node.dirty = True
+      self.dirty.append(node)
+
+  def reset(self) -> None:
+    for node in self.dirty:
+      node.reset()
+    self.dirty = []
+
+  def diff(self) -> list[dict[str, Any]]:
+    diffs: list[dict[str, Any]] = []
+    for node in self.dirty:
+      path = node.path()
+      if path is not None:
+        node.append_diffs(path, diffs)
+    return diffs
+
+
+class _Node:
+  """Records the changes of a dataclass instance, list or dict in the state."""
+
+  __slots__ = ("value", "tracker", "parent", "key", "dirty", "changed")
+
+  def __init__(
+    self,
+    value: Any,
+    tracker: _StateTracker,
+    parent: "_Node | None",
+    key: Any,
+  ):
+    self.value = value
+    self.tracker = tracker
+    self.parent = parent
+    self.key = key
+    self.dirty = False
+    # Fields, keys or indexes whose values were replaced.
+    self.changed: set[Any] = set()
+
+  # The node of a dataclass instance is in its `__dict__`, so copies of the
+  # instance (e.g. snapshots of the state) must not share it.
+  def __deepcopy__(self, memo: dict[int, Any]) -> None:
+    return None
+
+  def __reduce__(self) -> tuple[Callable[[], None], tuple[()]]:
+    return (_untracked, ())
+
+  def mark_changed(self, key: Any) -> None:
+    self.changed.add(key)
+    self.tracker.mark_dirty(self)
+
+  def reset(self) -> None:
+    self.dirty = False
+    self.changed.clear()
+
+  def covers(self, key: Any) -> bool:
+    """Returns whether the value at the key is sent whole by this node."""
+    return key in self.changed
+
+  def holds(self, key: Any, value: Any) -> bool:
+    """Returns whether the value is at the key of this node's value."""
+    return self.value.__dict__.get(key) is value
+
+  def path(self) -> list[Any] | None:
+    """Returns the path of the value, or None if its changes are not sent.
+
+    Changes are not sent if the value is no longer in the state, or if it is
+    sent whole as part of a changed parent.
+    """
+    path: list[Any] = []
+    node = self
+    while node.parent is not None:
+      parent = node.parent
+      if parent.covers(node.key) or not parent.holds(node.key, node.value):
+        return None
+      path.append(node.key)
+      node = parent
+    if node is not self.tracker.root:
+      return None
+    path.reverse()
+    return path
+
+  def is_attached(self) -> bool:
+    node = self
+    while node.parent is not None:
+      if not node.parent.holds(node.key, node.value):
+        return False
+      node = node.parent
+    return node is self.tracker.root
+
+  def append_diffs(self, path: list[Any], diffs: list[dict[str, Any]]) -> None:
+    for name in self.changed:
+      _append_diff(
+        diffs,
+        [*path, name],
+        _DIFF_ACTION_VALUES_CHANGED,
+        self.value.__dict__[name],
+      )
+
+
+class _DictNode(_Node):
+  __slots__ = ("removed", "added")
+
+  def __init__(
+    self,
+    value: Any,
+    tracker: _StateTracker,
+    parent: _Node | None,
+    key: Any,
+  ):
+    super().__init__(value, tracker, parent, key)
+    self.removed: set[Any] = set()
+    # Keys that were not in the dict at the last reset, so the client does not
+    # have them.
+    self.added: set[Any] = set()
+
+  def mark_changed(self, key: Any) -> None:
+    if key in self.removed:
+      self.removed.discard(key)
+    elif not dict.__contains__(self.value, key):
+      self.added.add(key)
+    super().mark_changed(key)
+
+  def mark_removed(self, key: Any) -> None:
+    self.changed.discard(key)
+    if key in self.added:
+      self.added.discard(key)
+    else:
+      self.removed.add(key)
+    self.tracker.mark_dirty(self)
+
+  def reset(self) -> None:
+    super().reset()
+    self.removed.clear()
+    self.added.clear()
+
+  def holds(self, key: Any, value: Any) -> bool:
+    return dict.get(self.value, key, _MISSING) is value
+
+  def append_diffs(self, path: list[Any], diffs: list[dict[str, Any]]) -> None:
+    for key in self.removed:
+      _append_diff(diffs, [*path, key], _DIFF_ACTION_DICT_ITEM_REMOVED, None)
+    for key in self.changed:
+      _append_diff(
+        diffs,
+        [*path, key],
+        _DIFF_ACTION_VALUES_CHANGED,
+        dict.__getitem__(self.value, key),
+      )
+
+
+class _ListNode(_Node):
+  __slots__ = ("length", "replaced")
+
+  def __init__(
+    self,
+    value: Any,
+    tracker: _StateTracker,
+    parent: _Node | None,
+    key: Any,
+  ):
+    super().__init__(value, tracker, parent, key)
+    # Items from this index were appended, and are sent as added items.
+    self.length = len(value)
+    # Whether the list is sent whole, e.g. after inserting or sorting items.
+    self.replaced = False
+
+  def mark_changed(self, key: Any) -> None:
+    if key < self.length:
+      super().mark_changed(key)
+    else:
+      self.tracker.mark_dirty(self)
+
+  def mark_appended(self) -> None:
+    self.tracker.mark_dirty(self)
+
+  def mark_replaced(self) -> None:
+    self.replaced = True
+    self.tracker.mark_dirty(self)
+    self.update_keys()
+
+  def update_keys(self, start: int = 0) -> None:
+    """Updates the keys of the items from the index, which may have moved.
+
+    The keys must be current for the items to be found in the list by
+    `is_attached`, e.g. when an item is added to the state again in the same
+    event. An item which is in the list more than once keeps its last index.
+    """
+    for index in range(start, len(self.value)):
+      item = list.__getitem__(self.value, index)
+      if type(item) is TrackedSet:
+        if item._parent is self:
+          item._key = index
+        continue
+      node = _get_node(item)
+      if node is not None and node.parent is self:
+        node.key = index
+
+  def reset(self) -> None:
+    super().reset()
+    self.replaced = False
+    self.length = len(self.value)
+
+  def covers(self, key: Any) -> bool:
+    return self.replaced or key >= self.length or key in self.changed
+
+  def holds(self, key: Any, value: Any) -> bool:
+    return key < len(self.value) and list.__getitem__(self.value, key) is value
+
+  def append_diffs(self, path: list[Any], diffs: list[dict[str, Any]]) -> None:
+    items = self.value
+    if self.replaced:
+      _append_diff(diffs, path, _DIFF_ACTION_VALUES_CHANGED, items)
+      return
+    for index in sorted(self.changed):
+      if index < len(items):
+        _append_diff(
+          diffs, [*path, index], _DIFF_ACTION_VALUES_CHANGED, items[index]
+        )
+    for index in range(self.length, len(items)):
+      _append_diff(
+        diffs, [*path, index], _DIFF_ACTION_ITERABLE_ITEM_ADDED, items[index]
+      )
+
+
+def _untracked() -> None:
+  return None
+
+
+_MISSING = object()
+
+
+def _append_diff(
+  diffs: list[dict[str, Any]], path: list[Any], action: str, value: Any
+) -> None:
+  diffs.append({"path": path, "action": action, "value": value})
+
+
+def _get_node(value: Any) -> _Node | None:
+  if type(value) in _TRACKED_CONTAINER_TYPES:
+    return value._node
+  value_dict = getattr(value, "__dict__", None)
+  if value_dict is not None and is_dataclass(value):
+    return value_dict.get(_NODE_ATTRIBUTE)
+  return None
+
+
+def _track(value: Any, parent: _Node, key: Any) -> Any:
+  """Returns the value to store at the key of the parent, tracking its changes.
+
+  Values that are already tracked at another place in the state are copied
+  (see module docs).
+  """
+  value_type = type(value)
+  if value_type is list:
+    return _track_list(value, parent.tracker, parent, key)
+  if value_type is dict:
+    return _track_dict(value, parent.tracker, parent, key)
+  if value_type is set:
+    return TrackedSet(value, parent, key)
+  if value_type is TrackedSet:
+    if value._parent is parent and value._key == key:
+      return value
+    return TrackedSet(value, parent, key)
+  is_container = value_type in _TRACKED_CONTAINER_TYPES
+  if not is_container and not (
+    is_dataclass(value) and _instrument_class(value_type)
+  ):
+    return value
+
+  node = _get_node(value)
+  if node is not None and node.tracker is parent.tracker:
+    if node.parent is parent and node.key == key:
+      return value
+    if not node.is_attached():
+      # E.g. an item popped from a list and added to another list.
+      node.parent = parent
+      node.key = key
+      return value
+  if value_type is TrackedList:
+    return _track_list(value, parent.tracker, parent, key)
+  if value_type is TrackedDict:
+    return _track_dict(value, parent.tracker, parent, key)
+  if node is not None:
+    value = _copy_dataclass(value)
+  return _track_dataclass(value, parent.tracker, parent, key).value
+
+
+def _track_dataclass(
+  value: Any, tracker: _StateTracker, parent: _Node | None, key: Any
+) -> _Node:
+  node = _Node(value, tracker, parent, key)
+  value_dict = value.__dict__
+  value_dict[_NODE_ATTRIBUTE] = node
+  for name in _field_names[type(value)]:
+    if name in value_dict:
+      value_dict[name] = _track(value_dict[name], node, name)
+  return node
+
+
+def _copy_dataclass(value: Any) -> Any:
+  copied = object.__new__(type(value))
+  copied.__dict__.update(value.__dict__)
+  del copied.__dict__[_NODE_ATTRIBUTE]
+  return copied
+
+
+def _track_list(
+  items: Iterable[Any], tracker: _StateTracker, parent: _Node, key: Any
+) -> "TrackedList":
+  tracked = TrackedList(items)
+  node = _ListNode(tracked, tracker, parent, key)
+  for index, item in enumerate(tracked):
+    list.__setitem__(tracked, index, _track(item, node, index))
+  tracked._node = node
+  return tracked
+
+
+def _track_dict(
+  items: dict[Any, Any], tracker: _StateTracker, parent: _Node, key: Any
+) -> "TrackedDict":
+  tracked = TrackedDict(items)
+  node = _DictNode(tracked, tracker, parent, key)
+  for item_key, item in tracked.items():
+    dict.__setitem__(tracked, item_key, _track(item, node, item_key))
+  tracked._node = node
+  return tracked
+
+
+def _instrument_class(cls: type[Any]) -> bool:
+  """Makes assignments to the fields of the dataclass be recorded.
+
+  Returns False if the instances of the dataclass cannot be tracked.
+  """
+  if cls in _field_names:
+    return True
+  params = getattr(cls, "__dataclass_params__", None)
+  if params is None or params.frozen or "__slots__" in cls.__dict__:
+    return False
+  setattr_fn = cls.__setattr__
+  if not getattr(setattr_fn, "_mesop_tracks_mutations", False):
+    cls.__setattr__ = _create_tracking_setattr(setattr_fn)
+  _field_names[cls] = frozenset(field.name for field in fields(cls))
+  return True
+
+
+def _create_tracking_setattr(
+  setattr_fn: Callable[[Any, str, Any], None],
+) -> Callable[[Any, str, Any], None]:
+  def __setattr__(self: Any, name: str, value: Any) -> None:
+    node = self.__dict__.get(_NODE_ATTRIBUTE)
+    if node is not None and name in _field_names[type(self)]:
+      previous_value = self.__dict__.get(name, _MISSING)
+      if value is previous_value:
+        # E.g. `state.items += [item]`, which already recorded the changes.
+        return
+      value = _track(value, node, name)
+      node.mark_changed(name)
+    setattr_fn(self, name, value)
+
+  __setattr__._mesop_tracks_mutations = True  # type: ignore
+  return __setattr__
+
+
+class TrackedList(list[Any]):
+  """A list in a tracked state, which records its mutations."""
+
+  __slots__ = ("_node",)
+
+  def __init__(self, items: Iterable[Any] = ()):
+    super().__init__(items)
+    # None if the list is not in a tracked state, e.g. a copy.
+    self._node: _ListNode | None = None
+
+  # Copies are plain lists, since they are not in a tracked state.
+  def __reduce_ex__(self, protocol: SupportsIndex) -> Any:
+    return (list, (list(self),))
+
+  def __setitem__(self, index: Any, value: Any) -> None:
+    node = self._node
+    if node is None:
+      super().__setitem__(index, value)
+    elif isinstance(index, slice):
+      super().__setitem__(index, value)
+      node.mark_replaced()
+      # Tracks the new items, and moves the nodes of the moved items.
+      for position, item in enumerate(self):
+        list.__setitem__(self, position, _track(item, node, position))
+    else:
+      index = range(len(self))[index]
+      super().__setitem__(index, _track(value, node, index))
+      node.mark_changed(index)
+
+  def __delitem__(self, index: Any) -> None:
+    super().__delitem__(index)
+    self._mark_replaced()
+
+  def __iadd__(self, items: Iterable[Any]) -> "TrackedList":  # type: ignore
+    self.extend(items)
+    return self
+
+  def __imul__(self, count: SupportsIndex) -> "TrackedList":  # type: ignore
+    length = len(self)
+    super().__imul__(count)
+    node = self._node
+    if node is not None:
+      # Copies the repeated items, which are otherwise tracked at one index.
+      for index in range(length, len(self)):
+        list.__setitem__(
+          self, index, _track(list.__getitem__(self, index), node, index)
+        )
+      node.mark_replaced()
+    return self
+
+  def append(self, value: Any) -> None:
+    node = self._node
+    if node is not None:
+      value = _track(value, node, len(self))
+      node.mark_appended()
+    super().append(value)
+
+  def extend(self, items: Iterable[Any]) -> None:
+    node = self._node
+    if node is None:
+      super().extend(items)
+      return
+    for item in list(items):
+      super().append(_track(item, node, len(self)))
+    node.mark_appended()
+
+  def insert(self, index: SupportsIndex, value: Any) -> None:
+    node = self._node
+    if node is not None:
+      # No item of the list has this key, so items of the list are copied. The
+      # key is updated by `mark_replaced`.
+      value = _track(value, node, len(self))
+    super().insert(index, value)
+    self._mark_replaced()
+
+  def pop(self, index: SupportsIndex = -1) -> Any:
+    value = super().pop(index)
+    node = self._node
+    if node is not None:
+      index = range(len(self) + 1)[index]
+      if index < node.length:
+        node.mark_replaced()
+      else:
+        # Removing appended items does not change the other items.
+        node.update_keys(index)
+    return value
+
+  def remove(self, value: Any) -> None:
+    super().remove(value)
+    self._mark_replaced()
+
+  def clear(self) -> None:
+    super().clear()
+    self._mark_replaced()
+
+  def sort(self, *args: Any, **kwargs: Any) -> None:
+    super().sort(*args, **kwargs)
+    self._mark_replaced()
+
+  def reverse(self) -> None:
+    super().reverse()
+    self._mark_replaced()
+
+  def _mark_replaced(self) -> None:
+    if self._node is not None:
+      self._node.mark_replaced()
+
+
+class TrackedDict(dict[Any, Any]):
+  """A dict in a tracked state, which records its mutations."""
+
+  __slots__ = ("_node",)
+
+  def __init__(self, *args: Any, **kwargs: Any):
+    super().__init__(*args, **kwargs)
+    # None if the dict is not in a tracked state, e.g. a copy.
+    self._node: _DictNode | None = None
+
+  # Copies are plain dicts, since they are not in a tracked state.
+  def __reduce_ex__(self, protocol: SupportsIndex) -> Any:
+    return (dict, (dict(self),))
+
+  def __setitem__(self, key: Any, value: Any) -> None:
+    node = self._node
+    if node is not None:
+      value = _track(value, node, key)
+      node.mark_changed(key)
+    super().__setitem__(key, value)
+
+  def __delitem__(self, key: Any) -> None:
+    super().__delitem__(key)
+    if self._node is not None:
+      self._node.mark_removed(key)
+
+  def __ior__(self, other: Any) -> "TrackedDict":  # type: ignore
+    self.update(other)
+    return self
+
+  def pop(self, key: Any, *default: Any) -> Any:
+    had_key = key in self
+    value = super().pop(key, *default)
+    if had_key and self._node is not None:
+      self._node.mark_removed(key)
+    return value
+
+  def popitem(self) -> tuple[Any, Any]:
+    key, value = super().popitem()
+    if self._node is not None:
+      self._node.mark_removed(key)
+    return key, value
+
+  def clear(self) -> None:
+    if self._node is not None:
+      for key in self:
+        self._node.mark_removed(key)
+    super().clear()
+
+  def setdefault(self, key: Any, default: Any = None) -> Any:
+    if key not in self:
+      self[key] = default
+    return self[key]
+
+  def update(self, *args: Any, **kwargs: Any) -> None:
+    for key, value in dict(*args, **kwargs).items():
+      self[key] = value
+
+
+class TrackedSet(set[Any]):
+  """A set in a tracked state, which is sent whole when it is mutated."""
+
+  __slots__ = ("_parent", "_key")
+
+  def __init__(
+    self,
+    items: Iterable[Any] = (),
+    parent: _Node | None = None,
+    key: Any = None,
+  ):
+    super().__init__(items)
+    self._parent = parent
+    self._key = key
+
+  # Copies are plain sets, since they are not in a tracked state.
+  def __reduce_ex__(self, protocol: SupportsIndex) -> Any:
+    return (set, (set(self),))
+
+  def _mark_changed(self) -> None:
+    parent = self._parent
+    if parent is not None and parent.holds(self._key, self):
+      parent.mark_changed(self._key)
+
+
+def _create_tracked_set_method(name: str) -> Callable[..., Any]:
+  method = getattr(set, name)
+
+  def tracked_method(self: TrackedSet, *args: Any) -> Any:
+    result = method(self, *args)
+    self._mark_changed()
+    return result
+
+  tracked_method.__name__ = name
+  return tracked_method
+
+
+for _name in (
+  "add",
+  "clear",
+  "difference_update",
+  "discard",
+  "intersection_update",
+  "pop",
+  "remove",
+  "symmetric_difference_update",
+  "update",
+  "__iand__",
+  "__ior__",
+  "__isub__",
+  "__ixor__",
+):
+  setattr(TrackedSet, _name, _create_tracked_set_method(_name))
+
+_TRACKED_CONTAINER_TYPES = frozenset((TrackedList, TrackedDict))
+
+# Copies of these are plain lists, dicts and sets, e.g. in the snapshot of a state
+# without tracking that holds one of them.
+register_diff_base_type(TrackedList, list)
+register_diff_base_type(TrackedDict, dict)
+register_diff_base_type(TrackedSet, set)
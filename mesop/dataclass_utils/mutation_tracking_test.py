@@ -0,0 +1,415 @@
+import copy
+import json
+import pickle
+from dataclasses import dataclass, field
+from typing import Any
+
+import pandas as pd
+import pytest
+
+from mesop.dataclass_utils.dataclass_utils import (
+  diff_state,
+  serialize_dataclass,
+  update_dataclass_from_json,
+)
+from mesop.dataclass_utils.mutation_tracking import (
+  TrackedDict,
+  TrackedList,
+  diff_tracked_state,
+  enable_mutation_tracking,
+  start_tracking,
+)
+from mesop.exceptions import MesopException
+
+
+@dataclass
+class Message:
+  role: str = ""
+  content: str = ""
+  tags: set[str] = field(default_factory=set)
+
+
+@dataclass
+class Nested:
+  values: list[int] = field(default_factory=list)
+
+
+@dataclass
+class State:
+  name: str = ""
+  count: int = 0
+  messages: list[Message] = field(default_factory=list)
+  lookup: dict[str, list[int]] = field(default_factory=dict)
+  matrix: list[list[int]] = field(default_factory=list)
+  nested: Nested = field(default_factory=Nested)
+  data: pd.DataFrame | None = None
+
+
+enable_mutation_tracking(State)
+
+
+def create_state() -> State:
+  state = State(
+    name="name",
+    messages=[Message("user", "Hello"), Message("model", "Hi")],
+    lookup={"a": [1, 2], "b": [3]},
+    matrix=[[1, 2], [3, 4]],
+    nested=Nested(values=[1, 2, 3]),
+  )
+  start_tracking(state)
+  return state
+
+
+def diff(state: State) -> list[dict[str, Any]]:
+  return json.loads(diff_tracked_state(state))
+
+
+def _apply_state_diff(state_json: str, diff_json: str) -> Any:
+  """Applies the diff like `applyStateDiff` in `diff.ts`, and returns the state."""
+  root = json.loads(state_json)
+  for row in json.loads(diff_json):
+    *parent_path, key = row["path"]
+    parent = root
+    for parent_key in parent_path:
+      parent = parent[
+        parent_key if isinstance(parent, list) else str(parent_key)
+      ]
+    if isinstance(parent, dict):
+      key = str(key)
+    if row["action"] == "values_changed":
+      parent[key] = row["value"]
+    elif row["action"] == "dictionary_item_removed":
+      del parent[key]
+    elif row["action"] == "iterable_item_added":
+      parent.insert(key, row["value"])
+    else:
+      raise AssertionError(f"Unexpected action: {row['action']}")
+  return root
+
+
+def test_no_mutations():
+  state = create_state()
+
+  assert diff(state) == []
+
+
+def test_assign_fields():
+  state = create_state()
+  state.name = "new name"
+  state.count += 1
+  state.nested.values = [4]
+
+  assert sorted(diff(state), key=lambda row: row["path"]) == [
+    {"path": ["count"], "action": "values_changed", "value": 1},
+    {"path": ["name"], "action": "values_changed", "value": "new name"},
+    {"path": ["nested", "values"], "action": "values_changed", "value": [4]},
+  ]
+  assert type(state.nested.values) is TrackedList
+
+
+def test_assign_same_value():
+  state = create_state()
+  state.name = "name"
+  state.messages = state.messages
+
+  assert diff(state) == []
+
+
+def test_append_and_update_list_items():
+  state = create_state()
+  state.messages[1].content += " there"
+  state.messages.append(Message("user", "How are you?"))
+  state.messages[2].content = "How are you doing?"
+  state.matrix[0][1] = 5
+
+  assert diff(state) == [
+    {
+      "path": ["messages", 1, "content"],
+      "action": "values_changed",
+      "value": "Hi there",
+    },
+    {
+      "path": ["messages", 2],
+      "action": "iterable_item_added",
+      "value": {
+        "role": "user",
+        "content": "How are you doing?",
+        "tags": {"__python.set__": []},
+      },
+    },
+    {"path": ["matrix", 0, 1], "action": "values_changed", "value": 5},
+  ]
+
+
+def test_insert_sends_whole_list():
+  state = create_state()
+  state.messages.insert(0, Message("user", "First"))
+  state.messages[1].content = "Hello!"
+
+  assert diff(state) == [
+    {
+      "path": ["messages"],
+      "action": "values_changed",
+      "value": [
+        {"role": "user", "content": "First", "tags": {"__python.set__": []}},
+        {"role": "user", "content": "Hello!", "tags": {"__python.set__": []}},
+        {"role": "model", "content": "Hi", "tags": {"__python.set__": []}},
+      ],
+    },
+  ]
+
+
+def test_dict_mutations():
+  state = create_state()
+  state.lookup["a"].append(3)
+  state.lookup["c"] = [4]
+  del state.lookup["b"]
+
+  assert diff(state) == [
+    {"path": ["lookup", "a", 2], "action": "iterable_item_added", "value": 3},
+    {
+      "path": ["lookup", "b"],
+      "action": "dictionary_item_removed",
+      "value": None,
+    },
+    {"path": ["lookup", "c"], "action": "values_changed", "value": [4]},
+  ]
+
+
+def test_dict_keys_added_and_removed_in_one_event_are_not_sent():
+  state = create_state()
+  state.lookup["c"] = [4]
+  state.lookup["d"] = [5]
+  del state.lookup["c"]
+  state.lookup.pop("d")
+  state.lookup.setdefault("e", [])
+  state.lookup.clear()
+
+  assert sorted(diff(state), key=lambda row: row["path"]) == [
+    {
+      "path": ["lookup", "a"],
+      "action": "dictionary_item_removed",
+      "value": None,
+    },
+    {
+      "path": ["lookup", "b"],
+      "action": "dictionary_item_removed",
+      "value": None,
+    },
+  ]
+
+
+def test_removed_dict_keys_added_again_are_sent():
+  state = create_state()
+  del state.lookup["a"]
+  state.lookup["a"] = [5]
+
+  assert diff(state) == [
+    {"path": ["lookup", "a"], "action": "values_changed", "value": [5]},
+  ]
+
+
+def test_set_mutations_send_whole_set():
+  state = create_state()
+  state.messages[0].tags.add("greeting")
+
+  assert diff(state) == [
+    {
+      "path": ["messages", 0, "tags"],
+      "action": "values_changed",
+      "value": {"__python.set__": ["greeting"]},
+    },
+  ]
+
+
+def test_changes_are_cleared_by_start_tracking():
+  state = create_state()
+  state.messages.sort(key=lambda message: message.content)
+  state.name = "new name"
+  start_tracking(state)
+
+  # The items were moved by the previous changes.
+  state.messages[0].content = "Hey"
+
+  assert diff(state) == [
+    {
+      "path": ["messages", 0, "content"],
+      "action": "values_changed",
+      "value": "Hey",
+    },
+  ]
+  assert state.messages[0].role == "user"
+
+
+def test_values_in_the_state_are_copied_when_assigned_elsewhere():
+  state = create_state()
+  state.lookup["copy"] = state.nested.values
+  state.lookup["copy"].append(4)
+
+  assert state.nested.values == [1, 2, 3]
+  assert diff(state) == [
+    {
+      "path": ["lookup", "copy"],
+      "action": "values_changed",
+      "value": [1, 2, 3, 4],
+    },
+  ]
+
+
+def test_values_removed_from_the_state_are_not_tracked():
+  state = create_state()
+  message = state.messages.pop()
+  start_tracking(state)
+  message.content = "Removed"
+  values = state.nested.values
+  state.nested = Nested()
+  start_tracking(state)
+  values.append(4)
+
+  assert diff(state) == []
+
+
+def test_moved_values_are_tracked():
+  state = create_state()
+  message = state.messages.pop()
+  state.messages.append(message)
+  start_tracking(state)
+  message.content = "Moved"
+
+  assert diff(state) == [
+    {
+      "path": ["messages", 1, "content"],
+      "action": "values_changed",
+      "value": "Moved",
+    },
+  ]
+
+
+def test_moved_items_added_again_are_copied():
+  state = create_state()
+  state.messages.append(Message("user", "How are you?"))
+  start_tracking(state)
+  state.messages.pop(0)
+  state.messages.append(state.messages[0])
+  start_tracking(state)
+  state.messages[0].content = "changed"
+
+  assert state.messages[2].content == "Hi"
+  assert diff(state) == [
+    {
+      "path": ["messages", 0, "content"],
+      "action": "values_changed",
+      "value": "changed",
+    },
+  ]
+
+
+def test_data_frames_are_sent_when_assigned():
+  state = create_state()
+  state.data = pd.DataFrame(data={"a": [1]})
+
+  assert [row["path"] for row in diff(state)] == [["data"]]
+
+
+def test_copies_are_not_tracked():
+  state = create_state()
+  for copied in (copy.deepcopy(state), pickle.loads(pickle.dumps(state))):
+    assert copied == state
+    assert type(copied.messages) is list
+    assert type(copied.lookup) is dict
+    copied.messages.append(Message())
+    copied.name = "copy"
+
+  assert diff(state) == []
+
+
+@dataclass
+class UntrackedState:
+  messages: list[Message] = field(default_factory=list)
+  lookup: dict[str, list[int]] = field(default_factory=dict)
+  tags: set[str] = field(default_factory=set)
+
+
+def test_tracked_values_in_untracked_state_are_diffed_by_value():
+  state = create_state()
+  untracked_state = UntrackedState(
+    messages=state.messages,
+    lookup=state.lookup,
+    tags=state.messages[0].tags,
+  )
+  # E.g. the snapshot of the untracked state before an event.
+  snapshot = copy.deepcopy(untracked_state)
+
+  assert json.loads(diff_state(snapshot, untracked_state)) == []
+
+  state.messages.append(Message("user", "Bye"))
+  state.messages[0].tags.add("greeting")
+
+  assert sorted(
+    (row["path"], row["action"])
+    for row in json.loads(diff_state(snapshot, untracked_state))
+  ) == [
+    (["messages", 0, "tags", "__python.set__"], "set_item_added"),
+    (["messages", 2], "iterable_item_added"),
+    (["tags", "__python.set__"], "set_item_added"),
+  ]
+
+
+def test_update_from_json():
+  state = create_state()
+  update_dataclass_from_json(
+    state, serialize_dataclass(State(name="new name", lookup={"x": [1]}))
+  )
+  start_tracking(state)
+  state.lookup["x"].append(2)
+
+  assert type(state.lookup) is TrackedDict
+  assert diff(state) == [
+    {"path": ["lookup", "x", 1], "action": "iterable_item_added", "value": 2},
+  ]
+
+
+def test_diff_untracked_state():
+  with pytest.raises(MesopException):
+    diff_tracked_state(State())
+
+
+@pytest.mark.parametrize(
+  "mutate",
+  [
+    lambda state: state.messages.reverse(),
+    lambda state: state.messages.pop(0),
+    lambda state: state.messages.extend([Message("a"), Message("b")]),
+    lambda state: state.messages.__setitem__(slice(0, 1), [Message("c")]),
+    lambda state: state.matrix[1].remove(state.matrix[1][0]),
+    lambda state: state.matrix.append(state.matrix[0]),
+    lambda state: state.messages.__imul__(2),
+    lambda state: state.messages.append(state.messages.pop(1)),
+    lambda state: state.messages.insert(1, state.messages[0]),
+    lambda state: state.lookup.update({"a": [5], "d": []}),
+    lambda state: state.lookup.setdefault("e", []).append(1),
+    lambda state: state.lookup.pop("a", None),
+    lambda state: state.lookup.clear(),
+    lambda state: state.lookup.__setitem__("f", [1]) or state.lookup.pop("f"),
+    lambda state: setattr(state, "nested", Nested([7])),
+    lambda state: state.nested.values.__iadd__([8, 9]),
+  ],
+)
+def test_round_trip(mutate):
+  state = create_state()
+  state.messages.extend([Message("user", "3"), Message("model", "4")])
+  start_tracking(state)
+  # The second event applies to the state as changed by the first event.
+  for _ in range(2):
+    state_json = serialize_dataclass(state)
+    mutate(state)
+    state.messages[0].content += "!"
+
+    assert _apply_state_diff(state_json, diff_tracked_state(state)) == (
+      json.loads(serialize_dataclass(state))
+    )
+    start_tracking(state)
+
+
+if __name__ == "__main__":
+  raise SystemExit(pytest.main([__file__]))
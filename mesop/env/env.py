@@ -48,6 +48,98 @@ MESOP_WEBSOCKETS_ENABLED = (
   os.environ.get("MESOP_WEBSOCKETS_ENABLED", "false").lower() == "true"
 )
 
+# Limits for processing WebSocket messages. See `WebSocketScheduler`.
+MESOP_WEBSOCKET_MAX_WORKERS = int(
+  os.environ.get("MESOP_WEBSOCKET_MAX_WORKERS", "100")
+)
+MESOP_WEBSOCKET_MAX_QUEUED = int(
+  os.environ.get("MESOP_WEBSOCKET_MAX_QUEUED", "400")
+)
+MESOP_WEBSOCKET_MAX_QUEUED_PER_SESSION = int(
+  os.environ.get("MESOP_WEBSOCKET_MAX_QUEUED_PER_SESSION", "20")
+)
+MESOP_WEBSOCKET_MAX_RUNNING_PER_SESSION = int(
+  os.environ.get("MESOP_WEBSOCKET_MAX_RUNNING_PER_SESSION", "4")
+)
+
+# Limits for the per-connection contexts kept in WebSockets mode. Zero means no limit.
+# Evicted contexts are saved to the state session backend (which must be configured)
+# so they can be restored on the session's next event.
+MESOP_WEBSOCKET_CONTEXT_IDLE_TIMEOUT_SECONDS = int(
+  os.environ.get("MESOP_WEBSOCKET_CONTEXT_IDLE_TIMEOUT_SECONDS", "0")
+)
+MESOP_WEBSOCKET_MAX_CONTEXTS = int(
+  os.environ.get("MESOP_WEBSOCKET_MAX_CONTEXTS", "0")
+)
+
+# Lets user events dispatch to handlers registered in a process-wide registry instead
+# of re-running the page function to rediscover them.
+MESOP_HANDLER_REGISTRY_ENABLED = (
+  os.environ.get("MESOP_HANDLER_REGISTRY_ENABLED", "false").lower() == "true"
+)
+
+# Sends UI responses as length-prefixed binary frames instead of base64-encoded text.
+MESOP_BINARY_TRANSPORT_ENABLED = (
+  os.environ.get("MESOP_BINARY_TRANSPORT_ENABLED", "false").lower() == "true"
+)
+
+# Compresses UI stream responses with gzip or deflate (based on the request's
+# Accept-Encoding header), flushing after each event so streaming is not delayed.
+MESOP_STREAM_COMPRESSION_ENABLED = (
+  os.environ.get("MESOP_STREAM_COMPRESSION_ENABLED", "false").lower() == "true"
+)
+
+MESOP_STREAM_COMPRESSION_LEVEL = int(
+  os.environ.get("MESOP_STREAM_COMPRESSION_LEVEL", "6")
+)
+if not -1 <= MESOP_STREAM_COMPRESSION_LEVEL <= 9:
+  raise MesopDeveloperException(
+    f"MESOP_STREAM_COMPRESSION_LEVEL must be between -1 and 9, but got {MESOP_STREAM_COMPRESSION_LEVEL} instead."
+  )
+
+# Sends each distinct style once per session (or per response when WebSockets are
+# disabled) and references it by ID from the components that use it.
+MESOP_STYLE_TABLE_ENABLED = (
+  os.environ.get("MESOP_STYLE_TABLE_ENABLED", "false").lower() == "true"
+)
+
+# How component arguments are validated when not running in debug mode. Debug mode
+# always validates them fully. See `ValidationMode`.
+MESOP_PROD_VALIDATION_MODE = os.environ.get(
+  "MESOP_PROD_VALIDATION_MODE", "full"
+).lower()
+if MESOP_PROD_VALIDATION_MODE not in ("full", "fast", "none"):
+  raise MesopDeveloperException(
+    f"MESOP_PROD_VALIDATION_MODE must be one of full, fast or none, but got {MESOP_PROD_VALIDATION_MODE} instead."
+  )
+
+# Negotiates the permessage-deflate extension for WebSocket connections if the client
+# supports it.
+MESOP_WEBSOCKET_COMPRESSION_ENABLED = (
+  os.environ.get("MESOP_WEBSOCKET_COMPRESSION_ENABLED", "true").lower()
+  == "true"
+)
+
+# Minimum time between renders for generator event handlers. Yields that arrive sooner
+# are merged into the next render. Zero (the default) renders on every yield.
+MESOP_MIN_FRAME_INTERVAL_MS = int(
+  os.environ.get("MESOP_MIN_FRAME_INTERVAL_MS", "0")
+)
+
+MESOP_SERVER_TIMING_ENABLED = (
+  os.environ.get("MESOP_SERVER_TIMING_ENABLED", "false").lower() == "true"
+)
+
+MESOP_METRICS_ENABLED = (
+  os.environ.get("MESOP_METRICS_ENABLED", "false").lower() == "true"
+)
+
+# Captures stack samples of UI requests, or steps of generator handlers, that take
+# longer than this. Zero (the default) disables profiling.
+MESOP_PROFILE_SLOW_EVENTS_MS = int(
+  os.environ.get("MESOP_PROFILE_SLOW_EVENTS_MS", "0")
+)
+
 MESOP_HTTP_CACHE_JS_BUNDLE = (
   os.environ.get("MESOP_HTTP_CACHE_JS_BUNDLE", "false").lower() == "true"
 )
@@ -0,0 +1,304 @@
+"""Reuses the component trees of components whose inputs did not change.
+
+Components opt in with `@me.component(pure=True)` if they only depend on their
+arguments. Their component trees are cached by the runtime, so that they are
+shared across sessions.
+
+Components opt in with `@me.component(reactive=True)` if they only depend on
+their arguments and state. While a reactive
+component is rendered, the state fields that it reads (including from nested
+components) are recorded. On the next render, if the component is called with
+equal arguments and the state fields it read are also equal, the component
+tree built by the previous call is reused instead of calling the component.
+
+Calls are matched by position: the n-th call of a component within the same
+reactive component (or outside of any reactive component) is matched with the
+n-th call of the previous render.
+"""
+
+import copy
+from dataclasses import dataclass, fields
+from dataclasses import field as dataclass_field
+from functools import partial
+from typing import Any, Callable
+
+from mesop.runtime.component_tree import ComponentNode
+
+_CallKey = tuple[Callable[..., Any], int]
+_StateField = tuple[type[Any], str]
+
+
+@dataclass(kw_only=True)
+class CachedComponent:
+  args: tuple[Any, ...]
+  kwargs: dict[str, Any]
+  # Values of the state fields read when the component was rendered.
+  state_reads: dict[_StateField, Any]
+  component: ComponentNode
+  return_value: Any
+  # Reactive components called by this component.
+  children: dict[_CallKey, "CachedComponent"]
+
+
+@dataclass
+class Registrations:
+  """Event handlers and JS modules registered while rendering a component."""
+
+  handlers: dict[str, Callable[..., Any]] = dataclass_field(
+    default_factory=dict
+  )
+  js_modules: set[str] = dataclass_field(default_factory=set)
+
+
+@dataclass(kw_only=True)
+class PureComponentOutput:
+  component: ComponentNode
+  return_value: Any
+  # Need to be registered in each context that reuses the component tree.
+  registrations: Registrations
+
+
+class _Scope:
+  """Tracks a call of a reactive component while it is rendered."""
+
+  def __init__(
+    self,
+    previous_children: dict[_CallKey, CachedComponent],
+    key: _CallKey | None = None,
+    args: tuple[Any, ...] | None = None,
+    kwargs: dict[str, Any] | None = None,
+  ):
+    self.previous_children = previous_children
+    self.key = key
+    # None if the arguments could not be copied.
+    self.args = args
+    self.kwargs = kwargs
+    self.children: dict[_CallKey, CachedComponent] = {}
+    self.state_reads: dict[_StateField, Any] = {}
+    self.call_counts: dict[Callable[..., Any], int] = {}
+    # True if a state field could not be copied, so its changes are not
+    # detected.
+    self.has_untracked_reads = False
+
+  def next_key(self, fn: Callable[..., Any]) -> _CallKey:
+    count = self.call_counts.get(fn, 0)
+    self.call_counts[fn] = count + 1
+    return (fn, count)
+
+
+class ComponentCache:
+  def __init__(self, states: dict[type[Any], object]):
+    self._states = states
+    # The first scope is for the calls made outside of reactive components.
+    self._scopes: list[_Scope] = [_Scope({})]
+    # Copies of the state fields read during this render, and whether the
+    # copies made by the last render are equal to the current values. These
+    # are shared, so that many components reading a large field (e.g. the items
+    # of a list) do not each copy and compare it.
+    self._snapshots: dict[_StateField, Any] = {}
+    self._unchanged_snapshots: dict[tuple[_StateField, int], bool] = {}
+
+  def start_render(self) -> None:
+    """Makes the calls cached by the last render available to this render."""
+    self._scopes = [_Scope(self._scopes[0].children)]
+    self._snapshots = {}
+    self._unchanged_snapshots = {}
+
+  def is_tracking(self) -> bool:
+    return len(self._scopes) > 1
+
+  def record_state_read(
+    self, state_cls: type[Any], name: str, value: Any
+  ) -> None:
+    # The state object may be read after the component was rendered, e.g. by an
+    # event handler that captured it.
+    if not self.is_tracking():
+      return
+    scope = self._scopes[-1]
+    state_field = (state_cls, name)
+    if state_field in scope.state_reads:
+      return
+    if state_field not in self._snapshots:
+      try:
+        self._snapshots[state_field] = copy.deepcopy(value)
+      except Exception:
+        scope.has_untracked_reads = True
+        return
+    scope.state_reads[state_field] = self._snapshots[state_field]
+
+  def enter(
+    self,
+    fn: Callable[..., Any],
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+  ) -> CachedComponent | None:
+    """Starts a call of a reactive component.
+
+    Returns the cached call if its inputs did not change, in which case the
+    caller should reuse its component tree. Otherwise the caller must render
+    the component and then call `exit`.
+    """
+    scope = self._scopes[-1]
+    key = scope.next_key(fn)
+    cached = scope.previous_children.get(key)
+    if cached is not None and self._is_unchanged(cached, args, kwargs):
+      scope.children[key] = cached
+      for state_field, value in cached.state_reads.items():
+        scope.state_reads.setdefault(state_field, value)
+      return cached
+
+    try:
+      args_copy = copy.deepcopy(args)
+      kwargs_copy = copy.deepcopy(kwargs)
+    except Exception:
+      args_copy = None
+      kwargs_copy = None
+    self._scopes.append(
+      _Scope(
+        cached.children if cached is not None else {},
+        key,
+        args_copy,
+        kwargs_copy,
+      )
+    )
+    return None
+
+  def exit(self, component: ComponentNode | None, return_value: Any) -> None:
+    """Finishes a call started by `enter` that was rendered.
+
+    `component` is the rendered component tree, or None if it cannot be reused
+    by the next render.
+    """
+    scope = self._scopes.pop()
+    parent = self._scopes[-1]
+    for state_field, value in scope.state_reads.items():
+      parent.state_reads.setdefault(state_field, value)
+    if scope.has_untracked_reads:
+      parent.has_untracked_reads = True
+    elif (
+      component is not None
+      and scope.key is not None
+      and scope.args is not None
+      and scope.kwargs is not None
+    ):
+      component.freeze()
+      parent.children[scope.key] = CachedComponent(
+        args=scope.args,
+        kwargs=scope.kwargs,
+        state_reads=scope.state_reads,
+        component=component,
+        return_value=return_value,
+        children=scope.children,
+      )
+
+  def _is_unchanged(
+    self,
+    cached: CachedComponent,
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+  ) -> bool:
+    if len(args) != len(cached.args) or kwargs.keys() != cached.kwargs.keys():
+      return False
+    if not all(
+      _values_equal(arg, cached_arg)
+      for arg, cached_arg in zip(args, cached.args, strict=True)
+    ):
+      return False
+    if not all(
+      _values_equal(value, cached.kwargs[name])
+      for name, value in kwargs.items()
+    ):
+      return False
+    return all(
+      self._is_snapshot_unchanged(state_field, snapshot)
+      for state_field, snapshot in cached.state_reads.items()
+    )
+
+  def _is_snapshot_unchanged(
+    self, state_field: _StateField, snapshot: Any
+  ) -> bool:
+    # Snapshots are kept alive by the cached calls, so their IDs are unique.
+    key = (state_field, id(snapshot))
+    is_unchanged = self._unchanged_snapshots.get(key)
+    if is_unchanged is None:
+      state_cls, name = state_field
+      state = self._states.get(state_cls)
+      is_unchanged = state is not None and _values_equal(
+        getattr(state, name), snapshot
+      )
+      self._unchanged_snapshots[key] = is_unchanged
+      if is_unchanged:
+        self._snapshots.setdefault(state_field, snapshot)
+    return is_unchanged
+
+
+class TrackedState:
+  """Records the fields read from a state object by reactive components.
+
+  Returned by `me.state` while a reactive component is rendered. Reads and
+  writes are forwarded to the state object.
+  """
+
+  __slots__ = ("_state", "_cache")
+
+  def __init__(self, state: object, cache: ComponentCache):
+    object.__setattr__(self, "_state", state)
+    object.__setattr__(self, "_cache", cache)
+
+  # Makes `isinstance` checks behave as for the state object.
+  @property
+  def __class__(self):  # type: ignore
+    return type(self._state)
+
+  def __getattr__(self, name: str) -> Any:
+    value = getattr(self._state, name)
+    if name in self._state.__dataclass_fields__:  # type: ignore
+      self._cache.record_state_read(type(self._state), name, value)
+    return value
+
+  def __setattr__(self, name: str, value: Any) -> None:
+    setattr(self._state, name, value)
+
+  def __eq__(self, other: object) -> bool:
+    self._record_all_reads()
+    if type(other) is TrackedState:
+      other = other._state
+    return self._state == other
+
+  __hash__ = None  # type: ignore
+
+  def __deepcopy__(self, memo: dict[int, Any]) -> Any:
+    # Copied when the state object is passed to a reactive component, which then
+    # depends on all of its fields.
+    self._record_all_reads()
+    return copy.deepcopy(self._state, memo)
+
+  def __repr__(self) -> str:
+    return repr(self._state)
+
+  def _record_all_reads(self) -> None:
+    for field in fields(self._state):  # type: ignore
+      self._cache.record_state_read(
+        type(self._state), field.name, getattr(self._state, field.name)
+      )
+
+
+def _values_equal(value: Any, cached_value: Any) -> bool:
+  if type(value) is TrackedState:
+    # The state object was passed as an argument, so all of its fields are used.
+    value._record_all_reads()
+    value = value._state
+  if value is cached_value:
+    return True
+  # Event handlers are often partials created on each render.
+  if isinstance(value, partial) and isinstance(cached_value, partial):
+    return (
+      value.func is cached_value.func
+      and _values_equal(value.args, cached_value.args)
+      and _values_equal(value.keywords, cached_value.keywords)
+    )
+  try:
+    return type(value) is type(cached_value) and bool(value == cached_value)
+  except Exception:
+    # E.g. DataFrames cannot be compared with `==`.
+    return False
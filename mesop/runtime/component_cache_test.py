@@ -0,0 +1,145 @@
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable
+
+import pytest
+
+from mesop.runtime.component_cache import ComponentCache, TrackedState
+from mesop.runtime.component_tree import ComponentNode
+
+
+@dataclass
+class State:
+  count: int = 0
+  items: list[str] = field(default_factory=list)
+  other: int = 0
+
+
+def render(
+  cache: ComponentCache, fn: Callable[..., Any], *args: Any, **kwargs: Any
+) -> bool:
+  """Renders a reactive component and returns False if it was cached."""
+  if cache.enter(fn, args, kwargs) is not None:
+    return False
+  fn(*args, **kwargs)
+  cache.exit(ComponentNode(), None)
+  return True
+
+
+def test_reuses_component_if_read_fields_are_unchanged():
+  state = State()
+  cache = ComponentCache({State: state})
+
+  def counter():
+    TrackedState(state, cache).count  # noqa: B018
+
+  assert render(cache, counter)
+  cache.start_render()
+  state.other = 1
+  assert not render(cache, counter)
+  cache.start_render()
+  state.count = 1
+  assert render(cache, counter)
+
+
+def test_detects_in_place_changes():
+  state = State()
+  cache = ComponentCache({State: state})
+
+  def item_list():
+    TrackedState(state, cache).items  # noqa: B018
+
+  render(cache, item_list)
+  cache.start_render()
+  state.items.append("a")
+
+  assert render(cache, item_list)
+
+
+def test_rerenders_component_if_arguments_changed():
+  cache = ComponentCache({})
+
+  def label(text: str, on_click: Callable[..., Any]):
+    pass
+
+  def on_click(event: Any, index: int):
+    pass
+
+  render(cache, label, "a", on_click=partial(on_click, index=1))
+  cache.start_render()
+  assert not render(cache, label, "a", on_click=partial(on_click, index=1))
+  cache.start_render()
+  assert render(cache, label, "a", on_click=partial(on_click, index=2))
+  cache.start_render()
+  assert render(cache, label, "b", on_click=partial(on_click, index=2))
+
+
+def test_matches_calls_by_position():
+  cache = ComponentCache({})
+
+  def label(text: str):
+    pass
+
+  render(cache, label, "a")
+  render(cache, label, "b")
+  cache.start_render()
+
+  assert render(cache, label, "b")
+  assert render(cache, label, "a")
+
+
+def test_parent_depends_on_fields_read_by_children():
+  state = State()
+  cache = ComponentCache({State: state})
+  rendered = []
+
+  def child():
+    rendered.append("child")
+    TrackedState(state, cache).count  # noqa: B018
+
+  def parent():
+    rendered.append("parent")
+    render(cache, child)
+
+  render(cache, parent)
+  cache.start_render()
+  render(cache, parent)
+  assert rendered == ["parent", "child"]
+
+  cache.start_render()
+  state.count = 1
+  render(cache, parent)
+  assert rendered == ["parent", "child", "parent", "child"]
+
+
+def test_reuses_unchanged_children_of_rerendered_parent():
+  cache = ComponentCache({})
+  rendered = []
+
+  def child():
+    rendered.append("child")
+
+  def parent(text: str):
+    rendered.append(text)
+    render(cache, child)
+
+  render(cache, parent, "a")
+  cache.start_render()
+  render(cache, parent, "b")
+
+  assert rendered == ["a", "child", "b"]
+
+
+def test_tracked_state_behaves_like_state():
+  state = State()
+  tracked_state = TrackedState(state, ComponentCache({State: state}))
+
+  tracked_state.count = 2
+
+  assert isinstance(tracked_state, State)
+  assert state.count == 2
+  assert tracked_state == State(count=2)
+
+
+if __name__ == "__main__":
+  raise SystemExit(pytest.main([__file__]))
@@ -0,0 +1,137 @@
+"""Compact component tree built while rendering.
+
+Building `pb.Component` messages incrementally is slow in Python: every
+`children.add()`, `MergeFrom` and `CopyFrom` goes through the protobuf runtime,
+and moving a subtree (e.g. into a slot) copies it. Instead, the fields of each
+component are serialized once when it is created, and the tree is kept as plain
+Python nodes. The tree is converted to a `pb.Component` once the render is done,
+by concatenating the serialized nodes and parsing the result.
+"""
+
+import struct
+
+import mesop.protos.ui_pb2 as pb
+from mesop.utils.varint import encode_varint
+
+# Tags (field number and wire type) of the `pb.Component` fields.
+_TYPE_TAG = b"\x0a"
+_CHILDREN_TAG = b"\x12"
+_KEY_TAG = b"\x1a"
+_SOURCE_CODE_LOCATION_TAG = b"\x22"
+_STYLE_TAG = b"\x2a"
+_STYLE_DEBUG_JSON_TAG = b"\x32"
+_SUBTREE_HASH_TAG = b"\x39"
+# Tags of the `pb.Type` fields.
+_TYPE_NAME_TAG = b"\x22"
+_TYPE_VALUE_TAG = b"\x2a"
+_TYPE_DEBUG_JSON_TAG = b"\x32"
+_TYPE_INDEX_TAG = b"\x38"
+# Tag of `pb.Key.key`.
+_KEY_KEY_TAG = b"\x0a"
+
+
+class ComponentNode:
+  __slots__ = ("fields", "children", "subtree_hash", "_serialized")
+
+  def __init__(self, fields: bytes = b""):
+    # Serialized `pb.Component`, without its children and subtree hash.
+    self.fields = fields
+    self.children: list[ComponentNode] = []
+    # Zero if unknown, see `pb.Component.subtree_hash`.
+    self.subtree_hash = 0
+    # Only set once the node is frozen.
+    self._serialized: bytes | None = None
+
+  @classmethod
+  def create(
+    cls,
+    *,
+    component_name: bytes,
+    type_value: bytes,
+    type_index: int = 0,
+    type_debug_json: str | None = None,
+    key: str | None = None,
+    style: bytes | None = None,
+    style_debug_json: str = "",
+    source_code_location: bytes | None = None,
+  ) -> "ComponentNode":
+    """Creates a node without building a `pb.Component`.
+
+    Message fields are passed serialized, e.g. `component_name` is a serialized
+    `pb.ComponentName`. The node is equal to a `pb.Component` with the same
+    fields set, including the `pb.Type` and `pb.Key` fields.
+    """
+    type_parts = [
+      _encode_field(_TYPE_NAME_TAG, component_name),
+      _encode_field(_TYPE_VALUE_TAG, type_value),
+    ]
+    if type_debug_json is not None:
+      type_parts.append(
+        _encode_field(_TYPE_DEBUG_JSON_TAG, type_debug_json.encode())
+      )
+    type_parts.append(_TYPE_INDEX_TAG)
+    # Negative int32 values are encoded as 64-bit two's complement.
+    type_parts.append(encode_varint(type_index & 0xFFFFFFFFFFFFFFFF))
+    parts = [
+      _encode_field(_TYPE_TAG, b"".join(type_parts)),
+      _encode_field(
+        _KEY_TAG,
+        b"" if key is None else _encode_field(_KEY_KEY_TAG, key.encode()),
+      ),
+    ]
+    if source_code_location is not None:
+      parts.append(
+        _encode_field(_SOURCE_CODE_LOCATION_TAG, source_code_location)
+      )
+    if style is not None:
+      parts.append(_encode_field(_STYLE_TAG, style))
+    parts.append(
+      _encode_field(_STYLE_DEBUG_JSON_TAG, style_debug_json.encode())
+    )
+    return cls(b"".join(parts))
+
+  @classmethod
+  def from_proto(cls, component: pb.Component) -> "ComponentNode":
+    fields = pb.Component()
+    fields.CopyFrom(component)
+    fields.ClearField("children")
+    fields.ClearField("subtree_hash")
+    node = cls(fields.SerializeToString())
+    node.children = [cls.from_proto(child) for child in component.children]
+    node.subtree_hash = component.subtree_hash
+    return node
+
+  def freeze(self) -> None:
+    """Marks the subtree as final, e.g. because it is cached across renders.
+
+    Frozen subtrees keep their serialized form, so that it is reused by every
+    tree that includes them. They must not be changed afterwards.
+    """
+    if self._serialized is None:
+      self._serialized = self._serialize()
+
+  def serialize(self) -> bytes:
+    """Returns the subtree serialized as a `pb.Component`."""
+    if self._serialized is not None:
+      return self._serialized
+    return self._serialize()
+
+  def to_proto(self) -> pb.Component:
+    return pb.Component.FromString(self.serialize())
+
+  def _serialize(self) -> bytes:
+    parts = [self.fields]
+    for child in self.children:
+      serialized_child = child.serialize()
+      parts.append(_CHILDREN_TAG)
+      parts.append(encode_varint(len(serialized_child)))
+      parts.append(serialized_child)
+    if self.subtree_hash:
+      parts.append(_SUBTREE_HASH_TAG)
+      parts.append(struct.pack("<q", self.subtree_hash))
+    return b"".join(parts)
+
+
+def _encode_field(tag: bytes, value: bytes) -> bytes:
+  """Encodes a length-delimited field."""
+  return tag + encode_varint(len(value)) + value
@@ -0,0 +1,92 @@
+import pytest
+
+import mesop.protos.ui_pb2 as pb
+from mesop.runtime.component_tree import ComponentNode
+
+
+def create_component(key: str) -> ComponentNode:
+  return ComponentNode.create(
+    component_name=pb.ComponentName(fn_name="text").SerializeToString(),
+    type_value=pb.Key(key=key).SerializeToString(),
+    key=key,
+  )
+
+
+def test_create_matches_proto():
+  node = ComponentNode.create(
+    component_name=pb.ComponentName(
+      core_module=True, fn_name="box"
+    ).SerializeToString(),
+    type_value=b"value",
+    type_index=-1,
+    type_debug_json="{}",
+    style=pb.Style(color="red").SerializeToString(),
+    style_debug_json='{"color": "red"}',
+    source_code_location=pb.SourceCodeLocation(
+      module="app", line=1
+    ).SerializeToString(),
+  )
+
+  assert node.to_proto() == pb.Component(
+    key=pb.Key(),
+    type=pb.Type(
+      name=pb.ComponentName(core_module=True, fn_name="box"),
+      value=b"value",
+      debug_json="{}",
+      type_index=-1,
+    ),
+    style=pb.Style(color="red"),
+    style_debug_json='{"color": "red"}',
+    source_code_location=pb.SourceCodeLocation(module="app", line=1),
+  )
+
+
+def test_create_without_optional_fields_matches_proto():
+  node = ComponentNode.create(
+    component_name=pb.ComponentName(fn_name="text").SerializeToString(),
+    type_value=b"",
+    key="a",
+  )
+
+  component = node.to_proto()
+  assert component == pb.Component(
+    key=pb.Key(key="a"),
+    type=pb.Type(
+      name=pb.ComponentName(fn_name="text"), value=b"", type_index=0
+    ),
+    style_debug_json="",
+  )
+  assert not component.HasField("style")
+  assert not component.type.HasField("debug_json")
+
+
+def test_to_proto_includes_children_and_subtree_hashes():
+  parent = create_component("parent")
+  parent.subtree_hash = -2
+  parent.children = [create_component("a"), create_component("b")]
+  parent.children[0].subtree_hash = 1
+  parent.children[0].children = [create_component("c")]
+
+  component = parent.to_proto()
+
+  assert component.subtree_hash == -2
+  assert [child.key.key for child in component.children] == ["a", "b"]
+  assert component.children[0].subtree_hash == 1
+  assert component.children[0].children[0].key.key == "c"
+  assert ComponentNode.from_proto(component).to_proto() == component
+
+
+def test_frozen_node_keeps_serialized_form():
+  node = create_component("a")
+  node.freeze()
+  serialized = node.serialize()
+
+  parent = create_component("parent")
+  parent.children = [node, node]
+
+  assert node.serialize() is serialized
+  assert parent.to_proto().children[1] == node.to_proto()
+
+
+if __name__ == "__main__":
+  raise SystemExit(pytest.main([__file__]))
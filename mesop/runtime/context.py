@@ -1,16 +1,25 @@
 import copy
 import logging
 import threading
-import types
 import urllib.parse as urlparse
-from collections.abc import Callable, Generator, Sequence
+from collections.abc import (
+  AsyncGenerator,
+  Callable,
+  Generator,
+  Iterator,
+  Sequence,
+)
+from contextlib import contextmanager
 from dataclasses import dataclass
 from typing import Any, TypeVar, cast
 
 import mesop.protos.ui_pb2 as pb
 from mesop.dataclass_utils import (
   diff_state,
+  diff_tracked_state,
+  has_mutation_tracking,
   serialize_dataclass,
+  start_tracking,
   update_dataclass_from_json,
 )
 from mesop.env.env import MESOP_WEBSOCKETS_ENABLED
@@ -18,8 +27,16 @@ from mesop.exceptions import (
   MesopDeveloperException,
   MesopException,
 )
+from mesop.runtime.component_cache import (
+  ComponentCache,
+  Registrations,
+  TrackedState,
+)
+from mesop.runtime.component_tree import ComponentNode
+from mesop.runtime.style_table import StyleTable
+from mesop.server.config import app_config
 from mesop.server.state_session import state_session
-from mesop.utils.async_utils import run_async_generator, run_coroutine
+from mesop.utils.async_utils import iterate_handler_result, run_sync
 
 T = TypeVar("T")
 
@@ -64,7 +81,7 @@ class NodeSlot:
   """
 
   name: str
-  parent_node: pb.Component
+  parent_node: ComponentNode
   insertion_index: int
 
 
@@ -77,19 +94,36 @@ class NodeTreeState:
   """Keeps track of the node tree state during traversal."""
 
   def __init__(self):
-    self._current_node = pb.Component()
-    self._previous_node: pb.Component | None = None
+    self._current_node = ComponentNode()
+    self._previous_node: ComponentNode | None = None
+    # The last node converted by `current_component` or `previous_node`, which is
+    # only converted once since the tree does not change after it is rendered.
+    self._converted_node: tuple[ComponentNode, pb.Component] | None = None
     self._node_slots: list[NodeSlot | NullSlot] = []
 
-  def current_node(self) -> pb.Component:
+  def current_node(self) -> ComponentNode:
     return self._current_node
 
+  def current_component(self) -> pb.Component:
+    """Returns the current node converted to a `pb.Component`.
+
+    Must only be called once the current node's subtree has been rendered.
+    """
+    return self._to_proto(self._current_node)
+
   def previous_node(self) -> pb.Component | None:
     """Used to track the last/previous state of the component tree before the UI updated.
 
     This is used for performing component tree diffs.
     """
-    return self._previous_node
+    if self._previous_node is None:
+      return None
+    return self._to_proto(self._previous_node)
+
+  def _to_proto(self, node: ComponentNode) -> pb.Component:
+    if self._converted_node is None or self._converted_node[0] is not node:
+      self._converted_node = (node, node.to_proto())
+    return self._converted_node[1]
 
   def save_current_node_as_slot(self, name: str = "") -> None:
     self._node_slots.append(
@@ -104,14 +138,11 @@ class NodeTreeState:
     self._node_slots.append(NullSlot())
 
   def clear_node_slots_to_first_null_slot(self) -> None:
-    null_slot_found = False
-    node_slots = []
-    for node_slot in reversed(self._node_slots):
-      if null_slot_found:
-        node_slots.append(node_slot)
-      if isinstance(node_slot, NullSlot):
-        null_slot_found = True
-    self._node_slots = list(reversed(node_slots))
+    # Only pops the slots of the innermost content component, so that nested
+    # content components do not each scan the slots of their ancestors.
+    while self._node_slots:
+      if isinstance(self._node_slots.pop(), NullSlot):
+        break
 
   def node_slots(self) -> list[NodeSlot]:
     node_slots = []
@@ -121,14 +152,14 @@ class NodeTreeState:
       node_slots.append(node_slot)
     return list(reversed(node_slots))
 
-  def set_current_node(self, node: pb.Component) -> None:
+  def set_current_node(self, node: ComponentNode) -> None:
     self._current_node = node
 
   def set_previous_node_from_current_node(self) -> None:
     self._previous_node = self._current_node
 
   def reset_current_node(self) -> None:
-    self._current_node = pb.Component()
+    self._current_node = ComponentNode()
 
   def reset_previous_node(self) -> None:
     self._previous_node = None
@@ -142,18 +173,27 @@ class Context:
     debug_mode: bool = False,
   ) -> None:
     self._node_tree_state = NodeTreeState()
+    # Only increases, so that callers can tell if a slot was saved in between.
+    self._saved_slot_count = 0
     self._states: dict[type[Any], object] = states
     self._debug_mode = debug_mode
     # Previous states is used for performing state diffs.
-    self._previous_states: dict[type[Any], object] = copy.deepcopy(states)
+    self._previous_states = _snapshot_states(states)
+    self._component_cache = ComponentCache(states)
+    # One per pure component that is being rendered (innermost last).
+    self._pure_component_registrations: list[Registrations] = []
     self._handlers: dict[str, Handler] = {}
     self._commands: list[pb.Command] = []
     self._has_rendered: bool = False
+    # Whether the session's state could not be restored (see `Runtime`), so the
+    # client shows state that the server no longer has.
+    self._has_lost_state: bool = False
     self._viewport_size: pb.ViewportSize | None = None
     self._theme_settings: pb.ThemeSettings | None = None
     self._js_modules: set[str] = set()
     self._query_params: dict[str, list[str]] = {}
     self._pending_cookies: list[PendingCookie] = []
+    self._style_table = StyleTable()
     if MESOP_WEBSOCKETS_ENABLED:
       self._lock = threading.Lock()
 
@@ -173,6 +213,8 @@ class Context:
 
   def register_js_module(self, js_module_path: str) -> None:
     self._js_modules.add(js_module_path)
+    for registrations in self._pure_component_registrations:
+      registrations.js_modules.add(js_module_path)
 
   def js_modules(self) -> set[str]:
     return self._js_modules
@@ -186,6 +228,12 @@ class Context:
   def set_has_rendered(self, has_rendered: bool) -> None:
     self._has_rendered = has_rendered
 
+  def has_lost_state(self) -> bool:
+    return self._has_lost_state
+
+  def set_has_lost_state(self, has_lost_state: bool) -> None:
+    self._has_lost_state = has_lost_state
+
   def query_params(self) -> dict[str, list[str]]:
     return self._query_params
 
@@ -378,6 +426,28 @@ class Context:
 
   def register_event_handler(self, fn_id: str, handler: Handler) -> None:
     self._handlers[fn_id] = handler
+    for registrations in self._pure_component_registrations:
+      registrations.handlers[fn_id] = handler
+
+  @contextmanager
+  def record_pure_component_registrations(self) -> Iterator[Registrations]:
+    """Records the event handlers and JS modules registered by a pure component.
+
+    They are registered again when the component's cached output is reused, which
+    may happen in another context.
+    """
+    registrations = Registrations()
+    self._pure_component_registrations.append(registrations)
+    try:
+      yield registrations
+    finally:
+      self._pure_component_registrations.pop()
+
+  def replay_registrations(self, registrations: Registrations) -> None:
+    for fn_id, handler in registrations.handlers.items():
+      self.register_event_handler(fn_id, handler)
+    for js_module_path in registrations.js_modules:
+      self.register_js_module(js_module_path)
 
   def get_node_tree_state(self) -> NodeTreeState:
     return self._node_tree_state
@@ -385,19 +455,27 @@ class Context:
   def set_node_tree_state(self, node_tree_state: NodeTreeState) -> None:
     self._node_tree_state = node_tree_state
 
-  def current_node(self) -> pb.Component:
+  def current_node(self) -> ComponentNode:
     return self._node_tree_state.current_node()
 
+  def current_component(self) -> pb.Component:
+    return self._node_tree_state.current_component()
+
   def previous_node(self) -> pb.Component | None:
     return self._node_tree_state.previous_node()
 
   def save_current_node_as_slot(self, name: str = "") -> None:
     self._node_tree_state.save_current_node_as_slot(name)
+    self._saved_slot_count += 1
+
+  def saved_slot_count(self) -> int:
+    """Number of slots saved by this context, including detached node trees."""
+    return self._saved_slot_count
 
   def clear_node_slots_to_first_null_slot(self) -> None:
     self._node_tree_state.clear_node_slots_to_first_null_slot()
 
-  def set_current_node(self, node: pb.Component) -> None:
+  def set_current_node(self, node: ComponentNode) -> None:
     self._node_tree_state.set_current_node(node)
 
   def set_previous_node_from_current_node(self) -> None:
@@ -416,8 +494,22 @@ class Context:
 
 Did you forget to decorate your state class `{state.__name__}` with @stateclass?"""
       )
+    if self._pure_component_registrations:
+      raise MesopDeveloperException(
+        f"""Tried to get the state instance for `{state.__name__}` in a pure component.
+
+The output of pure components is shared across sessions, so it must only depend on the component's arguments. Pass the state values as arguments, or use `@me.component(reactive=True)` instead."""
+      )
+    if self._component_cache.is_tracking():
+      return cast(T, TrackedState(self._states[state], self._component_cache))
     return cast(T, self._states[state])
 
+  def component_cache(self) -> ComponentCache:
+    return self._component_cache
+
+  def style_table(self) -> StyleTable:
+    return self._style_table
+
   def serialize_state(self) -> pb.States:
     states = pb.States()
     for state in self._states.values():
@@ -426,10 +518,19 @@ Did you forget to decorate your state class `{state.__name__}` with @stateclass?
 
   def diff_state(self) -> pb.States:
     states = pb.States()
-    for state, previous_state in zip(
-      self._states.values(), self._previous_states.values(), strict=False
-    ):
-      states.states.append(pb.State(data=diff_state(previous_state, state)))
+    for state_cls, state in self._states.items():
+      previous_state = self._previous_states.get(state_cls)
+      if previous_state is None:
+        data = diff_tracked_state(state)
+      else:
+        # With a state session, the client does not send its state, so the
+        # patches of DataFrames would pile up in it.
+        data = diff_state(
+          previous_state,
+          state,
+          data_frame_patches=not app_config.state_session_enabled,
+        )
+      states.states.append(pb.State(data=data))
     return states
 
   def restore_state_from_session(self, state_token: str):
@@ -438,7 +539,7 @@ Did you forget to decorate your state class `{state.__name__}` with @stateclass?
     If the `state_token` is not found in the cache, an exception will be raised.
     """
     state_session.restore(state_token, self._states)
-    self._previous_states = copy.deepcopy(self._states)
+    self._previous_states = _snapshot_states(self._states)
 
   def save_state_to_session(self, state_token: str):
     """Caches the current state into the state session."""
@@ -449,18 +550,19 @@ Did you forget to decorate your state class `{state.__name__}` with @stateclass?
     state_session.clear_stale_sessions()
 
   def update_state(self, states: pb.States) -> None:
-    for state, previous_state, proto_state in zip(
-      self._states.values(),
-      self._previous_states.values(),
-      states.states,
-      strict=False,
+    for (state_cls, state), proto_state in zip(
+      self._states.items(), states.states, strict=False
     ):
       update_dataclass_from_json(state, proto_state.data)
-      update_dataclass_from_json(previous_state, proto_state.data)
+      previous_state = self._previous_states.get(state_cls)
+      if previous_state is None:
+        start_tracking(state)
+      else:
+        update_dataclass_from_json(previous_state, proto_state.data)
 
-  def run_event_handler(
+  async def run_event_handler(
     self, event: pb.UserEvent
-  ) -> Generator[None, None, None]:
+  ) -> AsyncGenerator[None, None]:
     if (
       event.HasField("navigation")
       or event.HasField("hot_reload")
@@ -473,14 +575,10 @@ Did you forget to decorate your state class `{state.__name__}` with @stateclass?
     payload = cast(Any, event)
     handler = self._handlers.get(event.handler_id)
     if handler:
-      result = handler(payload)
+      result = await run_sync(handler, payload)
       if result is not None:
-        if isinstance(result, types.AsyncGeneratorType):
-          yield from run_async_generator(result)
-        elif isinstance(result, types.CoroutineType):
-          yield run_coroutine(result)
-        else:
-          yield from result
+        async for _ in iterate_handler_result(result):
+          yield
       else:
         yield
     else:
@@ -490,3 +588,25 @@ Did you forget to decorate your state class `{state.__name__}` with @stateclass?
       if self._debug_mode:
         raise MesopDeveloperException(error_message)
       logger.warning(error_message)
+
+
+def delete_state_from_session(state_token: str) -> None:
+  """Deletes the state cached in the state session, if it will not be restored."""
+  state_session.delete(state_token)
+
+
+def _snapshot_states(
+  states: dict[type[Any], object],
+) -> dict[type[Any], object]:
+  """Returns copies of the states to diff against after an event.
+
+  States whose classes track their mutations are not copied. Their tracking is
+  started instead.
+  """
+  previous_states: dict[type[Any], object] = {}
+  for state_cls, state in states.items():
+    if has_mutation_tracking(state_cls):
+      start_tracking(state)
+    else:
+      previous_states[state_cls] = copy.deepcopy(state)
+  return previous_states
@@ -1,10 +1,15 @@
 import pytest
 
 import mesop.protos.ui_pb2 as pb
+from mesop.runtime.component_tree import ComponentNode
 from mesop.runtime.context import NodeTreeState
 
 
-def create_default_single_component():
+def create_default_single_component() -> ComponentNode:
+  return ComponentNode.from_proto(create_default_single_component_proto())
+
+
+def create_default_single_component_proto() -> pb.Component:
   return pb.Component(
     key=pb.Key(key="key"),
     style=pb.Style(color="red", columns="1"),
@@ -32,7 +37,9 @@ def test_set_previous_node_from_current_node():
 
   node_tree_state.set_previous_node_from_current_node()
 
-  assert node_tree_state.previous_node() == current_component
+  assert (
+    node_tree_state.previous_node() == create_default_single_component_proto()
+  )
 
 
 def test_reset_current_node():
@@ -43,13 +50,13 @@ def test_reset_current_node():
 
   node_tree_state.reset_current_node()
 
-  assert node_tree_state.current_node() == pb.Component()
+  assert node_tree_state.current_component() == pb.Component()
 
 
 def test_reset_previous_node():
   node_tree_state = NodeTreeState()
   node_tree_state.set_previous_node_from_current_node()
-  assert node_tree_state.previous_node() == node_tree_state.current_node()
+  assert node_tree_state.previous_node() == node_tree_state.current_component()
 
   node_tree_state.reset_previous_node()
 
@@ -70,7 +77,7 @@ def test_save_current_node_as_slot():
   node_slots = node_tree_state.node_slots()
   assert len(node_slots) == 1
   assert node_slots[0].name == ""
-  assert node_slots[0].parent_node == c1
+  assert node_slots[0].parent_node is c1
   assert node_slots[0].insertion_index == 2
 
 
@@ -84,7 +91,7 @@ def test_save_current_node_as_slot_with_name():
   node_slots = node_tree_state.node_slots()
   assert len(node_slots) == 1
   assert node_slots[0].name == "test"
-  assert node_slots[0].parent_node == current_node
+  assert node_slots[0].parent_node is current_node
   assert node_slots[0].insertion_index == 0
 
 
@@ -92,7 +99,6 @@ def test_multiple_save_current_node_as_slot():
   node_tree_state = NodeTreeState()
   c1 = create_default_single_component()
   c2 = create_default_single_component()
-  c2.style.CopyFrom(pb.Style(color="blue"))
   node_tree_state.set_current_node(c1)
   node_tree_state.save_current_node_as_slot()
   node_tree_state.set_current_node(c2)
@@ -100,8 +106,8 @@ def test_multiple_save_current_node_as_slot():
 
   node_slots = node_tree_state.node_slots()
   assert len(node_slots) == 2
-  assert node_slots[0].parent_node == c1
-  assert node_slots[1].parent_node == c2
+  assert node_slots[0].parent_node is c1
+  assert node_slots[1].parent_node is c2
 
 
 def test_clear_node_slots_to_first_null_slot():
@@ -111,17 +117,15 @@ def test_clear_node_slots_to_first_null_slot():
   node_tree_state.save_current_node_as_slot()
   node_tree_state.add_null_slot()
   c2 = create_default_single_component()
-  c2.style.CopyFrom(pb.Style(color="blue"))
   node_tree_state.set_current_node(c2)
   node_tree_state.save_current_node_as_slot()
   c3 = create_default_single_component()
   node_tree_state.set_current_node(c3)
-  c2.style.CopyFrom(pb.Style(color="green"))
   node_tree_state.save_current_node_as_slot()
 
   node_tree_state.clear_node_slots_to_first_null_slot()
   assert len(node_tree_state.node_slots()) == 1
-  assert node_tree_state.node_slots()[0].parent_node == c1
+  assert node_tree_state.node_slots()[0].parent_node is c1
 
   node_tree_state.clear_node_slots_to_first_null_slot()
   assert len(node_tree_state.node_slots()) == 0
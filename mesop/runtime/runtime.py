@@ -1,4 +1,9 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
 from collections.abc import AsyncGenerator, Coroutine
+from contextlib import asynccontextmanager, contextmanager
 from copy import deepcopy
 from dataclasses import dataclass
 from typing import Any, Callable, Generator, Type, TypeVar, cast
@@ -6,24 +11,50 @@ from typing import Any, Callable, Generator, Type, TypeVar, cast
 from flask import g, request
 
 import mesop.protos.ui_pb2 as pb
-from mesop.env.env import MESOP_WEBSOCKETS_ENABLED
+from mesop.env.env import (
+  MESOP_WEBSOCKET_CONTEXT_IDLE_TIMEOUT_SECONDS,
+  MESOP_WEBSOCKET_MAX_CONTEXTS,
+  MESOP_WEBSOCKETS_ENABLED,
+)
 from mesop.events import LoadEvent, MesopEvent
 from mesop.exceptions import MesopDeveloperException, MesopUserException
 from mesop.key import Key
-from mesop.runtime.context import Context
+from mesop.runtime.component_cache import PureComponentOutput
+from mesop.runtime.context import Context, delete_state_from_session
 from mesop.security.security_policy import SecurityPolicy
+from mesop.server.state_session import generate_evicted_context_token
+from mesop.utils.async_utils import run_sync
 from mesop.utils.backoff import exponential_backoff
 from mesop.warn import warn
 
+logger = logging.getLogger(__name__)
+
 Handler = Callable[[Any], None | Generator[None, None, None]]
 newline = "\n"
 
+# Upper bound on the number of handlers kept in the process-wide handler registry.
+# Handler IDs for `functools.partial` handlers include their arguments, so the number
+# of distinct IDs can grow with the data being rendered.
+_EVENT_HANDLER_REGISTRY_MAX_SIZE = 10_000
+
+# Upper bound on the number of calls of pure components whose output is cached.
+_PURE_COMPONENT_CACHE_MAX_SIZE = 1_000
+
 
 @dataclass
 class EmptyState:
   pass
 
 
+@dataclass
+class _WebSocketContext:
+  context: Context
+  last_used: float
+  # Number of events currently using the context. Contexts that are in use are never
+  # evicted.
+  users: int = 0
+
+
 OnLoadHandler = Callable[
   [LoadEvent],
   None
@@ -61,25 +92,195 @@ class Runtime:
     self._state_classes: list[type[Any]] = []
     self._loading_errors: list[pb.ServerError] = []
     self._has_served_traffic = False
-    self._contexts = {}
+    # Contexts for WebSocket sessions, ordered from least to most recently used.
+    self._contexts: OrderedDict[str, _WebSocketContext] = OrderedDict()
+    self._contexts_lock = threading.Lock()
+    # Tokens of the states of evicted contexts, which are saved to the state session
+    # backend, by session.
+    self._evicted_context_tokens: dict[str, str] = {}
+    # Events that are set once the evicted contexts have been saved, so that their
+    # sessions do not restore their state before it is saved.
+    self._spilling_contexts: dict[str, threading.Event] = {}
+    # Process-wide registry of event handlers that do not depend on the context they
+    # were registered in. This allows user events to be dispatched without re-running
+    # the page function to discover the handler.
+    self._event_handlers: OrderedDict[str, Handler] = OrderedDict()
+    self._event_handlers_lock = threading.Lock()
+    # Process-wide cache of the output of pure components, keyed by the component
+    # function and its arguments. Since a new runtime is created on hot reload, the
+    # output of stale component functions is not reused.
+    self._pure_components: OrderedDict[Any, PureComponentOutput] = OrderedDict()
+    self._pure_components_lock = threading.Lock()
 
   def context(self) -> Context:
     if MESOP_WEBSOCKETS_ENABLED and hasattr(request, "websocket_session_id"):
       websocket_session_id = request.websocket_session_id  # type: ignore
-      if websocket_session_id not in self._contexts:
-        self._contexts[websocket_session_id] = self.create_context()
-      return self._contexts[websocket_session_id]
+      # Fast path since this is called very frequently (e.g. for each component).
+      entry = self._contexts.get(websocket_session_id)
+      if entry is not None:
+        return entry.context
+      return self._get_or_create_websocket_context(websocket_session_id)
     if "_mesop_context" not in g:
       g._mesop_context = self.create_context()
     return g._mesop_context
 
+  @contextmanager
+  def websocket_context_in_use(self, websocket_session_id: str):
+    """Marks the session's context as in use while processing an event.
+
+    Contexts that are in use are not evicted. This is also when idle or least recently
+    used contexts of other sessions are evicted.
+    """
+    self._get_or_create_websocket_context(websocket_session_id, use=True)
+    try:
+      yield
+    finally:
+      self._release_websocket_context(websocket_session_id)
+
+  @asynccontextmanager
+  async def websocket_context_in_use_async(self, websocket_session_id: str):
+    """Like `websocket_context_in_use`, but saves and restores the state of evicted
+    contexts with `run_sync`, so that state session backends doing network calls do
+    not block the event loop."""
+    await run_sync(self._use_websocket_context, websocket_session_id)
+    try:
+      yield
+    finally:
+      self._release_websocket_context(websocket_session_id)
+
+  def _use_websocket_context(self, websocket_session_id: str) -> Context:
+    return self._get_or_create_websocket_context(websocket_session_id, use=True)
+
+  def _release_websocket_context(self, websocket_session_id: str) -> None:
+    with self._contexts_lock:
+      entry = self._contexts.get(websocket_session_id)
+      if entry is not None:
+        entry.users -= 1
+        entry.last_used = time.monotonic()
+        self._contexts.move_to_end(websocket_session_id)
+
+  def _get_or_create_websocket_context(
+    self, websocket_session_id: str, *, use: bool = False
+  ) -> Context:
+    now = time.monotonic()
+    with self._contexts_lock:
+      entry = self._contexts.get(websocket_session_id)
+      state_token: str | None = None
+      spilling: threading.Event | None = None
+      if entry is None:
+        entry = _WebSocketContext(context=self.create_context(), last_used=now)
+        self._contexts[websocket_session_id] = entry
+        state_token = self._evicted_context_tokens.pop(
+          websocket_session_id, None
+        )
+        spilling = self._spilling_contexts.get(websocket_session_id)
+      if use:
+        entry.users += 1
+      entry.last_used = now
+      self._contexts.move_to_end(websocket_session_id)
+      evicted_contexts = self._evict_contexts_locked(now)
+
+    # The evicted contexts are saved before waiting for other sessions' contexts to
+    # be saved, so that threads cannot wait for each other.
+    for (
+      evicted_id,
+      evicted_context,
+      evicted_state_token,
+      evicted_spilling,
+    ) in evicted_contexts:
+      try:
+        evicted_context.save_state_to_session(evicted_state_token)
+      except Exception as e:
+        logger.warning(
+          "Could not save state for evicted WebSocket session: %s", e
+        )
+      finally:
+        with self._contexts_lock:
+          if self._spilling_contexts.get(evicted_id) is evicted_spilling:
+            del self._spilling_contexts[evicted_id]
+        evicted_spilling.set()
+    if state_token is not None:
+      if spilling is not None:
+        spilling.wait()
+      try:
+        entry.context.restore_state_from_session(state_token)
+      except Exception as e:
+        logger.warning(
+          "Could not restore state for evicted WebSocket session, so its page"
+          " is reset: %s",
+          e,
+        )
+        # The states may have been partly restored.
+        entry.context = self.create_context()
+        entry.context.set_has_lost_state(True)
+    return entry.context
+
+  def _evict_contexts_locked(
+    self, now: float
+  ) -> list[tuple[str, Context, str, threading.Event]]:
+    """Evicts idle contexts and, if over the limit, the least recently used contexts.
+
+    Returns the evicted contexts to save, with the tokens to save them with and the
+    events to set once they are saved.
+    """
+    if (
+      not MESOP_WEBSOCKET_CONTEXT_IDLE_TIMEOUT_SECONDS
+      and not MESOP_WEBSOCKET_MAX_CONTEXTS
+    ):
+      return []
+    evicted_ids: list[str] = []
+    num_over_limit = (
+      len(self._contexts) - MESOP_WEBSOCKET_MAX_CONTEXTS
+      if MESOP_WEBSOCKET_MAX_CONTEXTS
+      else 0
+    )
+    for websocket_session_id, entry in self._contexts.items():
+      is_idle = bool(MESOP_WEBSOCKET_CONTEXT_IDLE_TIMEOUT_SECONDS) and (
+        now - entry.last_used >= MESOP_WEBSOCKET_CONTEXT_IDLE_TIMEOUT_SECONDS
+      )
+      # Contexts are ordered by last use, so the remaining contexts are not idle.
+      if not is_idle and len(evicted_ids) >= num_over_limit:
+        break
+      if not entry.users:
+        evicted_ids.append(websocket_session_id)
+
+    evicted_contexts: list[tuple[str, Context, str, threading.Event]] = []
+    for websocket_session_id in evicted_ids:
+      entry = self._contexts.pop(websocket_session_id)
+      state_token = generate_evicted_context_token()
+      self._evicted_context_tokens[websocket_session_id] = state_token
+      spilling = threading.Event()
+      self._spilling_contexts[websocket_session_id] = spilling
+      evicted_contexts.append(
+        (websocket_session_id, entry.context, state_token, spilling)
+      )
+    return evicted_contexts
+
   def delete_context(self, websocket_session_id: str) -> None:
-    if websocket_session_id in self._contexts:
-      del self._contexts[websocket_session_id]
-    else:
+    """Deletes the session's context, or the saved state of its evicted context.
+
+    Deleting the saved state may block on the state session backend.
+    """
+    with self._contexts_lock:
+      if websocket_session_id in self._contexts:
+        del self._contexts[websocket_session_id]
+        return
+      state_token = self._evicted_context_tokens.pop(websocket_session_id, None)
+      spilling = self._spilling_contexts.get(websocket_session_id)
+    if state_token is None:
       warn(
         f"Tried to delete context with websocket_session_id={websocket_session_id} that doesn't exist."
       )
+      return
+    # Otherwise the state could be saved after it is deleted.
+    if spilling is not None:
+      spilling.wait()
+    try:
+      delete_state_from_session(state_token)
+    except Exception as e:
+      logger.warning(
+        "Could not delete state for evicted WebSocket session: %s", e
+      )
 
   def create_context(self) -> Context:
     # If running in prod mode, *always* enable the has served traffic safety check.
@@ -131,6 +332,7 @@ Try one of the following paths:
 {newline.join([f"[{p}]({p})" for p in paths])}
                                      """
       )
+    self.context().component_cache().start_render()
     self._path_to_page_config[path].page_fn()
 
   def register_page(self, *, path: str, page_config: PageConfig) -> None:
@@ -159,6 +361,42 @@ Try one of the following paths:
   def get_loading_errors(self) -> list[pb.ServerError]:
     return self._loading_errors
 
+  def register_event_handler(self, fn_id: str, handler: Handler) -> None:
+    """Registers an event handler that is safe to share across contexts.
+
+    The least recently used handlers are evicted once the registry is full.
+    """
+    with self._event_handlers_lock:
+      self._event_handlers[fn_id] = handler
+      self._event_handlers.move_to_end(fn_id)
+      if len(self._event_handlers) > _EVENT_HANDLER_REGISTRY_MAX_SIZE:
+        self._event_handlers.popitem(last=False)
+
+  def get_event_handler(self, fn_id: str) -> Handler | None:
+    with self._event_handlers_lock:
+      handler = self._event_handlers.get(fn_id)
+      if handler is not None:
+        self._event_handlers.move_to_end(fn_id)
+      return handler
+
+  def cache_pure_component(self, key: Any, output: PureComponentOutput) -> None:
+    """Caches the output of a pure component call.
+
+    The least recently used outputs are evicted once the cache is full.
+    """
+    with self._pure_components_lock:
+      self._pure_components[key] = output
+      self._pure_components.move_to_end(key)
+      if len(self._pure_components) > _PURE_COMPONENT_CACHE_MAX_SIZE:
+        self._pure_components.popitem(last=False)
+
+  def get_pure_component(self, key: Any) -> PureComponentOutput | None:
+    with self._pure_components_lock:
+      output = self._pure_components.get(key)
+      if output is not None:
+        self._pure_components.move_to_end(key)
+      return output
+
   def register_native_component_fn(self, component_fn: Callable[..., Any]):
     self.component_fns.add(component_fn)
 
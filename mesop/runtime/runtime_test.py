@@ -0,0 +1,286 @@
+import asyncio
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+from flask import Flask, request
+
+import mesop.protos.ui_pb2 as pb
+from mesop.dataclass_utils import (
+  enable_mutation_tracking,
+  serialize_dataclass,
+)
+from mesop.runtime.component_cache import PureComponentOutput, Registrations
+from mesop.runtime.runtime import Runtime, reset_runtime, runtime
+from mesop.server.config import Config
+from mesop.server.state_session import MemoryStateSessionBackend
+from mesop.utils.async_utils import offload_sync_calls
+
+
+@dataclass
+class State:
+  value: str = ""
+
+
+@dataclass
+class MutationTrackingState:
+  values: list[int] = field(default_factory=list)
+
+
+enable_mutation_tracking(MutationTrackingState)
+
+
+@dataclass
+class DataFrameState:
+  data: pd.DataFrame | None = None
+
+
+@pytest.fixture
+def app():
+  app = Flask(__name__)
+  with patch("mesop.runtime.runtime.MESOP_WEBSOCKETS_ENABLED", True):
+    yield app
+
+
+def create_runtime() -> Runtime:
+  runtime = Runtime()
+  runtime.register_state_class(State)
+  return runtime
+
+
+def get_context(app: Flask, runtime: Runtime, websocket_session_id: str):
+  with app.test_request_context():
+    request.websocket_session_id = websocket_session_id  # type: ignore
+    with runtime.websocket_context_in_use(websocket_session_id):
+      return runtime.context()
+
+
+def test_evicts_least_recently_used_contexts(app: Flask):
+  runtime = create_runtime()
+  with patch("mesop.runtime.runtime.MESOP_WEBSOCKET_MAX_CONTEXTS", 2):
+    context_a = get_context(app, runtime, "a")
+    get_context(app, runtime, "b")
+    assert get_context(app, runtime, "a") is context_a
+    get_context(app, runtime, "c")
+
+  assert list(runtime._contexts) == ["a", "c"]
+
+
+def test_does_not_evict_contexts_in_use(app: Flask):
+  runtime = create_runtime()
+  with (
+    patch("mesop.runtime.runtime.MESOP_WEBSOCKET_MAX_CONTEXTS", 1),
+    app.test_request_context(),
+    runtime.websocket_context_in_use("a"),
+  ):
+    get_context(app, runtime, "b")
+
+    assert list(runtime._contexts) == ["a", "b"]
+
+
+def test_evicts_idle_contexts(app: Flask):
+  runtime = create_runtime()
+  with (
+    patch(
+      "mesop.runtime.runtime.MESOP_WEBSOCKET_CONTEXT_IDLE_TIMEOUT_SECONDS", 60
+    ),
+    patch("mesop.runtime.runtime.time.monotonic") as mock_monotonic,
+  ):
+    mock_monotonic.return_value = 0
+    get_context(app, runtime, "a")
+    mock_monotonic.return_value = 30
+    get_context(app, runtime, "b")
+    mock_monotonic.return_value = 70
+    get_context(app, runtime, "c")
+
+  assert list(runtime._contexts) == ["b", "c"]
+
+
+def test_restores_evicted_context_from_state_session(app: Flask):
+  runtime = create_runtime()
+  with (
+    patch("mesop.runtime.runtime.MESOP_WEBSOCKET_MAX_CONTEXTS", 1),
+    patch("mesop.runtime.context.state_session", MemoryStateSessionBackend()),
+  ):
+    get_context(app, runtime, "a").state(State).value = "a"
+    get_context(app, runtime, "b")
+    assert "a" not in runtime._contexts
+
+    assert get_context(app, runtime, "a").state(State).value == "a"
+
+
+class SlowStateSessionBackend(MemoryStateSessionBackend):
+  def __init__(self):
+    super().__init__()
+    self.saving = threading.Event()
+
+  def save(self, token: str, states: Any):
+    self.saving.set()
+    time.sleep(0.2)
+    super().save(token, states)
+
+
+def test_restore_waits_for_evicted_context_to_be_saved(app: Flask):
+  runtime = create_runtime()
+  state_session = SlowStateSessionBackend()
+  with (
+    patch("mesop.runtime.runtime.MESOP_WEBSOCKET_MAX_CONTEXTS", 1),
+    patch("mesop.runtime.context.state_session", state_session),
+  ):
+    get_context(app, runtime, "a").state(State).value = "a"
+    evicting_thread = threading.Thread(
+      target=get_context, args=(app, runtime, "b")
+    )
+    evicting_thread.start()
+    state_session.saving.wait()
+
+    assert get_context(app, runtime, "a").state(State).value == "a"
+    evicting_thread.join()
+
+
+def test_websocket_context_in_use_async_restores_evicted_context(app: Flask):
+  runtime = create_runtime()
+
+  async def get_context_async(websocket_session_id: str):
+    with app.test_request_context(), offload_sync_calls():
+      request.websocket_session_id = websocket_session_id  # type: ignore
+      async with runtime.websocket_context_in_use_async(websocket_session_id):
+        return runtime.context()
+
+  with (
+    patch("mesop.runtime.runtime.MESOP_WEBSOCKET_MAX_CONTEXTS", 1),
+    patch("mesop.runtime.context.state_session", MemoryStateSessionBackend()),
+  ):
+    asyncio.run(get_context_async("a")).state(State).value = "a"
+    asyncio.run(get_context_async("b"))
+    assert "a" not in runtime._contexts
+
+    assert asyncio.run(get_context_async("a")).state(State).value == "a"
+
+
+def test_resets_context_whose_state_cannot_be_restored(app: Flask):
+  runtime = create_runtime()
+  state_session = MemoryStateSessionBackend()
+  with (
+    patch("mesop.runtime.runtime.MESOP_WEBSOCKET_MAX_CONTEXTS", 1),
+    patch("mesop.runtime.context.state_session", state_session),
+  ):
+    get_context(app, runtime, "a").state(State).value = "a"
+    get_context(app, runtime, "b")
+    # E.g. the saved state expired.
+    state_session.cache.clear()
+    context = get_context(app, runtime, "a")
+
+  assert context.has_lost_state()
+  assert context.state(State).value == ""
+
+
+def test_delete_evicted_context(app: Flask):
+  runtime = create_runtime()
+  state_session = MemoryStateSessionBackend()
+  with (
+    patch("mesop.runtime.runtime.MESOP_WEBSOCKET_MAX_CONTEXTS", 1),
+    patch("mesop.runtime.context.state_session", state_session),
+  ):
+    get_context(app, runtime, "a")
+    get_context(app, runtime, "b")
+    assert len(state_session.cache) == 1
+
+    runtime.delete_context("a")
+    runtime.delete_context("b")
+
+  assert not runtime._contexts
+  assert not runtime._evicted_context_tokens
+  assert not state_session.cache
+
+
+def create_pure_component_output(key: str) -> PureComponentOutput:
+  return PureComponentOutput(
+    component=pb.Component(key=pb.Key(key=key)),
+    return_value=None,
+    registrations=Registrations(),
+  )
+
+
+def test_diff_state_with_mutation_tracking():
+  runtime = Runtime()
+  runtime.register_state_class(State)
+  runtime.register_state_class(MutationTrackingState)
+  context = runtime.create_context()
+  context.update_state(
+    pb.States(
+      states=[
+        pb.State(data=json.dumps({"value": "a"})),
+        pb.State(data=json.dumps({"values": [1, 2]})),
+      ]
+    )
+  )
+
+  context.state(State).value = "b"
+  context.state(MutationTrackingState).values.append(3)
+
+  assert [json.loads(state.data) for state in context.diff_state().states] == [
+    [{"path": ["value"], "action": "values_changed", "value": "b"}],
+    [{"path": ["values", 2], "action": "iterable_item_added", "value": 3}],
+  ]
+
+
+@pytest.mark.parametrize(
+  "state_session_backend,action",
+  [("none", "data_frame_patched"), ("memory", "data_frame_changed")],
+)
+def test_diff_data_frame_state(state_session_backend: str, action: str):
+  runtime = Runtime()
+  runtime.register_state_class(DataFrameState)
+  context = runtime.create_context()
+  context.update_state(
+    pb.States(
+      states=[
+        pb.State(
+          data=serialize_dataclass(
+            DataFrameState(data=pd.DataFrame(data={"a": list(range(200))}))
+          )
+        )
+      ]
+    )
+  )
+  context.state(DataFrameState).data.iat[0, 0] = 10
+
+  # With a state session, the client does not send its state back, so the
+  # patches would pile up in it.
+  with patch(
+    "mesop.runtime.context.app_config",
+    Config(state_session_backend=state_session_backend),
+  ):
+    diffs = json.loads(context.diff_state().states[0].data)
+
+  assert [diff["action"] for diff in diffs] == [action]
+
+
+def test_evicts_least_recently_used_pure_components():
+  runtime = create_runtime()
+  output_a = create_pure_component_output("a")
+  with patch("mesop.runtime.runtime._PURE_COMPONENT_CACHE_MAX_SIZE", 2):
+    runtime.cache_pure_component("a", output_a)
+    runtime.cache_pure_component("b", create_pure_component_output("b"))
+    assert runtime.get_pure_component("a") is output_a
+    runtime.cache_pure_component("c", create_pure_component_output("c"))
+
+  assert list(runtime._pure_components) == ["a", "c"]
+
+
+def test_reset_runtime_clears_pure_components():
+  runtime().cache_pure_component("a", create_pure_component_output("a"))
+
+  reset_runtime(without_hot_reload=True)
+
+  assert runtime().get_pure_component("a") is None
+
+
+if __name__ == "__main__":
+  raise SystemExit(pytest.main([__file__]))
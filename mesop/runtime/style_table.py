@@ -0,0 +1,65 @@
+"""Sends each distinct style to the client once per session.
+
+Apps usually give many components the same styles, which would otherwise be
+serialized into every component (and every component diff) sent to the client.
+When the style table is enabled, the styles of the components sent to the client
+are replaced with IDs, and each style is sent once (in `RenderEvent.styles`)
+before it is first referenced.
+
+A style table belongs to a context, so styles are sent once per WebSocket
+session, and once per response otherwise. IDs are only unique within a context,
+so the client replaces its entries when an ID is sent again.
+"""
+
+import mesop.protos.ui_pb2 as pb
+
+# Bounds the memory used per session when styles are computed from data. Styles
+# that do not fit in the table are sent inline.
+_STYLE_TABLE_MAX_SIZE = 10_000
+
+
+class StyleTable:
+  def __init__(self):
+    self._ids: dict[bytes, int] = {}
+    # Entries that have not been sent to the client yet.
+    self._new_entries: list[pb.StyleTableEntry] = []
+
+  def replace_styles(self, component: pb.Component) -> None:
+    """Replaces the styles of the component tree with IDs in place."""
+    if component.HasField("style"):
+      style_id = self._style_id(component.style)
+      if style_id:
+        component.ClearField("style")
+        component.style_id = style_id
+    for child in component.children:
+      self.replace_styles(child)
+
+  def replace_styles_in_diff(self, diff: pb.ComponentDiff) -> None:
+    """Replaces the styles of the component diff with IDs in place."""
+    if diff.HasField("style"):
+      style_id = self._style_id(diff.style)
+      if style_id:
+        diff.ClearField("style")
+        diff.style_id = style_id
+    if diff.HasField("component"):
+      self.replace_styles(diff.component)
+    for child in diff.children:
+      self.replace_styles_in_diff(child)
+
+  def pop_new_entries(self) -> list[pb.StyleTableEntry]:
+    """Returns the entries referenced since the last call, to send them."""
+    entries = self._new_entries
+    self._new_entries = []
+    return entries
+
+  def _style_id(self, style: pb.Style) -> int:
+    """Returns the ID of the style, or zero if the table is full."""
+    key = style.SerializeToString(deterministic=True)
+    style_id = self._ids.get(key)
+    if style_id is None:
+      if len(self._ids) >= _STYLE_TABLE_MAX_SIZE:
+        return 0
+      style_id = len(self._ids) + 1
+      self._ids[key] = style_id
+      self._new_entries.append(pb.StyleTableEntry(id=style_id, style=style))
+    return style_id
@@ -0,0 +1,103 @@
+from unittest.mock import patch
+
+import pytest
+
+import mesop.protos.ui_pb2 as pb
+from mesop.runtime.style_table import StyleTable
+
+
+def test_replace_styles_sends_each_style_once():
+  table = StyleTable()
+  component = pb.Component(
+    style=pb.Style(color="red"),
+    children=[
+      pb.Component(style=pb.Style(color="blue")),
+      pb.Component(style=pb.Style(color="red")),
+      pb.Component(),
+    ],
+  )
+
+  table.replace_styles(component)
+
+  assert component == pb.Component(
+    style_id=1,
+    children=[
+      pb.Component(style_id=2),
+      pb.Component(style_id=1),
+      pb.Component(),
+    ],
+  )
+  assert table.pop_new_entries() == [
+    pb.StyleTableEntry(id=1, style=pb.Style(color="red")),
+    pb.StyleTableEntry(id=2, style=pb.Style(color="blue")),
+  ]
+
+  component = pb.Component(style=pb.Style(color="blue"))
+  table.replace_styles(component)
+
+  assert component == pb.Component(style_id=2)
+  assert table.pop_new_entries() == []
+
+
+def test_replace_styles_in_diff():
+  table = StyleTable()
+  diff = pb.ComponentDiff(
+    style=pb.Style(color="red"),
+    update_strategy_style=pb.ComponentDiff.UPDATE_STRATEGY_REPLACE,
+    children=[
+      pb.ComponentDiff(
+        component=pb.Component(style=pb.Style(color="blue")),
+        diff_type=pb.ComponentDiff.DIFF_TYPE_ADD,
+      ),
+      # Clears the style.
+      pb.ComponentDiff(
+        update_strategy_style=pb.ComponentDiff.UPDATE_STRATEGY_REPLACE,
+      ),
+    ],
+  )
+
+  table.replace_styles_in_diff(diff)
+
+  assert diff == pb.ComponentDiff(
+    style_id=1,
+    update_strategy_style=pb.ComponentDiff.UPDATE_STRATEGY_REPLACE,
+    children=[
+      pb.ComponentDiff(
+        component=pb.Component(style_id=2),
+        diff_type=pb.ComponentDiff.DIFF_TYPE_ADD,
+      ),
+      pb.ComponentDiff(
+        update_strategy_style=pb.ComponentDiff.UPDATE_STRATEGY_REPLACE,
+      ),
+    ],
+  )
+  assert [entry.id for entry in table.pop_new_entries()] == [1, 2]
+
+
+def test_replace_styles_sends_styles_inline_when_full():
+  # `mesop.runtime` is rebound to the `runtime` function once `mesop` is
+  # imported, so the module cannot be patched with `monkeypatch`, which looks
+  # up the path with `getattr`.
+  with patch("mesop.runtime.style_table._STYLE_TABLE_MAX_SIZE", 1):
+    table = StyleTable()
+    component = pb.Component(
+      children=[
+        pb.Component(style=pb.Style(color="red")),
+        pb.Component(style=pb.Style(color="blue")),
+        pb.Component(style=pb.Style(color="red")),
+      ],
+    )
+
+    table.replace_styles(component)
+
+    assert component == pb.Component(
+      children=[
+        pb.Component(style_id=1),
+        pb.Component(style=pb.Style(color="blue")),
+        pb.Component(style_id=1),
+      ],
+    )
+
+
+if __name__ == "__main__":
+  raise SystemExit(pytest.main([__file__]))
@@ -0,0 +1,405 @@
+import asyncio
+import functools
+import logging
+import secrets
+import sys
+from collections.abc import AsyncGenerator
+from io import BytesIO
+from typing import Any, Awaitable, Callable, Protocol
+
+from absl import flags
+from flask import Flask, request
+
+import mesop.protos.ui_pb2 as pb
+from mesop.env.env import (
+  MESOP_PROFILE_SLOW_EVENTS_MS,
+  MESOP_SERVER_TIMING_ENABLED,
+  MESOP_STREAM_COMPRESSION_ENABLED,
+  MESOP_TRUST_PROXY_HEADERS,
+  MESOP_WEBSOCKET_MAX_QUEUED,
+  MESOP_WEBSOCKET_MAX_QUEUED_PER_SESSION,
+  MESOP_WEBSOCKET_MAX_RUNNING_PER_SESSION,
+  MESOP_WEBSOCKET_MAX_WORKERS,
+  MESOP_WEBSOCKETS_ENABLED,
+)
+from mesop.exceptions import MesopDeveloperException
+from mesop.runtime import runtime
+from mesop.server.metrics import RequestTimings, create_request_timings
+from mesop.server.server import UI_PATH, apply_proxy_fix
+from mesop.server.server_utils import (
+  BINARY_CONTENT_TYPE,
+  StreamCompressor,
+  get_stream_encoding,
+  is_binary_transport,
+  is_same_site,
+  parse_ui_request,
+  serialize_server_busy,
+)
+from mesop.server.websocket_scheduler import WebSocketScheduler
+from mesop.server.wsgi_app import create_app
+from mesop.utils.async_utils import offload_sync_calls, run_sync
+
+Scope = dict[str, Any]
+Receive = Callable[[], Awaitable[dict[str, Any]]]
+Send = Callable[[dict[str, Any]], Awaitable[None]]
+
+
+class GenerateData(Protocol):
+  def __call__(
+    self,
+    ui_request: pb.UiRequest,
+    timings: RequestTimings | None = None,
+    *,
+    profile: bool = True,
+  ) -> AsyncGenerator[str | bytes, None]: ...
+
+
+def create_asgi_app(*, debug_mode: bool = False):
+  """
+  Creates an ASGI app that can be used to run Mesop in an ASGI server like uvicorn.
+
+  UI requests (both SSE and WebSockets) are processed on the ASGI server's event
+  loop, so async event handlers run concurrently without needing a thread for each
+  in-flight request. Sync event handlers are run in a worker thread so they do not
+  block the event loop.
+
+  All other requests (e.g. static files) are served by the Mesop WSGI app, which
+  requires the `asgiref` package.
+
+  Args:
+    debug_mode: If True, enables debug mode for the Mesop app.
+  """
+  _app: _AsgiApp | None = None
+
+  async def asgi_app(scope: Scope, receive: Receive, send: Send):
+    # Lazily create and reuse the app instance similar to `create_wsgi_app`.
+    nonlocal _app
+    if not _app:
+      # See `create_wsgi_app` for why we parse an empty list of flags.
+      flags.FLAGS(sys.argv[:1])
+      _app = _AsgiApp(create_app(prod_mode=not debug_mode)._flask_app)
+    await _app(scope, receive, send)
+
+  return asgi_app
+
+
+class _AsgiApp:
+  def __init__(self, flask_app: Flask):
+    try:
+      from asgiref.wsgi import WsgiToAsgi
+    except ImportError as e:
+      raise MesopDeveloperException(
+        "The `asgiref` package is required to use `create_asgi_app`. Install it with: pip install asgiref"
+      ) from e
+
+    self._flask_app = flask_app
+    self._generate_data: GenerateData = flask_app.extensions[
+      "mesop.generate_data"
+    ]
+    if MESOP_PROFILE_SLOW_EVENTS_MS:
+      # The profiler samples the thread processing a request, but the event loop's
+      # thread processes every request, so the samples would mix up requests.
+      logging.warning(
+        "MESOP_PROFILE_SLOW_EVENTS_MS is not supported by the ASGI app, so slow"
+        " events are not profiled."
+      )
+    self._wsgi_fallback = WsgiToAsgi(flask_app.wsgi_app)
+    # Schedules WebSocket messages fairly across connections, similar to the WSGI
+    # WebSocket handler. Messages are processed as tasks on the event loop instead
+    # of in a thread pool.
+    self._ws_scheduler = WebSocketScheduler(
+      start=lambda run: asyncio.ensure_future(run()),
+      max_workers=MESOP_WEBSOCKET_MAX_WORKERS,
+      max_queued=MESOP_WEBSOCKET_MAX_QUEUED,
+      max_queued_per_session=MESOP_WEBSOCKET_MAX_QUEUED_PER_SESSION,
+      max_running_per_session=MESOP_WEBSOCKET_MAX_RUNNING_PER_SESSION,
+    )
+    # Reported by the metrics route, which is served by the Flask app.
+    flask_app.extensions["mesop.websocket_scheduler"] = self._ws_scheduler
+
+  async def __call__(self, scope: Scope, receive: Receive, send: Send):
+    if scope["type"] == "lifespan":
+      await _handle_lifespan(receive, send)
+    elif scope["type"] == "websocket":
+      if MESOP_WEBSOCKETS_ENABLED and scope["path"] == UI_PATH:
+        await self._handle_websocket(scope, receive, send)
+      else:
+        await send({"type": "websocket.close"})
+    elif scope["path"] == UI_PATH and scope["method"] == "POST":
+      await self._handle_ui_stream(scope, receive, send)
+    else:
+      await self._wsgi_fallback(scope, receive, send)
+
+  async def _handle_ui_stream(self, scope: Scope, receive: Receive, send: Send):
+    body = await _read_body(receive)
+    with self._flask_app.request_context(_build_environ(scope, body)):
+      # Prevent CSRF. See `ui_stream` in server.py.
+      if not runtime().debug_mode and not is_same_site(
+        request.headers.get("Origin"), request.url_root
+      ):
+        await _send_error(send, 403, "Rejecting cross-site POST request")
+        return
+      if not body:
+        await _send_error(send, 400, "Missing request payload")
+        return
+      ui_request = parse_ui_request(
+        body, binary=request.mimetype == BINARY_CONTENT_TYPE
+      )
+      content_type = (
+        BINARY_CONTENT_TYPE if is_binary_transport() else "text/event-stream"
+      )
+      headers = [
+        (b"content-type", content_type.encode("latin1")),
+        # See `make_sse_response` in server_utils.py.
+        (b"x-accel-buffering", b"no"),
+      ]
+      # See `make_ui_stream_response` in server_utils.py.
+      encoding = get_stream_encoding()
+      compressor = StreamCompressor(encoding) if encoding else None
+      if encoding:
+        headers.append((b"content-encoding", encoding.encode("latin1")))
+      if MESOP_STREAM_COMPRESSION_ENABLED:
+        headers.append((b"vary", b"Accept-Encoding"))
+
+      timings = create_request_timings()
+      chunks = self._generate_data(ui_request, timings, profile=False)
+      first_chunks: list[str | bytes] = []
+      if MESOP_SERVER_TIMING_ENABLED:
+        # See `ui_stream` in server.py.
+        with offload_sync_calls():
+          async for chunk in chunks:
+            first_chunks.append(chunk)
+            break
+        headers.append(
+          (b"server-timing", timings.server_timing_header().encode("latin1"))
+        )
+
+      await send(
+        {
+          "type": "http.response.start",
+          "status": 200,
+          "headers": headers,
+        }
+      )
+      disconnected = asyncio.Event()
+      disconnect_watcher = asyncio.create_task(
+        _watch_disconnect(receive, disconnected)
+      )
+      try:
+        with offload_sync_calls():
+          async for chunk in _prepend(first_chunks, chunks):
+            if disconnected.is_set():
+              break
+            await send(
+              {
+                "type": "http.response.body",
+                "body": compressor.compress(chunk)
+                if compressor
+                else _to_bytes(chunk),
+                "more_body": True,
+              }
+            )
+      finally:
+        disconnect_watcher.cancel()
+        await chunks.aclose()
+      if not disconnected.is_set():
+        await send(
+          {
+            "type": "http.response.body",
+            "body": compressor.finish() if compressor else b"",
+          }
+        )
+
+  async def _handle_websocket(self, scope: Scope, receive: Receive, send: Send):
+    environ = _build_environ(scope, b"")
+    connect_message = await receive()
+    if connect_message["type"] != "websocket.connect":
+      return
+    with self._flask_app.request_context(environ):
+      # Prevent cross-site WebSocket hijacking (CSWSH). See `handle_websocket` in
+      # server.py.
+      if not runtime().debug_mode and not is_same_site(
+        request.headers.get("Origin"), request.url_root
+      ):
+        await send({"type": "websocket.close"})
+        return
+    await send({"type": "websocket.accept"})
+
+    session_id = secrets.token_urlsafe(32)
+    send_lock = asyncio.Lock()
+    tasks: set[asyncio.Task[None]] = set()
+
+    async def process_message(ui_request: pb.UiRequest):
+      task = asyncio.current_task()
+      assert task
+      tasks.add(task)
+      try:
+        with (
+          self._flask_app.request_context(environ),
+          offload_sync_calls(),
+        ):
+          async with runtime().websocket_context_in_use_async(session_id):
+            request.websocket_session_id = session_id  # type: ignore
+            async for data_chunk in self._generate_data(
+              ui_request, profile=False
+            ):
+              async with send_lock:
+                if isinstance(data_chunk, bytes):
+                  await send({"type": "websocket.send", "bytes": data_chunk})
+                else:
+                  await send({"type": "websocket.send", "text": data_chunk})
+      except Exception as e:
+        logging.error("WebSocket error: %s", e)
+      finally:
+        tasks.discard(task)
+
+    try:
+      while True:
+        message = await receive()
+        if message["type"] == "websocket.disconnect":
+          break
+        data = message.get("text") or message.get("bytes")
+        if not data:
+          continue  # Ignore empty messages
+
+        try:
+          ui_request = parse_ui_request(data, binary=isinstance(data, bytes))
+        except Exception as parse_error:
+          logging.error("Failed to parse message: %s", parse_error)
+          continue  # Skip processing this message
+
+        if not self._ws_scheduler.submit(
+          session_id, functools.partial(process_message, ui_request)
+        ):
+          # Tell the client to resend the request later instead of silently
+          # dropping it.
+          logging.warning(
+            "WebSocket server at capacity, asking client to retry message."
+          )
+          with self._flask_app.request_context(environ):
+            busy_response = serialize_server_busy(ui_request)
+          async with send_lock:
+            if isinstance(busy_response, bytes):
+              await send({"type": "websocket.send", "bytes": busy_response})
+            else:
+              await send({"type": "websocket.send", "text": busy_response})
+    finally:
+      self._ws_scheduler.close_session(session_id)
+      for task in list(tasks):
+        task.cancel()
+      # Deleting the saved state of an evicted context may block.
+      with offload_sync_calls():
+        await run_sync(runtime().delete_context, session_id)
+
+
+async def _handle_lifespan(receive: Receive, send: Send):
+  while True:
+    message = await receive()
+    if message["type"] == "lifespan.startup":
+      await send({"type": "lifespan.startup.complete"})
+    elif message["type"] == "lifespan.shutdown":
+      await send({"type": "lifespan.shutdown.complete"})
+      return
+
+
+async def _read_body(receive: Receive) -> bytes:
+  body = b""
+  while True:
+    message = await receive()
+    if message["type"] == "http.disconnect":
+      return body
+    body += message.get("body", b"")
+    if not message.get("more_body", False):
+      return body
+
+
+async def _watch_disconnect(receive: Receive, disconnected: asyncio.Event):
+  while True:
+    message = await receive()
+    if message["type"] == "http.disconnect":
+      disconnected.set()
+      return
+
+
+async def _prepend(
+  items: list[str | bytes], chunks: AsyncGenerator[str | bytes, None]
+) -> AsyncGenerator[str | bytes, None]:
+  for item in items:
+    yield item
+  async for chunk in chunks:
+    yield chunk
+
+
+def _to_bytes(chunk: str | bytes) -> bytes:
+  return chunk if isinstance(chunk, bytes) else chunk.encode("utf-8")
+
+
+async def _send_error(send: Send, status: int, message: str):
+  await send(
+    {
+      "type": "http.response.start",
+      "status": status,
+      "headers": [(b"content-type", b"text/plain; charset=utf-8")],
+    }
+  )
+  await send({"type": "http.response.body", "body": message.encode("utf-8")})
+
+
+def _build_environ(scope: Scope, body: bytes) -> dict[str, Any]:
+  """Builds a WSGI environ from an ASGI scope.
+
+  This lets the UI request run inside a Flask request context, which Mesop uses to
+  look up the current context and request data (e.g. cookies).
+  """
+  server_name, server_port = scope.get("server") or ("localhost", 80)
+  scheme = scope.get("scheme", "http")
+  if scheme in ("ws", "wss"):
+    scheme = "https" if scheme == "wss" else "http"
+  environ: dict[str, Any] = {
+    "REQUEST_METHOD": scope.get("method", "GET"),
+    "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+    "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+    "QUERY_STRING": scope.get("query_string", b"").decode("ascii"),
+    "SERVER_NAME": server_name,
+    "SERVER_PORT": str(server_port),
+    "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+    "wsgi.version": (1, 0),
+    "wsgi.url_scheme": scheme,
+    "wsgi.input": BytesIO(body),
+    "wsgi.errors": sys.stderr,
+    "wsgi.multithread": True,
+    "wsgi.multiprocess": True,
+    "wsgi.run_once": False,
+    "CONTENT_LENGTH": str(len(body)),
+  }
+  if scope.get("client"):
+    environ["REMOTE_ADDR"] = scope["client"][0]
+    environ["REMOTE_PORT"] = str(scope["client"][1])
+  for raw_name, raw_value in scope.get("headers", []):
+    name = raw_name.decode("latin1")
+    value = raw_value.decode("latin1")
+    if name == "content-type":
+      corrected_name = "CONTENT_TYPE"
+    elif name == "content-length":
+      corrected_name = "CONTENT_LENGTH"
+    else:
+      corrected_name = "HTTP_" + name.upper().replace("-", "_")
+    if corrected_name in environ and corrected_name.startswith("HTTP_"):
+      value = environ[corrected_name] + "," + value
+    environ[corrected_name] = value
+
+  if MESOP_TRUST_PROXY_HEADERS:
+    environ = _apply_proxy_fix_to_environ(environ)
+  return environ
+
+
+def _apply_proxy_fix_to_environ(environ: dict[str, Any]) -> dict[str, Any]:
+  """Returns the environ as seen by an app behind `ProxyFix`."""
+  fixed_environ: dict[str, Any] = {}
+
+  def capture_environ(environ: dict[str, Any], start_response: Any):
+    fixed_environ.update(environ)
+    return []
+
+  apply_proxy_fix(capture_environ)(environ, lambda *args: None)
+  return fixed_environ
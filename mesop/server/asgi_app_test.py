@@ -0,0 +1,254 @@
+import asyncio
+import base64
+import gzip
+import struct
+import threading
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+
+import mesop.protos.ui_pb2 as pb
+from mesop.runtime import PageConfig, reset_runtime, runtime
+from mesop.security.security_policy import SecurityPolicy
+from mesop.server import asgi_app, metrics, server, server_utils
+from mesop.server.asgi_app import create_asgi_app
+from mesop.server.profiler import SlowEventProfiler
+from mesop.server.server_utils import STREAM_END
+
+
+@pytest.fixture(autouse=True)
+def reset():
+  reset_runtime(without_hot_reload=True)
+  # `reset_runtime` preserves debug mode, so reset it explicitly.
+  runtime().debug_mode = False
+  runtime().register_page(
+    path="/",
+    page_config=PageConfig(
+      page_fn=lambda: None,
+      title="Test",
+      stylesheets=[],
+      security_policy=SecurityPolicy(),
+      on_load=None,
+    ),
+  )
+  yield
+  reset_runtime(without_hot_reload=True)
+
+
+def call_asgi_app(
+  app: Any, *, path: str, body: bytes, headers: list[tuple[bytes, bytes]]
+) -> list[dict[str, Any]]:
+  scope = {
+    "type": "http",
+    "method": "POST",
+    "path": path,
+    "query_string": b"",
+    "headers": headers,
+    "server": ("localhost", 32123),
+    "scheme": "http",
+  }
+  request_messages = [{"type": "http.request", "body": body}]
+  sent_messages: list[dict[str, Any]] = []
+
+  async def receive():
+    if request_messages:
+      return request_messages.pop(0)
+    # Block until the app is done, similar to a client that stays connected.
+    await asyncio.Event().wait()
+
+  async def send(message: dict[str, Any]):
+    sent_messages.append(message)
+
+  asyncio.run(app(scope, receive, send))
+  return sent_messages
+
+
+def test_asgi_app_streams_ui_response():
+  app = create_asgi_app(debug_mode=True)
+  ui_request = pb.UiRequest(path="/", init=pb.InitRequest())
+
+  messages = call_asgi_app(
+    app,
+    path="/__ui__",
+    body=base64.urlsafe_b64encode(ui_request.SerializeToString()),
+    headers=[],
+  )
+
+  assert messages[0]["status"] == 200
+  assert (b"content-type", b"text/event-stream") in messages[0]["headers"]
+  body = b"".join(message.get("body", b"") for message in messages[1:])
+  assert body.decode("utf-8").endswith(STREAM_END)
+
+
+def test_asgi_app_streams_binary_ui_response():
+  app = create_asgi_app(debug_mode=True)
+  ui_request = pb.UiRequest(path="/", init=pb.InitRequest())
+
+  messages = call_asgi_app(
+    app,
+    path="/__ui__",
+    body=ui_request.SerializeToString(),
+    headers=[
+      (b"content-type", b"application/octet-stream"),
+      (b"accept", b"application/octet-stream"),
+    ],
+  )
+
+  assert messages[0]["status"] == 200
+  assert (b"content-type", b"application/octet-stream") in messages[0][
+    "headers"
+  ]
+  body = b"".join(message.get("body", b"") for message in messages[1:])
+  frames = []
+  while body:
+    length = struct.unpack(">I", body[:4])[0]
+    frames.append(body[4 : 4 + length])
+    body = body[4 + length :]
+  # The stream ends with an empty frame.
+  assert frames[-1] == b""
+  ui_response = pb.UiResponse()
+  ui_response.ParseFromString(frames[0])
+  assert ui_response.render.title == "Test"
+
+
+def test_asgi_app_compresses_ui_response():
+  app = create_asgi_app(debug_mode=True)
+  ui_request = pb.UiRequest(path="/", init=pb.InitRequest())
+
+  with (
+    patch.object(asgi_app, "MESOP_STREAM_COMPRESSION_ENABLED", True),
+    patch.object(server_utils, "MESOP_STREAM_COMPRESSION_ENABLED", True),
+  ):
+    messages = call_asgi_app(
+      app,
+      path="/__ui__",
+      body=base64.urlsafe_b64encode(ui_request.SerializeToString()),
+      headers=[(b"accept-encoding", b"gzip")],
+    )
+
+  assert (b"content-encoding", b"gzip") in messages[0]["headers"]
+  body = b"".join(message.get("body", b"") for message in messages[1:])
+  assert gzip.decompress(body).decode("utf-8").endswith(STREAM_END)
+
+
+def test_asgi_app_sends_server_timing_header():
+  app = create_asgi_app(debug_mode=True)
+  ui_request = pb.UiRequest(path="/", init=pb.InitRequest())
+
+  with (
+    patch.object(asgi_app, "MESOP_SERVER_TIMING_ENABLED", True),
+    patch.object(metrics, "MESOP_SERVER_TIMING_ENABLED", True),
+  ):
+    messages = call_asgi_app(
+      app,
+      path="/__ui__",
+      body=base64.urlsafe_b64encode(ui_request.SerializeToString()),
+      headers=[],
+    )
+
+  server_timing = dict(messages[0]["headers"])[b"server-timing"].decode()
+  assert "render;dur=" in server_timing
+  assert "total;dur=" in server_timing
+  body = b"".join(message.get("body", b"") for message in messages[1:])
+  assert body.decode("utf-8").endswith(STREAM_END)
+
+
+def test_asgi_app_renders_page_in_worker_thread():
+  render_thread_ids: list[int] = []
+  runtime().register_page(
+    path="/threaded",
+    page_config=PageConfig(
+      page_fn=lambda: render_thread_ids.append(threading.get_ident()),
+      title="Test",
+      stylesheets=[],
+      security_policy=SecurityPolicy(),
+      on_load=None,
+    ),
+  )
+  app = create_asgi_app(debug_mode=True)
+  ui_request = pb.UiRequest(path="/threaded", init=pb.InitRequest())
+
+  call_asgi_app(
+    app,
+    path="/__ui__",
+    body=base64.urlsafe_b64encode(ui_request.SerializeToString()),
+    headers=[],
+  )
+
+  # The page function does not run on the event loop's thread.
+  assert render_thread_ids
+  assert threading.get_ident() not in render_thread_ids
+
+
+def test_asgi_app_renders_coalesced_steps_in_worker_thread():
+  render_thread_ids: list[int] = []
+
+  async def on_load(e):
+    for _ in range(3):
+      yield
+
+  runtime().register_page(
+    path="/threaded",
+    page_config=PageConfig(
+      page_fn=lambda: render_thread_ids.append(threading.get_ident()),
+      title="Test",
+      stylesheets=[],
+      security_policy=SecurityPolicy(),
+      on_load=on_load,
+    ),
+  )
+  app = create_asgi_app(debug_mode=True)
+  ui_request = pb.UiRequest(path="/threaded", init=pb.InitRequest())
+
+  with patch.object(server, "MESOP_MIN_FRAME_INTERVAL_MS", 1000):
+    call_asgi_app(
+      app,
+      path="/__ui__",
+      body=base64.urlsafe_b64encode(ui_request.SerializeToString()),
+      headers=[],
+    )
+
+  # The first step and the skipped last step are rendered.
+  assert len(render_thread_ids) == 2
+  assert threading.get_ident() not in render_thread_ids
+
+
+def test_asgi_app_does_not_profile_slow_events():
+  with (
+    patch.object(asgi_app, "MESOP_PROFILE_SLOW_EVENTS_MS", 1),
+    patch.object(server, "MESOP_PROFILE_SLOW_EVENTS_MS", 1),
+    patch.object(SlowEventProfiler, "start") as start,
+  ):
+    app = create_asgi_app(debug_mode=True)
+    ui_request = pb.UiRequest(path="/", init=pb.InitRequest())
+
+    messages = call_asgi_app(
+      app,
+      path="/__ui__",
+      body=base64.urlsafe_b64encode(ui_request.SerializeToString()),
+      headers=[],
+    )
+
+  body = b"".join(message.get("body", b"") for message in messages[1:])
+  assert body.decode("utf-8").endswith(STREAM_END)
+  # The event loop's thread processes the requests of all sessions.
+  start.assert_not_called()
+
+
+def test_asgi_app_rejects_cross_site_ui_request():
+  app = create_asgi_app(debug_mode=False)
+  ui_request = pb.UiRequest(path="/", init=pb.InitRequest())
+
+  messages = call_asgi_app(
+    app,
+    path="/__ui__",
+    body=base64.urlsafe_b64encode(ui_request.SerializeToString()),
+    headers=[(b"origin", b"https://evil.example.com")],
+  )
+
+  assert messages[0]["status"] == 403
+
+
+if __name__ == "__main__":
+  raise SystemExit(pytest.main([__file__]))
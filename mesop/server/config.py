@@ -18,6 +18,7 @@ class Config(BaseModel):
   state_session_backend_firestore_collection: str = "mesop_state_sessions"
   state_session_backend_sql_connection_uri: str = ""
   state_session_backend_sql_table: str = "mesop_state_sessions"
+  state_session_codec: Literal["json", "msgpack", "orjson"] = "json"
   static_folder: str = "static"
   static_url_path: str = "/static"
 
@@ -43,6 +44,7 @@ def CreateConfigFromEnv() -> Config:
     state_session_backend_sql_table=os.getenv(
       "MESOP_STATE_SESSION_BACKEND_SQL_TABLE",
     ),
+    state_session_codec=os.getenv("MESOP_STATE_SESSION_CODEC"),  # type: ignore
     static_folder=os.getenv("MESOP_STATIC_FOLDER"),
     static_url_path=os.getenv("MESOP_STATIC_URL_PATH"),
   )
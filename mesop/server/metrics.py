@@ -0,0 +1,270 @@
+"""Timing instrumentation for UI requests.
+
+Each UI request records how long it spends in each phase (e.g. render,
+diffing, serializing). The timings are sent to the client with the
+`Server-Timing` header and aggregated into Prometheus histograms for the
+`/__metrics__` route.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import AsyncGenerator, AsyncIterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from mesop.env.env import (
+  MESOP_METRICS_ENABLED,
+  MESOP_PROFILE_SLOW_EVENTS_MS,
+  MESOP_SERVER_TIMING_ENABLED,
+)
+from mesop.server.websocket_scheduler import WebSocketSchedulerMetrics
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Same as the Prometheus client's default buckets.
+_BUCKETS_SECONDS = (
+  0.005,
+  0.01,
+  0.025,
+  0.05,
+  0.1,
+  0.25,
+  0.5,
+  1.0,
+  2.5,
+  5.0,
+  10.0,
+)
+
+# Upper bound on the number of distinct (path, handler) label pairs. Handler IDs
+# can include the arguments of `functools.partial` handlers, so this prevents
+# unbounded memory use and label cardinality. Additional label pairs are
+# recorded as "other".
+_MAX_LABEL_SETS = 1000
+_OTHER_LABEL = "other"
+
+
+class RequestTimings:
+  """Accumulates the time spent in each phase of a UI request."""
+
+  def __init__(self):
+    self.start_time = time.perf_counter()
+    self.durations: dict[str, float] = {}
+    self.path = ""
+    self.handler_id = ""
+    # Longest step of the event handler.
+    self.max_step_seconds = 0.0
+
+  @contextmanager
+  def phase(self, name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.add(name, time.perf_counter() - start)
+
+  def add(self, name: str, seconds: float):
+    self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+  async def time_steps(
+    self, name: str, steps: AsyncIterator[None]
+  ) -> AsyncGenerator[None, None]:
+    """Times each step of an event handler, excluding the caller's time."""
+    iterator = aiter(steps)
+    while True:
+      start = time.perf_counter()
+      try:
+        await anext(iterator)
+      except StopAsyncIteration:
+        self._add_step(name, time.perf_counter() - start)
+        return
+      self._add_step(name, time.perf_counter() - start)
+      yield
+
+  def _add_step(self, name: str, seconds: float):
+    self.add(name, seconds)
+    self.max_step_seconds = max(self.max_step_seconds, seconds)
+
+  def total_seconds(self) -> float:
+    return time.perf_counter() - self.start_time
+
+  def server_timing_header(self) -> str:
+    """Formats the timings as a `Server-Timing` header value."""
+    return ", ".join(
+      f"{name};dur={seconds * 1000:.1f}"
+      for name, seconds in [
+        *self.durations.items(),
+        ("total", self.total_seconds()),
+      ]
+    )
+
+
+class NullRequestTimings(RequestTimings):
+  """Used when request timing is disabled to avoid the timing overhead."""
+
+  @contextmanager
+  def phase(self, name: str) -> Iterator[None]:
+    yield
+
+  def add(self, name: str, seconds: float):
+    pass
+
+  def time_steps(
+    self, name: str, steps: AsyncIterator[None]
+  ) -> AsyncIterator[None]:
+    return steps
+
+
+NULL_REQUEST_TIMINGS = NullRequestTimings()
+
+
+def create_request_timings() -> RequestTimings:
+  """Returns a new `RequestTimings` if timings are reported anywhere."""
+  if (
+    MESOP_SERVER_TIMING_ENABLED
+    or MESOP_METRICS_ENABLED
+    or MESOP_PROFILE_SLOW_EVENTS_MS
+  ):
+    return RequestTimings()
+  return NULL_REQUEST_TIMINGS
+
+
+@dataclass
+class _Histogram:
+  bucket_counts: list[int] = field(
+    default_factory=lambda: [0] * (len(_BUCKETS_SECONDS) + 1)
+  )
+  count: int = 0
+  total: float = 0.0
+
+  def observe(self, seconds: float):
+    self.bucket_counts[bisect_left(_BUCKETS_SECONDS, seconds)] += 1
+    self.count += 1
+    self.total += seconds
+
+
+class UiRequestMetrics:
+  """Latency histograms for UI requests, by page path, handler ID and phase."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._label_sets: set[tuple[str, str]] = set()
+    # Keyed by (path, handler ID, phase). The "total" phase is the whole request.
+    self._histograms: dict[tuple[str, str, str], _Histogram] = {}
+
+  def record(self, timings: RequestTimings):
+    labels = (timings.path, timings.handler_id)
+    with self._lock:
+      if labels not in self._label_sets:
+        if len(self._label_sets) >= _MAX_LABEL_SETS:
+          labels = (_OTHER_LABEL, _OTHER_LABEL)
+        self._label_sets.add(labels)
+      for phase, seconds in [
+        *timings.durations.items(),
+        ("total", timings.total_seconds()),
+      ]:
+        key = (*labels, phase)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+          histogram = self._histograms[key] = _Histogram()
+        histogram.observe(seconds)
+
+  def to_prometheus_text(self) -> str:
+    name = "mesop_ui_request_phase_duration_seconds"
+    lines = [
+      f"# HELP {name} Time spent in each phase of a UI request.",
+      f"# TYPE {name} histogram",
+    ]
+    with self._lock:
+      for (path, handler_id, phase), histogram in sorted(
+        self._histograms.items()
+      ):
+        labels = (
+          f'path="{_escape_label(path)}",'
+          f'handler="{_escape_label(handler_id)}",'
+          f'phase="{_escape_label(phase)}"'
+        )
+        cumulative_count = 0
+        for bound, count in zip(
+          [*map(str, _BUCKETS_SECONDS), "+Inf"],
+          histogram.bucket_counts,
+          strict=True,
+        ):
+          cumulative_count += count
+          lines.append(
+            f'{name}_bucket{{{labels},le="{bound}"}} {cumulative_count}'
+          )
+        lines.append(f"{name}_sum{{{labels}}} {histogram.total}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+
+def format_metric(
+  name: str, metric_type: str, help_text: str, value: float
+) -> str:
+  """Formats a metric without labels in the Prometheus text format."""
+  return (
+    f"# HELP {name} {help_text}\n# TYPE {name} {metric_type}\n{name} {value}\n"
+  )
+
+
+def format_websocket_scheduler_metrics(
+  metrics: WebSocketSchedulerMetrics,
+) -> str:
+  prefix = "mesop_websocket_scheduler"
+  return "".join(
+    [
+      format_metric(
+        f"{prefix}_queued_jobs", "gauge", "Jobs waiting to run.", metrics.queued
+      ),
+      format_metric(
+        f"{prefix}_running_jobs", "gauge", "Jobs running.", metrics.running
+      ),
+      format_metric(
+        f"{prefix}_active_sessions",
+        "gauge",
+        "Sessions with queued or running jobs.",
+        metrics.active_sessions,
+      ),
+      format_metric(
+        f"{prefix}_submitted_jobs_total",
+        "counter",
+        "Jobs accepted by the scheduler.",
+        metrics.submitted,
+      ),
+      format_metric(
+        f"{prefix}_rejected_jobs_total",
+        "counter",
+        "Jobs rejected because the queue was full.",
+        metrics.rejected,
+      ),
+      format_metric(
+        f"{prefix}_completed_jobs_total",
+        "counter",
+        "Jobs that finished running.",
+        metrics.completed,
+      ),
+      format_metric(
+        f"{prefix}_wait_seconds_total",
+        "counter",
+        "Time jobs spent queued before running.",
+        metrics.total_wait_seconds,
+      ),
+      format_metric(
+        f"{prefix}_max_wait_seconds",
+        "gauge",
+        "Longest time a job spent queued before running.",
+        metrics.max_wait_seconds,
+      ),
+    ]
+  )
+
+
+def _escape_label(value: str) -> str:
+  return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Process-wide metrics, similar to the state session singleton.
+ui_request_metrics = UiRequestMetrics()
@@ -0,0 +1,137 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from mesop.server.metrics import (
+  RequestTimings,
+  UiRequestMetrics,
+  format_websocket_scheduler_metrics,
+)
+from mesop.server.websocket_scheduler import WebSocketSchedulerMetrics
+
+
+def create_timings(
+  path: str = "/", handler_id: str = "", **durations: float
+) -> RequestTimings:
+  timings = RequestTimings()
+  timings.path = path
+  timings.handler_id = handler_id
+  for name, seconds in durations.items():
+    timings.add(name, seconds)
+  return timings
+
+
+def test_phase_accumulates_durations():
+  with patch("mesop.server.metrics.time.perf_counter") as mock_perf_counter:
+    mock_perf_counter.side_effect = [0.0, 1.0, 2.0, 2.5, 3.0]
+    timings = RequestTimings()
+    with timings.phase("render"):
+      pass
+    with timings.phase("render"):
+      pass
+
+  assert timings.durations == {"render": 1.5}
+
+
+def test_server_timing_header():
+  timings = create_timings(render=0.0125, serialize=0.001)
+
+  with patch.object(timings, "total_seconds", return_value=0.02):
+    assert (
+      timings.server_timing_header()
+      == "render;dur=12.5, serialize;dur=1.0, total;dur=20.0"
+    )
+
+
+def test_time_steps_excludes_time_between_steps():
+  async def handler():
+    await asyncio.sleep(0)
+    yield
+    yield
+
+  async def main(timings: RequestTimings):
+    async for _ in timings.time_steps("handler", handler()):
+      timings.add("render", 1.0)
+
+  timings = RequestTimings()
+  asyncio.run(main(timings))
+
+  assert timings.durations["render"] == 2.0
+  assert timings.durations["handler"] < 1.0
+
+
+def test_to_prometheus_text():
+  metrics = UiRequestMetrics()
+  timings = create_timings("/chat", "handler_1", render=0.2)
+  with patch.object(timings, "total_seconds", return_value=3.0):
+    metrics.record(timings)
+
+  text = metrics.to_prometheus_text()
+
+  labels = 'path="/chat",handler="handler_1",phase="render"'
+  assert (
+    f'mesop_ui_request_phase_duration_seconds_bucket{{{labels},le="0.1"}} 0'
+    in text
+  )
+  assert (
+    f'mesop_ui_request_phase_duration_seconds_bucket{{{labels},le="0.25"}} 1'
+    in text
+  )
+  assert (
+    f'mesop_ui_request_phase_duration_seconds_bucket{{{labels},le="+Inf"}} 1'
+    in text
+  )
+  assert f"mesop_ui_request_phase_duration_seconds_sum{{{labels}}} 0.2" in text
+  assert f"mesop_ui_request_phase_duration_seconds_count{{{labels}}} 1" in text
+  assert (
+    'mesop_ui_request_phase_duration_seconds_sum{path="/chat",handler="handler_1",phase="total"} 3.0'
+    in text
+  )
+
+
+def test_escapes_label_values():
+  metrics = UiRequestMetrics()
+  metrics.record(create_timings('/a"b\\c', render=0.1))
+
+  assert 'path="/a\\"b\\\\c"' in metrics.to_prometheus_text()
+
+
+def test_caps_number_of_label_sets():
+  metrics = UiRequestMetrics()
+  with patch("mesop.server.metrics._MAX_LABEL_SETS", 2):
+    for handler_id in ["a", "b", "c", "d"]:
+      metrics.record(create_timings("/", handler_id, render=0.1))
+
+  text = metrics.to_prometheus_text()
+
+  assert 'handler="b",phase="render"' in text
+  assert 'handler="c"' not in text
+  assert (
+    'mesop_ui_request_phase_duration_seconds_count{path="other",handler="other",phase="render"} 2'
+    in text
+  )
+
+
+def test_format_websocket_scheduler_metrics():
+  text = format_websocket_scheduler_metrics(
+    WebSocketSchedulerMetrics(
+      queued=1,
+      running=2,
+      active_sessions=3,
+      submitted=4,
+      rejected=5,
+      completed=6,
+      total_wait_seconds=0.5,
+      max_wait_seconds=0.25,
+    )
+  )
+
+  assert "# TYPE mesop_websocket_scheduler_queued_jobs gauge" in text
+  assert "mesop_websocket_scheduler_queued_jobs 1\n" in text
+  assert "# TYPE mesop_websocket_scheduler_rejected_jobs_total counter" in text
+  assert "mesop_websocket_scheduler_rejected_jobs_total 5\n" in text
+
+
+if __name__ == "__main__":
+  raise SystemExit(pytest.main([__file__]))
@@ -0,0 +1,88 @@
+"""Serves a WSGI app from multiple worker processes.
+
+The app is loaded once in the parent process, which then forks the workers. The
+workers share the parent's listening socket, so the OS spreads connections
+across them, and they share the parent's memory pages until they write to them.
+"""
+
+import contextlib
+import gc
+import logging
+import os
+import signal
+import time
+
+from werkzeug.serving import BaseWSGIServer
+
+logger = logging.getLogger(__name__)
+
+# Delay before replacing a worker that exited unexpectedly, so that a worker
+# that crashes on startup does not make the parent spin.
+_RESTART_DELAY_SECONDS = 1.0
+
+
+def serve_prefork(server: BaseWSGIServer, *, workers: int) -> None:
+  """Runs `server` in `workers` forked processes until the parent is stopped.
+
+  Workers that exit unexpectedly are replaced. Sending SIGINT or SIGTERM to the
+  parent stops all of the workers.
+  """
+  if not hasattr(os, "fork"):
+    raise RuntimeError("Running multiple workers requires os.fork.")
+
+  # The garbage collector writes to the header of every object it tracks, which
+  # would copy the memory pages holding the objects created at startup (e.g.
+  # the app's modules) into every worker. Freezing moves them out of its reach.
+  gc.collect()
+  gc.freeze()
+
+  worker_pids: set[int] = set()
+  stopping = False
+
+  def start_worker():
+    pid = os.fork()
+    if pid == 0:
+      # Let the parent handle Ctrl+C and only exit when it tells the worker to.
+      signal.signal(signal.SIGINT, signal.SIG_IGN)
+      signal.signal(signal.SIGTERM, signal.SIG_DFL)
+      exit_code = 0
+      try:
+        server.serve_forever()
+      except BaseException:
+        logger.exception("Worker %s failed", os.getpid())
+        exit_code = 1
+      finally:
+        os._exit(exit_code)
+    worker_pids.add(pid)
+
+  def stop(signum, frame):
+    nonlocal stopping
+    stopping = True
+    for pid in worker_pids:
+      with contextlib.suppress(ProcessLookupError):
+        os.kill(pid, signal.SIGTERM)
+
+  signal.signal(signal.SIGINT, stop)
+  signal.signal(signal.SIGTERM, stop)
+  for _ in range(workers):
+    start_worker()
+  logger.info("Started %s workers: %s", workers, sorted(worker_pids))
+
+  try:
+    while worker_pids:
+      try:
+        pid, status = os.wait()
+      except ChildProcessError:
+        break
+      worker_pids.discard(pid)
+      if not stopping:
+        logger.warning(
+          "Worker %s exited with code %s, starting a new worker.",
+          pid,
+          os.waitstatus_to_exitcode(status),
+        )
+        time.sleep(_RESTART_DELAY_SECONDS)
+        if not stopping:
+          start_worker()
+  finally:
+    server.server_close()
@@ -0,0 +1,70 @@
+import os
+import signal
+import time
+import urllib.request
+from typing import Any, Callable
+
+import pytest
+from werkzeug.serving import make_server
+
+from mesop.server.prefork import serve_prefork
+
+
+def pid_app(environ: dict[str, Any], start_response: Callable[..., Any]):
+  start_response("200 OK", [("Content-Type", "text/plain")])
+  return [str(os.getpid()).encode()]
+
+
+def get(port: int) -> str:
+  # Workers may still be starting, so retry briefly.
+  for _ in range(50):
+    try:
+      with urllib.request.urlopen(f"http://localhost:{port}/") as response:
+        return response.read().decode()
+    except OSError:
+      time.sleep(0.1)
+  raise TimeoutError("Server did not respond")
+
+
+def test_serves_requests_from_worker_processes():
+  server = make_server("localhost", 0, pid_app, threaded=True)
+  supervisor_pid = os.fork()
+  if supervisor_pid == 0:
+    try:
+      serve_prefork(server, workers=2)
+    finally:
+      os._exit(0)
+  server.server_close()
+
+  try:
+    worker_pids = {get(server.port) for _ in range(10)}
+  finally:
+    os.kill(supervisor_pid, signal.SIGTERM)
+    _, status = os.waitpid(supervisor_pid, 0)
+
+  assert str(supervisor_pid) not in worker_pids
+  assert str(os.getpid()) not in worker_pids
+  assert os.waitstatus_to_exitcode(status) == 0
+
+
+def test_replaces_workers_that_exit():
+  server = make_server("localhost", 0, pid_app, threaded=True)
+  supervisor_pid = os.fork()
+  if supervisor_pid == 0:
+    try:
+      serve_prefork(server, workers=1)
+    finally:
+      os._exit(0)
+  server.server_close()
+
+  try:
+    first_worker_pid = get(server.port)
+    os.kill(int(first_worker_pid), signal.SIGKILL)
+    assert get(server.port) != first_worker_pid
+  finally:
+    os.kill(supervisor_pid, signal.SIGTERM)
+    os.waitpid(supervisor_pid, 0)
+
+
+if __name__ == "__main__":
+  raise SystemExit(pytest.main([__file__]))
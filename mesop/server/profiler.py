@@ -0,0 +1,145 @@
+"""Sampling profiler for slow UI requests.
+
+While a UI request is running, a background thread periodically samples the
+call stack of the thread processing it. If the request, or one step of a
+generator event handler, turns out to be slow, the samples are kept so that they
+can be viewed as a flame graph. Samples of fast requests are discarded.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from types import FrameType
+
+from mesop.server.metrics import RequestTimings
+
+_SAMPLE_INTERVAL_SECONDS = 0.005
+# Number of slow requests to keep. Older captures are discarded first.
+_MAX_CAPTURES = 50
+
+
+@dataclass
+class SlowEventCapture:
+  path: str
+  handler_id: str
+  duration_seconds: float
+  max_step_seconds: float
+  # Time the request finished (seconds since the epoch).
+  timestamp: float
+  # Number of samples by stack, in the collapsed stack format (root frame first,
+  # separated by ";").
+  stacks: Counter[str]
+
+
+# Compared by identity so that it can be stored in a set.
+@dataclass(eq=False)
+class ProfiledRequest:
+  thread_id: int
+  stacks: Counter[str] = field(default_factory=Counter)
+
+
+class SlowEventProfiler:
+  def __init__(
+    self,
+    threshold_ms: int,
+    *,
+    sample_interval_seconds: float = _SAMPLE_INTERVAL_SECONDS,
+    max_captures: int = _MAX_CAPTURES,
+  ):
+    self._threshold_seconds = threshold_ms / 1000
+    self._sample_interval_seconds = sample_interval_seconds
+    self._lock = threading.Lock()
+    self._has_active_requests = threading.Condition(self._lock)
+    self._active_requests: set[ProfiledRequest] = set()
+    self._captures: deque[SlowEventCapture] = deque(maxlen=max_captures)
+    self._sampler: threading.Thread | None = None
+
+  def start(self) -> ProfiledRequest:
+    """Starts sampling the current thread, which processes the UI request."""
+    profiled_request = ProfiledRequest(thread_id=threading.get_ident())
+    with self._lock:
+      self._active_requests.add(profiled_request)
+      if self._sampler is None:
+        self._sampler = threading.Thread(
+          target=self._run_sampler, name="mesop-profiler", daemon=True
+        )
+        self._sampler.start()
+      self._has_active_requests.notify()
+    return profiled_request
+
+  def finish(self, profiled_request: ProfiledRequest, timings: RequestTimings):
+    """Stops sampling and keeps the samples if the request was slow."""
+    duration_seconds = timings.total_seconds()
+    with self._lock:
+      self._active_requests.discard(profiled_request)
+      if (
+        duration_seconds < self._threshold_seconds
+        and timings.max_step_seconds < self._threshold_seconds
+      ) or not profiled_request.stacks:
+        return
+      self._captures.append(
+        SlowEventCapture(
+          path=timings.path,
+          handler_id=timings.handler_id,
+          duration_seconds=duration_seconds,
+          max_step_seconds=timings.max_step_seconds,
+          timestamp=time.time(),
+          stacks=profiled_request.stacks,
+        )
+      )
+
+  def captures(self) -> list[SlowEventCapture]:
+    with self._lock:
+      return list(self._captures)
+
+  def sample(self):
+    """Samples the stacks of the active requests once."""
+    frames = sys._current_frames()
+    with self._lock:
+      for profiled_request in self._active_requests:
+        frame = frames.get(profiled_request.thread_id)
+        if frame is not None:
+          profiled_request.stacks[_collapse_stack(frame)] += 1
+
+  def _run_sampler(self):
+    while True:
+      with self._lock:
+        while not self._active_requests:
+          self._has_active_requests.wait()
+      self.sample()
+      time.sleep(self._sample_interval_seconds)
+
+
+def to_collapsed_stacks(captures: list[SlowEventCapture]) -> str:
+  """Formats the captures as collapsed stacks, which flame graph tools accept.
+
+  Each stack starts with frames for the page path and handler ID, so that the
+  flame graph groups the samples by event.
+  """
+  lines = []
+  for capture in captures:
+    handler_id = capture.handler_id or "(no handler)"
+    root = f"{_escape_frame(capture.path)};{_escape_frame(handler_id)}"
+    for stack, count in capture.stacks.items():
+      lines.append(f"{root};{stack} {count}")
+  return "\n".join(lines) + "\n" if lines else ""
+
+
+def _collapse_stack(frame: FrameType | None) -> str:
+  frames = []
+  while frame is not None:
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    frames.append(
+      _escape_frame(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+    )
+    frame = frame.f_back
+  return ";".join(reversed(frames))
+
+
+def _escape_frame(name: str) -> str:
+  # ";" separates frames and a newline separates stacks.
+  return name.replace(";", ":").replace("\n", " ")
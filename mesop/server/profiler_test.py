@@ -0,0 +1,106 @@
+from collections import Counter
+from unittest.mock import patch
+
+import pytest
+
+from mesop.server.metrics import RequestTimings
+from mesop.server.profiler import (
+  SlowEventCapture,
+  SlowEventProfiler,
+  to_collapsed_stacks,
+)
+
+
+def create_timings(
+  handler_id: str = "on_click", total_seconds: float = 0.0
+) -> RequestTimings:
+  timings = RequestTimings()
+  timings.path = "/chat"
+  timings.handler_id = handler_id
+  patch.object(timings, "total_seconds", return_value=total_seconds).start()
+  return timings
+
+
+@pytest.fixture(autouse=True)
+def stop_patches():
+  yield
+  patch.stopall()
+
+
+def profile_request(
+  profiler: SlowEventProfiler, timings: RequestTimings
+) -> None:
+  profiled_request = profiler.start()
+  profiler.sample()
+  profiler.finish(profiled_request, timings)
+
+
+def test_captures_slow_requests():
+  profiler = SlowEventProfiler(100)
+
+  profile_request(profiler, create_timings(total_seconds=0.2))
+
+  [capture] = profiler.captures()
+  assert capture.path == "/chat"
+  assert capture.handler_id == "on_click"
+  assert capture.duration_seconds == 0.2
+  assert any(
+    ";profile_request (profiler_test.py:" in stack for stack in capture.stacks
+  )
+
+
+def test_captures_slow_steps():
+  profiler = SlowEventProfiler(100)
+  timings = create_timings(total_seconds=0.05)
+  timings.max_step_seconds = 0.1
+
+  profile_request(profiler, timings)
+
+  assert len(profiler.captures()) == 1
+
+
+def test_discards_fast_requests():
+  profiler = SlowEventProfiler(100)
+
+  profile_request(profiler, create_timings(total_seconds=0.05))
+
+  assert profiler.captures() == []
+
+
+def test_keeps_latest_captures():
+  profiler = SlowEventProfiler(100, max_captures=2)
+
+  for handler_id in ["a", "b", "c"]:
+    profile_request(profiler, create_timings(handler_id, total_seconds=1))
+
+  assert [capture.handler_id for capture in profiler.captures()] == ["b", "c"]
+
+
+def test_to_collapsed_stacks():
+  captures = [
+    SlowEventCapture(
+      path="/",
+      handler_id="",
+      duration_seconds=1,
+      max_step_seconds=0,
+      timestamp=0,
+      stacks=Counter({"main (app.py:1);page (app.py:5)": 3}),
+    ),
+    SlowEventCapture(
+      path="/chat",
+      handler_id="on;click",
+      duration_seconds=1,
+      max_step_seconds=1,
+      timestamp=0,
+      stacks=Counter({"main (app.py:1)": 2}),
+    ),
+  ]
+
+  assert to_collapsed_stacks(captures) == (
+    "/;(no handler);main (app.py:1);page (app.py:5) 3\n"
+    "/chat;on:click;main (app.py:1) 2\n"
+  )
+
+
+if __name__ == "__main__":
+  raise SystemExit(pytest.main([__file__]))
@@ -1,13 +1,14 @@
-import base64
 import dataclasses
+import functools
+import itertools
 import logging
 import os
 import secrets
 import threading
 import time
-import types
-from collections.abc import Generator, Sequence
+from collections.abc import AsyncGenerator, Generator, Iterable, Sequence
 from concurrent.futures import ThreadPoolExecutor
+from typing import Any
 
 from flask import (
   Flask,
@@ -21,36 +22,70 @@ from flask import (
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 import mesop.protos.ui_pb2 as pb
-from mesop.component_helpers import diff_component
+from mesop.component_helpers import diff_component, without_subtree_hashes
 from mesop.env.env import (
   MESOP_APP_BASE_PATH,
   MESOP_BASE_URL_PATH,
+  MESOP_HANDLER_REGISTRY_ENABLED,
+  MESOP_METRICS_ENABLED,
+  MESOP_MIN_FRAME_INTERVAL_MS,
   MESOP_PROD_UNREDACTED_ERRORS,
+  MESOP_PROFILE_SLOW_EVENTS_MS,
+  MESOP_SERVER_TIMING_ENABLED,
+  MESOP_STYLE_TABLE_ENABLED,
   MESOP_TRUST_PROXY_HEADERS,
+  MESOP_WEBSOCKET_COMPRESSION_ENABLED,
+  MESOP_WEBSOCKET_CONTEXT_IDLE_TIMEOUT_SECONDS,
+  MESOP_WEBSOCKET_MAX_CONTEXTS,
+  MESOP_WEBSOCKET_MAX_QUEUED,
+  MESOP_WEBSOCKET_MAX_QUEUED_PER_SESSION,
+  MESOP_WEBSOCKET_MAX_RUNNING_PER_SESSION,
+  MESOP_WEBSOCKET_MAX_WORKERS,
   MESOP_WEBSOCKETS_ENABLED,
 )
 from mesop.events import LoadEvent
 from mesop.exceptions import MesopDeveloperException, format_traceback
 from mesop.runtime import runtime
 from mesop.runtime.context import PendingCookie
+from mesop.server.config import app_config
 from mesop.server.constants import WEB_COMPONENTS_PATH_SEGMENT
+from mesop.server.metrics import (
+  NULL_REQUEST_TIMINGS,
+  PROMETHEUS_CONTENT_TYPE,
+  RequestTimings,
+  create_request_timings,
+  format_websocket_scheduler_metrics,
+  ui_request_metrics,
+)
+from mesop.server.profiler import SlowEventProfiler, to_collapsed_stacks
 from mesop.server.server_debug_routes import configure_debug_routes
 from mesop.server.server_utils import (
-  STREAM_END,
+  BINARY_CONTENT_TYPE,
+  coalesce_frames,
   create_update_state_event,
   get_static_folder,
   get_static_url_path,
   is_same_site,
-  make_sse_response,
+  make_ui_stream_response,
+  parse_ui_request,
   prefix_base_url,
   serialize,
+  serialize_server_busy,
+  serialize_stream_end,
+)
+from mesop.server.websocket_scheduler import WebSocketScheduler
+from mesop.utils.async_utils import (
+  iterate_handler_result,
+  run_async_generator,
+  run_sync,
 )
-from mesop.utils.async_utils import run_async_generator, run_coroutine
 from mesop.utils.url_utils import remove_url_query_param
 from mesop.warn import warn
 
 UI_PATH = prefix_base_url("/__ui__")
 APPLY_COOKIES_PATH = prefix_base_url("/__apply-cookies")
+METRICS_PATH = prefix_base_url("/__metrics__")
+SLOW_EVENTS_PATH = prefix_base_url("/__slow-events__")
 
 logger = logging.getLogger(__name__)
 
@@ -152,16 +187,9 @@ class _CookieTokenCache:
 _cookie_token_cache = _CookieTokenCache()
 
 
-def _process_on_load_result(result) -> Generator[None, None, None]:
-  """Process on_load result, handling sync generators, async generators, and coroutines."""
-  if result is not None:
-    if isinstance(result, types.AsyncGeneratorType):
-      yield from run_async_generator(result)
-    elif isinstance(result, types.CoroutineType):
-      yield run_coroutine(result)
-    else:
-      # Regular generator
-      yield from result
+def apply_proxy_fix(wsgi_app: Any) -> ProxyFix:
+  """Wraps the WSGI app so it uses the forwarded headers set by a trusted proxy."""
+  return ProxyFix(wsgi_app, x_for=1, x_proto=1, x_host=1, x_port=1, x_prefix=1)
 
 
 def configure_flask_app(
@@ -169,6 +197,15 @@ def configure_flask_app(
 ) -> Flask:
   if MESOP_WEBSOCKETS_ENABLED:
     logger.info("Experiment enabled: MESOP_WEBSOCKETS_ENABLED")
+  if MESOP_HANDLER_REGISTRY_ENABLED:
+    logger.info("Experiment enabled: MESOP_HANDLER_REGISTRY_ENABLED")
+  if (
+    MESOP_WEBSOCKET_CONTEXT_IDLE_TIMEOUT_SECONDS or MESOP_WEBSOCKET_MAX_CONTEXTS
+  ) and not app_config.state_session_enabled:
+    # Otherwise the state of evicted contexts would be lost.
+    raise MesopDeveloperException(
+      "MESOP_WEBSOCKET_CONTEXT_IDLE_TIMEOUT_SECONDS and MESOP_WEBSOCKET_MAX_CONTEXTS require MESOP_STATE_SESSION_BACKEND to be set, since evicted contexts are saved to the state session backend."
+    )
 
   if MESOP_APP_BASE_PATH:
     logger.info(f"MESOP_APP_BASE_PATH set to {MESOP_APP_BASE_PATH}")
@@ -200,9 +237,13 @@ def configure_flask_app(
     # via auto-detection of known cloud platforms). Do NOT enable this in
     # deployments that are not behind a trusted reverse proxy, as it would allow
     # callers to spoof X-Forwarded-* headers and bypass origin checks.
-    flask_app.wsgi_app = ProxyFix(  # type: ignore[method-assign]
-      flask_app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_port=1, x_prefix=1
-    )
+    flask_app.wsgi_app = apply_proxy_fix(flask_app.wsgi_app)  # type: ignore[method-assign]
+
+  profiler = (
+    SlowEventProfiler(MESOP_PROFILE_SLOW_EVENTS_MS)
+    if MESOP_PROFILE_SLOW_EVENTS_MS
+    else None
+  )
 
   def maybe_append_apply_cookies_command() -> None:
     """If the context has pending cookies, cache them and append an ApplyCookiesCommand."""
@@ -215,18 +256,44 @@ def configure_flask_app(
       pb.Command(apply_cookies=pb.ApplyCookiesCommand(token=token))
     )
 
-  def render_loop(
+  async def render_loop(
     path: str,
     trace_mode: bool = False,
     init_request: bool = False,
-  ) -> Generator[str, None, None]:
+    timings: RequestTimings = NULL_REQUEST_TIMINGS,
+  ) -> AsyncGenerator[str | bytes, None]:
+    """Renders the page and yields the serialized response.
+
+    The page is rendered with `run_sync`, so that a slow page function, or waiting
+    for the context lock, does not stall other sessions on a shared event loop.
+    Handlers are never running while the page renders (see `coalesce_frames`).
+    """
+    try:
+      serialized_data = await run_sync(render, path, trace_mode, timings)
+    except Exception as e:
+      logging.error(e)
+      if e in exceptions_to_propagate:
+        raise e
+      for chunk in yield_errors(
+        error=pb.ServerError(exception=str(e), traceback=format_traceback())
+      ):
+        yield chunk
+      return
+    # Yield after the context lock is released, since the consumer may suspend
+    # (e.g. while sending data to the client).
+    yield serialized_data
+
+  def render(
+    path: str, trace_mode: bool, timings: RequestTimings
+  ) -> str | bytes:
+    runtime().context().acquire_lock()
     try:
-      runtime().context().acquire_lock()
-      runtime().run_path(path=path)
+      with timings.phase("render"):
+        runtime().run_path(path=path)
       page_config = runtime().get_page_config(path=path)
       title = page_config.title if page_config else "Unknown path"
 
-      root_component = runtime().context().current_node()
+      root_component = runtime().context().current_component()
       previous_root_component = runtime().context().previous_node()
       component_diff = None
       if (
@@ -237,8 +304,26 @@ def configure_flask_app(
         and not trace_mode
         and previous_root_component
       ):
-        component_diff = diff_component(previous_root_component, root_component)
+        with timings.phase("diff_component"):
+          component_diff = diff_component(
+            previous_root_component, root_component
+          )
         root_component = None
+      else:
+        client_component = without_subtree_hashes(root_component)
+        if MESOP_STYLE_TABLE_ENABLED and client_component is root_component:
+          # Styles are replaced in place, so the context's tree is copied.
+          client_component = pb.Component()
+          client_component.CopyFrom(root_component)
+        root_component = client_component
+      styles = []
+      if MESOP_STYLE_TABLE_ENABLED:
+        style_table = runtime().context().style_table()
+        if root_component is not None:
+          style_table.replace_styles(root_component)
+        if component_diff is not None:
+          style_table.replace_styles_in_diff(component_diff)
+        styles = style_table.pop_new_entries()
       commands = runtime().context().commands()
       # Need to clear commands so that we don't keep on re-sending commands
       # (e.g. scroll into view) for the same context (e.g. multiple render loops
@@ -259,21 +344,16 @@ def configure_flask_app(
             f"/{WEB_COMPONENTS_PATH_SEGMENT}{js_module}"
             for js_module in js_modules
           ],
+          styles=styles,
         )
       )
       runtime().context().set_has_rendered(True)
-      yield serialize(data)
-    except Exception as e:
-      logging.error(e)
-      if e in exceptions_to_propagate:
-        raise e
-      yield from yield_errors(
-        error=pb.ServerError(exception=str(e), traceback=format_traceback())
-      )
+      with timings.phase("serialize"):
+        return serialize(data)
     finally:
       runtime().context().release_lock()
 
-  def yield_errors(error: pb.ServerError) -> Generator[str, None, None]:
+  def yield_errors(error: pb.ServerError) -> Generator[str | bytes, None, None]:
     should_redact_errors = (
       not runtime().debug_mode and not MESOP_PROD_UNREDACTED_ERRORS
     )
@@ -290,19 +370,41 @@ def configure_flask_app(
     ui_response = pb.UiResponse(error=error)
 
     yield serialize(ui_response)
-    yield STREAM_END
-
-  def generate_data(ui_request: pb.UiRequest) -> Generator[str, None, None]:
+    yield serialize_stream_end()
+
+  async def generate_data(
+    ui_request: pb.UiRequest,
+    timings: RequestTimings | None = None,
+    *,
+    profile: bool = True,
+  ) -> AsyncGenerator[str | bytes, None]:
+    """Processes the UI request and yields the serialized responses.
+
+    Args:
+      profile: Whether to sample the request with the slow event profiler, which
+        samples the current thread. Disabled by the ASGI app, whose event loop
+        thread also runs other requests.
+    """
+    if timings is None:
+      timings = create_request_timings()
+    timings.path = ui_request.path
+    timings.handler_id = (
+      ui_request.user_event.handler_id
+      if ui_request.HasField("user_event")
+      else ""
+    )
+    profiled_request = profiler.start() if profiler and profile else None
     try:
       # Wait for hot reload to complete on the server-side before processing the
       # request. This avoids a race condition where the client-side reloads before
       # the server has reloaded.
-      runtime().wait_for_hot_reload()
+      await run_sync(runtime().wait_for_hot_reload)
       if runtime().has_loading_errors():
         # Only showing the first error since our error UI only
         # shows one error at a time, and in practice there's usually
         # one error.
-        yield from yield_errors(runtime().get_loading_errors()[0])
+        for chunk in yield_errors(runtime().get_loading_errors()[0]):
+          yield chunk
 
       if ui_request.HasField("init"):
         runtime().context().set_theme_settings(ui_request.init.theme_settings)
@@ -310,29 +412,13 @@ def configure_flask_app(
         runtime().context().initialize_query_params(
           ui_request.init.query_params
         )
-        page_config = runtime().get_page_config(path=ui_request.path)
-        if page_config and page_config.on_load:
-          result = page_config.on_load(
-            LoadEvent(
-              path=ui_request.path,
-            )
-          )
-          # on_load is a generator function then we need to iterate through
-          # the generator object. This also handles async generators and coroutines.
-          if result:
-            for _ in _process_on_load_result(result):
-              maybe_append_apply_cookies_command()
-              yield from render_loop(path=ui_request.path, init_request=True)
-              runtime().context().set_previous_node_from_current_node()
-              runtime().context().reset_current_node()
-          else:
-            maybe_append_apply_cookies_command()
-            yield from render_loop(path=ui_request.path, init_request=True)
-        else:
-          yield from render_loop(path=ui_request.path, init_request=True)
+        async for chunk in render_initial_page(
+          path=ui_request.path, timings=timings
+        ):
+          yield chunk
         if not MESOP_WEBSOCKETS_ENABLED:
-          yield create_update_state_event()
-        yield STREAM_END
+          yield create_update_state_event(timings=timings)
+        yield serialize_stream_end()
       elif ui_request.HasField("user_event"):
         event = ui_request.user_event
         runtime().context().set_theme_settings(event.theme_settings)
@@ -340,20 +426,49 @@ def configure_flask_app(
         runtime().context().initialize_query_params(event.query_params)
 
         if not MESOP_WEBSOCKETS_ENABLED:
-          if event.states.states:
-            runtime().context().update_state(event.states)
-          else:
-            runtime().context().restore_state_from_session(event.state_token)
-
+          with timings.phase("state_restore"):
+            if event.states.states:
+              runtime().context().update_state(event.states)
+            else:
+              runtime().context().restore_state_from_session(event.state_token)
+        elif runtime().context().has_lost_state():
+          # The state of the session's evicted context could not be restored, so
+          # the event is dropped and the page is rendered from scratch, rather
+          # than running the handler on state the user has never seen.
+          async for chunk in render_initial_page(
+            path=ui_request.path, timings=timings
+          ):
+            yield chunk
+          yield serialize_stream_end()
+          return
+
+        handler_id = ui_request.user_event.handler_id
+        # If the handler is in the process-wide handler registry, we can skip the
+        # trace render loop since it's only needed to register the event handlers.
+        # The tradeoff is that there is no previous component tree to diff against,
+        # so the full component tree will be sent.
+        registered_handler = (
+          runtime().get_event_handler(handler_id)
+          if MESOP_HANDLER_REGISTRY_ENABLED and handler_id
+          else None
+        )
+        if registered_handler:
+          runtime().context().register_event_handler(
+            handler_id, registered_handler
+          )
         # In websockets mode, since the context instance is long-lived, we only
         # need to do a trace render loop if the context has not completed at least
         # one render loop.
-        if (
+        #
+        # Events without a handler ID do not need a trace render loop since there
+        # are no handlers to look up and the previous node is reset below.
+        elif handler_id and (
           not MESOP_WEBSOCKETS_ENABLED or not runtime().context().has_rendered()
         ):
-          for _ in render_loop(path=ui_request.path, trace_mode=True):
-            pass
-        if ui_request.user_event.handler_id:
+          with timings.phase("trace_render"):
+            async for _ in render_loop(path=ui_request.path, trace_mode=True):
+              pass
+        if handler_id and not registered_handler:
           runtime().context().set_previous_node_from_current_node()
         else:
           # Set previous node to None to skip component diffs on hot reload. This is
@@ -374,10 +489,13 @@ def configure_flask_app(
             page_config and page_config.on_load and not has_run_navigate_on_load
           ):
             has_run_navigate_on_load = True
-            yield from run_page_load(path=path)
+            async for chunk in run_page_load(path=path, timings=timings):
+              yield chunk
 
         result = runtime().context().run_event_handler(ui_request.user_event)
-        for _ in result:
+        async for _ in coalesce_frames(
+          timings.time_steps("handler", result), MESOP_MIN_FRAME_INTERVAL_MS
+        ):
           maybe_append_apply_cookies_command()
           navigate_commands = [
             command
@@ -398,8 +516,9 @@ def configure_flask_app(
                 command.navigate.query_params
               )
               if command.navigate.url.startswith(("http://", "https://")):
-                yield from render_loop(path=path)
-                yield STREAM_END
+                async for chunk in render_loop(path=path, timings=timings):
+                  yield chunk
+                yield serialize_stream_end()
                 return
               path = remove_url_query_param(command.navigate.url)
               page_config = runtime().get_page_config(path=path)
@@ -409,16 +528,18 @@ def configure_flask_app(
                 and not has_run_navigate_on_load
               ):
                 has_run_navigate_on_load = True
-                yield from run_page_load(path=path)
+                async for chunk in run_page_load(path=path, timings=timings):
+                  yield chunk
 
-          yield from render_loop(path=path)
+          async for chunk in render_loop(path=path, timings=timings):
+            yield chunk
           runtime().context().set_previous_node_from_current_node()
           runtime().context().reset_current_node()
         # Flush any cookies queued by a generator handler that yielded 0 times.
         maybe_append_apply_cookies_command()
         if not MESOP_WEBSOCKETS_ENABLED:
-          yield create_update_state_event(diff=True)
-        yield STREAM_END
+          yield create_update_state_event(diff=True, timings=timings)
+        yield serialize_stream_end()
       else:
         raise Exception(f"Unknown request type: {ui_request}")
 
@@ -429,23 +550,77 @@ def configure_flask_app(
       # not leak into the next event cycle.  This matters most in WebSockets
       # mode where the Context is long-lived across multiple requests.
       runtime().context().clear_pending_cookies()
-      yield from yield_errors(
+      for chunk in yield_errors(
         error=pb.ServerError(exception=str(e), traceback=format_traceback())
-      )
+      ):
+        yield chunk
+    finally:
+      if MESOP_METRICS_ENABLED:
+        ui_request_metrics.record(timings)
+      if profiler and profiled_request:
+        profiler.finish(profiled_request, timings)
+
+  async def render_initial_page(
+    *, path: str, timings: RequestTimings
+  ) -> AsyncGenerator[str | bytes, None]:
+    """Runs the page's on_load handler, if any, and renders the page."""
+    # The page is rendered from scratch, so the client no longer shows lost state.
+    runtime().context().set_has_lost_state(False)
+    page_config = runtime().get_page_config(path=path)
+    if page_config and page_config.on_load:
+      with timings.phase("on_load"):
+        result = await run_sync(page_config.on_load, LoadEvent(path=path))
+      # on_load is a generator function then we need to iterate through
+      # the generator object. This also handles async generators and coroutines.
+      if result:
+        async for _ in coalesce_frames(
+          timings.time_steps("on_load", iterate_handler_result(result)),
+          MESOP_MIN_FRAME_INTERVAL_MS,
+        ):
+          maybe_append_apply_cookies_command()
+          async for chunk in render_loop(
+            path=path, init_request=True, timings=timings
+          ):
+            yield chunk
+          runtime().context().set_previous_node_from_current_node()
+          runtime().context().reset_current_node()
+      else:
+        maybe_append_apply_cookies_command()
+        async for chunk in render_loop(
+          path=path, init_request=True, timings=timings
+        ):
+          yield chunk
+    else:
+      async for chunk in render_loop(
+        path=path, init_request=True, timings=timings
+      ):
+        yield chunk
 
-  def run_page_load(*, path: str):
+  async def run_page_load(
+    *, path: str, timings: RequestTimings
+  ) -> AsyncGenerator[str | bytes, None]:
     page_config = runtime().get_page_config(path=path)
     assert page_config and page_config.on_load
-    result = page_config.on_load(LoadEvent(path=path))
+    with timings.phase("on_load"):
+      result = await run_sync(page_config.on_load, LoadEvent(path=path))
     # on_load is a generator function then we need to iterate through
     # the generator object. This also handles async generators and coroutines.
     if result:
-      for _ in _process_on_load_result(result):
+      async for _ in coalesce_frames(
+        timings.time_steps("on_load", iterate_handler_result(result)),
+        MESOP_MIN_FRAME_INTERVAL_MS,
+      ):
         maybe_append_apply_cookies_command()
-        yield from render_loop(path=path, init_request=True)
+        async for chunk in render_loop(
+          path=path, init_request=True, timings=timings
+        ):
+          yield chunk
         runtime().context().set_previous_node_from_current_node()
         runtime().context().reset_current_node()
 
+  # Exposed so that the ASGI app can stream UI responses on its own event loop.
+  flask_app.extensions["mesop.generate_data"] = generate_data
+
   @flask_app.route(UI_PATH, methods=["POST"])
   def ui_stream() -> Response:
     # Prevent CSRF by checking the request site matches the site
@@ -460,12 +635,50 @@ def configure_flask_app(
     data = request.data
     if not data:
       raise Exception("Missing request payload")
-    ui_request = pb.UiRequest()
-    ui_request.ParseFromString(base64.urlsafe_b64decode(data))
+    ui_request = parse_ui_request(
+      data, binary=request.mimetype == BINARY_CONTENT_TYPE
+    )
 
-    response = make_sse_response(stream_with_context(generate_data(ui_request)))
+    timings = create_request_timings()
+    chunks: Iterable[str | bytes] = run_async_generator(
+      generate_data(ui_request, timings)
+    )
+    if MESOP_SERVER_TIMING_ENABLED:
+      # Headers are sent before the body, so compute the first event eagerly. The
+      # header then covers the phases up to the first event (typically the first
+      # render). Use the metrics route for the timings of the whole request.
+      chunks = iter(chunks)
+      first_chunk = next(chunks, None)
+      if first_chunk is not None:
+        chunks = itertools.chain([first_chunk], chunks)
+    response = make_ui_stream_response(stream_with_context(chunks))
+    if MESOP_SERVER_TIMING_ENABLED:
+      response.headers["Server-Timing"] = timings.server_timing_header()
     return response
 
+  if MESOP_METRICS_ENABLED:
+
+    @flask_app.route(METRICS_PATH, methods=["GET"])
+    def metrics() -> Response:
+      text = ui_request_metrics.to_prometheus_text()
+      # Only set when WebSockets are enabled.
+      scheduler: WebSocketScheduler | None = flask_app.extensions.get(
+        "mesop.websocket_scheduler"
+      )
+      if scheduler:
+        text += format_websocket_scheduler_metrics(scheduler.metrics())
+      return Response(text, content_type=PROMETHEUS_CONTENT_TYPE)
+
+  if profiler:
+
+    @flask_app.route(SLOW_EVENTS_PATH, methods=["GET"])
+    def slow_events() -> Response:
+      # Collapsed stacks, which can be viewed with flame graph tools such as
+      # speedscope or flamegraph.pl.
+      return Response(
+        to_collapsed_stacks(profiler.captures()), content_type="text/plain"
+      )
+
   @flask_app.route(APPLY_COOKIES_PATH, methods=["POST"])
   def apply_cookies() -> Response:
     """Endpoint that sets cookies previously queued by me.set_cookie().
@@ -520,21 +733,35 @@ def configure_flask_app(
 
     sock = Sock(flask_app)
 
-    # Global thread pool and admission semaphore, scoped to this Flask app instance
-    # so they are only created when WebSockets are actually enabled.
+    if not MESOP_WEBSOCKET_COMPRESSION_ENABLED:
+
+      @flask_app.before_request
+      def disable_websocket_compression():
+        # simple-websocket accepts permessage-deflate whenever the client offers
+        # it, so we remove the client's offer to disable compression.
+        if request.path == UI_PATH:
+          request.environ.pop("HTTP_SEC_WEBSOCKET_EXTENSIONS", None)
+
+    # Thread pool and scheduler, scoped to this Flask app instance so they are only
+    # created when WebSockets are actually enabled.
     #
     # _ws_executor caps the total number of OS threads processing WebSocket requests
     # across ALL connections, preventing thread exhaustion from either a single
     # flooded connection or many concurrent connections (CWE-400).
     #
-    # _ws_semaphore enforces a hard limit on the total number of tasks that may be
-    # in-flight at once (running + queued in the executor). Without this, a flood of
-    # connections could fill the executor's unbounded internal queue, exhausting RAM.
-    # acquire() is non-blocking: excess messages are dropped rather than queued.
-    _WS_MAX_WORKERS = 100
-    _WS_MAX_IN_FLIGHT = 500
-    _ws_executor = ThreadPoolExecutor(max_workers=_WS_MAX_WORKERS)
-    _ws_semaphore = threading.BoundedSemaphore(_WS_MAX_IN_FLIGHT)
+    # _ws_scheduler only submits tasks to the executor when a worker is free, and
+    # bounds the number of queued tasks, so a flood of messages cannot exhaust RAM.
+    # It also takes tasks from each session in turn, so a single noisy connection
+    # cannot starve the others.
+    _ws_executor = ThreadPoolExecutor(max_workers=MESOP_WEBSOCKET_MAX_WORKERS)
+    _ws_scheduler = WebSocketScheduler(
+      start=_ws_executor.submit,
+      max_workers=MESOP_WEBSOCKET_MAX_WORKERS,
+      max_queued=MESOP_WEBSOCKET_MAX_QUEUED,
+      max_queued_per_session=MESOP_WEBSOCKET_MAX_QUEUED_PER_SESSION,
+      max_running_per_session=MESOP_WEBSOCKET_MAX_RUNNING_PER_SESSION,
+    )
+    flask_app.extensions["mesop.websocket_scheduler"] = _ws_scheduler
 
     @sock.route(UI_PATH)
     def handle_websocket(ws: Server):
@@ -548,15 +775,14 @@ def configure_flask_app(
         return
 
       def ws_generate_data(ws, ui_request):
-        # Semaphore is always released here, whether generate_data succeeds or raises,
-        # so the in-flight count stays accurate and slots are never leaked.
         try:
-          for data_chunk in generate_data(ui_request):
-            if not ws.connected:
-              break
-            ws.send(data_chunk)
-        finally:
-          _ws_semaphore.release()
+          with runtime().websocket_context_in_use(session_id):
+            for data_chunk in run_async_generator(generate_data(ui_request)):
+              if not ws.connected:
+                break
+              ws.send(data_chunk)
+        except Exception as e:
+          logging.error("WebSocket error: %s", e)
 
       # Generate a unique session ID for the WebSocket connection
       session_id = secrets.token_urlsafe(32)
@@ -568,34 +794,38 @@ def configure_flask_app(
           if not message:
             continue  # Ignore empty messages
 
-          ui_request = pb.UiRequest()
           try:
-            decoded_message = base64.urlsafe_b64decode(message)
-            ui_request.ParseFromString(decoded_message)
+            # Binary frames contain the serialized proto as is, while text
+            # frames contain it as base64.
+            ui_request = parse_ui_request(
+              message, binary=isinstance(message, bytes)
+            )
           except Exception as parse_error:
             logging.error("Failed to parse message: %s", parse_error)
             continue  # Skip processing this message
 
-          # Reject the message immediately if the server is already at capacity.
-          # This keeps memory bounded regardless of how many connections are open.
-          if not _ws_semaphore.acquire(blocking=False):
+          # The scheduler runs the task in the bounded thread pool rather than
+          # spawning a raw OS thread. copy_current_request_context snapshots the
+          # Flask request context here (in the WebSocket handler thread) so each
+          # pool task runs with the correct context, even though pool threads are
+          # reused across requests.
+          if not _ws_scheduler.submit(
+            session_id,
+            functools.partial(
+              copy_current_request_context(ws_generate_data), ws, ui_request
+            ),
+          ):
+            # Tell the client to resend the request later instead of silently
+            # dropping it.
             logging.warning(
-              "WebSocket server at capacity (%d in-flight tasks), dropping message.",
-              _WS_MAX_IN_FLIGHT,
+              "WebSocket server at capacity, asking client to retry message."
             )
-            continue
-
-          # Submit to the bounded thread pool rather than spawning a raw OS thread.
-          # copy_current_request_context snapshots the Flask request context here
-          # (in the WebSocket handler thread) so each pool task runs with the
-          # correct context, even though pool threads are reused across requests.
-          _ws_executor.submit(
-            copy_current_request_context(ws_generate_data), ws, ui_request
-          )
+            ws.send(serialize_server_busy(ui_request))
 
       except Exception as e:
         logging.error("WebSocket error: %s", e)
       finally:
+        _ws_scheduler.close_session(session_id)
         # Clean up context when connection closes
         if hasattr(request, "websocket_session_id"):
           websocket_session_id = request.websocket_session_id  # type: ignore
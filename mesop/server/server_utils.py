@@ -2,19 +2,28 @@ import base64
 import json
 import os
 import secrets
+import struct
+import time
 import urllib.parse as urlparse
-from collections.abc import Generator, Iterable
+import zlib
+from collections.abc import AsyncGenerator, AsyncIterator, Generator, Iterable
 from typing import Any
 from urllib import request as urllib_request
 
-from flask import Response
+from flask import Response, has_request_context, request
 from werkzeug.security import safe_join
 
 import mesop.protos.ui_pb2 as pb
-from mesop.env.env import MESOP_BASE_URL_PATH, get_app_base_path
+from mesop.env.env import (
+  MESOP_BASE_URL_PATH,
+  MESOP_STREAM_COMPRESSION_ENABLED,
+  MESOP_STREAM_COMPRESSION_LEVEL,
+  get_app_base_path,
+)
 from mesop.exceptions import MesopDeveloperException
 from mesop.runtime import runtime
 from mesop.server.config import app_config
+from mesop.server.metrics import NULL_REQUEST_TIMINGS, RequestTimings
 
 
 def prefix_base_url(path: str) -> str:
@@ -44,22 +53,125 @@ LOCALHOSTS = (
 
 STREAM_END = "data: <stream_end>\n\n"
 
+BINARY_CONTENT_TYPE = "application/octet-stream"
+
+# Query param value that WebSocket clients use to request binary frames, since
+# browsers cannot set headers on the WebSocket upgrade request.
+BINARY_TRANSPORT_QUERY_PARAM = ("transport", "binary")
+
+# Binary frames are prefixed with the payload length as a 4-byte big-endian
+# unsigned integer. An empty frame marks the end of the stream.
+BINARY_STREAM_END = struct.pack(">I", 0)
+
+
+def is_binary_transport() -> bool:
+  """Returns true if the client asked for binary frames for the current UI request.
+
+  HTTP clients opt in with the `Accept` header and WebSocket clients opt in with a
+  query param on the WebSocket URL.
+  """
+  if not has_request_context():
+    return False
+  key, value = BINARY_TRANSPORT_QUERY_PARAM
+  if request.args.get(key) == value:
+    return True
+  return BINARY_CONTENT_TYPE in request.headers.get("Accept", "")
+
 
-def serialize(response: pb.UiResponse) -> str:
-  encoded = base64.b64encode(response.SerializeToString()).decode("utf-8")
+def serialize(response: pb.UiResponse) -> str | bytes:
+  data = response.SerializeToString()
+  if is_binary_transport():
+    return struct.pack(">I", len(data)) + data
+  encoded = base64.b64encode(data).decode("utf-8")
   return f"data: {encoded}\n\n"
 
 
+# How long the client should wait before resending a request that the server was
+# too busy to accept.
+SERVER_BUSY_RETRY_AFTER_MS = 500
+
+
+def serialize_server_busy(ui_request: pb.UiRequest) -> str | bytes:
+  """Serializes a response telling the client to resend `ui_request` later."""
+  return serialize(
+    pb.UiResponse(
+      server_busy=pb.ServerBusyEvent(
+        retry_after_ms=SERVER_BUSY_RETRY_AFTER_MS, request=ui_request
+      )
+    )
+  )
+
+
+def serialize_stream_end() -> str | bytes:
+  if is_binary_transport():
+    return BINARY_STREAM_END
+  return STREAM_END
+
+
+def parse_ui_request(data: str | bytes, *, binary: bool) -> pb.UiRequest:
+  """Parses a UI request sent as raw bytes (binary) or URL-safe base64 text."""
+  ui_request = pb.UiRequest()
+  if binary:
+    ui_request.ParseFromString(data)
+  else:
+    ui_request.ParseFromString(base64.urlsafe_b64decode(data))
+  return ui_request
+
+
+async def coalesce_frames(
+  steps: AsyncIterator[None], min_interval_ms: int
+) -> AsyncGenerator[None, None]:
+  """Yields for each handler step that should be rendered.
+
+  Steps that arrive less than `min_interval_ms` after the last rendered step are
+  merged into the next rendered step, which caps the render rate for handlers that
+  yield very often (e.g. streaming LLM tokens). Steps that queue commands or cookies
+  are always rendered, so they are sent right away and in order. If the last step
+  was skipped, it is yielded once the handler is done so the final UI is rendered.
+
+  Steps are only yielded between handler steps, never while the handler runs, so
+  the render only sees state that the handler has yielded.
+  """
+  if min_interval_ms <= 0:
+    async for _ in steps:
+      yield
+    return
+
+  min_interval_seconds = min_interval_ms / 1000
+  last_render_time: float | None = None
+  has_pending_step = False
+  async for _ in steps:
+    now = time.monotonic()
+    if (
+      last_render_time is None
+      or now - last_render_time >= min_interval_seconds
+      or runtime().context().commands()
+      or runtime().context().pending_cookies()
+    ):
+      has_pending_step = False
+      yield
+      # Measure from when the render finished so that slow renders also reduce
+      # the render rate.
+      last_render_time = time.monotonic()
+    else:
+      has_pending_step = True
+  if has_pending_step:
+    yield
+
+
 def generate_state_token():
   """Generates a state token used to cache and look up Mesop state."""
   return secrets.token_urlsafe(16)
 
 
-def create_update_state_event(diff: bool = False) -> str:
+def create_update_state_event(
+  diff: bool = False, timings: RequestTimings = NULL_REQUEST_TIMINGS
+) -> str | bytes:
   """Creates a state event to send to the client.
 
   Args:
     diff: If true, sends diffs instead of the full state objects
+    timings: Records the time spent saving, diffing and serializing the state
 
   Returns:
     serialized `pb.UiResponse`
@@ -71,15 +183,18 @@ def create_update_state_event(diff: bool = False) -> str:
   # need to send the full state back on the next user event request.
   if app_config.state_session_enabled:
     state_token = generate_state_token()
-    runtime().context().save_state_to_session(state_token)
-
-  update_state_event = pb.UpdateStateEvent(
-    state_token=state_token,
-    diff_states=runtime().context().diff_state() if diff else None,
-    full_states=runtime().context().serialize_state() if not diff else None,
-  )
+    with timings.phase("state_save"):
+      runtime().context().save_state_to_session(state_token)
+
+  with timings.phase("diff_state" if diff else "serialize_state"):
+    update_state_event = pb.UpdateStateEvent(
+      state_token=state_token,
+      diff_states=runtime().context().diff_state() if diff else None,
+      full_states=runtime().context().serialize_state() if not diff else None,
+    )
 
-  return serialize(pb.UiResponse(update_state_event=update_state_event))
+  with timings.phase("serialize"):
+    return serialize(pb.UiResponse(update_state_event=update_state_event))
 
 
 def is_same_site(url1: str | None, url2: str | None):
@@ -128,6 +243,87 @@ def sse_request(
           yield event_data
 
 
+# Maps each supported content encoding to the zlib `wbits` value that produces it.
+_STREAM_ENCODING_WBITS = {
+  "gzip": zlib.MAX_WBITS | 16,
+  "deflate": zlib.MAX_WBITS,
+}
+
+
+def get_stream_encoding() -> str | None:
+  """Returns the content encoding to compress the current UI stream with, if any."""
+  if not MESOP_STREAM_COMPRESSION_ENABLED or not has_request_context():
+    return None
+  return request.accept_encodings.best_match(list(_STREAM_ENCODING_WBITS))
+
+
+class StreamCompressor:
+  """Compresses a stream of UI response chunks.
+
+  Each chunk is flushed as it is compressed so the client can process the event
+  right away instead of waiting for the compressor's buffer to fill up. The
+  compression context is shared across chunks, so repeated content (e.g. styles)
+  across events is still compressed well.
+  """
+
+  def __init__(self, encoding: str):
+    self._compressor = zlib.compressobj(
+      MESOP_STREAM_COMPRESSION_LEVEL,
+      zlib.DEFLATED,
+      _STREAM_ENCODING_WBITS[encoding],
+    )
+
+  def compress(self, chunk: str | bytes) -> bytes:
+    if isinstance(chunk, str):
+      chunk = chunk.encode("utf-8")
+    return self._compressor.compress(chunk) + self._compressor.flush(
+      zlib.Z_SYNC_FLUSH
+    )
+
+  def finish(self) -> bytes:
+    return self._compressor.flush()
+
+
+def compress_stream(
+  chunks: Iterable[str | bytes], encoding: str
+) -> Generator[bytes, None, None]:
+  compressor = StreamCompressor(encoding)
+  for chunk in chunks:
+    yield compressor.compress(chunk)
+  yield compressor.finish()
+
+
+def make_ui_stream_response(chunks: Iterable[str | bytes]) -> Response:
+  """Creates a streaming response for a UI request.
+
+  Uses the transport (SSE or binary) and content encoding requested by the client.
+  """
+  encoding = get_stream_encoding()
+  if encoding:
+    chunks = compress_stream(chunks, encoding)
+  response = (
+    make_binary_stream_response(chunks)
+    if is_binary_transport()
+    else make_sse_response(chunks)
+  )
+  if encoding:
+    response.headers["Content-Encoding"] = encoding
+  if MESOP_STREAM_COMPRESSION_ENABLED:
+    response.vary.add("Accept-Encoding")
+  return response
+
+
+def make_binary_stream_response(
+  response: Iterable[str | bytes] | bytes | None = None,
+):
+  return Response(
+    response,
+    content_type=BINARY_CONTENT_TYPE,
+    # See `make_sse_response`. Proxies may also buffer streamed binary responses.
+    headers={"X-Accel-Buffering": "no"},
+  )
+
+
 def make_sse_response(
   response: Iterable[bytes] | bytes | Iterable[str] | str | None = None,
 ):
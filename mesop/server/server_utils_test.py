@@ -1,5 +1,9 @@
+import asyncio
 import importlib
-from unittest.mock import patch
+import zlib
+from unittest.mock import MagicMock, patch
+
+from flask import Flask
 
 import mesop.server.server_utils as su
 from mesop.env import env
@@ -59,3 +63,130 @@ def test_is_same_site_different_hosts():
 def test_is_same_site_none():
   assert su.is_same_site(None, "http://localhost:32123") is False
   assert su.is_same_site("http://localhost:32123", None) is False
+
+
+def test_is_binary_transport():
+  app = Flask(__name__)
+  with app.test_request_context(headers={"Accept": "text/event-stream"}):
+    assert not su.is_binary_transport()
+    assert su.serialize_stream_end() == su.STREAM_END
+  with app.test_request_context(headers={"Accept": su.BINARY_CONTENT_TYPE}):
+    assert su.is_binary_transport()
+    assert su.serialize_stream_end() == b"\x00\x00\x00\x00"
+  with app.test_request_context("/__ui__?transport=binary"):
+    assert su.is_binary_transport()
+  assert not su.is_binary_transport()
+
+
+def test_get_stream_encoding():
+  app = Flask(__name__)
+  with patch.object(su, "MESOP_STREAM_COMPRESSION_ENABLED", True):
+    with app.test_request_context(headers={"Accept-Encoding": "gzip, br"}):
+      assert su.get_stream_encoding() == "gzip"
+    with app.test_request_context(
+      headers={"Accept-Encoding": "gzip;q=0, deflate"}
+    ):
+      assert su.get_stream_encoding() == "deflate"
+    with app.test_request_context(headers={"Accept-Encoding": "br"}):
+      assert su.get_stream_encoding() is None
+  with patch.object(su, "MESOP_STREAM_COMPRESSION_ENABLED", False):
+    with app.test_request_context(headers={"Accept-Encoding": "gzip"}):
+      assert su.get_stream_encoding() is None
+
+
+def test_compress_stream_flushes_each_chunk():
+  decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+  stream = su.compress_stream(["data: a\n\n", b"data: b\n\n"], "gzip")
+
+  # Each compressed chunk can be decompressed as soon as it is received.
+  assert decompressor.decompress(next(stream)) == b"data: a\n\n"
+  assert decompressor.decompress(next(stream)) == b"data: b\n\n"
+  assert decompressor.decompress(next(stream)) == b""
+  assert decompressor.eof
+
+
+def run_coalesce_frames(
+  step_times: list[float],
+  min_interval_ms: int,
+  commands_at: tuple[int, ...] = (),
+) -> list[int]:
+  """Returns the indices of the steps that are rendered."""
+  current_step = -1
+  rendered_steps: list[int] = []
+  context = MagicMock()
+  context.pending_cookies.return_value = ()
+  context.commands.side_effect = lambda: (
+    ["command"] if current_step in commands_at else []
+  )
+
+  async def steps():
+    nonlocal current_step
+    for i in range(len(step_times)):
+      current_step = i
+      yield
+
+  async def consume():
+    async for _ in su.coalesce_frames(steps(), min_interval_ms):
+      rendered_steps.append(current_step)
+
+  with (
+    patch.object(su, "runtime") as mock_runtime,
+    patch.object(
+      su.time, "monotonic", side_effect=lambda: step_times[current_step]
+    ),
+  ):
+    mock_runtime.return_value.context.return_value = context
+    asyncio.run(consume())
+  return rendered_steps
+
+
+def test_coalesce_frames_disabled():
+  assert run_coalesce_frames([0, 0, 0], min_interval_ms=0) == [0, 1, 2]
+
+
+def test_coalesce_frames_merges_fast_steps_and_flushes_last_step():
+  assert run_coalesce_frames(
+    [0, 0.01, 0.02, 0.1, 0.11], min_interval_ms=50
+  ) == [0, 3, 4]
+
+
+def test_coalesce_frames_does_not_repeat_rendered_last_step():
+  assert run_coalesce_frames([0, 0.01, 0.1], min_interval_ms=50) == [0, 2]
+
+
+def test_coalesce_frames_renders_steps_with_commands():
+  assert run_coalesce_frames(
+    [0, 0.01, 0.02, 0.03], min_interval_ms=50, commands_at=(1,)
+  ) == [0, 1, 3]
+
+
+def test_coalesce_frames_does_not_render_while_step_runs():
+  current_step = -1
+  step_running = False
+  rendered_steps: list[tuple[int, bool]] = []
+  context = MagicMock()
+  context.pending_cookies.return_value = ()
+  context.commands.return_value = []
+
+  async def steps():
+    nonlocal current_step, step_running
+    for i in range(3):
+      step_running = True
+      # The last step waits for a slow call, which takes longer than the interval.
+      if i == 2:
+        await asyncio.sleep(0.2)
+      current_step = i
+      step_running = False
+      yield
+
+  async def consume():
+    async for _ in su.coalesce_frames(steps(), min_interval_ms=100):
+      rendered_steps.append((current_step, step_running))
+
+  with patch.object(su, "runtime") as mock_runtime:
+    mock_runtime.return_value.context.return_value = context
+    asyncio.run(consume())
+
+  # The skipped step is rendered with the last step, after the slow call, rather
+  # than while the last step is running.
+  assert rendered_steps == [(0, False), (2, False)]
@@ -1,6 +1,7 @@
 import logging
 import os
 import re
+import secrets
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any, Protocol
@@ -8,14 +9,41 @@ from typing import Any, Protocol
 import msgpack
 
 from mesop.dataclass_utils import (
+  dataclass_to_dict,
   serialize_dataclass,
+  update_dataclass_from_dict,
   update_dataclass_from_json,
 )
-from mesop.exceptions import MesopException
+from mesop.dataclass_utils.dataclass_utils import (
+  MesopJSONEncoder,
+  decode_mesop_json_state_hook,
+)
+from mesop.exceptions import MesopDeveloperException, MesopException
 from mesop.server.config import Config, app_config
 
 States = dict[type[Any], object]
 
+# Prefix of the tokens of the states of evicted WebSocket contexts (see `Runtime`).
+# These states are kept for `_EVICTED_CONTEXT_TTL_MINUTES` rather than the backend's
+# `_SESSION_TTL_MINUTES`, since a WebSocket session can be idle for much longer than
+# a client takes to send a state token back.
+_EVICTED_CONTEXT_TOKEN_PREFIX = "ws-"
+_EVICTED_CONTEXT_TTL_MINUTES = 24 * 60
+
+
+def generate_evicted_context_token() -> str:
+  """Generates a token to save the state of an evicted WebSocket context with.
+
+  The token fits in the token column of `SqlStateSessionBackend`.
+  """
+  return _EVICTED_CONTEXT_TOKEN_PREFIX + secrets.token_urlsafe(15)
+
+
+def _session_ttl_minutes(token: str, default_ttl_minutes: int) -> int:
+  if token.startswith(_EVICTED_CONTEXT_TOKEN_PREFIX):
+    return _EVICTED_CONTEXT_TTL_MINUTES
+  return default_ttl_minutes
+
 
 def _current_datetime():
   """Helper to return datetime now so we can mock the time easier."""
@@ -27,6 +55,116 @@ def _current_datetime_utc():
   return datetime.utcnow()
 
 
+class StateSessionCodec(Protocol):
+  """Interface for encoding the states saved by state session backends."""
+
+  def encode(self, states: States) -> bytes:
+    """Encodes the given states."""
+    raise NotImplementedError()
+
+  def decode(self, states: States, data: bytes):
+    """Updates the given states from the encoded states."""
+    raise NotImplementedError()
+
+
+class JsonStateSessionCodec(StateSessionCodec):
+  """Encodes each state as JSON, like the states sent to the client."""
+
+  def encode(self, states: States) -> bytes:
+    return msgpack.packb(  # type: ignore
+      [serialize_dataclass(state) for state in states.values()]
+    )
+
+  def decode(self, states: States, data: bytes):
+    for state, serialized_state in zip(states.values(), msgpack.unpackb(data)):
+      update_dataclass_from_json(state, serialized_state)
+
+
+class MsgpackStateSessionCodec(StateSessionCodec):
+  """Encodes the states with MessagePack.
+
+  Values that are not supported by MessagePack are encoded like `MesopJSONEncoder`
+  does. Unlike JSON, bytes and DataFrames encoded with Arrow are stored as is rather
+  than in base64, and dict keys are not converted to strings.
+  """
+
+  def __init__(self):
+    self._default = MesopJSONEncoder(binary=True).default
+
+  def encode(self, states: States) -> bytes:
+    return msgpack.packb(  # type: ignore
+      [dataclass_to_dict(state) for state in states.values()],
+      default=self._default,
+    )
+
+  def decode(self, states: States, data: bytes):
+    states_data = msgpack.unpackb(
+      data,
+      object_hook=decode_mesop_json_state_hook,
+      strict_map_key=False,
+    )
+    for state, state_data in zip(states.values(), states_data):
+      update_dataclass_from_dict(state, state_data)
+
+
+class OrjsonStateSessionCodec(StateSessionCodec):
+  """Encodes the states as JSON with orjson, which encodes faster than `json`.
+
+  The encoded states are the same as the JSON codec's, except that floats that are
+  not finite (e.g. NaN) become null.
+  """
+
+  def __init__(self):
+    try:
+      import orjson
+    except ImportError as e:
+      raise MesopDeveloperException(
+        "The orjson state session codec requires orjson. Install it with `pip install orjson`."
+      ) from e
+    self._orjson = orjson
+    self._default = MesopJSONEncoder().default
+    # Dataclasses nested in other values are encoded by `MesopJSONEncoder`, since orjson
+    # omits fields whose names start with an underscore.
+    self._option = (
+      orjson.OPT_NON_STR_KEYS
+      | orjson.OPT_PASSTHROUGH_DATACLASS
+      | orjson.OPT_PASSTHROUGH_DATETIME
+    )
+
+  def encode(self, states: States) -> bytes:
+    return self._orjson.dumps(
+      [dataclass_to_dict(state) for state in states.values()],
+      default=self._default,
+      option=self._option,
+    )
+
+  def decode(self, states: States, data: bytes):
+    for state, state_data in zip(states.values(), self._orjson.loads(data)):
+      update_dataclass_from_dict(state, _decode_json_objects(state_data))
+
+
+def _decode_json_objects(value: Any) -> Any:
+  """Decodes the values encoded by `MesopJSONEncoder` in place, like `json.loads` does
+  with `decode_mesop_json_state_hook`."""
+  if type(value) is dict:
+    for key, item in value.items():
+      if type(item) is dict or type(item) is list:
+        value[key] = _decode_json_objects(item)
+    return decode_mesop_json_state_hook(value)
+  for index, item in enumerate(value):
+    if type(item) is dict or type(item) is list:
+      value[index] = _decode_json_objects(item)
+  return value
+
+
+def CreateStateSessionCodecFromConfig(config: Config) -> StateSessionCodec:
+  if config.state_session_codec == "msgpack":
+    return MsgpackStateSessionCodec()
+  if config.state_session_codec == "orjson":
+    return OrjsonStateSessionCodec()
+  return JsonStateSessionCodec()
+
+
 class StateSessionBackend(Protocol):
   """Interface for state session backends."""
 
@@ -38,6 +176,10 @@ class StateSessionBackend(Protocol):
     """Saves state to the backend with the given token."""
     raise NotImplementedError()
 
+  def delete(self, token: str):
+    """Deletes the saved state of the given token, if any."""
+    raise NotImplementedError()
+
   def clear_stale_sessions(self):
     """Deletes unused state data."""
     raise NotImplementedError()
@@ -52,6 +194,9 @@ class NullStateSessionBackend(StateSessionBackend):
   def save(self, token: str, states: States):
     pass
 
+  def delete(self, token: str):
+    pass
+
   def clear_stale_sessions(self):
     pass
 
@@ -88,6 +233,9 @@ class MemoryStateSessionBackend(StateSessionBackend):
   def save(self, token: str, states: States):
     self.cache[token] = (_current_datetime(), states)
 
+  def delete(self, token: str):
+    self.cache.pop(token, None)
+
   def clear_stale_sessions(self):
     stale_keys = set()
 
@@ -107,10 +255,9 @@ class MemoryStateSessionBackend(StateSessionBackend):
 
     for key in cache_keys:
       timestamp, _ = self.cache.get(key, (None, None))
+      ttl_minutes = _session_ttl_minutes(key, self._SESSION_TTL_MINUTES)
       if (
-        timestamp
-        and timestamp + timedelta(minutes=self._SESSION_TTL_MINUTES)
-        < current_time
+        timestamp and timestamp + timedelta(minutes=ttl_minutes) < current_time
       ):
         stale_keys.add(key)
 
@@ -139,12 +286,13 @@ class FileStateSessionBackend(StateSessionBackend):
   _SESSION_TTL_MINUTES = 10
   _SESSION_LOCK_FILE = "mesop_session.lock"
 
-  def __init__(self, base_dir: Path):
+  def __init__(self, base_dir: Path, codec: StateSessionCodec | None = None):
     if base_dir is None:
       raise RuntimeError(
         "Base dir must be set when using `FileStateSessionBackend`"
       )
     self.base_dir = base_dir
+    self.codec = codec or JsonStateSessionCodec()
     self.prefix = "session"
 
   # Matches tokens produced by secrets.token_urlsafe: base64url alphabet only.
@@ -163,8 +311,8 @@ class FileStateSessionBackend(StateSessionBackend):
     file_path = self._make_file_path(token)
     try:
       with open(file_path, "rb") as f:
-        states_data = msgpack.unpackb(f.read())
-      _deserialize_state(states, states_data)
+        states_data = f.read()
+      self.codec.decode(states, states_data)
     except FileNotFoundError as e:
       raise MesopException("Token not found in state session backend.") from e
     else:
@@ -176,7 +324,11 @@ class FileStateSessionBackend(StateSessionBackend):
   def save(self, token: str, states: States):
     """Saves state to the backend with the given token."""
     with open(self._make_file_path(token), "wb") as f:
-      f.write(msgpack.packb(_serialize_state(states)))  # type: ignore
+      f.write(self.codec.encode(states))
+
+  def delete(self, token: str):
+    """Deletes the saved state of the given token, if any."""
+    self._make_file_path(token).unlink(missing_ok=True)
 
   def clear_stale_sessions(self):
     """Deletes unused state data."""
@@ -188,10 +340,10 @@ class FileStateSessionBackend(StateSessionBackend):
       current_time = _current_datetime()
       if os.path.isfile(file_path) and filename.startswith(self.prefix):
         timestamp = datetime.fromtimestamp(os.path.getctime(file_path))
-        if (
-          timestamp + timedelta(minutes=self._SESSION_TTL_MINUTES)
-          < current_time
-        ):
+        ttl_minutes = _session_ttl_minutes(
+          filename[len(self.prefix) :], self._SESSION_TTL_MINUTES
+        )
+        if timestamp + timedelta(minutes=ttl_minutes) < current_time:
           try:
             os.remove(file_path)
           except FileNotFoundError as e:
@@ -230,8 +382,11 @@ class FirestoreStateSessionBackend(StateSessionBackend):
   # Hardcode for now, but probably make adjustable in the future.
   _SESSION_TTL_MINUTES = 10
 
-  def __init__(self, collection_name: str):
+  def __init__(
+    self, collection_name: str, codec: StateSessionCodec | None = None
+  ):
     self.collection_name = collection_name
+    self.codec = codec or JsonStateSessionCodec()
     self.db = self._initialize_firestore_db()
 
   def _initialize_firestore_db(self):
@@ -270,8 +425,7 @@ class FirestoreStateSessionBackend(StateSessionBackend):
     if not doc.exists:
       raise MesopException("Token not found in state session backend.")
 
-    states_data = msgpack.unpackb(doc.to_dict()["state"])  # type: ignore
-    _deserialize_state(states, states_data)
+    self.codec.decode(states, doc.to_dict()["state"])  # type: ignore
 
     doc_ref.delete()
 
@@ -280,12 +434,18 @@ class FirestoreStateSessionBackend(StateSessionBackend):
     doc_ref = self.db.collection(self.collection_name).document(token)
     doc_ref.set(
       {
-        "state": msgpack.packb(_serialize_state(states)),
+        "state": self.codec.encode(states),
         "expiresAt": _current_datetime_utc()
-        + timedelta(minutes=self._SESSION_TTL_MINUTES),
+        + timedelta(
+          minutes=_session_ttl_minutes(token, self._SESSION_TTL_MINUTES)
+        ),
       }
     )
 
+  def delete(self, token: str):
+    """Deletes the saved state of the given token, if any."""
+    self.db.collection(self.collection_name).document(token).delete()
+
   def clear_stale_sessions(self):
     """Deletes unused state data.
 
@@ -308,7 +468,12 @@ class SqlStateSessionBackend(StateSessionBackend):
   _SESSION_TTL_MINUTES = 10
   _SESSION_CLEAR_N_REQUESTS = 10
 
-  def __init__(self, connection_uri: str, table_name: str):
+  def __init__(
+    self,
+    connection_uri: str,
+    table_name: str,
+    codec: StateSessionCodec | None = None,
+  ):
     from sqlalchemy import (
       Column,
       DateTime,
@@ -319,6 +484,7 @@ class SqlStateSessionBackend(StateSessionBackend):
       create_engine,
     )
 
+    self.codec = codec or JsonStateSessionCodec()
     self.db = create_engine(connection_uri)
     self.metadata = MetaData()
     self.table = Table(
@@ -350,8 +516,7 @@ class SqlStateSessionBackend(StateSessionBackend):
         select(self.table).where(self.table.c.token == token)
       ).one_or_none()
       if result:
-        states_data = msgpack.unpackb(result.states)  # type: ignore
-        _deserialize_state(states, states_data)
+        self.codec.decode(states, result.states)
       else:
         raise MesopException("Token not found in state session backend.")
 
@@ -365,30 +530,47 @@ class SqlStateSessionBackend(StateSessionBackend):
       conn.execute(
         insert(self.table).values(
           token=token,
-          states=msgpack.packb(_serialize_state(states)),
+          states=self.codec.encode(states),
           created_at=_current_datetime_utc(),
         )
       )
 
+  def delete(self, token: str):
+    """Deletes the saved state of the given token, if any."""
+    from sqlalchemy import delete
+
+    with self.db.begin() as conn:
+      conn.execute(delete(self.table).where(self.table.c.token == token))
+
   def clear_stale_sessions(self):
     """Clears stale sessions from database.
 
     Only query the database after every X requests to avoid fruitlessly querying the
     database unnecessarily.
     """
-    from sqlalchemy import delete
+    from sqlalchemy import and_, delete, or_
 
     if self.request_count < self._SESSION_CLEAR_N_REQUESTS:
       return
 
     self.request_count = 0
 
+    current_time = _current_datetime_utc()
+    is_evicted_context = self.table.c.token.startswith(
+      _EVICTED_CONTEXT_TOKEN_PREFIX, autoescape=True
+    )
     with self.db.begin() as conn:
       conn.execute(
         delete(self.table).where(
-          self.table.c.created_at
-          < _current_datetime_utc()
-          - timedelta(minutes=self._SESSION_TTL_MINUTES)
+          or_(
+            and_(
+              ~is_evicted_context,
+              self.table.c.created_at
+              < current_time - timedelta(minutes=self._SESSION_TTL_MINUTES),
+            ),
+            self.table.c.created_at
+            < current_time - timedelta(minutes=_EVICTED_CONTEXT_TTL_MINUTES),
+          )
         )
       )
 
@@ -398,30 +580,23 @@ def CreateStateSessionFromConfig(config: Config):
   if config.state_session_backend == "memory":
     return MemoryStateSessionBackend()
   elif config.state_session_backend == "file":
-    return FileStateSessionBackend(config.state_session_backend_file_base_dir)
+    return FileStateSessionBackend(
+      config.state_session_backend_file_base_dir,
+      CreateStateSessionCodecFromConfig(config),
+    )
   elif config.state_session_backend == "firestore":
     return FirestoreStateSessionBackend(
-      config.state_session_backend_firestore_collection
+      config.state_session_backend_firestore_collection,
+      CreateStateSessionCodecFromConfig(config),
     )
   elif config.state_session_backend == "sql":
     return SqlStateSessionBackend(
       config.state_session_backend_sql_connection_uri,
       config.state_session_backend_sql_table,
+      CreateStateSessionCodecFromConfig(config),
     )
   return NullStateSessionBackend()
 
 
 # The state session is a singleton object.
 state_session = CreateStateSessionFromConfig(app_config)
-
-
-def _serialize_state(states: States) -> list[str]:
-  states_data = []
-  for state in states.values():
-    states_data.append(serialize_dataclass(state))
-  return states_data
-
-
-def _deserialize_state(states: States, states_data: list[str]):
-  for state, serialized_state in zip(states.values(), states_data):
-    update_dataclass_from_json(state, serialized_state)
@@ -1,11 +1,12 @@
 # ruff: noqa: RUF013
 from collections import defaultdict
-from dataclasses import dataclass
-from datetime import datetime, timedelta
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
 from pathlib import Path
 from typing import Iterable
 from unittest.mock import patch
 
+import msgpack
 import pytest
 from google.api_core import gapic_v1
 from google.api_core import retry as retries
@@ -20,13 +21,18 @@ from google.protobuf.timestamp_pb2 import Timestamp
 from mesop.exceptions import MesopException
 from mesop.server.config import Config
 from mesop.server.state_session import (
+  CreateStateSessionCodecFromConfig,
   CreateStateSessionFromConfig,
   FileStateSessionBackend,
   FirestoreStateSessionBackend,
+  JsonStateSessionCodec,
   MemoryStateSessionBackend,
+  MsgpackStateSessionCodec,
   NullStateSessionBackend,
+  OrjsonStateSessionCodec,
   SqlStateSessionBackend,
   States,
+  generate_evicted_context_token,
 )
 
 
@@ -41,6 +47,21 @@ class StateB:
   bool_value: bool = True
 
 
+@dataclass
+class Item:
+  name: str = ""
+  created: date = date(2024, 1, 1)
+
+
+@dataclass
+class StateC:
+  items: list[Item] = field(default_factory=list)
+  lookup: dict[str, list[int]] = field(default_factory=dict)
+  tags: set[str] = field(default_factory=set)
+  data: bytes = b""
+  updated: datetime | None = None
+
+
 @pytest.fixture
 def sqlite_backend(tmp_path):
   return SqlStateSessionBackend(
@@ -90,6 +111,69 @@ def test_create_state_session_file():
   )
 
 
+@pytest.mark.parametrize(
+  "codec,expected_codec",
+  [
+    ("json", JsonStateSessionCodec),
+    ("msgpack", MsgpackStateSessionCodec),
+    ("orjson", OrjsonStateSessionCodec),
+  ],
+)
+def test_create_state_session_codec_from_config(codec, expected_codec):
+  if codec == "orjson":
+    pytest.importorskip("orjson")
+  assert isinstance(
+    CreateStateSessionCodecFromConfig(Config(state_session_codec=codec)),
+    expected_codec,
+  )
+
+
+@pytest.mark.parametrize("codec", ["json", "msgpack", "orjson"])
+def test_file_backend_save_and_restore_states_with_codec(tmp_path, codec):
+  if codec == "orjson":
+    pytest.importorskip("orjson")
+  backend = FileStateSessionBackend(
+    tmp_path,
+    CreateStateSessionCodecFromConfig(Config(state_session_codec=codec)),
+  )
+  saved_states: States = {
+    StateA: StateA(str_value="ABC"),
+    StateC: StateC(
+      items=[Item("a"), Item("b", date(2024, 6, 1))],
+      lookup={"x": [1, 2]},
+      tags={"y"},
+      data=b"\x00\x01",
+      updated=datetime(2024, 6, 1, 12, 30),
+    ),
+  }
+  backend.save("test", saved_states)
+
+  states: States = {StateA: StateA(), StateC: StateC()}
+  backend.restore("test", states)
+
+  assert states == saved_states
+
+
+def test_msgpack_codec_stores_data_frames_as_arrow():
+  pd = pytest.importorskip("pandas")
+  pytest.importorskip("pyarrow")
+
+  @dataclass
+  class StateWithDataFrame:
+    data: pd.DataFrame | None = None
+
+  codec = MsgpackStateSessionCodec()
+  df = pd.DataFrame(data={"a": [1, 2], "b": ["x", "y"]})
+  data = codec.encode({StateWithDataFrame: StateWithDataFrame(data=df)})
+
+  states: States = {StateWithDataFrame: StateWithDataFrame()}
+  codec.decode(states, data)
+
+  encoded_data = msgpack.unpackb(data)[0]["data"]
+  assert isinstance(encoded_data["__pandas.DataFrame.arrow__"], bytes)
+  pd.testing.assert_frame_equal(states[StateWithDataFrame].data, df)
+
+
 def test_null_backend_restore_raises_exception():
   backend = NullStateSessionBackend()
   with pytest.raises(
@@ -168,6 +252,25 @@ def test_backend_token_is_cleared_after_restore(
     backend.restore("test", empty_states)
 
 
+@pytest.mark.parametrize("backend_key", ["memory", "file", "firestore", "sql"])
+def test_backend_delete(backend_key, state_session_backend_factory):
+  backend = state_session_backend_factory[backend_key]
+  backend.save("test", {type(StateA): StateA(str_value="ABC")})
+
+  backend.delete("test")
+  # Deleting a missing token does nothing.
+  backend.delete("test")
+
+  with pytest.raises(
+    MesopException, match="Token not found in state session backend."
+  ):
+    backend.restore("test", {type(StateA): StateA()})
+
+
+def test_evicted_context_token_fits_sql_token_column():
+  assert len(generate_evicted_context_token()) <= 23
+
+
 def test_memory_backend_clear_stale_sessions():
   # GIVEN
   states: States = {
@@ -196,6 +299,19 @@ def test_memory_backend_clear_stale_sessions():
   assert states == {type(StateA): StateA()}
 
 
+def test_memory_backend_keeps_evicted_contexts_for_longer():
+  token = generate_evicted_context_token()
+  backend = MemoryStateSessionBackend()
+  backend.cache = {
+    "key1": (datetime.now() - timedelta(minutes=11), {type(StateA): StateA()}),
+    token: (datetime.now() - timedelta(minutes=11), {type(StateA): StateA()}),
+  }
+
+  backend.clear_stale_sessions()
+
+  assert list(backend.cache) == [token]
+
+
 @pytest.mark.parametrize(
   "malicious_token",
   [
@@ -268,6 +384,27 @@ def test_file_backend_clear_stale_sessions(tmp_path):
       backend.restore("key2", states)
 
 
+def test_file_backend_keeps_evicted_contexts_for_longer(tmp_path):
+  token = generate_evicted_context_token()
+  backend = FileStateSessionBackend(tmp_path)
+  states: States = {type(StateA): StateA(str_value="ABC")}
+  backend.save("key1", {type(StateA): StateA()})
+  backend.save(token, {type(StateA): StateA()})
+
+  with patch(
+    "mesop.server.state_session._current_datetime",
+  ) as _mock_current_datetime:
+    _mock_current_datetime.return_value = datetime.now() + timedelta(minutes=15)
+    backend.clear_stale_sessions()
+
+  with pytest.raises(
+    MesopException, match="Token not found in state session backend."
+  ):
+    backend.restore("key1", states)
+  backend.restore(token, states)
+  assert states == {type(StateA): StateA()}
+
+
 def test_file_backend_clear_stale_sessions_skipped(tmp_path):
   # GIVEN
   backend = FileStateSessionBackend(tmp_path)
@@ -341,6 +478,42 @@ def test_sql_backend_clear_stale_sessions(sqlite_backend):
       sqlite_backend.restore("key2", states)
 
 
+def test_sql_backend_keeps_evicted_contexts_for_longer(sqlite_backend):
+  token = generate_evicted_context_token()
+  states: States = {type(StateA): StateA(str_value="ABC")}
+  sqlite_backend.save("key1", {type(StateA): StateA()})
+  sqlite_backend.save(token, {type(StateA): StateA()})
+
+  with patch(
+    "mesop.server.state_session._current_datetime_utc",
+  ) as _mock_current_datetime_utc:
+    _mock_current_datetime_utc.return_value = datetime.utcnow() + timedelta(
+      minutes=15
+    )
+    sqlite_backend.request_count = sqlite_backend._SESSION_CLEAR_N_REQUESTS
+    sqlite_backend.clear_stale_sessions()
+    with pytest.raises(
+      MesopException, match="Token not found in state session backend."
+    ):
+      sqlite_backend.restore("key1", states)
+    sqlite_backend.restore(token, states)
+  assert states == {type(StateA): StateA()}
+
+  sqlite_backend.save(token, {type(StateA): StateA()})
+  with patch(
+    "mesop.server.state_session._current_datetime_utc",
+  ) as _mock_current_datetime_utc:
+    _mock_current_datetime_utc.return_value = datetime.utcnow() + timedelta(
+      days=2
+    )
+    sqlite_backend.request_count = sqlite_backend._SESSION_CLEAR_N_REQUESTS
+    sqlite_backend.clear_stale_sessions()
+    with pytest.raises(
+      MesopException, match="Token not found in state session backend."
+    ):
+      sqlite_backend.restore(token, states)
+
+
 def test_sql_backend_clear_stale_sessions_skipped(sqlite_backend):
   # GIVEN
   states: States = {
@@ -428,22 +601,21 @@ class FakeFirestoreDocumentReference(DocumentReference):
 
     return write.WriteResult()
 
-
-def delete(
-  self,
-  option: _helpers.WriteOption = None,  # type: ignore
-  retry: retries.Retry = gapic_v1.method.DEFAULT,  # type: ignore
-  timeout: float = None,  # type: ignore
-) -> Timestamp:
-  self.doc = DocumentSnapshot(
+  def delete(
     self,
-    None,
-    exists=False,
-    read_time=None,
-    create_time=None,
-    update_time=None,
-  )
-  return Timestamp()
+    option: _helpers.WriteOption = None,  # type: ignore
+    retry: retries.Retry = gapic_v1.method.DEFAULT,  # type: ignore
+    timeout: float = None,  # type: ignore
+  ) -> Timestamp:
+    self.doc = DocumentSnapshot(
+      self,
+      None,
+      exists=False,
+      read_time=None,
+      create_time=None,
+      update_time=None,
+    )
+    return Timestamp()
 
 
 if __name__ == "__main__":
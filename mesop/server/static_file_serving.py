@@ -16,6 +16,7 @@ from werkzeug.security import safe_join
 
 from mesop.env.env import (
   MESOP_BASE_URL_PATH,
+  MESOP_BINARY_TRANSPORT_ENABLED,
   MESOP_HTTP_CACHE_JS_BUNDLE,
   MESOP_WEB_COMPONENTS_HTTP_CACHE_KEY,
   MESOP_WEBSOCKETS_ENABLED,
@@ -102,6 +103,7 @@ def configure_static_file_serving(
       ):
         experiment_settings = {
           "websocketsEnabled": MESOP_WEBSOCKETS_ENABLED,
+          "binaryTransportEnabled": MESOP_BINARY_TRANSPORT_ENABLED,
           "webComponentsCacheKey": MESOP_WEB_COMPONENTS_HTTP_CACHE_KEY,
         }
         lines[i] = f"""
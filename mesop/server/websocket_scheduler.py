@@ -0,0 +1,197 @@
+import inspect
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+Job = Callable[[], Any]
+
+
+@dataclass(frozen=True)
+class WebSocketSchedulerMetrics:
+  # Number of jobs waiting to run.
+  queued: int
+  # Number of jobs running.
+  running: int
+  # Number of sessions with queued or running jobs.
+  active_sessions: int
+  # Totals since the scheduler was created.
+  submitted: int
+  rejected: int
+  completed: int
+  # Time jobs spent waiting in the queue before they started running.
+  total_wait_seconds: float
+  max_wait_seconds: float
+
+
+@dataclass
+class _SessionQueue:
+  jobs: deque[tuple[Job, float]] = field(default_factory=deque)
+  running: int = 0
+  is_ready: bool = False
+  is_closed: bool = False
+
+
+class WebSocketScheduler:
+  """Schedules jobs (i.e. processing a WebSocket message) fairly across sessions.
+
+  Each session has its own queue, and jobs from the same session are started in the
+  order they were submitted. Sessions take turns starting jobs (round-robin), so a
+  session that sends many messages cannot take over all the workers.
+
+  Instead of queueing without limit, `submit` returns False when the session's queue
+  or the total queue is full, so the caller can tell the client to retry later.
+
+  The scheduler is thread-safe and does not run jobs itself. `start` is called with a
+  callable that runs the job, e.g. `ThreadPoolExecutor.submit`. If the job returns an
+  awaitable, the callable returns an awaitable that must be awaited (e.g. with
+  `asyncio.ensure_future`) and the job is only considered done once it completes.
+  """
+
+  def __init__(
+    self,
+    *,
+    start: Callable[[Callable[[], Any]], Any],
+    max_workers: int,
+    max_queued: int,
+    max_queued_per_session: int,
+    max_running_per_session: int,
+  ):
+    self._start = start
+    self._max_workers = max_workers
+    self._max_queued = max_queued
+    self._max_queued_per_session = max_queued_per_session
+    self._max_running_per_session = max_running_per_session
+
+    self._lock = threading.Lock()
+    self._sessions: dict[str, _SessionQueue] = {}
+    # Sessions that have queued jobs and can start another job, in the order they
+    # will be served.
+    self._ready_sessions: deque[str] = deque()
+    self._queued = 0
+    self._running = 0
+
+    self._submitted = 0
+    self._rejected = 0
+    self._completed = 0
+    self._total_wait_seconds = 0.0
+    self._max_wait_seconds = 0.0
+
+  def submit(self, session_id: str, job: Job) -> bool:
+    """Queues the job. Returns False if the job was rejected because the queue is full."""
+    with self._lock:
+      session = self._sessions.get(session_id)
+      if session is None:
+        session = self._sessions[session_id] = _SessionQueue()
+      if (
+        session.is_closed
+        or len(session.jobs) >= self._max_queued_per_session
+        or self._queued >= self._max_queued
+      ):
+        self._rejected += 1
+        self._maybe_delete_session_locked(session_id)
+        return False
+      session.jobs.append((job, time.monotonic()))
+      self._queued += 1
+      self._submitted += 1
+      self._maybe_mark_ready_locked(session_id)
+      runs = self._dispatch_locked()
+    self._start_runs(runs)
+    return True
+
+  def close_session(self, session_id: str):
+    """Drops the session's queued jobs. Running jobs are not interrupted."""
+    with self._lock:
+      session = self._sessions.get(session_id)
+      if session is None:
+        return
+      session.is_closed = True
+      self._queued -= len(session.jobs)
+      session.jobs.clear()
+      if session.is_ready:
+        self._ready_sessions.remove(session_id)
+        session.is_ready = False
+      self._maybe_delete_session_locked(session_id)
+
+  def metrics(self) -> WebSocketSchedulerMetrics:
+    with self._lock:
+      return WebSocketSchedulerMetrics(
+        queued=self._queued,
+        running=self._running,
+        active_sessions=len(self._sessions),
+        submitted=self._submitted,
+        rejected=self._rejected,
+        completed=self._completed,
+        total_wait_seconds=self._total_wait_seconds,
+        max_wait_seconds=self._max_wait_seconds,
+      )
+
+  def _dispatch_locked(self) -> list[Callable[[], Any]]:
+    runs: list[Callable[[], Any]] = []
+    now = time.monotonic()
+    while self._running < self._max_workers and self._ready_sessions:
+      session_id = self._ready_sessions.popleft()
+      session = self._sessions[session_id]
+      session.is_ready = False
+      job, submitted_at = session.jobs.popleft()
+      session.running += 1
+      self._queued -= 1
+      self._running += 1
+      wait_seconds = now - submitted_at
+      self._total_wait_seconds += wait_seconds
+      self._max_wait_seconds = max(self._max_wait_seconds, wait_seconds)
+      runs.append(self._make_run(session_id, job))
+      # Go to the back of the line so other sessions get a turn first.
+      self._maybe_mark_ready_locked(session_id)
+    return runs
+
+  def _make_run(self, session_id: str, job: Job) -> Callable[[], Any]:
+    def run():
+      try:
+        result = job()
+      except BaseException:
+        self._finish(session_id)
+        raise
+      if inspect.isawaitable(result):
+        return self._finish_after(session_id, result)
+      self._finish(session_id)
+      return result
+
+    return run
+
+  async def _finish_after(self, session_id: str, awaitable: Any):
+    try:
+      return await awaitable
+    finally:
+      self._finish(session_id)
+
+  def _finish(self, session_id: str):
+    with self._lock:
+      session = self._sessions[session_id]
+      session.running -= 1
+      self._running -= 1
+      self._completed += 1
+      self._maybe_mark_ready_locked(session_id)
+      self._maybe_delete_session_locked(session_id)
+      runs = self._dispatch_locked()
+    self._start_runs(runs)
+
+  def _start_runs(self, runs: list[Callable[[], Any]]):
+    for run in runs:
+      self._start(run)
+
+  def _maybe_mark_ready_locked(self, session_id: str):
+    session = self._sessions[session_id]
+    if (
+      not session.is_ready
+      and session.jobs
+      and session.running < self._max_running_per_session
+    ):
+      session.is_ready = True
+      self._ready_sessions.append(session_id)
+
+  def _maybe_delete_session_locked(self, session_id: str):
+    session = self._sessions[session_id]
+    if not session.jobs and not session.running:
+      del self._sessions[session_id]
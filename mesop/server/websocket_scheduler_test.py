@@ -0,0 +1,148 @@
+import asyncio
+from typing import Any, Callable
+
+import pytest
+
+from mesop.server.websocket_scheduler import WebSocketScheduler
+
+
+class ManualStarter:
+  """Collects started jobs so tests can control when they run."""
+
+  def __init__(self):
+    self.runs: list[Callable[[], Any]] = []
+
+  def __call__(self, run: Callable[[], Any]):
+    self.runs.append(run)
+
+  def run_next(self):
+    self.runs.pop(0)()
+
+
+def create_scheduler(starter: ManualStarter, **kwargs) -> WebSocketScheduler:
+  options = {
+    "max_workers": 1,
+    "max_queued": 100,
+    "max_queued_per_session": 100,
+    "max_running_per_session": 1,
+  }
+  options.update(kwargs)
+  return WebSocketScheduler(start=starter, **options)
+
+
+def test_runs_sessions_round_robin():
+  starter = ManualStarter()
+  scheduler = create_scheduler(starter)
+  ran: list[str] = []
+
+  for job_id in ["a1", "a2", "a3"]:
+    scheduler.submit("a", lambda job_id=job_id: ran.append(job_id))
+  for job_id in ["b1", "b2"]:
+    scheduler.submit("b", lambda job_id=job_id: ran.append(job_id))
+  while starter.runs:
+    starter.run_next()
+
+  assert ran == ["a1", "b1", "a2", "b2", "a3"]
+
+
+def test_limits_running_jobs_per_session():
+  starter = ManualStarter()
+  scheduler = create_scheduler(
+    starter, max_workers=10, max_running_per_session=2
+  )
+
+  for _ in range(3):
+    scheduler.submit("a", lambda: None)
+  scheduler.submit("b", lambda: None)
+
+  assert len(starter.runs) == 3
+  assert scheduler.metrics().running == 3
+  assert scheduler.metrics().queued == 1
+
+  starter.run_next()
+
+  assert len(starter.runs) == 3
+  assert scheduler.metrics().queued == 0
+
+
+def test_rejects_when_queue_is_full():
+  starter = ManualStarter()
+  scheduler = create_scheduler(starter, max_queued=2, max_queued_per_session=1)
+
+  # The first job starts running right away, so it is not queued.
+  assert scheduler.submit("a", lambda: None)
+  assert scheduler.submit("a", lambda: None)
+  assert not scheduler.submit("a", lambda: None)
+  assert scheduler.submit("b", lambda: None)
+  assert not scheduler.submit("c", lambda: None)
+
+  metrics = scheduler.metrics()
+  assert metrics.submitted == 3
+  assert metrics.rejected == 2
+  assert metrics.queued == 2
+
+
+def test_close_session_drops_queued_jobs():
+  starter = ManualStarter()
+  scheduler = create_scheduler(starter)
+  ran: list[str] = []
+
+  scheduler.submit("a", lambda: ran.append("a1"))
+  scheduler.submit("a", lambda: ran.append("a2"))
+  scheduler.submit("b", lambda: ran.append("b1"))
+  scheduler.close_session("a")
+  while starter.runs:
+    starter.run_next()
+
+  assert ran == ["a1", "b1"]
+  metrics = scheduler.metrics()
+  assert metrics.queued == 0
+  assert metrics.active_sessions == 0
+  assert metrics.completed == 2
+
+
+def test_failing_job_frees_worker():
+  starter = ManualStarter()
+  scheduler = create_scheduler(starter)
+
+  def fail():
+    raise ValueError("failed")
+
+  scheduler.submit("a", fail)
+  scheduler.submit("b", lambda: None)
+  with pytest.raises(ValueError):
+    starter.run_next()
+
+  assert len(starter.runs) == 1
+  assert scheduler.metrics().completed == 1
+
+
+def test_async_jobs_finish_when_awaited():
+  ran: list[str] = []
+
+  async def main():
+    scheduler = WebSocketScheduler(
+      start=lambda run: asyncio.ensure_future(run()),
+      max_workers=1,
+      max_queued=10,
+      max_queued_per_session=10,
+      max_running_per_session=1,
+    )
+
+    async def job(job_id: str):
+      await asyncio.sleep(0)
+      ran.append(job_id)
+
+    scheduler.submit("a", lambda: job("a1"))
+    scheduler.submit("b", lambda: job("b1"))
+    assert scheduler.metrics().running == 1
+    while scheduler.metrics().completed < 2:
+      await asyncio.sleep(0)
+
+  asyncio.run(main())
+
+  assert ran == ["a1", "b1"]
+
+
+if __name__ == "__main__":
+  raise SystemExit(pytest.main([__file__]))
@@ -3,14 +3,18 @@ from typing import Any, Callable
 
 from absl import flags
 from flask import Flask
+from werkzeug.serving import make_server
 
 from mesop.runtime import enable_debug_mode
+from mesop.server.config import app_config
 from mesop.server.constants import EDITOR_PACKAGE_PATH, PROD_PACKAGE_PATH
 from mesop.server.flags import port
 from mesop.server.logging import log_startup
+from mesop.server.prefork import serve_prefork
 from mesop.server.server import configure_flask_app
 from mesop.server.static_file_serving import configure_static_file_serving
 from mesop.utils.host_util import get_local_host
+from mesop.warn import warn
 
 
 class App:
@@ -19,11 +23,29 @@ class App:
   def __init__(self, flask_app: Flask):
     self._flask_app = flask_app
 
-  def run(self):
+  def run(self, workers: int = 1):
+    if workers > 1:
+      self._run_workers(workers)
+      return
+
     log_startup(port=port())
 
     self._flask_app.run(host=get_local_host(), port=port(), use_reloader=False)
 
+  def _run_workers(self, workers: int):
+    if app_config.state_session_backend == "memory":
+      warn(
+        "MESOP_STATE_SESSION_BACKEND=memory does not work with multiple workers "
+        "because each worker has its own memory, so requests handled by "
+        "another worker will not find the user's state. Use a shared backend "
+        "such as file, firestore or sql instead."
+      )
+    server = make_server(
+      get_local_host(), port(), self._flask_app, threaded=True
+    )
+    log_startup(port=port())
+    serve_prefork(server, workers=workers)
+
 
 def create_app(
   prod_mode: bool,
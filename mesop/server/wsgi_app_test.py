@@ -1,4 +1,11 @@
+from unittest.mock import patch
+
+import pytest
+
+from mesop.exceptions import MesopDeveloperException
 from mesop.runtime import runtime
+from mesop.server import server
+from mesop.server.config import Config
 from mesop.server.wsgi_app import create_app
 
 
@@ -14,7 +21,34 @@ def test_wsgi_app_debug_mode():
   assert runtime().debug_mode is True
 
 
-if __name__ == "__main__":
-  import pytest
+def test_wsgi_app_serves_metrics():
+  with patch.object(server, "MESOP_METRICS_ENABLED", True):
+    app = create_app(prod_mode=True)
+
+  response = app._flask_app.test_client().get("/__metrics__")
+
+  assert response.status_code == 200
+  assert response.mimetype == "text/plain"
+  assert b"# TYPE mesop_ui_request_phase_duration_seconds histogram" in (
+    response.data
+  )
+
 
+def test_wsgi_app_rejects_context_eviction_without_state_session():
+  with (
+    patch.object(server, "MESOP_WEBSOCKET_MAX_CONTEXTS", 100),
+    pytest.raises(MesopDeveloperException, match="MESOP_STATE_SESSION_BACKEND"),
+  ):
+    create_app(prod_mode=True)
+
+
+def test_wsgi_app_evicts_contexts_with_state_session():
+  with (
+    patch.object(server, "MESOP_WEBSOCKET_MAX_CONTEXTS", 100),
+    patch.object(server, "app_config", Config(state_session_backend="memory")),
+  ):
+    assert create_app(prod_mode=True) is not None
+
+
+if __name__ == "__main__":
   raise SystemExit(pytest.main([__file__]))
@@ -2,19 +2,31 @@
 
 import asyncio
 import types
-from typing import Generator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncGenerator, Callable, Generator, TypeVar
+
+T = TypeVar("T")
+
+# When enabled, blocking calls into app code (e.g. sync event handlers) are run in a
+# worker thread so they do not stall the shared event loop used by the ASGI app.
+_offload_sync_calls: ContextVar[bool] = ContextVar(
+  "mesop_offload_sync_calls", default=False
+)
+
+_ITERATOR_DONE = object()
 
 
 def run_async_generator(
-  agen: types.AsyncGeneratorType[None, None],
-) -> Generator[None, None, None]:
+  agen: types.AsyncGeneratorType[T, None],
+) -> Generator[T, None, None]:
   """Run an async generator by iterating through it using an event loop.
 
   Args:
     agen: The async generator to run
 
   Yields:
-    None for each iteration of the async generator
+    Each value yielded by the async generator
   """
   loop = get_or_create_event_loop()
   try:
@@ -22,6 +34,11 @@ def run_async_generator(
       yield loop.run_until_complete(agen.__anext__())
   except StopAsyncIteration:
     pass
+  finally:
+    # Close the async generator eagerly if iteration stops early (e.g. the client
+    # disconnected) so that its cleanup code runs now rather than when the event loop
+    # runs next.
+    loop.run_until_complete(agen.aclose())
 
 
 def run_coroutine(coroutine: types.CoroutineType):
@@ -49,3 +66,49 @@ def get_or_create_event_loop():
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     return loop
+
+
+@contextmanager
+def offload_sync_calls():
+  """Runs blocking calls made through `run_sync` in a worker thread.
+
+  This should be used when running on a shared event loop.
+  """
+  token = _offload_sync_calls.set(True)
+  try:
+    yield
+  finally:
+    _offload_sync_calls.reset(token)
+
+
+async def run_sync(fn: Callable[..., T], *args: Any) -> T:
+  """Calls a blocking function, in a worker thread if `offload_sync_calls` is enabled.
+
+  Context variables (e.g. the Flask request context) are propagated to the worker
+  thread.
+  """
+  if _offload_sync_calls.get():
+    return await asyncio.to_thread(fn, *args)
+  return fn(*args)
+
+
+async def iterate_handler_result(result: Any) -> AsyncGenerator[None, None]:
+  """Iterate through the result of an event handler.
+
+  Handles sync generators, async generators, and coroutines. Yields once for each
+  step of the handler, which is when the UI should be re-rendered.
+
+  Args:
+    result: The value returned by calling the event handler
+  """
+  if isinstance(result, types.AsyncGeneratorType):
+    async for _ in result:
+      yield
+  elif isinstance(result, types.CoroutineType):
+    await result
+    yield
+  else:
+    # Regular generator
+    iterator = iter(result)
+    while await run_sync(next, iterator, _ITERATOR_DONE) is not _ITERATOR_DONE:
+      yield
@@ -1,5 +1,18 @@
+import collections.abc
+import inspect
+import types
 from functools import wraps
-from typing import Any, Callable, TypeVar, cast
+from typing import (
+  Any,
+  Callable,
+  Literal,
+  TypeVar,
+  Union,
+  cast,
+  get_args,
+  get_origin,
+  get_type_hints,
+)
 
 import pydantic
 
@@ -13,8 +26,56 @@ F = TypeVar("F", bound=Callable[..., Any])
 
 pydantic_major_version = int(pydantic.VERSION.split(".")[0])
 
+# How the arguments of components are validated:
+# - "full": Validates (and converts) the arguments with pydantic.
+# - "fast": Checks the types of the arguments, without checking the items of
+#   containers (e.g. lists). Arguments that fail the checks are validated with
+#   pydantic, which may convert them (e.g. an int to a float) or raise.
+# - "none": Does not validate the arguments.
+ValidationMode = Literal["full", "fast", "none"]
 
-def validate(fn: F) -> F:
+# Types that pydantic passes through unchanged. Values of other types (e.g.
+# `True` for an `int`) may be converted, so they must be fully validated.
+_EXACT_TYPES = (str, int, float, bool, bytes, types.NoneType)
+
+
+class _Omitted:
+  """Default value of the arguments checked by `_compile_checks`."""
+
+  def __repr__(self) -> str:
+    # Used as the default value in the generated source code.
+    return "_mesop_omitted"
+
+
+_OMITTED = _Omitted()
+
+
+def validate(fn: F, *, mode: ValidationMode = "full") -> F:
+  if mode == "none":
+    return fn
+  validated_fn = _validate_fully(fn)
+  if mode == "full":
+    return validated_fn
+  is_valid = _compile_checks(fn)
+  if is_valid is None:
+    return validated_fn
+
+  @wraps(fn)
+  def wrapper(*args: Any, **kw_args: Any):
+    try:
+      valid = is_valid(*args, **kw_args)
+    except TypeError:
+      # E.g. an unknown or missing argument.
+      valid = False
+    if valid:
+      return fn(*args, **kw_args)
+    # Reports errors (or converts the arguments) like full validation.
+    return validated_fn(*args, **kw_args)
+
+  return cast(F, wrapper)
+
+
+def _validate_fully(fn: F) -> F:
   if pydantic_major_version >= 2:
     validated_fn = pydantic.validate_call(fn)
   else:
@@ -57,3 +118,112 @@ def validate(fn: F) -> F:
         ) from e
 
   return cast(F, wrapper)
+
+
+def _compile_checks(fn: Callable[..., Any]) -> Callable[..., bool] | None:
+  """Returns a function that cheaply checks the arguments of `fn`.
+
+  The function has the same signature as `fn`, so that Python binds the
+  arguments, and raises `TypeError` if they do not match the signature. Returns
+  None if the arguments cannot be checked, e.g. because the signature has
+  `*args`.
+  """
+  try:
+    hints = get_type_hints(fn)
+    parameters = list(inspect.signature(fn).parameters.values())
+  except Exception:
+    return None
+
+  # Names are prefixed so they do not clash with the parameters.
+  namespace: dict[str, Any] = {
+    "_mesop_omitted": _OMITTED,
+    "_mesop_type": type,
+    "_mesop_isinstance": isinstance,
+    "_mesop_callable": callable,
+  }
+  conditions: list[str] = []
+  for index, parameter in enumerate(parameters):
+    if parameter.kind in (
+      inspect.Parameter.VAR_POSITIONAL,
+      inspect.Parameter.VAR_KEYWORD,
+    ):
+      return None
+    condition = _compile_check(
+      parameter.name,
+      hints.get(parameter.name, Any),
+      namespace,
+      prefix=f"_mesop_{index}",
+    )
+    if condition is None:
+      continue
+    if parameter.default is not inspect.Parameter.empty:
+      # Default values are not checked.
+      condition = f"{parameter.name} is _mesop_omitted or {condition}"
+    conditions.append(f"({condition})")
+
+  signature = inspect.Signature(
+    [
+      parameter.replace(
+        annotation=inspect.Parameter.empty,
+        default=inspect.Parameter.empty
+        if parameter.default is inspect.Parameter.empty
+        else _OMITTED,
+      )
+      for parameter in parameters
+    ]
+  )
+  source = (
+    f"def is_valid{signature}:\n"
+    f"  return {' and '.join(conditions) or 'True'}\n"
+  )
+  exec(source, namespace)
+  return namespace["is_valid"]
+
+
+def _compile_check(
+  name: str, annotation: Any, namespace: dict[str, Any], *, prefix: str
+) -> str | None:
+  """Returns an expression that checks a value, or None to accept any value.
+
+  Values that the expression refers to are added to `namespace`.
+  """
+  if get_origin(annotation) in (Union, types.UnionType):
+    members = get_args(annotation)
+  else:
+    members = (annotation,)
+
+  exact_types: set[type[Any]] = set()
+  literals: set[tuple[type[Any], Any]] = set()
+  classes: list[type[Any]] = []
+  accepts_callables = False
+  for member in members:
+    origin = get_origin(member)
+    if member is None:
+      exact_types.add(types.NoneType)
+    elif member in _EXACT_TYPES:
+      exact_types.add(member)
+    elif origin is Literal:
+      literals.update((type(value), value) for value in get_args(member))
+    elif member is Callable or origin is collections.abc.Callable:
+      accepts_callables = True
+    elif member is not Any and isinstance(origin or member, type):
+      # The items of generic containers (e.g. `list[str]`) are not checked.
+      classes.append(origin or member)
+    else:
+      # E.g. `Any` or a type variable.
+      return None
+
+  checks = []
+  if exact_types:
+    namespace[f"{prefix}_types"] = frozenset(exact_types)
+    checks.append(f"_mesop_type({name}) in {prefix}_types")
+  if classes:
+    namespace[f"{prefix}_classes"] = tuple(classes)
+    checks.append(f"_mesop_isinstance({name}, {prefix}_classes)")
+  if accepts_callables:
+    checks.append(f"_mesop_callable({name})")
+  if literals:
+    # Raises `TypeError` for unhashable values, which cannot be literals.
+    namespace[f"{prefix}_literals"] = frozenset(literals)
+    checks.append(f"(_mesop_type({name}), {name}) in {prefix}_literals")
+  return " or ".join(checks)
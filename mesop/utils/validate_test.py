@@ -0,0 +1,88 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Literal
+
+import pytest
+
+from mesop.exceptions import MesopDeveloperException
+from mesop.utils.validate import validate
+
+
+@dataclass
+class Item:
+  name: str
+
+
+def example(
+  text: str,
+  size: float = 1.0,
+  *,
+  type: Literal["small", "large"] | None = None,
+  items: list[Item] | None = None,
+  on_click: Callable[..., Any] | None = None,
+  extra: Any = None,
+):
+  return text, size, type, items, on_click, extra
+
+
+@pytest.mark.parametrize("mode", ["full", "fast"])
+def test_validate_accepts_valid_arguments(mode):
+  fn = validate(example, mode=mode)
+  items = [Item(name="a")]
+
+  assert fn(
+    "hi", 2.0, type="large", items=items, on_click=print, extra=object
+  ) == ("hi", 2.0, "large", items, print, object)
+
+
+@pytest.mark.parametrize("mode", ["full", "fast"])
+def test_validate_converts_arguments_like_full_validation(mode):
+  fn = validate(example, mode=mode)
+
+  _, size, *_ = fn("hi", 2)
+
+  assert size == 2.0
+  assert type(size) is float
+
+
+@pytest.mark.parametrize(
+  "args,kw_args",
+  [
+    ((1,), {}),
+    (("hi",), {"type": "medium"}),
+    (("hi",), {"items": "not a list"}),
+    (("hi",), {"on_click": 1}),
+    (("hi",), {"unknown": 1}),
+    ((), {}),
+  ],
+)
+@pytest.mark.parametrize("mode", ["full", "fast"])
+def test_validate_rejects_invalid_arguments(mode, args, kw_args):
+  fn = validate(example, mode=mode)
+
+  with pytest.raises(MesopDeveloperException):
+    fn(*args, **kw_args)
+
+
+def test_validate_fast_does_not_check_items():
+  fn = validate(example, mode="fast")
+
+  assert fn("hi", items=["not an item"])[3] == ["not an item"]
+
+
+def test_validate_fast_positional_only_arguments():
+  def fn(count: int, /, label: str = ""):
+    return count, label
+
+  validated_fn = validate(fn, mode="fast")
+
+  assert validated_fn(1, label="a") == (1, "a")
+  with pytest.raises(MesopDeveloperException):
+    validated_fn("a")
+
+
+def test_validate_none_returns_function():
+  assert validate(example, mode="none") is example
+
+
+if __name__ == "__main__":
+  raise SystemExit(pytest.main([__file__]))
@@ -0,0 +1,25 @@
+"""Encoding of the varints used by the protobuf wire format."""
+
+
+def decode_varint(data: bytes, position: int) -> tuple[int, int]:
+  """Returns the varint at the position and the position after it."""
+  result = 0
+  shift = 0
+  while True:
+    byte = data[position]
+    position += 1
+    result |= (byte & 0x7F) << shift
+    if not byte & 0x80:
+      return result, position
+    shift += 7
+
+
+def encode_varint(value: int) -> bytes:
+  if value <= 0x7F:
+    return bytes((value,))
+  result = bytearray()
+  while value > 0x7F:
+    result.append((value & 0x7F) | 0x80)
+    value >>= 7
+  result.append(value)
+  return bytes(result)
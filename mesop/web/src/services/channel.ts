@@ -14,8 +14,10 @@ import {
 } from 'mesop/mesop/protos/ui_jspb_proto_pb/mesop/protos/ui_pb';
 import {Title} from '@angular/platform-browser';
 import {SSE} from '../utils/sse';
+import {BinaryStream, decodeFrame} from '../utils/binary_stream';
 import {prefixBasePath} from '../utils/base_path';
 import {applyComponentDiff, applyStateDiff} from '../utils/diff';
+import {StyleTable} from '../utils/style_table';
 import {getViewportSize} from '../utils/viewport_size';
 import {ThemeService} from './theme_service';
 import {getQueryParams} from '../utils/query_params';
@@ -56,6 +58,7 @@ export class Channel {
   private isWaiting = false;
   private isWaitingTimeout: number | undefined;
   private eventSource!: SSE;
+  private binaryStream: BinaryStream | undefined;
   private webSocket: WebSocket | undefined;
   private wsReconnectAttempts = 0;
   private wsMaxReconnectAttempts = 3;
@@ -68,6 +71,7 @@ export class Channel {
   private hotReloadBackoffCounter = 0;
   private hotReloadCounter = 0;
   private commandQueue: Command[] = [];
+  private styleTable = new StyleTable();
   private commandQueuePromise: Promise<void> | undefined;
 
   // Client-side state
@@ -125,6 +129,8 @@ export class Channel {
 
     if (this.experimentService.websocketsEnabled) {
       this.initWebSocket(initParams, request);
+    } else if (this.experimentService.binaryTransportEnabled) {
+      this.initBinaryStream(initParams, request);
     } else {
       this.initSSE(initParams, request);
     }
@@ -148,12 +154,7 @@ export class Channel {
         const data = (e as any).data;
         if (data === STREAM_END) {
           this.eventSource.close();
-          this.status = ChannelStatus.CLOSED;
-          clearTimeout(this.isWaitingTimeout);
-          this.isWaiting = false;
-          this._isHotReloading = false;
-          await this.processMessageQueue();
-          this.dequeueEvent();
+          await this.handleHttpStreamEnd();
           return;
         }
 
@@ -165,6 +166,55 @@ export class Channel {
     });
   }
 
+  /**
+   * Same as `initSSE` except the request and response are sent as binary
+   * frames instead of base64-encoded text, which is smaller and avoids the
+   * base64 encoding and decoding.
+   */
+  private initBinaryStream(initParams: InitParams, request: UiRequest) {
+    this.status = ChannelStatus.OPEN;
+    this.isWaitingTimeout = setTimeout(() => {
+      this.isWaiting = true;
+    }, WAIT_TIMEOUT_MS);
+
+    const {zone} = initParams;
+    this.initParams = initParams;
+
+    this.binaryStream = new BinaryStream(prefixBasePath('/__ui__'), {
+      payload: serializeRequest(request),
+      onFrame: (frame) => {
+        zone.run(async () => {
+          // An empty frame marks the end of the stream.
+          if (!frame.length) {
+            this.binaryStream?.close();
+            await this.handleHttpStreamEnd();
+            return;
+          }
+          const uiResponse = UiResponse.deserializeBinary(frame);
+          console.debug('Server event (binary): ', uiResponse.toObject());
+          this.queueMessage(request, uiResponse);
+        });
+      },
+      onError: (error) => {
+        zone.run(() => {
+          console.error('Binary stream error:', error);
+          this.status = ChannelStatus.CLOSED;
+          clearTimeout(this.isWaitingTimeout);
+          this.isWaiting = false;
+        });
+      },
+    });
+  }
+
+  private async handleHttpStreamEnd() {
+    this.status = ChannelStatus.CLOSED;
+    clearTimeout(this.isWaitingTimeout);
+    this.isWaiting = false;
+    this._isHotReloading = false;
+    await this.processMessageQueue();
+    this.dequeueEvent();
+  }
+
   private createInitRequest(): UiRequest {
     const refreshRequest = new UiRequest();
     const initRequest = new InitRequest();
@@ -176,19 +226,24 @@ export class Channel {
   }
 
   private initWebSocket(initParams: InitParams, request: UiRequest) {
+    const binary = this.experimentService.binaryTransportEnabled;
+    const generatePayload = binary ? serializeRequest : generatePayloadString;
     if (this.webSocket?.readyState === WebSocket.OPEN) {
       this.status = ChannelStatus.OPEN;
-      const payload = generatePayloadString(request);
+      const payload = generatePayload(request);
       this.webSocket.send(payload);
       return;
     }
 
     const wsProtocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    // Browsers cannot set headers on the WebSocket upgrade request, so binary
+    // frames are requested with a query param.
     const wsUrl = `${wsProtocol}//${window.location.host}${prefixBasePath(
       '/__ui__',
-    )}`;
+    )}${binary ? '?transport=binary' : ''}`;
 
     this.webSocket = new WebSocket(wsUrl);
+    this.webSocket.binaryType = 'arraybuffer';
     this.status = ChannelStatus.OPEN;
     this.isWaitingTimeout = setTimeout(() => {
       this.isWaiting = true;
@@ -199,19 +254,29 @@ export class Channel {
 
     this.webSocket.onopen = () => {
       // Send the initial UiRequest upon connection
-      const payload = generatePayloadString(request);
+      const payload = generatePayload(request);
       this.webSocket!.send(payload);
       this.wsReconnectAttempts = 0;
     };
 
     this.webSocket.onmessage = (event) => {
       zone.run(async () => {
-        const prefix = 'data: ';
-        const payloadData = (
-          event.data.slice(prefix.length) as string
-        ).trimEnd();
+        let array: Uint8Array;
+        if (event.data instanceof ArrayBuffer) {
+          array = decodeFrame(event.data);
+        } else {
+          const prefix = 'data: ';
+          const payloadData = (
+            event.data.slice(prefix.length) as string
+          ).trimEnd();
+          array =
+            payloadData === STREAM_END
+              ? new Uint8Array(0)
+              : toUint8Array(atob(payloadData));
+        }
 
-        if (payloadData === STREAM_END) {
+        // An empty payload marks the end of the stream.
+        if (!array.length) {
           this._isHotReloading = false;
           this.status = ChannelStatus.CLOSED;
           await this.processMessageQueue();
@@ -219,9 +284,19 @@ export class Channel {
           return;
         }
 
-        const array = toUint8Array(atob(payloadData));
         const uiResponse = UiResponse.deserializeBinary(array);
         console.debug('Server event (WebSocket): ', uiResponse.toObject());
+        if (uiResponse.getTypeCase() === UiResponse.TypeCase.SERVER_BUSY) {
+          // The server did not process the request, so resend it after the
+          // requested delay.
+          const serverBusy = uiResponse.getServerBusy()!;
+          setTimeout(() => {
+            if (this.webSocket?.readyState === WebSocket.OPEN) {
+              this.webSocket.send(generatePayload(serverBusy.getRequest()!));
+            }
+          }, serverBusy.getRetryAfterMs());
+          return;
+        }
         this.queueMessage(request, uiResponse);
       });
     };
@@ -306,6 +381,13 @@ export class Channel {
       case UiResponse.TypeCase.RENDER: {
         const rootComponent = uiResponse.getRender()!.getRootComponent()!;
         const componentDiff = uiResponse.getRender()!.getComponentDiff()!;
+        this.styleTable.update(uiResponse.getRender()!.getStylesList());
+        if (rootComponent !== undefined) {
+          this.styleTable.resolveComponent(rootComponent);
+        }
+        if (componentDiff !== undefined) {
+          this.styleTable.resolveComponentDiff(componentDiff);
+        }
 
         this.commandQueue.push(...uiResponse.getRender()!.getCommandsList());
         await this.processCommandQueue(onCommand);
@@ -352,6 +434,9 @@ export class Channel {
           console.error('error', uiResponse.getError());
         }
         break;
+      case UiResponse.TypeCase.SERVER_BUSY:
+        // Handled when the message is received (only sent in WebSockets mode).
+        break;
       case UiResponse.TypeCase.TYPE_NOT_SET:
         throw new Error(`Unhandled case for server event: ${uiResponse}`);
     }
@@ -567,14 +652,18 @@ function createDeferred<T = void>(): {
   return {promise, resolve, reject};
 }
 
-function generatePayloadString(request: UiRequest): string {
+function serializeRequest(request: UiRequest): Uint8Array {
   let path = window.location.pathname;
   const base = (window as any)['__MESOP_BASE_URL_PATH__'] as string | undefined;
   if (base && path.startsWith(base)) {
     path = path.slice(base.length) || '/';
   }
   request.setPath(path);
-  const array = request.serializeBinary();
+  return request.serializeBinary();
+}
+
+function generatePayloadString(request: UiRequest): string {
+  const array = serializeRequest(request);
   const byteString = btoa(fromUint8Array(array))
     // Make this URL-safe:
     .replace(/\+/g, '-')
@@ -2,6 +2,7 @@ import {Injectable} from '@angular/core';
 
 interface ExperimentSettings {
   readonly websocketsEnabled: boolean;
+  readonly binaryTransportEnabled: boolean;
   readonly webComponentsCacheKey: string | null;
 }
 
@@ -15,6 +16,8 @@ export class ExperimentService {
     const windowSettings = (window as any)['__MESOP_EXPERIMENTS__'];
     this.settings = {
       websocketsEnabled: windowSettings?.['websocketsEnabled'] ?? false,
+      binaryTransportEnabled:
+        windowSettings?.['binaryTransportEnabled'] ?? false,
       webComponentsCacheKey: windowSettings?.['webComponentsCacheKey'] ?? null,
     };
   }
@@ -22,6 +25,9 @@ export class ExperimentService {
   get websocketsEnabled(): boolean {
     return this.settings.websocketsEnabled;
   }
+  get binaryTransportEnabled(): boolean {
+    return this.settings.binaryTransportEnabled;
+  }
   get webComponentsCacheKey(): string | null {
     return this.settings.webComponentsCacheKey;
   }
@@ -0,0 +1,107 @@
+/**
+ * Binary transport for UI responses.
+ *
+ * Each frame is the serialized proto prefixed with its length as a 4-byte
+ * big-endian unsigned integer. An empty frame marks the end of the stream.
+ *
+ * This mirrors `serialize` in mesop/server/server_utils.py.
+ */
+
+export const BINARY_CONTENT_TYPE = 'application/octet-stream';
+
+const LENGTH_PREFIX_BYTES = 4;
+
+/**
+ * Splits a byte stream into frames. Chunks may contain partial frames or
+ * several frames, so leftover bytes are buffered until the next chunk.
+ */
+export class FrameDecoder {
+  private buffer = new Uint8Array(0);
+
+  /** Returns the payload of each frame completed by `chunk`. */
+  push(chunk: Uint8Array): Uint8Array[] {
+    if (this.buffer.length) {
+      const combined = new Uint8Array(this.buffer.length + chunk.length);
+      combined.set(this.buffer);
+      combined.set(chunk, this.buffer.length);
+      chunk = combined;
+    }
+    const frames: Uint8Array[] = [];
+    const view = new DataView(chunk.buffer, chunk.byteOffset, chunk.length);
+    let offset = 0;
+    while (chunk.length - offset >= LENGTH_PREFIX_BYTES) {
+      const length = view.getUint32(offset);
+      const end = offset + LENGTH_PREFIX_BYTES + length;
+      if (end > chunk.length) {
+        break;
+      }
+      frames.push(chunk.subarray(offset + LENGTH_PREFIX_BYTES, end));
+      offset = end;
+    }
+    // Copy the leftover bytes so we don't hold a reference to the whole chunk.
+    this.buffer = chunk.slice(offset);
+    return frames;
+  }
+}
+
+/**
+ * Decodes a single WebSocket message, which contains exactly one frame.
+ */
+export function decodeFrame(data: ArrayBuffer): Uint8Array {
+  const frames = new FrameDecoder().push(new Uint8Array(data));
+  if (frames.length !== 1) {
+    throw new Error(`Expected one frame but got ${frames.length}`);
+  }
+  return frames[0];
+}
+
+interface BinaryStreamOptions {
+  payload: Uint8Array;
+  onFrame: (frame: Uint8Array) => void;
+  onError: (error: unknown) => void;
+}
+
+/**
+ * Streams frames from a POST request, similar to `SSE` for the text transport.
+ */
+export class BinaryStream {
+  private readonly abortController = new AbortController();
+
+  constructor(url: string, options: BinaryStreamOptions) {
+    this.stream(url, options).catch((error) => {
+      if (!this.abortController.signal.aborted) {
+        options.onError(error);
+      }
+    });
+  }
+
+  close() {
+    this.abortController.abort();
+  }
+
+  private async stream(url: string, options: BinaryStreamOptions) {
+    const response = await fetch(url, {
+      method: 'POST',
+      headers: {
+        'Accept': BINARY_CONTENT_TYPE,
+        'Content-Type': BINARY_CONTENT_TYPE,
+      },
+      body: options.payload,
+      signal: this.abortController.signal,
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`Server responded with status: ${response.status}`);
+    }
+    const reader = response.body.getReader();
+    const decoder = new FrameDecoder();
+    while (true) {
+      const {done, value} = await reader.read();
+      if (done) {
+        return;
+      }
+      for (const frame of decoder.push(value)) {
+        options.onFrame(frame);
+      }
+    }
+  }
+}
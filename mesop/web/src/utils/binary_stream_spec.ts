@@ -0,0 +1,34 @@
+import {FrameDecoder, decodeFrame} from './binary_stream';
+
+function frame(...payload: number[]): number[] {
+  return [0, 0, 0, payload.length, ...payload];
+}
+
+describe('FrameDecoder', () => {
+  it('decodes multiple frames in one chunk', () => {
+    const decoder = new FrameDecoder();
+
+    const frames = decoder.push(new Uint8Array([...frame(1, 2), ...frame(3)]));
+
+    expect(frames.map((f) => Array.from(f))).toEqual([[1, 2], [3]]);
+  });
+
+  it('buffers partial frames across chunks', () => {
+    const decoder = new FrameDecoder();
+    const bytes = [...frame(1, 2, 3), ...frame()];
+
+    expect(decoder.push(new Uint8Array(bytes.slice(0, 2)))).toEqual([]);
+    expect(decoder.push(new Uint8Array(bytes.slice(2, 6)))).toEqual([]);
+    const frames = decoder.push(new Uint8Array(bytes.slice(6)));
+
+    expect(frames.map((f) => Array.from(f))).toEqual([[1, 2, 3], []]);
+  });
+});
+
+describe('decodeFrame', () => {
+  it('decodes a single frame', () => {
+    const data = new Uint8Array(frame(7, 8)).buffer;
+
+    expect(Array.from(decodeFrame(data))).toEqual([7, 8]);
+  });
+});
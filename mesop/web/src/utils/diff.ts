@@ -1,6 +1,7 @@
 import {
   Component,
   ComponentDiff,
+  Type,
 } from 'mesop/mesop/protos/ui_jspb_proto_pb/mesop/protos/ui_pb';
 
 /** Updates the given component in place with the provided diffs. */
@@ -34,50 +35,130 @@ export function applyComponentDiff(component: Component, diff: ComponentDiff) {
     ComponentDiff.UpdateStrategy.UPDATE_STRATEGY_REPLACE
   ) {
     component.setType(diff.getType());
+  } else if (
+    diff.getUpdateStrategyType() ===
+    ComponentDiff.UpdateStrategy.UPDATE_STRATEGY_APPEND
+  ) {
+    component.setType(
+      appendToTypeValue(component.getType()!, diff.getType()!.getValue_asU8()),
+    );
+  }
+
+  const childDiffs = diff.getChildrenList();
+  if (!childDiffs.length) {
+    return;
+  }
+  const children = [...component.getChildrenList()];
+
+  // Apply deletions first. Their indexes refer to the old children, so delete from
+  // the highest index to the lowest index to keep the remaining indexes valid.
+  const deleteIndexes = childDiffs
+    .filter(
+      (childDiff) =>
+        childDiff.getDiffType() === ComponentDiff.DiffType.DIFF_TYPE_DELETE,
+    )
+    .map((childDiff) => childDiff.getIndex() as number)
+    .sort((a, b) => b - a);
+  for (const deleteIndex of deleteIndexes) {
+    children.splice(deleteIndex, 1);
+  }
+
+  // Moves and inserts are sent when children are matched by key. They must be
+  // applied in order since each one refers to the children as updated by the
+  // previous ones.
+  for (const childDiff of childDiffs) {
+    if (childDiff.getDiffType() === ComponentDiff.DiffType.DIFF_TYPE_MOVE) {
+      const [child] = children.splice(childDiff.getFromIndex() as number, 1);
+      children.splice(childDiff.getIndex() as number, 0, child);
+    } else if (
+      childDiff.getDiffType() === ComponentDiff.DiffType.DIFF_TYPE_INSERT
+    ) {
+      children.splice(
+        childDiff.getIndex() as number,
+        0,
+        childDiff.getComponent()!,
+      );
+    }
   }
 
-  let deleteIndex = -1;
-  for (const childDiff of diff.getChildrenList()) {
+  // Update indexes refer to the new children.
+  for (const childDiff of childDiffs) {
     if (childDiff.getDiffType() === ComponentDiff.DiffType.DIFF_TYPE_UPDATE) {
       applyComponentDiff(
-        component.getChildrenList()[childDiff.getIndex() as number],
+        children[childDiff.getIndex() as number],
         childDiff,
       );
     } else if (
       // We do not care about adding the node to a specific index since we expect
       // additions to be added in order after all updates.
-      //
-      // Once deletions are applied, the additions should be at the expected location
-      // in the component tree.
       childDiff.getDiffType() === ComponentDiff.DiffType.DIFF_TYPE_ADD
     ) {
-      component.addChildren(childDiff.getComponent());
-    } else if (
-      childDiff.getDiffType() === ComponentDiff.DiffType.DIFF_TYPE_DELETE &&
-      (deleteIndex === -1 || (childDiff.getIndex() as number) < deleteIndex)
-    ) {
-      // Only track the smallest `deleteIndex` if there are deletions. See comment
-      // below.
-      deleteIndex = childDiff.getIndex() as number;
+      children.push(childDiff.getComponent()!);
     }
   }
 
-  // If deleteIndex is set to a non-negative number, this means that we have child nodes
-  // to delete.
-  //
-  // Due to the way deletes are determined, we know that deletes will always occur
-  // sequentially to the end of the list. This allows us to delete all nodes after the
-  // lowest `deleteIndex` found.
-  if (deleteIndex !== -1) {
-    component.setChildrenList(
-      component.getChildrenList().slice(0, deleteIndex),
-    );
+  component.setChildrenList(children);
+}
+
+/**
+ * Returns a copy of the type with bytes appended to the first field of its
+ * value, which is a length-delimited field (e.g. the text of a markdown
+ * component).
+ *
+ * A new type is returned, rather than updating it in place, so that components
+ * detect the change.
+ *
+ * Keep in sync with `_append_to_first_field` in helper.py.
+ */
+function appendToTypeValue(type: Type, appendedValue: Uint8Array): Type {
+  const value = type.getValue_asU8();
+  // Skip the tag of the first field, then decode the length of the field.
+  let position = 1;
+  let length = 0;
+  let multiplier = 1;
+  let byte: number;
+  do {
+    byte = value[position++];
+    length += (byte & 0x7f) * multiplier;
+    multiplier *= 128;
+  } while (byte & 0x80);
+  const end = position + length;
+
+  const newLength = encodeVarint(length + appendedValue.length);
+  const newValue = new Uint8Array(
+    1 + newLength.length + length + appendedValue.length + value.length - end,
+  );
+  let offset = 0;
+  for (const part of [
+    value.subarray(0, 1),
+    newLength,
+    value.subarray(position, end),
+    appendedValue,
+    value.subarray(end),
+  ]) {
+    newValue.set(part, offset);
+    offset += part.length;
+  }
+
+  const newType = Type.deserializeBinary(type.serializeBinary());
+  newType.setValue(newValue);
+  return newType;
+}
+
+function encodeVarint(value: number): Uint8Array {
+  const bytes: number[] = [];
+  while (value > 0x7f) {
+    bytes.push((value % 128) | 0x80);
+    value = Math.floor(value / 128);
   }
+  bytes.push(value);
+  return new Uint8Array(bytes);
 }
 
 const STATE_DIFF_VALUES_CHANGED = 'values_changed';
 const STATE_DIFF_TYPE_CHANGES = 'type_changes';
 const STATE_DIFF_DATA_FRAME_CHANGED = 'data_frame_changed';
+const STATE_DIFF_DATA_FRAME_PATCHED = 'data_frame_patched';
 const STATE_DIFF_EQUALITY_CHANGED = 'mesop_equality_changed';
 const STATE_DIFF_ITERABLE_ITEM_REMOVED = 'iterable_item_removed';
 const STATE_DIFF_ITERABLE_ITEM_ADDED = 'iterable_item_added';
@@ -88,6 +169,10 @@ const STATE_DIFF_DICT_ITEM_ADDED = 'dictionary_item_added';
 const STATE_DIFF_ITERABLE_ITEMS_INSERTED = 'iterable_items_inserted';
 const STATE_DIFF_ITERABLE_ITEMS_REMOVED = 'iterable_items_deleted';
 
+// Key of DataFrames with patches that the server applies when it decodes the state.
+// Keep in sync with `_PANDAS_PATCHED_OBJECT_KEY` in dataclass_utils.py.
+const PATCHED_DATA_FRAME_KEY = '__pandas.DataFrame.patched__';
+
 // Interface for state diff objects.
 interface StateDiff {
   path: (string | number)[];
@@ -125,6 +210,8 @@ export function applyStateDiff(stateJson: string, diffJson: string): string {
       row.action === STATE_DIFF_EQUALITY_CHANGED
     ) {
       updateValue(root, row.path, row.value);
+    } else if (row.action === STATE_DIFF_DATA_FRAME_PATCHED) {
+      addDataFramePatch(root, row.path, row.value);
     } else if (row.action === STATE_DIFF_DICT_ITEM_ADDED) {
       updateObjectValue(root, row.path, row.value);
     } else if (row.action === STATE_DIFF_DICT_ITEM_REMOVED) {
@@ -173,6 +260,32 @@ function updateValue(root: object, path: (string | number)[], value: any) {
   }
 }
 
+// Adds a patch (changed cells or rows) to the DataFrame at path.
+//
+// DataFrames are encoded in formats that cannot be updated here (e.g. Arrow), so the
+// patches are kept with the DataFrame, and applied by the server when it decodes the
+// state.
+function addDataFramePatch(
+  root: object,
+  path: (string | number)[],
+  patch: any,
+) {
+  const objectSegment = getLastObjectSegment(root, path);
+  if (objectSegment) {
+    const key = path[path.length - 1];
+    // @ts-ignore: Ignore type
+    const dataFrame = objectSegment[key];
+    if (dataFrame[PATCHED_DATA_FRAME_KEY]) {
+      dataFrame[PATCHED_DATA_FRAME_KEY].patches.push(patch);
+    } else {
+      // @ts-ignore: Ignore type
+      objectSegment[key] = {
+        [PATCHED_DATA_FRAME_KEY]: {data_frame: dataFrame, patches: [patch]},
+      };
+    }
+  }
+}
+
 // Adds item to the array at path.
 function addArrayValue(root: object, path: (string | number)[], value: any) {
   const objectSegment = getLastObjectSegment(root, path);
@@ -173,6 +173,28 @@ describe('applyComponentDiff functionality', () => {
     expect(c).toEqual(expectedC);
   });
 
+  it('applies append diffs on type field', () => {
+    // Starting component. Key stands in for a component type whose first field
+    // is text.
+    const c = createDefaultComponent();
+    c.getType()!.setValue(createKey('a'.repeat(100)).serializeBinary());
+    // Diff
+    const diff = new ComponentDiff();
+    const diffType = new Type();
+    diffType.setValue(new TextEncoder().encode('b'.repeat(100)));
+    diff.setType(diffType);
+    diff.setUpdateStrategyType(
+      ComponentDiff.UpdateStrategy.UPDATE_STRATEGY_APPEND,
+    );
+
+    applyComponentDiff(c, diff);
+
+    expect(
+      Key.deserializeBinary(c.getType()!.getValue_asU8()).getKey(),
+    ).toEqual('a'.repeat(100) + 'b'.repeat(100));
+    expect(c.getType()!.getName()).toEqual(createType('test').getName());
+  });
+
   it('applies update diffs on child components', () => {
     // Starting component
     const c1 = createDefaultComponent();
@@ -411,4 +433,56 @@ describe('applyComponentDiff functionality', () => {
 
     expect(c1).toEqual(expectedC1);
   });
+
+  it('applies delete, move and insert diffs on keyed child components', () => {
+    // Starting component: [a, b, c, d]
+    const c1 = createDefaultComponent();
+    for (const key of ['a', 'b', 'c', 'd']) {
+      const child = createDefaultComponent();
+      child.setKey(createKey(key));
+      c1.addChildren(child);
+    }
+    // Diff to get [d, new, a, c]
+    const diffC1 = new ComponentDiff();
+    diffC1.setDiffType(ComponentDiff.DiffType.DIFF_TYPE_UPDATE);
+    const deleteB = new ComponentDiff();
+    deleteB.setIndex(1);
+    deleteB.setDiffType(ComponentDiff.DiffType.DIFF_TYPE_DELETE);
+    diffC1.addChildren(deleteB);
+    const insertNew = new ComponentDiff();
+    insertNew.setIndex(0);
+    insertNew.setDiffType(ComponentDiff.DiffType.DIFF_TYPE_INSERT);
+    const newC = createDefaultComponent();
+    newC.setKey(createKey('new'));
+    insertNew.setComponent(newC);
+    diffC1.addChildren(insertNew);
+    const moveD = new ComponentDiff();
+    moveD.setIndex(0);
+    moveD.setFromIndex(3);
+    moveD.setDiffType(ComponentDiff.DiffType.DIFF_TYPE_MOVE);
+    diffC1.addChildren(moveD);
+    // Update indexes refer to the new children.
+    const updateC = new ComponentDiff();
+    updateC.setIndex(3);
+    updateC.setDiffType(ComponentDiff.DiffType.DIFF_TYPE_UPDATE);
+    updateC.setStyle(createStyle('blue', '2'));
+    updateC.setUpdateStrategyStyle(
+      ComponentDiff.UpdateStrategy.UPDATE_STRATEGY_REPLACE,
+    );
+    diffC1.addChildren(updateC);
+    // Expected updates
+    const expectedC1 = createDefaultComponent();
+    for (const key of ['d', 'new', 'a', 'c']) {
+      const child = createDefaultComponent();
+      child.setKey(createKey(key));
+      if (key === 'c') {
+        child.setStyle(createStyle('blue', '2'));
+      }
+      expectedC1.addChildren(child);
+    }
+
+    applyComponentDiff(c1, diffC1);
+
+    expect(c1).toEqual(expectedC1);
+  });
 });
@@ -315,6 +315,41 @@ describe('applyStateDiff functionality', () => {
     );
   });
 
+  it('adds data frame patches', () => {
+    const dataFrame = {'__pandas.DataFrame.arrow__': 'AAAA'};
+    const state1 = JSON.stringify({data: [dataFrame]});
+    const diff1 = JSON.stringify([
+      {
+        path: ['data', 0],
+        action: 'data_frame_patched',
+        value: {cells: [[1, 0, 'Universe']]},
+      },
+    ]);
+    const diff2 = JSON.stringify([
+      {
+        path: ['data', 0],
+        action: 'data_frame_patched',
+        value: {start: 0, stop: 1, reset_index: true},
+      },
+    ]);
+
+    expect(applyStateDiff(applyStateDiff(state1, diff1), diff2)).toBe(
+      JSON.stringify({
+        data: [
+          {
+            '__pandas.DataFrame.patched__': {
+              data_frame: dataFrame,
+              patches: [
+                {cells: [[1, 0, 'Universe']]},
+                {start: 0, stop: 1, reset_index: true},
+              ],
+            },
+          },
+        ],
+      }),
+    );
+  });
+
   it('applies updates to bytes', () => {
     const state1 = JSON.stringify({
       data: {
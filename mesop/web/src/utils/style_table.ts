@@ -0,0 +1,58 @@
+import {
+  Component,
+  ComponentDiff,
+  Style,
+  StyleTableEntry,
+} from 'mesop/mesop/protos/ui_jspb_proto_pb/mesop/protos/ui_pb';
+
+/**
+ * Resolves the style IDs sent by the server when the style table is enabled.
+ *
+ * Entries are kept for the lifetime of the page since the server only sends
+ * each style once per session. Resolved components share the style instances,
+ * which must not be modified.
+ */
+export class StyleTable {
+  private readonly styles = new Map<number, Style>();
+
+  /** Adds the entries, replacing any previous entries with the same IDs. */
+  update(entries: StyleTableEntry[]) {
+    for (const entry of entries) {
+      this.styles.set(entry.getId()!, entry.getStyle()!);
+    }
+  }
+
+  /** Replaces the style IDs of the component tree with styles in place. */
+  resolveComponent(component: Component) {
+    if (component.hasStyleId()) {
+      component.setStyle(this.getStyle(component.getStyleId()!));
+      component.clearStyleId();
+    }
+    for (const child of component.getChildrenList()) {
+      this.resolveComponent(child);
+    }
+  }
+
+  /** Replaces the style IDs of the component diff with styles in place. */
+  resolveComponentDiff(diff: ComponentDiff) {
+    if (diff.hasStyleId()) {
+      diff.setStyle(this.getStyle(diff.getStyleId()!));
+      diff.clearStyleId();
+    }
+    const component = diff.getComponent();
+    if (component) {
+      this.resolveComponent(component);
+    }
+    for (const child of diff.getChildrenList()) {
+      this.resolveComponentDiff(child);
+    }
+  }
+
+  private getStyle(id: number): Style | undefined {
+    const style = this.styles.get(id);
+    if (!style) {
+      console.error(`Style ID ${id} was not sent by the server.`);
+    }
+    return style;
+  }
+}
@@ -0,0 +1,83 @@
+import {
+  Component,
+  ComponentDiff,
+  Style,
+  StyleTableEntry,
+} from 'mesop/mesop/protos/ui_jspb_proto_pb/mesop/protos/ui_pb';
+import {StyleTable} from 'mesop/mesop/web/src/utils/style_table';
+
+function createStyle(color: string) {
+  const style = new Style();
+  style.setColor(color);
+  return style;
+}
+
+function createEntry(id: number, color: string) {
+  const entry = new StyleTableEntry();
+  entry.setId(id);
+  entry.setStyle(createStyle(color));
+  return entry;
+}
+
+function createComponent(styleId?: number) {
+  const component = new Component();
+  if (styleId !== undefined) {
+    component.setStyleId(styleId);
+  }
+  return component;
+}
+
+describe('StyleTable', () => {
+  it('resolves style IDs in a component tree', () => {
+    const table = new StyleTable();
+    table.update([createEntry(1, 'red'), createEntry(2, 'blue')]);
+    const root = createComponent(1);
+    root.addChildren(createComponent(2));
+    root.addChildren(createComponent());
+
+    table.resolveComponent(root);
+
+    const expected = new Component();
+    expected.setStyle(createStyle('red'));
+    const child = new Component();
+    child.setStyle(createStyle('blue'));
+    expected.addChildren(child);
+    expected.addChildren(new Component());
+    expect(root).toEqual(expected);
+  });
+
+  it('resolves style IDs in a component diff', () => {
+    const table = new StyleTable();
+    table.update([createEntry(1, 'red')]);
+    const diff = new ComponentDiff();
+    diff.setStyleId(1);
+    diff.setUpdateStrategyStyle(
+      ComponentDiff.UpdateStrategy.UPDATE_STRATEGY_REPLACE,
+    );
+    const childDiff = new ComponentDiff();
+    childDiff.setComponent(createComponent(1));
+    diff.addChildren(childDiff);
+
+    table.resolveComponentDiff(diff);
+
+    expect(diff.hasStyleId()).toBeFalse();
+    expect(diff.getStyle()).toEqual(createStyle('red'));
+    expect(diff.getChildrenList()[0].getComponent()!.getStyle()).toEqual(
+      createStyle('red'),
+    );
+  });
+
+  it('keeps entries across updates and replaces entries with the same ID', () => {
+    const table = new StyleTable();
+    table.update([createEntry(1, 'red'), createEntry(2, 'blue')]);
+    table.update([createEntry(1, 'green')]);
+    const first = createComponent(1);
+    const second = createComponent(2);
+
+    table.resolveComponent(first);
+    table.resolveComponent(second);
+
+    expect(first.getStyle()).toEqual(createStyle('green'));
+    expect(second.getStyle()).toEqual(createStyle('blue'));
+  });
+});
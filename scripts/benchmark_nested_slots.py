@@ -0,0 +1,101 @@
+"""Benchmarks rendering deeply nested content components.
+
+Renders a page similar to `mesop/examples/testing/complex_slots.py`, where each
+level nests a content component with named slots inside a content component
+with an unnamed slot, and reports the time to render the page and convert the
+component tree to a protobuf message. Each level adds three components to the
+depth of the component tree, which protobuf limits to 100.
+
+Usage:
+
+python scripts/benchmark_nested_slots.py --depth 25 --iterations 20
+"""
+
+import argparse
+import statistics
+import time
+
+from flask import Flask
+
+import mesop as me
+from mesop.runtime import runtime
+
+_depth = 0
+
+
+@me.slotclass
+class LayoutSlots:
+  header: me.NamedSlot
+  footer: me.NamedSlot
+
+
+@me.content_component(named_slots=LayoutSlots)
+def layout_named(level: int):
+  with me.box(style=me.Style(display="flex", flex_direction="column")):
+    me.text(f"Header start {level}")
+    with custom_card():
+      me.text("Card within the layout")
+    me.slot(name="header")
+    me.text(f"Header end {level}")
+    me.text(f"Footer start {level}")
+    me.slot(name="footer")
+    me.text(f"Footer end {level}")
+
+
+@me.content_component
+def custom_card():
+  with me.card():
+    me.card_header(title="Custom Card")
+    with me.card_content():
+      me.slot()
+
+
+def nested(level: int):
+  if level == _depth:
+    me.text("Innermost content")
+    return
+  with layout_named(level) as slots:
+    with slots.header():
+      with custom_card():
+        nested(level + 1)
+    with slots.footer():
+      for i in range(5):
+        me.text(f"Footer item {i}")
+
+
+@me.page(path="/benchmark/nested_slots")
+def page():
+  nested(0)
+
+
+def render() -> int:
+  context = runtime().context()
+  context.reset_current_node()
+  runtime().run_path("/benchmark/nested_slots")
+  return context.current_component().ByteSize()
+
+
+def main():
+  global _depth
+  parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+  parser.add_argument("--depth", type=int, default=25)
+  parser.add_argument("--iterations", type=int, default=20)
+  args = parser.parse_args()
+  _depth = args.depth
+
+  with Flask(__name__).app_context():
+    # Warm up caches, e.g. the serialized component names.
+    size = render()
+    durations = []
+    for _ in range(args.iterations):
+      start = time.perf_counter()
+      render()
+      durations.append(time.perf_counter() - start)
+
+  print(f"Depth: {args.depth} ({size} bytes)")
+  print(f"Median: {statistics.median(durations) * 1000:.2f} ms")
+  print(f"Min: {min(durations) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+  main()
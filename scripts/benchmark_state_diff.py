@@ -0,0 +1,152 @@
+"""Benchmarks diffing state, compared to the DeepDiff implementation.
+
+Diffs a state class with a list of nested dataclasses for a few common changes,
+and reports the time per diff and the size of the diff for `diff_state` and
+`diff_state_with_deepdiff`. Also reports the time to copy the state before an
+event, which `diff_state` requires, and the time to diff the state when its
+mutations are tracked (see `mutation_tracking.py`), which requires no copy.
+
+Usage:
+
+python scripts/benchmark_state_diff.py --items 1000 --iterations 10
+"""
+
+import argparse
+import copy
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from mesop.dataclass_utils.dataclass_utils import (
+  diff_state,
+  diff_state_with_deepdiff,
+)
+from mesop.dataclass_utils.mutation_tracking import (
+  diff_tracked_state,
+  enable_mutation_tracking,
+  start_tracking,
+)
+
+
+@dataclass
+class Message:
+  role: str = ""
+  content: str = ""
+  tokens: list[int] = field(default_factory=list)
+  metadata: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class State:
+  messages: list[Message] = field(default_factory=list)
+  input: str = ""
+  loading: bool = False
+
+
+@dataclass
+class TrackedState(State):
+  pass
+
+
+enable_mutation_tracking(TrackedState)
+
+
+def create_state(items: int, cls: type[State] = State) -> State:
+  return cls(
+    messages=[
+      Message(
+        role="user" if i % 2 else "model",
+        content=f"Message {i}",
+        tokens=list(range(10)),
+        metadata={"id": str(i)},
+      )
+      for i in range(items)
+    ]
+  )
+
+
+def no_change(state: State) -> None:
+  pass
+
+
+def update_field(state: State) -> None:
+  state.input = "Hello"
+  state.loading = True
+
+
+def append_message(state: State) -> None:
+  state.messages.append(Message(role="user", content="New message"))
+
+
+def update_last_message(state: State) -> None:
+  state.messages[-1].content += " (edited)"
+
+
+def insert_first_message(state: State) -> None:
+  state.messages.insert(0, Message(role="user", content="New message"))
+
+
+def time_diff(
+  diff: Callable[[Any, Any], str], state1: State, state2: State, iterations: int
+) -> tuple[float, int]:
+  """Returns the fastest time per diff in milliseconds, and the diff size."""
+  durations = []
+  for _ in range(iterations):
+    start = time.perf_counter()
+    result = diff(state1, state2)
+    durations.append(time.perf_counter() - start)
+  return min(durations) * 1000, len(result)
+
+
+def time_tracked_diff(
+  change: Callable[[State], None], items: int, iterations: int
+) -> float:
+  """Returns the fastest time to make the change and diff it in milliseconds."""
+  durations = []
+  for _ in range(iterations):
+    state = create_state(items, TrackedState)
+    start_tracking(state)
+    start = time.perf_counter()
+    change(state)
+    diff_tracked_state(state)
+    durations.append(time.perf_counter() - start)
+  return min(durations) * 1000
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+  parser.add_argument("--items", type=int, default=1_000)
+  parser.add_argument("--iterations", type=int, default=10)
+  args = parser.parse_args()
+
+  state1 = create_state(args.items)
+  durations = []
+  for _ in range(args.iterations):
+    start = time.perf_counter()
+    copy.deepcopy(state1)
+    durations.append(time.perf_counter() - start)
+  print(f"copy: {min(durations) * 1000:.2f} ms")
+
+  for change in (
+    no_change,
+    update_field,
+    append_message,
+    update_last_message,
+    insert_first_message,
+  ):
+    state2 = copy.deepcopy(state1)
+    change(state2)
+    duration, size = time_diff(diff_state, state1, state2, args.iterations)
+    deepdiff_duration, deepdiff_size = time_diff(
+      diff_state_with_deepdiff, state1, state2, args.iterations
+    )
+    tracked_duration = time_tracked_diff(change, args.items, args.iterations)
+    print(
+      f"{change.__name__}: {duration:.2f} ms ({size} bytes),"
+      f" DeepDiff: {deepdiff_duration:.2f} ms ({deepdiff_size} bytes),"
+      f" tracked: {tracked_duration:.3f} ms"
+    )
+
+
+if __name__ == "__main__":
+  main()
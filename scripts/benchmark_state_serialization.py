@@ -0,0 +1,125 @@
+"""Benchmarks serializing state, compared to `asdict` and `json`.
+
+Serializes and deserializes a state class with a list of nested dataclasses, and
+reports the time per call for `serialize_dataclass` and `update_dataclass_from_json`
+compared to encoding with `asdict`. Also reports the time to save and restore the
+state, and its size, with each state session codec.
+
+Usage:
+
+python scripts/benchmark_state_serialization.py --items 1000 --iterations 10
+"""
+
+import argparse
+import json
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Callable
+
+from mesop.dataclass_utils.dataclass_utils import (
+  MesopJSONEncoder,
+  serialize_dataclass,
+  update_dataclass_from_json,
+)
+from mesop.exceptions import MesopDeveloperException
+from mesop.server.state_session import (
+  JsonStateSessionCodec,
+  MsgpackStateSessionCodec,
+  OrjsonStateSessionCodec,
+  StateSessionCodec,
+)
+
+
+@dataclass
+class Message:
+  role: str = ""
+  content: str = ""
+  created: datetime = datetime(2024, 1, 1)
+  tokens: list[int] = field(default_factory=list)
+  metadata: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class State:
+  messages: list[Message] = field(default_factory=list)
+  input: str = ""
+  loading: bool = False
+
+
+def create_state(items: int) -> State:
+  return State(
+    messages=[
+      Message(
+        role="user" if i % 2 else "model",
+        content=f"Message {i}",
+        tokens=list(range(10)),
+        metadata={"id": str(i)},
+      )
+      for i in range(items)
+    ]
+  )
+
+
+def time_calls(fn: Callable[[], Any], iterations: int) -> float:
+  """Returns the fastest time per call in milliseconds."""
+  durations = []
+  for _ in range(iterations):
+    start = time.perf_counter()
+    fn()
+    durations.append(time.perf_counter() - start)
+  return min(durations) * 1000
+
+
+def time_codec(
+  codec: StateSessionCodec, state: State, iterations: int
+) -> tuple[float, float, int]:
+  """Returns the fastest times to encode and decode the state in milliseconds, and
+  the size of the encoded state."""
+  data = codec.encode({State: state})
+  encode_duration = time_calls(lambda: codec.encode({State: state}), iterations)
+  decode_duration = time_calls(
+    lambda: codec.decode({State: State()}, data), iterations
+  )
+  return encode_duration, decode_duration, len(data)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+  parser.add_argument("--items", type=int, default=1_000)
+  parser.add_argument("--iterations", type=int, default=10)
+  args = parser.parse_args()
+
+  state = create_state(args.items)
+  serialized_state = serialize_dataclass(state)
+  asdict_duration = time_calls(
+    lambda: json.dumps(asdict(state), cls=MesopJSONEncoder), args.iterations
+  )
+  duration = time_calls(lambda: serialize_dataclass(state), args.iterations)
+  print(f"serialize: {duration:.2f} ms, with asdict: {asdict_duration:.2f} ms")
+  duration = time_calls(
+    lambda: update_dataclass_from_json(State(), serialized_state),
+    args.iterations,
+  )
+  print(f"update: {duration:.2f} ms")
+
+  codecs: list[StateSessionCodec] = [
+    JsonStateSessionCodec(),
+    MsgpackStateSessionCodec(),
+  ]
+  try:
+    codecs.append(OrjsonStateSessionCodec())
+  except MesopDeveloperException:
+    print("orjson is not installed")
+  for codec in codecs:
+    encode_duration, decode_duration, size = time_codec(
+      codec, state, args.iterations
+    )
+    print(
+      f"{type(codec).__name__}: save {encode_duration:.2f} ms,"
+      f" restore {decode_duration:.2f} ms ({size} bytes)"
+    )
+
+
+if __name__ == "__main__":
+  main()
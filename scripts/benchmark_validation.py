@@ -0,0 +1,55 @@
+"""Benchmarks the overhead of validating component arguments.
+
+Calls `me.text` with each validation mode (see `ValidationMode`) and reports the
+time per call, and the overhead compared to calling the component without
+validation.
+
+Usage:
+
+python scripts/benchmark_validation.py --calls 10000
+"""
+
+import argparse
+import inspect
+import time
+
+from flask import Flask
+
+import mesop as me
+from mesop.runtime import runtime
+from mesop.utils.validate import validate
+
+_STYLE = me.Style(padding=me.Padding.all(8), color="red")
+
+
+def time_calls(fn, calls: int) -> float:
+  """Returns the fastest time per call in microseconds."""
+  durations = []
+  for _ in range(10):
+    runtime().context().reset_current_node()
+    start = time.perf_counter()
+    for i in range(calls):
+      fn(f"Item {i}", type="body-1", style=_STYLE, key=str(i))
+    durations.append(time.perf_counter() - start)
+  return min(durations) / calls * 1_000_000
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+  parser.add_argument("--calls", type=int, default=10_000)
+  args = parser.parse_args()
+
+  text = inspect.unwrap(me.text)
+  with Flask(__name__).app_context():
+    baseline = time_calls(text, args.calls)
+    print(f"no validation: {baseline:.2f} us per call")
+    for mode in ("full", "fast"):
+      duration = time_calls(validate(text, mode=mode), args.calls)
+      print(
+        f"{mode}: {duration:.2f} us per call"
+        f" ({duration - baseline:.2f} us overhead)"
+      )
+
+
+if __name__ == "__main__":
+  main()